@@ -10,6 +10,7 @@ from src.api.schemas import (
     CacheStatsResponse,
     MatchDetailResponse,
     SearchSuggestion,
+    SimilarTrackResponse,
     TrackResponse,
     TrackTraitResponse,
     TransitionMatchResponse,
@@ -30,6 +31,7 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api")
 
 _match_finder = None
+_ann_index = None
 
 _BPM_BIN_WIDTH = 5
 
@@ -44,10 +46,19 @@ def _get_match_finder():
     if _match_finder is None:
         from src.harmonic_mixing.cosine_cache import CosineCache
         from src.harmonic_mixing.transition_match_finder import TransitionMatchFinder
-        _match_finder = TransitionMatchFinder(cosine_cache=CosineCache())
+        _match_finder = TransitionMatchFinder(cosine_cache=CosineCache(neighbor_table=True))
     return _match_finder
 
 
+def _get_ann_index():
+    """Load the ANN index, reloading it when a store refresh replaced it."""
+    global _ann_index
+    if _ann_index is None or _ann_index.is_stale():
+        from src.feature_extraction.ann_index import AnnIndex
+        _ann_index = AnnIndex.open()
+    return _ann_index
+
+
 @router.get("/search", response_model=List[SearchSuggestion])
 def api_search(q: str = Query(..., min_length=1)):
     from src.api.es import search as es_search
@@ -231,6 +242,40 @@ def api_match_detail(track_id: int, candidate_id: int):
         session.close()
 
 
+@router.get("/tracks/{track_id}/similar", response_model=List[SimilarTrackResponse])
+def api_similar_tracks(track_id: int, k: int = Query(10, ge=1, le=100)):
+    from src.models.track import Track
+
+    index = _get_ann_index()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Similarity index unavailable")
+    vector = index.vector(track_id)
+    if vector is None:
+        raise HTTPException(status_code=404, detail="Track not in similarity index")
+
+    session = _get_session()
+    try:
+        hits = index.search(vector, k=k, exclude=[track_id])
+        ids = [hit_id for hit_id, _ in hits]
+        tracks = {
+            track.id: track
+            for track in session.query(Track).filter(Track.id.in_(ids)).all()
+        } if ids else {}
+        return [
+            dict(serialize_track_row(tracks[hit_id]), similarity=round(score, 4))
+            for hit_id, score in hits
+            if hit_id in tracks
+        ]
+    except HTTPException:
+        raise
+    except Exception:
+        session.rollback()
+        logger.exception("Similar track lookup failed for track_id=%s", track_id)
+        raise HTTPException(status_code=500, detail="Similar track lookup failed")
+    finally:
+        session.close()
+
+
 # ---------------------------------------------------------------------------
 # Admin / cache stats
 # ---------------------------------------------------------------------------
@@ -15,6 +15,10 @@ class TrackResponse(BaseModel):
     energy: Optional[int] = None
 
 
+class SimilarTrackResponse(TrackResponse):
+    similarity: float
+
+
 class SearchSuggestion(BaseModel):
     id: int
     title: str
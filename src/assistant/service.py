@@ -39,7 +39,7 @@ class Assistant:
 
     def __init__(self):
         self.session = database.create_session()
-        self.cosine_cache = CosineCache()
+        self.cosine_cache = CosineCache(neighbor_table=True)
         self.transition_match_finder = TransitionMatchFinder(
             self.session, cosine_cache=self.cosine_cache
         )
@@ -0,0 +1,226 @@
+"""Blocked all-pairs similarity over a matrix of descriptor vectors.
+
+Scoring every pair of an N-track library one call at a time is O(N^2)
+Python calls. iter_tiles() instead walks the upper triangle of the N x N
+similarity matrix in square tiles and scores each tile with the batched
+scorers of track_similarity (one score_many() call per tile row). Tiles are
+yielded in order as they finish, so consumers can fold them into whatever
+they need (condensed score vectors, per-track top-K lists, ...) without the
+full matrix ever existing.
+
+The tile edge is chosen so that the tiles in flight (two per worker plus the
+one being consumed) fit within ALL_PAIRS_MEMORY_MB. With more than one tile
+and worker, tiles are scored on a pool of ALL_PAIRS_WORKERS processes, each
+holding one float64 copy of the matrix.
+
+A diagonal tile (row_start == col_start) covers the full square block,
+including the self-pairs and each pair twice; off-diagonal tiles cover each
+pair once, with the rows before the columns.
+
+Usage:
+    for tile in iter_tiles(matrix, ScorerName.LATE_FUSION_V1):
+        ...  # tile.scores[i, j] scores rows row_start + i and col_start + j
+
+    indices, scores = top_k_neighbours(matrix, k=25)
+"""
+
+import collections
+import math
+import multiprocessing
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from src.feature_extraction.config import ALL_PAIRS_MEMORY_MB, ALL_PAIRS_WORKERS
+from src.feature_extraction.track_similarity import (
+    ScorerName,
+    get_live_fusion_weights,
+    score_many,
+)
+
+
+# Bounds on the tile edge: small tiles waste time on per-row overhead
+_MIN_TILE = 64
+_MAX_TILE = 4096
+
+# Tiles submitted to the pool per worker before waiting for results
+_IN_FLIGHT_PER_WORKER = 2
+
+
+class Tile(NamedTuple):
+    row_start: int
+    col_start: int
+    scores: np.ndarray
+
+    @property
+    def is_diagonal(self) -> bool:
+        return self.row_start == self.col_start
+
+
+def tile_size(n: int, memory_mb: float = ALL_PAIRS_MEMORY_MB, workers: int = 1) -> int:
+    """Tile edge whose in-flight float64 tiles fit within memory_mb."""
+    in_flight = _IN_FLIGHT_PER_WORKER * max(workers, 1) + 1
+    edge = int(math.sqrt(memory_mb * 1024 * 1024 / (8.0 * in_flight)))
+    return max(1, min(n, max(_MIN_TILE, min(edge, _MAX_TILE))))
+
+
+def tile_bounds(n: int, size: int):
+    """(row_start, row_stop, col_start, col_stop) of the upper-triangle tiles."""
+    starts = range(0, n, size)
+    return [
+        (r, min(r + size, n), c, min(c + size, n))
+        for r in starts
+        for c in starts
+        if c >= r
+    ]
+
+
+def score_tile(matrix: np.ndarray, bounds, scorer: ScorerName, **kw) -> np.ndarray:
+    """(rows, cols) score block of matrix rows against matrix columns."""
+    r0, r1, c0, c1 = bounds
+    cols = matrix[c0:c1]
+    return np.stack([score_many(row, cols, scorer=scorer, **kw) for row in matrix[r0:r1]])
+
+
+# Set in pool workers by _init_worker
+_worker_state = {}
+
+
+def _init_worker(matrix, scorer, kw):
+    _worker_state["args"] = (matrix, scorer, kw)
+
+
+def _score_tile_task(bounds):
+    matrix, scorer, kw = _worker_state["args"]
+    return bounds, score_tile(matrix, bounds, scorer, **kw)
+
+
+def iter_tiles(
+    matrix,
+    scorer: ScorerName = ScorerName.LATE_FUSION_V1,
+    memory_mb: float = ALL_PAIRS_MEMORY_MB,
+    workers: int = ALL_PAIRS_WORKERS,
+    tile: Optional[int] = None,
+    **kw,
+):
+    """Yield the upper-triangle Tiles of matrix's all-pairs similarity.
+
+    kw is passed to the scorer (e.g. BenchmarkHarness.corpus_stats()).
+    tile overrides the edge derived from memory_mb. Pool workers get the
+    late-fusion weights resolved here, so they never open a database
+    session on the connection pool inherited across fork.
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    n = len(matrix)
+    if n == 0:
+        return
+    size = tile or tile_size(n, memory_mb, workers)
+    bounds = tile_bounds(n, size)
+    workers = min(max(workers, 1), len(bounds))
+
+    if workers == 1:
+        for b in bounds:
+            yield Tile(b[0], b[2], score_tile(matrix, b, scorer, **kw))
+        return
+
+    if "fusion_weights" not in kw:
+        kw = dict(kw, fusion_weights=get_live_fusion_weights())
+    pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(matrix, scorer, kw))
+    try:
+        pending = collections.deque()
+        remaining = iter(bounds)
+        for b in remaining:
+            pending.append(pool.apply_async(_score_tile_task, (b,)))
+            if len(pending) >= _IN_FLIGHT_PER_WORKER * workers:
+                break
+        while pending:
+            b, scores = pending.popleft().get()
+            next_bounds = next(remaining, None)
+            if next_bounds is not None:
+                pending.append(pool.apply_async(_score_tile_task, (next_bounds,)))
+            yield Tile(b[0], b[2], scores)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def condensed_offsets(n: int) -> np.ndarray:
+    """Index in a condensed (i < j, row-major) pair vector of pair (i, i + 1)."""
+    i = np.arange(n, dtype=np.int64)
+    return i * n - i * (i + 1) // 2
+
+
+def fill_condensed(out: np.ndarray, tile: Tile, offsets: np.ndarray) -> None:
+    """Copy tile's i < j pairs into the condensed score vector out."""
+    rows, cols = tile.scores.shape
+    for k in range(rows):
+        i = tile.row_start + k
+        j0 = max(tile.col_start, i + 1)
+        j1 = tile.col_start + cols
+        if j0 < j1:
+            start = offsets[i] + (j0 - i - 1)
+            out[start:start + (j1 - j0)] = tile.scores[k, j0 - tile.col_start:]
+
+
+def condensed_scores(matrix, scorer: ScorerName = ScorerName.LATE_FUSION_V1, **kw) -> np.ndarray:
+    """Scores of every pair (i < j) in row-major order, as in scipy's pdist."""
+    n = len(matrix)
+    out = np.empty(n * (n - 1) // 2, dtype=np.float64)
+    offsets = condensed_offsets(n)
+    for t in iter_tiles(matrix, scorer, **kw):
+        fill_condensed(out, t, offsets)
+    return out
+
+
+class TopK:
+    """Running top-k neighbours of every row, folded in from Tiles."""
+
+    def __init__(self, n: int, k: int):
+        self.k = max(0, min(k, n - 1))
+        self.scores = np.full((n, self.k), -np.inf)
+        self.indices = np.full((n, self.k), -1, dtype=np.int64)
+
+    def add(self, tile: Tile) -> None:
+        if self.k == 0:
+            return
+        scores = tile.scores
+        if tile.is_diagonal:
+            scores = scores.copy()
+            np.fill_diagonal(scores, -np.inf)
+            self._merge(tile.row_start, scores, tile.col_start)
+        else:
+            self._merge(tile.row_start, scores, tile.col_start)
+            self._merge(tile.col_start, scores.T, tile.row_start)
+
+    def _merge(self, row_start, scores, col_start):
+        rows = slice(row_start, row_start + len(scores))
+        candidates = np.concatenate([self.scores[rows], scores], axis=1)
+        ids = np.concatenate(
+            [
+                self.indices[rows],
+                np.broadcast_to(
+                    np.arange(col_start, col_start + scores.shape[1]), scores.shape
+                ),
+            ],
+            axis=1,
+        )
+        keep = np.argpartition(-candidates, self.k - 1, axis=1)[:, :self.k]
+        self.scores[rows] = np.take_along_axis(candidates, keep, axis=1)
+        self.indices[rows] = np.take_along_axis(ids, keep, axis=1)
+
+    def result(self):
+        """(indices, scores), each (n, k), best neighbour first."""
+        order = np.argsort(-self.scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(self.indices, order, axis=1),
+            np.take_along_axis(self.scores, order, axis=1),
+        )
+
+
+def top_k_neighbours(matrix, k: int, scorer: ScorerName = ScorerName.LATE_FUSION_V1, **kw):
+    """(indices, scores) of every row's k best-scoring other rows."""
+    top = TopK(len(matrix), k)
+    for t in iter_tiles(matrix, scorer, **kw):
+        top.add(t)
+    return top.result()
@@ -0,0 +1,425 @@
+"""Approximate nearest-neighbour (IVF) index over global descriptor vectors.
+
+Transition candidates come from Camelot/BPM buckets; this index answers
+"which tracks sound most like this one" across the whole library instead.
+Vectors are mapped to an index space that mirrors late_fusion_v1 block by
+block (see _embed(); MFCC/energy are z-scored with the training set's
+mean/std) and partitioned into inverted lists by spherical k-means. A query
+probes the n_probe lists whose centroids are closest to it and re-ranks their
+members exactly with score_many(), so results are scored like everywhere else
+(late_fusion_v1 by default); only tracks in unprobed lists can be missed. measure_recall() reports recall@k
+against brute force.
+
+The index is saved as DESCRIPTOR_STORE_DIR/<descriptor version>/ann_index.npz
+(written to a temporary file and renamed into place) and kept in step with
+the descriptor store by sync(): new and recomputed vectors are assigned to
+their nearest existing list, removed tracks are dropped, and the lists are
+retrained once the library has grown _RETRAIN_GROWTH times past the training
+set.
+
+Usage:
+    index, counts = ann_index.sync(store)     # after descriptor_store.refresh()
+    index = AnnIndex.open()                   # None when nothing was built
+    hits = index.search(index.vector(track_id), k=10, exclude=[track_id])
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.feature_extraction.config import (
+    ANN_LISTS,
+    ANN_N_PROBE,
+    DESCRIPTOR_DIMS,
+    DESCRIPTOR_STORE_DIR,
+    DESCRIPTOR_VERSION,
+    descriptor_store_dir,
+)
+from src.feature_extraction.track_similarity import (
+    BPM_IDX,
+    CHROMA_MEAN,
+    CHROMA_STD,
+    ENERGY_BRIGHTNESS,
+    FUSION_WEIGHT_ENERGY,
+    FUSION_WEIGHT_HARMONIC,
+    FUSION_WEIGHT_RHYTHM,
+    FUSION_WEIGHT_TIMBRE,
+    HARMONIC_MEAN_WEIGHT,
+    HARMONIC_STD_WEIGHT,
+    MFCC_MEAN,
+    MFCC_STD,
+    RHYTHM_BPM_WEIGHT,
+    RHYTHM_TEMPOGRAM_WEIGHT,
+    TEMPOGRAM,
+    ScorerName,
+    score_many,
+)
+
+
+# Bump when the saved layout changes
+_FORMAT_VERSION = 1
+
+_FILE_NAME = "ann_index.npz"
+
+_EPS = 1e-10
+_KMEANS_ITERATIONS = 20
+
+# Retrain the lists once the index holds this many times its training set
+_RETRAIN_GROWTH = 2.0
+
+# BPM phase: a quarter turn per 0.6 octave, so a full turn spans more than the
+# normalised BPM range. The BPM kernel is much sharper than the cosine-style
+# blocks, so its block counts double.
+_BPM_PHASE = np.pi / (8 * 0.15)
+_BPM_EMPHASIS = 2.0
+_MIN_BPM = 1e-3
+
+# Rows assigned to lists per matrix product
+_ASSIGN_CHUNK = 8192
+
+
+def _unit(x):
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), _EPS)
+
+
+def _shift_invariant(chroma):
+    """Magnitude spectrum of centred chroma: equal for all 12 transpositions."""
+    centred = chroma - chroma.mean(axis=-1, keepdims=True)
+    return _unit(np.abs(np.fft.rfft(centred, axis=-1)))
+
+
+def _embed(vectors, mean, scale):
+    """Map raw descriptors to unit vectors whose dot products track late_fusion_v1.
+
+    Each block is embedded so that its own dot product behaves like the
+    block similarity, then weighted by the square root of its fusion weight:
+    transposition-invariant chroma spectra for the harmonic block, square-
+    rooted tempogram (Bhattacharyya overlap, close to the Jensen-Shannon
+    score), BPM as a phase on the log2 scale, and z-scored MFCC/energy.
+    """
+    v = np.asarray(vectors, dtype=np.float32)
+    z = (v - mean) / scale
+    phase = np.log2(np.maximum(v[..., BPM_IDX:BPM_IDX + 1], _MIN_BPM)) * _BPM_PHASE
+    blocks = [
+        (FUSION_WEIGHT_HARMONIC * HARMONIC_MEAN_WEIGHT, _shift_invariant(v[..., CHROMA_MEAN])),
+        (FUSION_WEIGHT_HARMONIC * HARMONIC_STD_WEIGHT, _shift_invariant(v[..., CHROMA_STD])),
+        (
+            FUSION_WEIGHT_RHYTHM * RHYTHM_BPM_WEIGHT * _BPM_EMPHASIS,
+            np.concatenate([np.cos(phase), np.sin(phase)], axis=-1),
+        ),
+        (
+            FUSION_WEIGHT_RHYTHM * RHYTHM_TEMPOGRAM_WEIGHT,
+            _unit(np.sqrt(np.maximum(v[..., TEMPOGRAM], 0.0))),
+        ),
+        (
+            FUSION_WEIGHT_TIMBRE,
+            _unit(np.concatenate([z[..., MFCC_MEAN], z[..., MFCC_STD]], axis=-1)),
+        ),
+        (FUSION_WEIGHT_ENERGY, _unit(z[..., ENERGY_BRIGHTNESS])),
+    ]
+    return _unit(np.concatenate([np.sqrt(w) * b for w, b in blocks], axis=-1)).astype(np.float32)
+
+
+def _nearest(x, centroids):
+    """Index of the highest-dot-product centroid of each row of x."""
+    labels = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), _ASSIGN_CHUNK):
+        chunk = x[start:start + _ASSIGN_CHUNK]
+        labels[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return labels
+
+
+def _spherical_kmeans(x, n_lists, iterations, seed):
+    """Unit-norm centroids of n_lists clusters of the unit rows of x."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = _nearest(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, x)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms < _EPS
+        if empty.any():
+            # Re-seed empty lists from random rows
+            sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1)
+        centroids = sums / np.maximum(norms, _EPS)[:, None]
+    return centroids
+
+
+class AnnIndex:
+    """Inverted-file index of raw descriptor vectors keyed by track ID."""
+
+    def __init__(self, centroids, mean, scale, track_ids, vectors, trained_count, path=None):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.trained_count = int(trained_count)
+        self.path = path
+        self._mtime_ns = None
+        self._set_rows(
+            np.asarray(track_ids, dtype=np.int64),
+            np.asarray(vectors, dtype=np.float32).reshape(-1, DESCRIPTOR_DIMS),
+        )
+
+    def _set_rows(self, track_ids, vectors):
+        """Store rows grouped by list, with per-list offsets."""
+        lists = (
+            _nearest(self._embed(vectors), self.centroids)
+            if len(track_ids)
+            else np.empty(0, dtype=np.int64)
+        )
+        order = np.argsort(lists, kind="stable")
+        self.track_ids = track_ids[order]
+        self.vectors = vectors[order]
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(lists, minlength=len(self.centroids)))]
+        ).astype(np.int64)
+        self._by_id = np.argsort(self.track_ids, kind="stable")
+
+    def _embed(self, vectors):
+        return _embed(vectors, self.mean, self.scale)
+
+    @classmethod
+    def build(cls, track_ids, vectors, n_lists=ANN_LISTS, seed=0):
+        """Train lists on vectors and index them.
+
+        n_lists <= 0 picks about sqrt(N) lists.
+        """
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, DESCRIPTOR_DIMS)
+        n = len(vectors)
+        if n == 0:
+            return cls(
+                np.empty((0, DESCRIPTOR_DIMS)),
+                np.zeros(DESCRIPTOR_DIMS),
+                np.ones(DESCRIPTOR_DIMS),
+                track_ids,
+                vectors,
+                0,
+            )
+        std = vectors.std(axis=0)
+        index = cls(
+            np.empty((0, DESCRIPTOR_DIMS)),
+            vectors.mean(axis=0),
+            np.where(std < _EPS, 1.0, std),
+            np.empty(0, dtype=np.int64),
+            np.empty((0, DESCRIPTOR_DIMS)),
+            n,
+        )
+        n_lists = n_lists if n_lists > 0 else int(round(np.sqrt(n)))
+        index.centroids = _spherical_kmeans(
+            index._embed(vectors), max(1, min(n_lists, n)), _KMEANS_ITERATIONS, seed
+        ).astype(np.float32)
+        index._set_rows(track_ids, vectors)
+        return index
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def needs_retrain(self, size):
+        """True when an index of size vectors should get freshly trained lists."""
+        return self.n_lists == 0 or size > _RETRAIN_GROWTH * max(self.trained_count, 1)
+
+    def _rows_of(self, track_ids):
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        if len(self.track_ids) == 0:
+            return np.full(track_ids.shape, -1, dtype=np.int64)
+        sorted_ids = self.track_ids[self._by_id]
+        pos = np.minimum(np.searchsorted(sorted_ids, track_ids), len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == track_ids, self._by_id[pos], -1)
+
+    def vector(self, track_id):
+        row = int(self._rows_of([track_id])[0])
+        return self.vectors[row] if row >= 0 else None
+
+    def add(self, track_ids, vectors):
+        """Insert (or replace) vectors, assigning each to its nearest list."""
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        if len(track_ids) == 0:
+            return
+        keep = ~np.isin(self.track_ids, track_ids)
+        self._set_rows(
+            np.concatenate([self.track_ids[keep], track_ids]),
+            np.concatenate(
+                [self.vectors[keep], np.asarray(vectors, dtype=np.float32).reshape(-1, DESCRIPTOR_DIMS)]
+            ),
+        )
+
+    def remove(self, track_ids):
+        keep = ~np.isin(self.track_ids, np.asarray(track_ids, dtype=np.int64))
+        if not keep.all():
+            self._set_rows(self.track_ids[keep], self.vectors[keep])
+
+    def probe(self, query_vec, n_probe=ANN_N_PROBE):
+        """Rows of the n_probe lists whose centroids are closest to query_vec."""
+        closeness = self.centroids @ self._embed(query_vec)
+        probed = np.argsort(-closeness, kind="stable")[:max(1, n_probe)]
+        return np.concatenate(
+            [np.arange(self.offsets[c], self.offsets[c + 1]) for c in probed]
+        )
+
+    def search(
+        self,
+        query_vec,
+        k=10,
+        n_probe=ANN_N_PROBE,
+        scorer=ScorerName.LATE_FUSION_V1,
+        exclude=(),
+    ):
+        """[(track_id, score)] of the k best-scoring tracks in the probed lists."""
+        if len(self) == 0 or k < 1:
+            return []
+        query = np.asarray(query_vec, dtype=np.float32)
+        rows = self.probe(query, n_probe)
+        if len(exclude):
+            rows = rows[~np.isin(self.track_ids[rows], np.asarray(list(exclude), dtype=np.int64))]
+        if len(rows) == 0:
+            return []
+        scores = score_many(query, self.vectors[rows], scorer=scorer)
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(int(self.track_ids[rows[i]]), float(scores[i])) for i in best]
+
+    def save(self, path):
+        directory = os.path.dirname(path)
+        os.makedirs(directory or ".", exist_ok=True)
+        header = {"format": _FORMAT_VERSION, "dims": DESCRIPTOR_DIMS}
+        fd, tmp_path = tempfile.mkstemp(dir=directory or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    header=np.array(json.dumps(header)),
+                    centroids=self.centroids,
+                    mean=self.mean,
+                    scale=self.scale,
+                    track_ids=self.track_ids,
+                    vectors=self.vectors,
+                    trained_count=np.array(self.trained_count),
+                )
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self.path = path
+        self._mtime_ns = os.stat(path).st_mtime_ns
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved index, or return None if it is missing or unreadable."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            with np.load(path) as data:
+                header = json.loads(str(data["header"]))
+                if header["format"] != _FORMAT_VERSION or header["dims"] != DESCRIPTOR_DIMS:
+                    return None
+                index = cls(
+                    data["centroids"],
+                    data["mean"],
+                    data["scale"],
+                    data["track_ids"],
+                    data["vectors"],
+                    int(data["trained_count"]),
+                    path=path,
+                )
+        except (OSError, ValueError, KeyError):
+            return None
+        index._mtime_ns = mtime_ns
+        return index
+
+    @classmethod
+    def open(cls, store_dir=DESCRIPTOR_STORE_DIR, descriptor_version=DESCRIPTOR_VERSION):
+        """Load the index saved next to the descriptor store."""
+        return cls.load(index_path(store_dir, descriptor_version))
+
+    def is_stale(self):
+        """True when the file this index was loaded from has been replaced."""
+        try:
+            return os.stat(self.path).st_mtime_ns != self._mtime_ns
+        except (OSError, TypeError):
+            return True
+
+
+def index_path(store_dir=DESCRIPTOR_STORE_DIR, descriptor_version=DESCRIPTOR_VERSION):
+    return os.path.join(descriptor_store_dir(store_dir, descriptor_version), _FILE_NAME)
+
+
+def sync(store, path=None, rebuild=False):
+    """Bring the saved index in line with a DescriptorStore.
+
+    Returns (index, counts) with "added", "updated", "removed" and "trained"
+    (1 when the lists were (re)trained). The file is only rewritten when
+    something changed.
+    """
+    path = path or os.path.join(store.directory, _FILE_NAME)
+    index = None if rebuild else AnnIndex.load(path)
+    counts = {"added": 0, "updated": 0, "removed": 0, "trained": 0}
+
+    if index is None or index.needs_retrain(len(store.track_ids)):
+        index = AnnIndex.build(store.track_ids, store.vectors)
+        counts["added"] = len(index)
+        counts["trained"] = 1
+        index.save(path)
+        return index, counts
+
+    rows = store.rows(index.track_ids)
+    removed = index.track_ids[rows < 0]
+    present = rows >= 0
+    changed = np.zeros(len(index), dtype=bool)
+    changed[present] = (store.vectors[rows[present]] != index.vectors[present]).any(axis=1)
+    new = ~np.isin(store.track_ids, index.track_ids)
+
+    counts["removed"] = len(removed)
+    counts["updated"] = int(changed.sum())
+    counts["added"] = int(new.sum())
+    if not (counts["removed"] or counts["updated"] or counts["added"]):
+        return index, counts
+
+    upserts = np.concatenate([index.track_ids[changed], store.track_ids[new]])
+    index.remove(removed)
+    index.add(upserts, store.vectors[store.rows(upserts)])
+    index.save(path)
+    return index, counts
+
+
+def measure_recall(vectors, k=10, n_probes=(1, 2, 4, 8, 16), n_queries=200,
+                   scorer=ScorerName.LATE_FUSION_V1, n_lists=ANN_LISTS, seed=0):
+    """Recall@k of index searches against brute-force score_many() rankings.
+
+    Builds an index over vectors (track IDs 0..N-1) and queries it with up
+    to n_queries of them, each excluding itself. Returns {"k", "queries",
+    "n_lists", "recall": {n_probe: mean recall}, "probed_fraction":
+    {n_probe: mean fraction of the library re-ranked}}.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n = len(vectors)
+    k = max(1, min(k, n - 1))
+    index = AnnIndex.build(np.arange(n), vectors, n_lists=n_lists, seed=seed)
+    rng = np.random.default_rng(seed)
+    queries = rng.choice(n, size=min(n_queries, n), replace=False)
+
+    truth = {}
+    for q in queries.tolist():
+        scores = score_many(vectors[q], vectors, scorer=scorer)
+        scores[q] = -np.inf
+        truth[q] = set(np.argsort(-scores, kind="stable")[:k].tolist())
+
+    result = {"k": k, "queries": len(queries), "n_lists": index.n_lists,
+              "recall": {}, "probed_fraction": {}}
+    for n_probe in n_probes:
+        hits = []
+        probed = []
+        for q in queries.tolist():
+            found = index.search(vectors[q], k=k, n_probe=n_probe, scorer=scorer, exclude=[q])
+            hits.append(len(truth[q] & set(t for t, _ in found)) / float(k))
+            probed.append(len(index.probe(vectors[q], n_probe)) / float(n))
+        result["recall"][n_probe] = float(np.mean(hits))
+        result["probed_fraction"][n_probe] = float(np.mean(probed))
+    return result
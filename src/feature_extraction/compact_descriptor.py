@@ -4,21 +4,139 @@ import librosa
 from src.feature_extraction.config import (
     DESCRIPTOR_BPM_MIN,
     DESCRIPTOR_BPM_RANGE,
+    DESCRIPTOR_BASE_VERSION,
     DESCRIPTOR_DIMS,
+    DESCRIPTOR_FAST_SAMPLE_RATE,
+    DESCRIPTOR_PROFILE,
     DESCRIPTOR_TEMPOGRAM_BINS,
-    DESCRIPTOR_VERSION,
     DESCRIPTOR_ZONE_SECONDS,
     SAMPLE_RATE,
 )
+from src.feature_extraction import profiling
 from src.utils.file_operations import get_track_load_path
 
 # CQT needs at least 1 s of audio at the target sample rate; anything shorter
 # is either corrupt data or a non-music file and should be skipped.
 _MIN_AUDIO_SAMPLES = SAMPLE_RATE  # 1 second at 44 100 Hz
 
+# STFT window and hop (samples at SAMPLE_RATE) of every frame-level feature
+# in the descriptor
+_N_FFT = 2048
+_HOP_LENGTH = 512
 
-def _extract_zone_vector(y, sr):
-    """Extract a 75-d compact descriptor from a segment of audio samples.
+# Mel bands of the percussive spectrogram in the fast profile; its shorter
+# STFT leaves librosa's default 128 bands partly empty
+_FAST_N_MELS = 64
+
+DESCRIPTOR_PROFILES = ("full", "fast")
+
+
+def _check_length(y):
+    if len(y) < _MIN_AUDIO_SAMPLES:
+        raise ValueError(
+            "Audio segment too short for feature extraction: %d samples "
+            "(minimum %d, ~%.2f s)" % (len(y), _MIN_AUDIO_SAMPLES, _MIN_AUDIO_SAMPLES / SAMPLE_RATE)
+        )
+
+
+def _fit_frames(values, n_frames):
+    """Trim or edge-pad the last axis of values to n_frames."""
+    if values.shape[-1] >= n_frames:
+        return values[..., :n_frames]
+    padding = [(0, 0)] * (values.ndim - 1) + [(0, n_frames - values.shape[-1])]
+    return np.pad(values, padding, mode="edge")
+
+
+def _separate_full(y, sr, stft):
+    """HPSS on the full-rate STFT; returns (chroma, percussive mel power)."""
+    with profiling.stage("hpss"):
+        stft_harm, stft_perc = librosa.decompose.hpss(stft)
+        y_harm = librosa.istft(stft_harm, hop_length=_HOP_LENGTH, length=len(y))
+        y_perc = librosa.istft(stft_perc, hop_length=_HOP_LENGTH, length=len(y))
+        del stft_harm, stft_perc
+
+    with profiling.stage("chroma_cqt"):
+        chroma = librosa.feature.chroma_cqt(y=y_harm, sr=sr, hop_length=_HOP_LENGTH)
+    with profiling.stage("mel"):
+        perc_mel = librosa.feature.melspectrogram(
+            S=np.abs(librosa.stft(y_perc, hop_length=_HOP_LENGTH)) ** 2, sr=sr
+        )
+    return chroma, perc_mel
+
+
+def _separate_fast(y, sr):
+    """HPSS on a DESCRIPTOR_FAST_SAMPLE_RATE STFT with the same frame rate
+    and window duration as the full-rate one. The percussive part goes
+    straight from the separated spectrogram to a mel spectrogram; only the
+    harmonic part is resynthesized, for the CQT chroma."""
+    fast_sr = DESCRIPTOR_FAST_SAMPLE_RATE
+    hop_length = int(round(_HOP_LENGTH * fast_sr / sr))
+    n_fft = int(round(_N_FFT * fast_sr / sr))
+    with profiling.stage("hpss"):
+        y_fast = librosa.resample(y, orig_sr=sr, target_sr=fast_sr)
+        stft_harm, stft_perc = librosa.decompose.hpss(
+            librosa.stft(y_fast, n_fft=n_fft, hop_length=hop_length)
+        )
+        y_harm = librosa.istft(stft_harm, hop_length=hop_length, length=len(y_fast))
+        del stft_harm
+
+    with profiling.stage("chroma_cqt"):
+        chroma = librosa.feature.chroma_cqt(y=y_harm, sr=fast_sr, hop_length=hop_length)
+    with profiling.stage("mel"):
+        perc_mel = librosa.feature.melspectrogram(
+            S=np.abs(stft_perc) ** 2, sr=fast_sr, n_fft=n_fft, n_mels=_FAST_N_MELS
+        )
+    return chroma, perc_mel
+
+
+def _frame_features(y, sr, profile=None):
+    """Compute the frame-level features behind a descriptor, once per signal.
+
+    Every feature uses a hop of _HOP_LENGTH samples at sr, so frame i of each
+    array covers the same audio and any zone of the track can be summarized
+    by slicing (see _aggregate_zone). The signal's STFT is taken once and
+    shared by the features that need it. profile ("full" or "fast",
+    default DESCRIPTOR_PROFILE) selects how the harmonic and percussive
+    parts are separated.
+    """
+    profile = profile or DESCRIPTOR_PROFILE
+    if profile not in DESCRIPTOR_PROFILES:
+        raise ValueError(
+            "Unknown descriptor profile %r (expected one of %s)"
+            % (profile, ", ".join(DESCRIPTOR_PROFILES))
+        )
+    _check_length(y)
+    with profiling.stage("stft"):
+        stft = librosa.stft(y, n_fft=_N_FFT, hop_length=_HOP_LENGTH)
+    n_frames = stft.shape[-1]
+
+    # Harmonic-percussive source separation. The percussive mel power is
+    # converted to dB per zone, since the dB floor (top_db below the peak)
+    # depends on the zone's own peak
+    if profile == "fast":
+        chroma, perc_mel = _separate_fast(y, sr)
+    else:
+        chroma, perc_mel = _separate_full(y, sr, stft)
+    magnitude = np.abs(stft)
+    del stft
+
+    features = {
+        "perc_mel": _fit_frames(perc_mel, n_frames),
+        "chroma": _fit_frames(chroma, n_frames),
+    }
+    with profiling.stage("mel"):
+        features["mel"] = librosa.feature.melspectrogram(S=magnitude ** 2, sr=sr)
+    with profiling.stage("spectral"):
+        features["rms"] = librosa.feature.rms(y=y, hop_length=_HOP_LENGTH)[0]
+        features["centroid"] = librosa.feature.spectral_centroid(S=magnitude, sr=sr)[0]
+        features["rolloff"] = librosa.feature.spectral_rolloff(S=magnitude, sr=sr)[0]
+        features["zcr"] = librosa.feature.zero_crossing_rate(y=y, hop_length=_HOP_LENGTH)[0]
+    return features
+
+
+def _aggregate_zone(features, sr, start_sample=0, stop_sample=None):
+    """Summarize _frame_features output over [start_sample, stop_sample) as a
+    75-d compact descriptor.
 
     Layout (75 dims total):
         [0:12]   beat-synchronous chroma_cqt mean  (harmonic)
@@ -36,20 +154,25 @@ def _extract_zone_vector(y, sr):
         [73]     zero-crossing rate mean            (energy)
         [74]     zero-crossing rate std             (energy)
     """
-    if len(y) < _MIN_AUDIO_SAMPLES:
-        raise ValueError(
-            "Audio segment too short for feature extraction: %d samples "
-            "(minimum %d, ~%.2f s)" % (len(y), _MIN_AUDIO_SAMPLES, _MIN_AUDIO_SAMPLES / SAMPLE_RATE)
+    start = int(round(start_sample / _HOP_LENGTH))
+    stop = None if stop_sample is None else start + 1 + (stop_sample - start_sample) // _HOP_LENGTH
+    zone = {name: values[..., start:stop] for name, values in features.items()}
+
+    # Beat tracking on the percussive onset envelope (median over mel bands;
+    # the tempogram below aggregates them by mean)
+    with profiling.stage("beat_track"):
+        perc_mel_db = librosa.power_to_db(zone["perc_mel"])
+        tempo, beat_frames = librosa.beat.beat_track(
+            onset_envelope=librosa.onset.onset_strength(
+                S=perc_mel_db, sr=sr, hop_length=_HOP_LENGTH, aggregate=np.median
+            ),
+            sr=sr,
+            hop_length=_HOP_LENGTH,
         )
-    # Harmonic-percussive source separation
-    y_harm, y_perc = librosa.effects.hpss(y)
-
-    # Beat tracking on percussive component
-    tempo, beat_frames = librosa.beat.beat_track(y=y_perc, sr=sr)
     bpm = float(np.atleast_1d(tempo)[0])
 
     # Beat-synchronous chroma CQT on harmonic component
-    chroma = librosa.feature.chroma_cqt(y=y_harm, sr=sr)
+    chroma = zone["chroma"]
     if beat_frames is not None and len(beat_frames) > 0:
         chroma_sync = librosa.util.sync(chroma, beat_frames, aggregate=np.mean)
     else:
@@ -58,7 +181,14 @@ def _extract_zone_vector(y, sr):
     chroma_std = np.std(chroma_sync, axis=1)     # (12,)
 
     # Tempogram: collapse to 16-bin histogram summary
-    tempogram = librosa.feature.tempogram(y=y_perc, sr=sr)
+    with profiling.stage("tempogram"):
+        tempogram = librosa.feature.tempogram(
+            onset_envelope=librosa.onset.onset_strength(
+                S=perc_mel_db, sr=sr, hop_length=_HOP_LENGTH
+            ),
+            sr=sr,
+            hop_length=_HOP_LENGTH,
+        )
     tempogram_row_means = np.mean(tempogram, axis=1)   # (n_tempo_bins,)
     n_bins = len(tempogram_row_means)
     group_size = max(n_bins // DESCRIPTOR_TEMPOGRAM_BINS, 1)
@@ -74,26 +204,27 @@ def _extract_zone_vector(y, sr):
     bpm_norm = float(np.clip((bpm - DESCRIPTOR_BPM_MIN) / DESCRIPTOR_BPM_RANGE, 0.0, 1.0))
 
     # MFCC on full signal
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13)
+    with profiling.stage("mfcc"):
+        mfcc = librosa.feature.mfcc(S=librosa.power_to_db(zone["mel"]), n_mfcc=13)
     mfcc_mean = np.mean(mfcc, axis=1)   # (13,)
     mfcc_std = np.std(mfcc, axis=1)     # (13,)
 
     # Energy / brightness features
     nyquist = sr / 2.0
 
-    rms = librosa.feature.rms(y=y)[0]
+    rms = zone["rms"]
     rms_mean = float(np.mean(rms))
     rms_std = float(np.std(rms))
 
-    centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
+    centroid = zone["centroid"]
     centroid_mean = float(np.mean(centroid)) / nyquist
     centroid_std = float(np.std(centroid)) / nyquist
 
-    rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr)[0]
+    rolloff = zone["rolloff"]
     rolloff_mean = float(np.mean(rolloff)) / nyquist
     rolloff_std = float(np.std(rolloff)) / nyquist
 
-    zcr = librosa.feature.zero_crossing_rate(y=y)[0]
+    zcr = zone["zcr"]
     zcr_mean = float(np.mean(zcr))
     zcr_std = float(np.std(zcr))
 
@@ -114,6 +245,17 @@ def _extract_zone_vector(y, sr):
     return descriptor.astype(np.float32)
 
 
+def _extract_zone_vector(y, sr, profile=None):
+    """Extract a 75-d compact descriptor from a segment of audio samples
+    (layout as in _aggregate_zone)."""
+    return _aggregate_zone(_frame_features(y, sr, profile), sr)
+
+
+def descriptor_version(profile):
+    """descriptor_version stored for vectors computed with profile."""
+    return DESCRIPTOR_BASE_VERSION if profile == "full" else "%s+%s" % (DESCRIPTOR_BASE_VERSION, profile)
+
+
 def pack_vector(v):
     """Pack a float32 numpy array to raw bytes for BYTEA storage."""
     return v.astype(np.float32).tobytes()
@@ -169,26 +311,42 @@ class CompactDescriptor:
       * global_vector  — whole track
       * intro_vector   — first DESCRIPTOR_ZONE_SECONDS seconds (None if track too short)
       * outro_vector   — last  DESCRIPTOR_ZONE_SECONDS seconds (None if track too short)
+
+    profile selects the extraction profile ("full" or "fast"); it defaults to
+    DESCRIPTOR_PROFILE and determines version.
     """
 
-    def __init__(self, track):
+    def __init__(self, track, profile=None):
         self.track = track
+        self.profile = profile or DESCRIPTOR_PROFILE
         self.global_vector = None
         self.intro_vector = None
         self.outro_vector = None
-        self.version = DESCRIPTOR_VERSION
-
-    def compute(self, audio_path=None):
-        if audio_path is None:
-            audio_path = get_track_load_path(self.track)
-        y, sr = librosa.load(audio_path, sr=SAMPLE_RATE, mono=True)
+        self.version = descriptor_version(self.profile)
 
-        self.global_vector = _extract_zone_vector(y, sr)
+    def compute(self, audio_path=None, y=None):
+        """Compute zone vectors from audio_path, or from y if given.
 
-        zone_samples = int(DESCRIPTOR_ZONE_SECONDS * sr)
-        if len(y) > zone_samples * 2:
-            self.intro_vector = _extract_zone_vector(y[:zone_samples], sr)
-            self.outro_vector = _extract_zone_vector(y[-zone_samples:], sr)
+        y must be a mono signal already at SAMPLE_RATE (e.g. from
+        audio_loader.decode_audio); passing it skips the decode.
+        """
+        if y is None and audio_path is None:
+            audio_path = get_track_load_path(self.track)
+        with profiling.track_file(audio_path or "<signal>"):
+            if y is None:
+                with profiling.stage("decode"):
+                    y, _ = librosa.load(audio_path, sr=SAMPLE_RATE, mono=True)
+            sr = SAMPLE_RATE
+
+            # Frame-level features are computed once for the whole track;
+            # each zone vector summarizes its own range of frames
+            features = _frame_features(y, sr, self.profile)
+            self.global_vector = _aggregate_zone(features, sr)
+
+            zone_samples = int(DESCRIPTOR_ZONE_SECONDS * sr)
+            if len(y) > zone_samples * 2:
+                self.intro_vector = _aggregate_zone(features, sr, 0, zone_samples)
+                self.outro_vector = _aggregate_zone(features, sr, len(y) - zone_samples, len(y))
 
     def pack_global(self):
         return pack_vector(self.global_vector)
@@ -1,7 +1,23 @@
+import hashlib
 import os
 
 # Compact descriptor constants
-DESCRIPTOR_VERSION = "1"
+DESCRIPTOR_BASE_VERSION = "1"
+
+# Descriptor extraction profile: "full" (HPSS on the 44.1 kHz STFT) or "fast"
+# (HPSS median filters on a DESCRIPTOR_FAST_SAMPLE_RATE STFT; the percussive
+# part is only used through its onset envelopes and is never resynthesized).
+# Any profile other than "full" is appended to DESCRIPTOR_VERSION, so vectors
+# from different profiles are never compared with each other.
+DESCRIPTOR_PROFILE = os.getenv("DESCRIPTOR_PROFILE", "full").lower()
+DESCRIPTOR_FAST_SAMPLE_RATE = 22050
+
+# Stored in track_descriptor.descriptor_version: "<base>" or "<base>+<profile>"
+DESCRIPTOR_VERSION = (
+    DESCRIPTOR_BASE_VERSION
+    if DESCRIPTOR_PROFILE == "full"
+    else "%s+%s" % (DESCRIPTOR_BASE_VERSION, DESCRIPTOR_PROFILE)
+)
 
 # Descriptor layout: 12+12 chroma + 1+16 rhythm + 13+13 MFCC + 2+2+2+2 energy = 75 dims
 DESCRIPTOR_CHROMA_DIMS = 24
@@ -25,10 +41,60 @@ DESCRIPTOR_BPM_RANGE = 140.0
 # Number of tempogram summary bins in the rhythm vector
 DESCRIPTOR_TEMPOGRAM_BINS = 16
 
+# compute_compact_descriptors process pool. Each worker holds a 44.1 kHz
+# decode plus its HPSS copies (several hundred MB for a long track), so the
+# default stays well below the core count. Workers are replaced after
+# DESCRIPTOR_MAX_TASKS_PER_CHILD tracks to return memory that librosa and
+# the allocator keep hold of; a track not finished within
+# DESCRIPTOR_TASK_TIMEOUT seconds is failed. Rows are committed in groups of
+# DESCRIPTOR_WRITE_BATCH.
+DESCRIPTOR_WORKERS = int(os.getenv("DESCRIPTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+DESCRIPTOR_MAX_TASKS_PER_CHILD = int(os.getenv("DESCRIPTOR_MAX_TASKS_PER_CHILD", "25"))
+DESCRIPTOR_WRITE_BATCH = int(os.getenv("DESCRIPTOR_WRITE_BATCH", "32"))
+DESCRIPTOR_TASK_TIMEOUT = float(os.getenv("DESCRIPTOR_TASK_TIMEOUT", "1800"))
+
+# Memory-mapped export of all global descriptor vectors (see
+# descriptor_store.py), one subdirectory per DESCRIPTOR_VERSION. Relative
+# paths resolve against the project root.
+DESCRIPTOR_STORE_DIR = os.getenv("DESCRIPTOR_STORE_DIR", "models/descriptors")
+
+
+def resolve_project_path(path):
+    """Return path, resolved against the project root when relative."""
+    if os.path.isabs(path):
+        return path
+    project_root = os.path.dirname(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    return os.path.join(project_root, path)
+
+
+def descriptor_store_dir(store_dir=DESCRIPTOR_STORE_DIR, descriptor_version=DESCRIPTOR_VERSION):
+    """Directory of a descriptor version's store and the files kept next to
+    it (ANN index, corpus statistics)."""
+    return os.path.join(resolve_project_path(store_dir), descriptor_version)
+
+
+# Blocked all-pairs similarity (see all_pairs.py). Tiles are sized so the
+# float64 score tiles in flight stay within ALL_PAIRS_MEMORY_MB, and are
+# scored on a pool of ALL_PAIRS_WORKERS processes.
+ALL_PAIRS_MEMORY_MB = float(os.getenv("ALL_PAIRS_MEMORY_MB", "256"))
+ALL_PAIRS_WORKERS = int(os.getenv("ALL_PAIRS_WORKERS", str(os.cpu_count() or 1)))
+
+# Approximate nearest-neighbour index (ann_index.py): descriptors are split
+# into ANN_LISTS inverted lists (0 = about sqrt(library size)) and a query
+# re-ranks the members of its ANN_N_PROBE closest lists.
+ANN_LISTS = int(os.getenv("ANN_LISTS", "0"))
+ANN_N_PROBE = int(os.getenv("ANN_N_PROBE", "8"))
+
+# Neighbours kept per track in the track_neighbors table
+# (compute_track_neighbors.py).
+TRACK_NEIGHBORS_K = int(os.getenv("TRACK_NEIGHBORS_K", "50"))
+
 SAMPLE_RATE = 44100
 
 # Trait extraction constants
-TRAIT_VERSION = "4"
+TRAIT_BASE_VERSION = "4"
 TRAIT_SAMPLE_RATE = 16000
 TRAIT_MODELS_DIR = "models/traits"
 
@@ -37,6 +103,11 @@ TRAIT_MODELS_DIR = "models/traits"
 # All display-layer filtering is applied downstream from these raw stored values.
 TRAIT_STORAGE_THRESHOLD = 0.01
 
+# Version of the stored backbone outputs (track_embedding). Bump when the mel
+# preprocessing or the EffNet/MAEST backbones change; head or threshold changes
+# only bump TRAIT_BASE_VERSION and can be recomputed from stored embeddings.
+TRAIT_EMBEDDING_BASE_VERSION = "1"
+
 # --- Display-layer filtering (applied at read/consumption time, not storage) ---
 
 MOOD_DISPLAY_THRESHOLD = 0.15
@@ -73,13 +144,191 @@ TRAIT_CLASSIFIERS_EFFNET = [
 # MAEST standalone backbone for 519-class Discogs genre classification
 TRAIT_CLASSIFIER_MAEST = "discogs-maest-30s-pw-519l"
 
+# Models whose outputs are stored in track_embedding
+TRAIT_EMBEDDING_BACKBONES = ("discogs-effnet-bsdynamic", TRAIT_CLASSIFIER_MAEST)
+
+# Load MAEST as a dynamic-batch variant (derived locally from the fixed-batch
+# export, needs the onnx package) so all 30 s patches of a track run in one
+# call. Falls back to one call per patch when the variant is unavailable.
+TRAIT_MAEST_DYNAMIC_BATCH = os.getenv("TRAIT_MAEST_DYNAMIC_BATCH", "1").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Max MAEST patches per ONNX call (~700 KB of input each, but transformer
+# activations grow quickly). Override with TRAIT_MAEST_MAX_BATCH.
+TRAIT_MAEST_MAX_BATCH = int(os.getenv("TRAIT_MAEST_MAX_BATCH", "16"))
+
 # Number of parallel worker processes for compute_track_traits.py.
 # Each worker loads the full ONNX model set (~430 MB); keep this low on
 # memory-constrained machines. Override with the TRAIT_WORKERS env var.
 TRAIT_WORKERS = int(os.getenv("TRAIT_WORKERS", "2"))
 
+# Tracks per TraitExtractor.compute_batch() call in compute_track_traits.py.
+# Mel patches from the whole batch go through EffNet together and each head
+# runs once on a (batch, 1280) matrix. Override with TRAIT_BATCH_SIZE.
+TRAIT_BATCH_SIZE = int(os.getenv("TRAIT_BATCH_SIZE", "8"))
+
+# compute_track_traits workers decode up to TRAIT_PREFETCH_BATCHES batches
+# ahead of inference on a background thread, and a writer thread commits
+# finished rows in groups of up to TRAIT_WRITE_BATCH.
+TRAIT_PREFETCH_BATCHES = int(os.getenv("TRAIT_PREFETCH_BATCHES", "2"))
+TRAIT_WRITE_BATCH = int(os.getenv("TRAIT_WRITE_BATCH", "32"))
+
+# feature_job ledger (see job_ledger.py). A job that fails
+# FEATURE_JOB_MAX_ATTEMPTS times is parked as failed. Claimed jobs are leased
+# for FEATURE_JOB_LEASE_SECONDS and renewed by a heartbeat every third of
+# that; a lease that runs out (its worker or node died) is reclaimed.
+FEATURE_JOB_MAX_ATTEMPTS = int(os.getenv("FEATURE_JOB_MAX_ATTEMPTS", "3"))
+FEATURE_JOB_LEASE_SECONDS = float(os.getenv("FEATURE_JOB_LEASE_SECONDS", "300"))
+
+# Upper bound on EffNet patches per ONNX call (~48 KB of input each) so a
+# batch of long tracks cannot blow up activation memory.
+# Override with TRAIT_EFFNET_MAX_PATCHES.
+TRAIT_EFFNET_MAX_PATCHES = int(os.getenv("TRAIT_EFFNET_MAX_PATCHES", "512"))
+
+# Opt-in inference-server mode for compute_track_traits.py: one process owns
+# the ONNX sessions and TRAIT_DECODE_WORKERS processes decode audio, compute
+# mels and ship them to it over shared memory. Model memory is paid once, so
+# decode parallelism can follow the core count instead of TRAIT_WORKERS.
+TRAIT_INFERENCE_SERVER = os.getenv("TRAIT_INFERENCE_SERVER", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+TRAIT_DECODE_WORKERS = int(
+    os.getenv("TRAIT_DECODE_WORKERS", str(os.cpu_count() or 1))
+)
+
+# Seconds a decode worker waits for the inference server before giving up.
+TRAIT_SERVER_TIMEOUT = float(os.getenv("TRAIT_SERVER_TIMEOUT", "600"))
+
+# On-disk mel spectrogram cache (see mel_cache.py). When enabled, re-extraction
+# of an unchanged file skips audio decoding and mel computation entirely.
+# Relative TRAIT_MEL_CACHE_DIR paths resolve against the project root.
+TRAIT_MEL_CACHE = os.getenv("TRAIT_MEL_CACHE", "0").lower() in ("1", "true", "yes")
+TRAIT_MEL_CACHE_DIR = os.getenv("TRAIT_MEL_CACHE_DIR", "models/traits/mel_cache")
+
+# Files longer than TRAIT_STREAM_MIN_SECONDS (DJ mixes, long recordings) are
+# decoded in TRAIT_STREAM_BLOCK_SECONDS blocks and fed to the models as mel
+# windows fill (see trait_streaming.py), so worker memory stays bounded.
+# 0 disables streaming. Only formats soundfile can read are streamed.
+TRAIT_STREAM_MIN_SECONDS = float(os.getenv("TRAIT_STREAM_MIN_SECONDS", "1200"))
+TRAIT_STREAM_BLOCK_SECONDS = float(os.getenv("TRAIT_STREAM_BLOCK_SECONDS", "10"))
+
+# Window the librosa extras (onset_density, spectral_flatness) are computed on:
+# "full" (whole track), "excerpts" (TRAIT_ANALYSIS_EXCERPTS evenly spaced
+# excerpts of TRAIT_ANALYSIS_SECONDS) or "center" (one TRAIT_ANALYSIS_SECONDS
+# crop around the midpoint). Any policy other than "full" is appended to
+# TRAIT_VERSION, so rows computed under different policies are never mixed.
+TRAIT_ANALYSIS_POLICY = os.getenv("TRAIT_ANALYSIS_POLICY", "full").lower()
+TRAIT_ANALYSIS_EXCERPTS = int(os.getenv("TRAIT_ANALYSIS_EXCERPTS", "3"))
+TRAIT_ANALYSIS_SECONDS = float(os.getenv("TRAIT_ANALYSIS_SECONDS", "30"))
+
+if TRAIT_ANALYSIS_POLICY == "full":
+    TRAIT_ANALYSIS_TAG = ""
+elif TRAIT_ANALYSIS_POLICY == "excerpts":
+    TRAIT_ANALYSIS_TAG = "excerpts-%dx%gs" % (
+        TRAIT_ANALYSIS_EXCERPTS,
+        TRAIT_ANALYSIS_SECONDS,
+    )
+elif TRAIT_ANALYSIS_POLICY == "center":
+    TRAIT_ANALYSIS_TAG = "center-%gs" % TRAIT_ANALYSIS_SECONDS
+else:
+    # Rejected by trait_extractor._analysis_spans() at extraction time
+    TRAIT_ANALYSIS_TAG = TRAIT_ANALYSIS_POLICY
+
+# ONNX Runtime session tuning (see model_manager._session_options).
+# TRAIT_ORT_INTRA_OP_THREADS is per session; 0 splits the CPU cores evenly
+# across the processes that load models (TRAIT_WORKERS, or the one inference
+# server) so parallel workers do not oversubscribe the machine. Inter-op
+# threads only matter with TRAIT_ORT_EXECUTION_MODE=parallel.
+TRAIT_ORT_INTRA_OP_THREADS = int(os.getenv("TRAIT_ORT_INTRA_OP_THREADS", "0"))
+TRAIT_ORT_INTER_OP_THREADS = int(os.getenv("TRAIT_ORT_INTER_OP_THREADS", "1"))
+TRAIT_ORT_EXECUTION_MODE = os.getenv("TRAIT_ORT_EXECUTION_MODE", "sequential").lower()
+# One of disable, basic, extended, all
+TRAIT_ORT_GRAPH_OPTIMIZATION = os.getenv("TRAIT_ORT_GRAPH_OPTIMIZATION", "all").lower()
+
+# Save each optimized graph next to its model and load it with graph
+# optimization disabled on later starts, so workers skip re-optimizing.
+TRAIT_ORT_OPTIMIZED_CACHE = os.getenv("TRAIT_ORT_OPTIMIZED_CACHE", "1").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Models loaded as dynamically quantized INT8 variants (see model_manager;
+# derived locally, needs the onnx package). Comma-separated manifest names,
+# or "all". Run compare_quantized_models before enabling a model.
+TRAIT_QUANTIZED_MODELS = [
+    name.strip()
+    for name in os.getenv("TRAIT_QUANTIZED_MODELS", "").split(",")
+    if name.strip()
+]
+
+
+def _quantization_tag(names):
+    """"" for fp32, "int8" for all models, else "int8-<hash of the names>"."""
+    if not names:
+        return ""
+    if "all" in names:
+        return "int8"
+    digest = hashlib.sha1(",".join(sorted(set(names))).encode("utf-8")).hexdigest()
+    return "int8-%s" % digest[:6]
+
+
+# INT8 outputs drift from fp32 (see compare_quantized_models), so the
+# quantized models are appended to the versions below and rows computed at
+# different precisions are never mixed. Embeddings only depend on the
+# backbones; every quantized model changes the traits.
+TRAIT_QUANTIZATION_TAG = _quantization_tag(TRAIT_QUANTIZED_MODELS)
+TRAIT_EMBEDDING_QUANTIZATION_TAG = _quantization_tag([
+    name
+    for name in TRAIT_QUANTIZED_MODELS
+    if name == "all" or name in TRAIT_EMBEDDING_BACKBONES
+])
+
+# Stored in track_trait.trait_version: "<base>[+<analysis tag>][+<int8 tag>]"
+TRAIT_VERSION = "+".join(
+    part
+    for part in (TRAIT_BASE_VERSION, TRAIT_ANALYSIS_TAG, TRAIT_QUANTIZATION_TAG)
+    if part
+)
+
+
+def split_trait_version(version):
+    """Split a stored trait_version into (base, analysis tag, quantization tag).
+
+    Missing parts are "". The quantization tag is "int8" or "int8-<hash>";
+    any other suffix is the analysis tag.
+    """
+    base, _, rest = version.partition("+")
+    analysis, quantization = [], ""
+    for part in rest.split("+") if rest else ():
+        if part == "int8" or part.startswith("int8-"):
+            quantization = part
+        else:
+            analysis.append(part)
+    return base, "+".join(analysis), quantization
+
+
+# Stored in track_embedding.embedding_version: "<base>" or "<base>+<int8 tag>"
+TRAIT_EMBEDDING_VERSION = "+".join(
+    part
+    for part in (TRAIT_EMBEDDING_BASE_VERSION, TRAIT_EMBEDDING_QUANTIZATION_TAG)
+    if part
+)
+
 # Number of parallel worker processes for compute_cosine_similarities.py.
 # Each worker loads TransitionMatchFinder (all tracks + camelot map) but no
 # heavy ONNX models, so memory is moderate (~50–100 MB per worker).
 # Override with the COSINE_WORKERS env var.
 COSINE_WORKERS = int(os.getenv("COSINE_WORKERS", "2"))
+
+# Per-stage timing of descriptor and trait extraction (see profiling.py).
+# When on, compute_compact_descriptors, compute_track_traits and
+# compute_audio_features print p50/p95 per stage and per file at the end of a
+# run, and write the report as JSON to FEATURE_TIMING_OUTPUT if it is set.
+FEATURE_TIMING = os.getenv("FEATURE_TIMING", "0").lower() in ("1", "true", "yes")
+FEATURE_TIMING_OUTPUT = os.getenv("FEATURE_TIMING_OUTPUT", "")
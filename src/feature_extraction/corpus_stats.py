@@ -0,0 +1,269 @@
+"""Persisted corpus statistics of the global descriptor vectors.
+
+cosine_after_global_zscore, standardized_euclidean and the timbre/energy
+blocks of late_fusion_v1 standardise by corpus statistics (corpus_mean,
+corpus_std, corpus_variance, timbre_variance, energy_variance). This module
+keeps them as a running per-dimension count/mean/M2 and saves them as
+DESCRIPTOR_STORE_DIR/<descriptor version>/corpus_stats.json, next to the
+descriptor store they describe.
+
+sync() is called on every store refresh (see export_descriptor_store). When
+the saved statistics describe the previous store generation, only the
+difference is applied: vectors that were removed or recomputed are taken
+out and new ones folded in with the batched form of Welford's update (Chan
+et al.), so the whole corpus is never re-read. Anything else rebuilds them
+from the store in one pass.
+
+Scores are persisted (track_cosine_similarity, track_neighbors) and cached,
+so the scorers do not use the running statistics directly: they use a
+frozen copy, scoring_stats.json, taken the first time the running
+statistics cover two vectors and only replaced on request (refreeze=True,
+export_descriptor_store --refreeze-stats). drift() tells how far the
+running statistics have moved from it.
+
+default_scorer_kwargs() loads the frozen statistics once per process;
+track_similarity.compute_similarity() and score_many() add them to every
+scorer call that does not pass its own (BenchmarkHarness does).
+
+Usage:
+    stats, counts = corpus_stats.sync(store, previous)  # after refresh()
+    kwargs = corpus_stats.default_scorer_kwargs()        # {} when none frozen
+"""
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.feature_extraction.config import (
+    DESCRIPTOR_DIMS,
+    DESCRIPTOR_STORE_DIR,
+    DESCRIPTOR_VERSION,
+    descriptor_store_dir,
+)
+from src.feature_extraction.track_similarity import ENERGY_BRIGHTNESS, MFCC_MEAN, MFCC_STD
+
+
+# Bump when the saved layout changes
+_FORMAT_VERSION = 1
+
+_FILE_NAME = "corpus_stats.json"
+_SCORING_FILE_NAME = "scoring_stats.json"
+
+# Vectors folded in per update() call during a rebuild
+_CHUNK = 8192
+
+# late_fusion_v1's timbre block: MFCC mean + std
+_TIMBRE = slice(MFCC_MEAN.start, MFCC_STD.stop)
+
+
+class CorpusStats:
+    """Running per-dimension count, mean and sum of squared deviations (M2)."""
+
+    def __init__(self, count=0, mean=None, m2=None, generation=None):
+        self.count = int(count)
+        self.mean = np.zeros(DESCRIPTOR_DIMS) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(DESCRIPTOR_DIMS) if m2 is None else np.asarray(m2, dtype=np.float64)
+        self.generation = generation
+
+    @classmethod
+    def from_vectors(cls, vectors, generation=None):
+        stats = cls(generation=generation)
+        for start in range(0, len(vectors), _CHUNK):
+            stats.update(vectors[start:start + _CHUNK])
+        return stats
+
+    def update(self, vectors):
+        """Fold vectors into the statistics."""
+        x = np.asarray(vectors, dtype=np.float64).reshape(-1, DESCRIPTOR_DIMS)
+        n_b = len(x)
+        if n_b == 0:
+            return
+        mean_b = x.mean(axis=0)
+        m2_b = ((x - mean_b) ** 2).sum(axis=0)
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * (n_b / n)
+        self.m2 = self.m2 + m2_b + delta ** 2 * (self.count * n_b / n)
+        self.count = n
+
+    def remove(self, vectors):
+        """Take previously folded-in vectors back out (the inverse of update)."""
+        x = np.asarray(vectors, dtype=np.float64).reshape(-1, DESCRIPTOR_DIMS)
+        n_b = len(x)
+        if n_b == 0:
+            return
+        n = self.count - n_b
+        if n <= 0:
+            self.count = 0
+            self.mean = np.zeros(DESCRIPTOR_DIMS)
+            self.m2 = np.zeros(DESCRIPTOR_DIMS)
+            return
+        mean_b = x.mean(axis=0)
+        m2_b = ((x - mean_b) ** 2).sum(axis=0)
+        mean_a = (self.count * self.mean - n_b * mean_b) / n
+        delta = mean_b - mean_a
+        self.m2 = np.maximum(self.m2 - m2_b - delta ** 2 * (n * n_b / self.count), 0.0)
+        self.mean = mean_a
+        self.count = n
+
+    @property
+    def variance(self):
+        """Population variance (as np.var), zero before two vectors were seen."""
+        if self.count < 2:
+            return np.zeros(DESCRIPTOR_DIMS)
+        return self.m2 / self.count
+
+    def scorer_kwargs(self):
+        """Keyword arguments for the standardised scorers; {} below two vectors."""
+        if self.count < 2:
+            return {}
+        variance = self.variance
+        return {
+            "corpus_mean": self.mean,
+            "corpus_std": np.sqrt(variance),
+            "corpus_variance": variance,
+            "timbre_variance": variance[_TIMBRE],
+            "energy_variance": variance[ENERGY_BRIGHTNESS],
+        }
+
+    def save(self, path, descriptor_version=DESCRIPTOR_VERSION):
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        payload = {
+            "format": _FORMAT_VERSION,
+            "descriptor_version": descriptor_version,
+            "dims": DESCRIPTOR_DIMS,
+            "generation": self.generation,
+            "count": self.count,
+            "mean": self.mean.tolist(),
+            "m2": self.m2.tolist(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, descriptor_version=DESCRIPTOR_VERSION):
+        """Load saved statistics, or return None if missing or not for this version."""
+        try:
+            with open(path) as f:
+                payload = json.load(f)
+            if (
+                payload["format"] != _FORMAT_VERSION
+                or payload["descriptor_version"] != descriptor_version
+                or payload["dims"] != DESCRIPTOR_DIMS
+            ):
+                return None
+            return cls(payload["count"], payload["mean"], payload["m2"], payload["generation"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+def stats_path(store_dir=DESCRIPTOR_STORE_DIR, descriptor_version=DESCRIPTOR_VERSION):
+    return os.path.join(descriptor_store_dir(store_dir, descriptor_version), _FILE_NAME)
+
+
+def scoring_stats_path(store_dir=DESCRIPTOR_STORE_DIR, descriptor_version=DESCRIPTOR_VERSION):
+    return os.path.join(descriptor_store_dir(store_dir, descriptor_version), _SCORING_FILE_NAME)
+
+
+def drift(stats, frozen):
+    """Largest relative change of a per-dimension standard deviation from
+    frozen to stats (0.0 when either has fewer than two vectors)."""
+    if stats.count < 2 or frozen.count < 2:
+        return 0.0
+    std = np.sqrt(stats.variance)
+    frozen_std = np.sqrt(frozen.variance)
+    nonzero = frozen_std > 0
+    if not nonzero.any():
+        return 0.0
+    return float(np.max(np.abs(std[nonzero] - frozen_std[nonzero]) / frozen_std[nonzero]))
+
+
+def _changed_rows(old, new):
+    """Rows of old that new no longer holds unchanged, and rows of new that
+    old did not hold unchanged."""
+    new_rows = new.rows(old.track_ids)
+    present = new_rows >= 0
+    same = np.zeros(len(old.track_ids), dtype=bool)
+    same[present] = (old.vectors[present] == new.vectors[new_rows[present]]).all(axis=1)
+    kept_in_new = np.zeros(len(new.track_ids), dtype=bool)
+    kept_in_new[new_rows[same]] = True
+    return np.flatnonzero(~same), np.flatnonzero(~kept_in_new)
+
+
+def sync(store, previous=None, path=None, rebuild=False, refreeze=False):
+    """Bring the saved statistics in line with a DescriptorStore.
+
+    previous is the store generation before the refresh that produced
+    store (None if unknown). The frozen scoring statistics are written when
+    there are none yet, or with refreeze. Returns (stats, counts) with
+    "added", "removed", "rebuilt" (1 when recomputed from the whole store),
+    "frozen" (1 when the scoring statistics were written) and "drift" (see
+    drift()) from the scoring statistics.
+    """
+    path = path or os.path.join(store.directory, _FILE_NAME)
+    stats = None if rebuild else CorpusStats.load(path, store.descriptor_version)
+    counts = {"added": 0, "removed": 0, "rebuilt": 0, "frozen": 0, "drift": 0.0}
+
+    if stats is not None and stats.generation == store.generation:
+        _freeze(stats, path, store.descriptor_version, refreeze, counts)
+        return stats, counts
+
+    if stats is None or previous is None or stats.generation != previous.generation:
+        stats = CorpusStats.from_vectors(store.vectors, generation=store.generation)
+        counts["added"] = stats.count
+        counts["rebuilt"] = 1
+    else:
+        removed, added = _changed_rows(previous, store)
+        stats.remove(previous.vectors[removed])
+        stats.update(store.vectors[added])
+        stats.generation = store.generation
+        counts["added"] = len(added)
+        counts["removed"] = len(removed)
+
+    stats.save(path, store.descriptor_version)
+    _freeze(stats, path, store.descriptor_version, refreeze, counts)
+    return stats, counts
+
+
+def _freeze(stats, path, descriptor_version, refreeze, counts):
+    """Copy stats to the scoring statistics next to path if there are none
+    yet (or refreeze), once they cover two vectors; record the drift."""
+    scoring_path = os.path.join(os.path.dirname(path), _SCORING_FILE_NAME)
+    frozen = None if refreeze else CorpusStats.load(scoring_path, descriptor_version)
+    if frozen is not None:
+        counts["drift"] = drift(stats, frozen)
+    elif stats.count >= 2:
+        stats.save(scoring_path, descriptor_version)
+        counts["frozen"] = 1
+        reset_default()
+
+
+# Scorer kwargs of the frozen statistics, loaded on first use in this process
+_default_kwargs = None
+
+
+def default_scorer_kwargs():
+    """Scorer kwargs of the frozen corpus statistics ({} when there are none)."""
+    global _default_kwargs
+    if _default_kwargs is None:
+        stats = CorpusStats.load(
+            scoring_stats_path(DESCRIPTOR_STORE_DIR, DESCRIPTOR_VERSION), DESCRIPTOR_VERSION
+        )
+        _default_kwargs = stats.scorer_kwargs() if stats is not None else {}
+    return _default_kwargs
+
+
+def reset_default():
+    """Forget the loaded statistics; the next scorer call reloads them."""
+    global _default_kwargs
+    _default_kwargs = None
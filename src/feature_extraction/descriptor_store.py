@@ -0,0 +1,313 @@
+"""Memory-mapped export of every track's global descriptor vector.
+
+Consumers that need many global vectors (similarity scoring, the cosine and
+benchmark scripts) would otherwise query track_descriptor rows and unpack
+each BYTEA value separately. The store holds all vectors of one descriptor
+version in a single contiguous float32 (N, DESCRIPTOR_DIMS) .npy array with
+rows sorted by track ID, plus an (N, 2) int64 index of [track_id,
+computed_at in epoch microseconds]. Opening it maps the array read-only, so
+a process loads the library in milliseconds and processes that open the
+same generation share its pages through the OS page cache.
+
+Layout under DESCRIPTOR_STORE_DIR/<descriptor version>/:
+
+    header.json            {"format", "descriptor_version", "dims", "count",
+                            "generation"}
+    vectors.<gen>.npy      float32 (count, dims)
+    index.<gen>.npy        int64 (count, 2)
+
+refresh() compares the index with the (track_id, computed_at) pairs in the
+database and fetches only rows that are new or were recomputed. Every
+refresh writes a new generation and then swaps header.json, so readers never
+see a half-written store. Open stores keep reading their own generation. The
+previous generation stays on disk for readers that read the old header just
+before the swap.
+
+A store lags behind the database until the next refresh. Consumers that
+persist scores computed from it call verify() after opening it, which stops
+serving the vectors whose row was recomputed or deleted since the export;
+those tracks are then read from track_descriptor instead.
+
+Usage:
+    store, counts = descriptor_store.refresh(session)
+    store = DescriptorStore.open()     # None when nothing was exported
+    store.verify(session)              # optional: drop stale vectors
+    v = store.vector(track_id)         # read-only view, or None
+"""
+
+import calendar
+import json
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from src.feature_extraction.config import (
+    DESCRIPTOR_DIMS,
+    DESCRIPTOR_STORE_DIR,
+    DESCRIPTOR_VERSION,
+    descriptor_store_dir,
+)
+from src.models.track_descriptor import TrackDescriptor
+
+
+# Bump when the on-disk layout changes
+_FORMAT_VERSION = 1
+
+_HEADER = "header.json"
+_GENERATION_FILE = re.compile(r"^(vectors|index)\.(\d+)\.npy$")
+
+# track_descriptor rows fetched per query during a refresh
+_FETCH_CHUNK = 1000
+
+
+def _generation_paths(directory, generation):
+    return (
+        os.path.join(directory, "vectors.%d.npy" % generation),
+        os.path.join(directory, "index.%d.npy" % generation),
+    )
+
+
+def _epoch_us(computed_at):
+    """computed_at as integer epoch microseconds (0 when unset)."""
+    if computed_at is None:
+        return 0
+    return calendar.timegm(computed_at.utctimetuple()) * 1000000 + computed_at.microsecond
+
+
+class DescriptorStore:
+    """One generation of the exported global vectors of a descriptor version."""
+
+    def __init__(self, directory, header, vectors, index):
+        self.directory = directory
+        self.descriptor_version = header["descriptor_version"]
+        self.generation = header["generation"]
+        self.vectors = vectors
+        self.track_ids = index[:, 0]
+        self._stamps = index[:, 1]
+        self._valid = None  # set by verify()
+
+    @classmethod
+    def open(cls, store_dir=DESCRIPTOR_STORE_DIR, descriptor_version=DESCRIPTOR_VERSION):
+        """Map the current generation, or return None if there is no usable store."""
+        directory = descriptor_store_dir(store_dir, descriptor_version)
+        try:
+            with open(os.path.join(directory, _HEADER)) as f:
+                header = json.load(f)
+            if (
+                header["format"] != _FORMAT_VERSION
+                or header["descriptor_version"] != descriptor_version
+                or header["dims"] != DESCRIPTOR_DIMS
+            ):
+                return None
+            vectors_path, index_path = _generation_paths(directory, header["generation"])
+            # Zero-length arrays cannot be mapped
+            mmap_mode = "r" if header["count"] > 0 else None
+            vectors = np.load(vectors_path, mmap_mode=mmap_mode)
+            index = np.load(index_path, mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError):
+            return None
+        if vectors.shape != (header["count"], DESCRIPTOR_DIMS) or index.shape != (
+            header["count"],
+            2,
+        ):
+            return None
+        return cls(directory, header, vectors, index)
+
+    def verify(self, session):
+        """Stop serving vectors whose track_descriptor row changed since the export.
+
+        Compares the index with the (track_id, computed_at) pairs in the
+        database; afterwards rows(), vector() and vectors_for() treat the
+        mismatched tracks as absent. Returns the number of stale vectors.
+        """
+        listed = (
+            session.query(TrackDescriptor.track_id, TrackDescriptor.computed_at)
+            .filter(TrackDescriptor.descriptor_version == self.descriptor_version)
+            .all()
+        )
+        current = {row.track_id: _epoch_us(row.computed_at) for row in listed}
+        self._valid = np.array(
+            [
+                current.get(track_id) == stamp
+                for track_id, stamp in zip(self.track_ids.tolist(), self._stamps.tolist())
+            ],
+            dtype=bool,
+        )
+        return int(np.count_nonzero(~self._valid))
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def __contains__(self, track_id):
+        return self.row(track_id) is not None
+
+    def rows(self, track_ids):
+        """Row index of each track ID, -1 where the store has no vector."""
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        if len(self.track_ids) == 0:
+            return np.full(track_ids.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self.track_ids, track_ids)
+        clipped = np.minimum(pos, len(self.track_ids) - 1)
+        found = self.track_ids[clipped] == track_ids
+        if self._valid is not None:
+            found &= self._valid[clipped]
+        return np.where(found, clipped, -1)
+
+    def row(self, track_id):
+        row = int(self.rows([track_id])[0])
+        return row if row >= 0 else None
+
+    def vector(self, track_id):
+        """Read-only view of track_id's global vector, or None."""
+        row = self.row(track_id)
+        return self.vectors[row] if row is not None else None
+
+    def vectors_for(self, track_ids):
+        """{track_id: read-only vector view} for the IDs present in the store."""
+        track_ids = list(track_ids)
+        rows = self.rows(track_ids)
+        return {
+            track_id: self.vectors[row]
+            for track_id, row in zip(track_ids, rows.tolist())
+            if row >= 0
+        }
+
+
+def _fetch_vectors(session, track_ids, descriptor_version):
+    """{track_id: float32 vector} for track_ids, read in chunks."""
+    fetched = {}
+    for start in range(0, len(track_ids), _FETCH_CHUNK):
+        chunk = track_ids[start:start + _FETCH_CHUNK]
+        rows = (
+            session.query(TrackDescriptor.track_id, TrackDescriptor.global_vector)
+            .filter(
+                TrackDescriptor.track_id.in_(chunk),
+                TrackDescriptor.descriptor_version == descriptor_version,
+            )
+            .all()
+        )
+        for row in rows:
+            vector = np.frombuffer(row.global_vector, dtype=np.float32)
+            if len(vector) == DESCRIPTOR_DIMS:
+                fetched[row.track_id] = vector
+    return fetched
+
+
+def _save_atomic(path, array):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _write_generation(directory, descriptor_version, generation, vectors, index):
+    os.makedirs(directory, exist_ok=True)
+    vectors_path, index_path = _generation_paths(directory, generation)
+    _save_atomic(vectors_path, vectors)
+    _save_atomic(index_path, index)
+
+    header = {
+        "format": _FORMAT_VERSION,
+        "descriptor_version": descriptor_version,
+        "dims": DESCRIPTOR_DIMS,
+        "count": len(index),
+        "generation": generation,
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(header, f)
+    os.replace(tmp_path, os.path.join(directory, _HEADER))
+
+    # Keep the previous generation for readers that just read the old header
+    for name in os.listdir(directory):
+        match = _GENERATION_FILE.match(name)
+        if match and int(match.group(2)) < generation - 1:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+
+
+def refresh(
+    session,
+    store_dir=DESCRIPTOR_STORE_DIR,
+    descriptor_version=DESCRIPTOR_VERSION,
+    full=False,
+):
+    """Bring the store up to date with track_descriptor.
+
+    Only rows that are missing from the store or whose computed_at changed
+    are read from the database; full=True re-reads every row. Returns
+    (store, counts), where counts has "added", "updated", "removed" and
+    "unchanged". If nothing changed, the current generation is returned and
+    nothing is written.
+    """
+    current = None if full else DescriptorStore.open(store_dir, descriptor_version)
+    listed = (
+        session.query(TrackDescriptor.track_id, TrackDescriptor.computed_at)
+        .filter(TrackDescriptor.descriptor_version == descriptor_version)
+        .order_by(TrackDescriptor.track_id)
+        .all()
+    )
+    track_ids = np.array([r.track_id for r in listed], dtype=np.int64)
+    stamps = np.array([_epoch_us(r.computed_at) for r in listed], dtype=np.int64)
+
+    if current is not None:
+        rows = current.rows(track_ids)
+        present = rows >= 0
+        reuse = present & (current._stamps[np.maximum(rows, 0)] == stamps)
+    else:
+        rows = np.full(len(track_ids), -1, dtype=np.int64)
+        present = reuse = np.zeros(len(track_ids), dtype=bool)
+
+    counts = {
+        "added": int((~present).sum()),
+        "updated": int((present & ~reuse).sum()),
+        "removed": (len(current) - int(present.sum())) if current is not None else 0,
+        "unchanged": int(reuse.sum()),
+    }
+    if current is not None and counts["added"] == counts["updated"] == counts["removed"] == 0:
+        return current, counts
+
+    vectors = np.empty((len(track_ids), DESCRIPTOR_DIMS), dtype=np.float32)
+    if reuse.any():
+        vectors[reuse] = current.vectors[rows[reuse]]
+    keep = reuse.copy()
+    fetched = _fetch_vectors(session, track_ids[~reuse].tolist(), descriptor_version)
+    for i in np.flatnonzero(~reuse):
+        vector = fetched.get(int(track_ids[i]))
+        if vector is not None:
+            vectors[i] = vector
+            keep[i] = True
+    if not keep.all():
+        # Deleted (or malformed) between listing and fetching
+        counts["added"] -= int((~keep & ~present).sum())
+        counts["updated"] -= int((~keep & present).sum())
+        counts["removed"] += int((~keep & present).sum())
+        vectors = vectors[keep]
+        track_ids, stamps = track_ids[keep], stamps[keep]
+
+    directory = descriptor_store_dir(store_dir, descriptor_version)
+    generation = current.generation + 1 if current is not None else 1
+    if current is None and os.path.isdir(directory):
+        # A forced or recovering refresh still must not reuse a live generation
+        generation = 1 + max(
+            [
+                int(m.group(2))
+                for m in map(_GENERATION_FILE.match, os.listdir(directory))
+                if m
+            ]
+            or [0]
+        )
+    index = np.stack([track_ids, stamps], axis=1) if len(track_ids) else np.empty(
+        (0, 2), dtype=np.int64
+    )
+    _write_generation(directory, descriptor_version, generation, vectors, index)
+    return DescriptorStore.open(store_dir, descriptor_version), counts
@@ -0,0 +1,223 @@
+"""Shared-memory ONNX inference server for trait extraction.
+
+Every TraitExtractor loads the EffNet, MAEST and head sessions (~430 MB), so
+running one per worker caps TRAIT_WORKERS on memory long before CPU. In
+server mode a single process owns the sessions, and any number of decode
+workers use a RemoteTraitExtractor: they decode audio, compute the mel and
+librosa extras locally, write the mels into a shared-memory block and queue a
+request. The server drains up to max_batch pending requests, runs them as one
+batched inference call, and replies with the (small) per-track model outputs.
+
+Usage:
+    server = InferenceServer(num_clients=8)
+    server.start()
+    # hand server.client(i) to worker i; it behaves like a TraitExtractor
+    ...
+    server.stop()
+"""
+
+import multiprocessing
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.errors import handle
+from src.feature_extraction.config import TRAIT_BATCH_SIZE, TRAIT_SERVER_TIMEOUT
+from src.feature_extraction.trait_extractor import TraitExtractor, _default_mel_cache
+
+
+def _read_mels(shm_name, shapes):
+    """Copy the mels described by shapes out of the named shared-memory block."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        mels = []
+        offset = 0
+        for shape in shapes:
+            view = np.ndarray(shape, dtype=np.float32, buffer=shm.buf, offset=offset)
+            mels.append(view.copy())
+            offset += view.nbytes
+            del view
+        return mels
+    finally:
+        shm.close()
+
+
+def _reply_error(response_queues, client_id, seq, exc):
+    # Exceptions are flattened to RuntimeError so an unpicklable exception
+    # cannot silently stall the queue feeder thread and hang the client.
+    response_queues[client_id].put(
+        (seq, RuntimeError("Inference server error: %r" % (exc,)))
+    )
+
+
+def _serve_batch(extractor, pending, response_queues):
+    """Run one batched inference call for pending requests and reply to each."""
+    requests = []
+    for client_id, seq, shm_name, shapes in pending:
+        try:
+            requests.append((client_id, seq, _read_mels(shm_name, shapes)))
+        except Exception as exc:
+            _reply_error(response_queues, client_id, seq, exc)
+
+    if not requests:
+        return
+
+    try:
+        outputs = extractor._infer([mel for _, _, mels in requests for mel in mels])
+    except Exception:
+        # Isolate the failing request instead of failing the whole batch
+        for client_id, seq, mels in requests:
+            try:
+                response_queues[client_id].put((seq, extractor._infer(mels)))
+            except Exception as exc:
+                _reply_error(response_queues, client_id, seq, exc)
+        return
+
+    offset = 0
+    for client_id, seq, mels in requests:
+        response_queues[client_id].put((seq, outputs[offset : offset + len(mels)]))
+        offset += len(mels)
+
+
+def _serve(request_queue, response_queues, max_batch, extractor_factory):
+    """Server process: load ONNX sessions once and answer requests until None."""
+    try:
+        extractor = extractor_factory()
+        init_error = None
+    except Exception as exc:
+        handle(exc)
+        extractor = None
+        init_error = exc
+
+    stop = False
+    while not stop:
+        request = request_queue.get()
+        if request is None:
+            break
+
+        pending = [request]
+        while len(pending) < max_batch:
+            try:
+                request = request_queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                stop = True
+                break
+            pending.append(request)
+
+        if init_error is not None:
+            for client_id, seq, _, _ in pending:
+                _reply_error(response_queues, client_id, seq, init_error)
+            continue
+
+        _serve_batch(extractor, pending, response_queues)
+
+
+class RemoteTraitExtractor(TraitExtractor):
+    """TraitExtractor whose model inference runs in an InferenceServer.
+
+    Decoding, mel computation and the librosa extras stay in the calling
+    process; only _infer() is delegated. compute(), compute_from_signal() and
+    compute_batch() behave exactly as on a local TraitExtractor.
+    """
+
+    def __init__(self, client_id, request_queue, response_queue):
+        # Deliberately skips TraitExtractor.__init__: no local ONNX sessions.
+        self._mel_cache = _default_mel_cache()
+        self._client_id = client_id
+        self._request_queue = request_queue
+        self._response_queue = response_queue
+        self._seq = 0
+
+    def _should_stream(self, audio_path: str) -> bool:
+        # Streaming runs the backbones as windows fill, which needs local
+        # sessions; long files are decoded whole and sent as one mel.
+        return False
+
+    def _infer(self, mels: list) -> list:
+        mels = [np.ascontiguousarray(mel, dtype=np.float32) for mel in mels]
+        total = sum(mel.nbytes for mel in mels)
+        shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+        try:
+            offset = 0
+            for mel in mels:
+                dst = np.ndarray(mel.shape, dtype=np.float32, buffer=shm.buf, offset=offset)
+                dst[:] = mel
+                offset += mel.nbytes
+                del dst
+
+            self._seq += 1
+            self._request_queue.put(
+                (self._client_id, self._seq, shm.name, [mel.shape for mel in mels])
+            )
+            seq = None
+            while seq != self._seq:
+                # Late replies to requests that already timed out are dropped
+                try:
+                    seq, result = self._response_queue.get(
+                        timeout=TRAIT_SERVER_TIMEOUT
+                    )
+                except queue.Empty:
+                    raise RuntimeError(
+                        "Inference server did not respond within %.0fs"
+                        % TRAIT_SERVER_TIMEOUT
+                    )
+        finally:
+            shm.close()
+            shm.unlink()
+
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class InferenceServer:
+    """Owns the inference process and the queues its clients talk over.
+
+    Each client index gets its own response queue, so one client must only
+    be used from one process at a time. extractor_factory builds the
+    server-side extractor and must be picklable (a class or module-level
+    function).
+    """
+
+    def __init__(
+        self,
+        num_clients: int,
+        max_batch: int = TRAIT_BATCH_SIZE,
+        extractor_factory=TraitExtractor,
+    ):
+        self._extractor_factory = extractor_factory
+        self._request_queue = multiprocessing.Queue()
+        self._response_queues = [multiprocessing.Queue() for _ in range(num_clients)]
+        self._max_batch = max(int(max_batch), 1)
+        self._process = None
+
+    def start(self):
+        self._process = multiprocessing.Process(
+            target=_serve,
+            args=(
+                self._request_queue,
+                self._response_queues,
+                self._max_batch,
+                self._extractor_factory,
+            ),
+        )
+        self._process.daemon = True
+        self._process.start()
+
+    def client(self, client_id: int) -> RemoteTraitExtractor:
+        return RemoteTraitExtractor(
+            client_id, self._request_queue, self._response_queues[client_id]
+        )
+
+    def stop(self, timeout: float = 30.0):
+        if self._process is None:
+            return
+        self._request_queue.put(None)
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._process = None
@@ -0,0 +1,407 @@
+"""Persistent work ledger for the feature-extraction batch scripts.
+
+Each unit of work is a feature_job row keyed by (job_type, track_id), e.g.
+("traits", 42) or ("cosine:1", 42), moving through
+
+    queued -> running -> done
+                      -> queued  (failed, attempts left)
+                      -> failed  (FEATURE_JOB_MAX_ATTEMPTS reached; reason kept)
+
+Workers claim the next queued rows with UPDATE ... FOR UPDATE SKIP LOCKED,
+so any number of processes, on one machine or several, can work the same
+run without handing out a track twice, and a new run started after a crash
+or Ctrl-C picks up exactly the rows that are not done. Rows are claimed by
+descending priority (file size, see scheduler.file_size), so the
+expensive tracks still start first.
+
+A claim is a lease of FEATURE_JOB_LEASE_SECONDS. While a worker holds jobs
+it runs keep_alive(), whose heartbeat thread renews the leases; when a
+worker or a whole node dies, its leases run out and the jobs go back in the
+queue on the next claim (counting as a failed attempt), wherever that claim
+comes from.
+
+The table is created by src/scripts/migrations/20261018_create_feature_job.py
+and 20261018_add_feature_job_lease.py.
+
+Usage:
+    ledger = JobLedger("traits", batch_size=TRAIT_BATCH_SIZE)
+    ledger.enqueue((t.id, file_size(path_of(t))) for t in todo)
+    # in each worker process:
+    with ledger.keep_alive():
+        for batch in ledger.batches():      # [(track_id, file_name), ...]
+            ...
+            ledger.done(saved_ids)
+            ledger.failed(track_id, "reason")
+"""
+
+import os
+import socket
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from src.db import database
+from src.errors import handle
+from src.feature_extraction.config import (
+    FEATURE_JOB_LEASE_SECONDS,
+    FEATURE_JOB_MAX_ATTEMPTS,
+)
+from src.models.feature_job import FeatureJob
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Rows per multi-row INSERT in enqueue()
+_ENQUEUE_CHUNK = 1000
+
+# Failure reasons are truncated to keep the table small
+_MAX_REASON_CHARS = 2000
+
+_CLAIM_SQL = text(
+    """
+    WITH claimed AS (
+        UPDATE feature_job
+        SET status = 'running',
+            attempts = attempts + 1,
+            worker = :worker,
+            claimed_at = NOW(),
+            lease_expires_at = NOW() + make_interval(secs => :lease)
+        WHERE id IN (
+            SELECT id FROM feature_job
+            WHERE job_type = :job_type AND status = 'queued'
+            ORDER BY priority DESC, track_id
+            LIMIT :limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING track_id, priority
+    )
+    SELECT claimed.track_id, track.file_name
+    FROM claimed JOIN track ON track.id = claimed.track_id
+    ORDER BY claimed.priority DESC, claimed.track_id
+    """
+)
+
+# Running jobs whose lease ran out (or whose worker is known to be dead)
+# go back in the queue, or are parked once out of attempts. A NULL lease
+# predates leasing and counts as expired.
+_EXPIRE_SQL = text(
+    """
+    UPDATE feature_job
+    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'queued' END,
+        error = 'lease expired (worker ' || COALESCE(worker, '?') || ')',
+        lease_expires_at = NULL,
+        finished_at = NOW()
+    WHERE id IN (
+        SELECT id FROM feature_job
+        WHERE job_type = :job_type AND status = 'running'
+          AND (lease_expires_at IS NULL OR lease_expires_at < NOW() OR id = ANY(:orphaned))
+        FOR UPDATE SKIP LOCKED
+    )
+    """
+)
+
+_HEARTBEAT_SQL = text(
+    """
+    UPDATE feature_job
+    SET lease_expires_at = NOW() + make_interval(secs => :lease)
+    WHERE job_type = :job_type AND status = 'running' AND worker = :worker
+    """
+)
+
+_DONE_SQL = text(
+    """
+    UPDATE feature_job
+    SET status = 'done', error = NULL, lease_expires_at = NULL, finished_at = NOW()
+    WHERE job_type = :job_type AND track_id = ANY(:track_ids)
+    """
+)
+
+_FAILED_SQL = text(
+    """
+    UPDATE feature_job
+    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'queued' END,
+        error = :reason,
+        lease_expires_at = NULL,
+        finished_at = NOW()
+    WHERE job_type = :job_type AND track_id = :track_id
+      AND status = 'running' AND worker = :worker
+    RETURNING status
+    """
+)
+
+
+# Process that last used each engine, keyed by id(engine)
+_engine_pids = {}
+
+
+def worker_id():
+    """Identify this process in feature_job.worker as host:pid."""
+    return "%s:%d" % (socket.gethostname(), os.getpid())
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class JobLedger:
+    """Claims and records feature_job rows of one job_type.
+
+    Holds no connection of its own, so it can be handed to worker processes
+    like the work queue it replaces. bind is an alternative Engine (tests);
+    the shared database engine is used otherwise. lease_seconds defaults to
+    FEATURE_JOB_LEASE_SECONDS.
+    """
+
+    def __init__(self, job_type, batch_size=1, bind=None, lease_seconds=None):
+        self.job_type = job_type
+        self.batch_size = max(int(batch_size), 1)
+        self.lease_seconds = float(lease_seconds or FEATURE_JOB_LEASE_SECONDS)
+        self._bind = bind
+        self._engine()
+
+    def _engine(self):
+        engine = self._bind if self._bind is not None else database.engine
+        pid = os.getpid()
+        if _engine_pids.setdefault(id(engine), pid) != pid:
+            # Pooled connections inherited across fork belong to the parent
+            engine.dispose(close=False)
+            _engine_pids[id(engine)] = pid
+        return engine
+
+    def enqueue(self, jobs, requeue=()):
+        """Queue (track_id, priority) pairs; returns the number of rows queued.
+
+        Tracks that already have a job keep it, unless its status is in
+        requeue, in which case it is reset to queued with a fresh attempt
+        count. Running jobs are never reset.
+        """
+        table = FeatureJob.__table__
+        requeue = [status for status in requeue if status != RUNNING]
+        rows = [
+            {"job_type": self.job_type, "track_id": int(track_id), "priority": int(priority)}
+            for track_id, priority in jobs
+        ]
+        n_queued = 0
+        with self._engine().begin() as conn:
+            for start in range(0, len(rows), _ENQUEUE_CHUNK):
+                stmt = pg_insert(table).values(rows[start : start + _ENQUEUE_CHUNK])
+                if requeue:
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["job_type", "track_id"],
+                        set_={
+                            "status": QUEUED,
+                            "priority": stmt.excluded.priority,
+                            "attempts": 0,
+                            "error": None,
+                            "worker": None,
+                            "claimed_at": None,
+                            "lease_expires_at": None,
+                            "finished_at": None,
+                        },
+                        where=table.c.status.in_(requeue),
+                    )
+                else:
+                    stmt = stmt.on_conflict_do_nothing(
+                        index_elements=["job_type", "track_id"]
+                    )
+                n_queued += conn.execute(stmt).rowcount
+        return n_queued
+
+    def prepare(self, jobs, requeue=()):
+        """Start of a run: requeue stale jobs, queue jobs, and return the
+        number of jobs now waiting to be claimed."""
+        self.requeue_stale()
+        self.enqueue(jobs, requeue=requeue)
+        return self.summary()[QUEUED]
+
+    def _expire(self, conn, orphaned=()):
+        return conn.execute(
+            _EXPIRE_SQL,
+            {
+                "job_type": self.job_type,
+                "max_attempts": FEATURE_JOB_MAX_ATTEMPTS,
+                "orphaned": list(orphaned),
+            },
+        ).rowcount
+
+    def claim(self, limit=None):
+        """Lease up to limit queued jobs to this process.
+
+        Expired leases are reclaimed first. Returns [(track_id, file_name),
+        ...], highest priority first; rows locked by a concurrent claim are
+        skipped rather than waited on.
+        """
+        with self._engine().begin() as conn:
+            self._expire(conn)
+            rows = conn.execute(
+                _CLAIM_SQL,
+                {
+                    "worker": worker_id(),
+                    "job_type": self.job_type,
+                    "limit": limit or self.batch_size,
+                    "lease": self.lease_seconds,
+                },
+            ).fetchall()
+        return [(row.track_id, row.file_name) for row in rows]
+
+    def heartbeat(self):
+        """Renew the leases of every job this process holds; returns the count."""
+        with self._engine().begin() as conn:
+            return conn.execute(
+                _HEARTBEAT_SQL,
+                {
+                    "job_type": self.job_type,
+                    "worker": worker_id(),
+                    "lease": self.lease_seconds,
+                },
+            ).rowcount
+
+    @contextmanager
+    def keep_alive(self):
+        """Renew this process's leases from a background thread until exit.
+
+        Heartbeats run every third of the lease, so two can be missed
+        (e.g. a slow database) before another worker may take the jobs over.
+        """
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.lease_seconds / 3.0):
+                try:
+                    self.heartbeat()
+                except Exception as exc:
+                    handle(exc, "Feature job heartbeat failed", print, False)
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+
+    def batches(self):
+        """Yield claimed batches of batch_size until no queued job is left."""
+        while True:
+            batch = self.claim()
+            if not batch:
+                return
+            yield batch
+
+    def done(self, track_ids):
+        track_ids = [int(track_id) for track_id in track_ids]
+        if not track_ids:
+            return
+        with self._engine().begin() as conn:
+            conn.execute(_DONE_SQL, {"job_type": self.job_type, "track_ids": track_ids})
+
+    def failed(self, track_id, reason):
+        """Record a failed attempt; the job is queued again until it runs out
+        of attempts. Returns the job's new status, or None when this process
+        no longer holds it (e.g. it was requeued as stale)."""
+        with self._engine().begin() as conn:
+            row = conn.execute(
+                _FAILED_SQL,
+                {
+                    "job_type": self.job_type,
+                    "track_id": int(track_id),
+                    "worker": worker_id(),
+                    "reason": str(reason)[:_MAX_REASON_CHARS],
+                    "max_attempts": FEATURE_JOB_MAX_ATTEMPTS,
+                },
+            ).first()
+        return row.status if row is not None else None
+
+    def requeue_stale(self):
+        """Release running jobs whose worker is gone; returns the count.
+
+        Besides expired leases, this releases jobs leased on this host by a
+        process that no longer exists, so an interrupted run on this machine
+        resumes immediately instead of waiting out its leases.
+        """
+        host = socket.gethostname()
+        with self._engine().begin() as conn:
+            running = conn.execute(
+                text(
+                    "SELECT id, worker FROM feature_job "
+                    "WHERE job_type = :job_type AND status = 'running'"
+                ),
+                {"job_type": self.job_type},
+            ).fetchall()
+            orphaned = []
+            for row in running:
+                owner, _, pid = (row.worker or "").rpartition(":")
+                if owner == host and pid.isdigit() and not _pid_alive(int(pid)):
+                    orphaned.append(row.id)
+            return self._expire(conn, orphaned)
+
+    def retry_failed(self):
+        """Queue every failed job again with a fresh attempt count."""
+        with self._engine().begin() as conn:
+            return conn.execute(
+                text(
+                    "UPDATE feature_job SET status = 'queued', attempts = 0, "
+                    "worker = NULL, claimed_at = NULL, lease_expires_at = NULL, "
+                    "finished_at = NULL "
+                    "WHERE job_type = :job_type AND status = 'failed'"
+                ),
+                {"job_type": self.job_type},
+            ).rowcount
+
+    def claimable(self):
+        """Number of jobs a claim could take now: queued, or with an expired lease."""
+        with self._engine().connect() as conn:
+            return conn.execute(
+                text(
+                    "SELECT COUNT(*) FROM feature_job WHERE job_type = :job_type "
+                    "AND (status = 'queued' OR (status = 'running' "
+                    "AND (lease_expires_at IS NULL OR lease_expires_at < NOW())))"
+                ),
+                {"job_type": self.job_type},
+            ).scalar()
+
+    def pending_track_ids(self):
+        """Track IDs with a queued or running job."""
+        with self._engine().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT track_id FROM feature_job "
+                    "WHERE job_type = :job_type AND status IN ('queued', 'running')"
+                ),
+                {"job_type": self.job_type},
+            ).fetchall()
+        return {row.track_id for row in rows}
+
+    def summary(self):
+        """Return {status: job count} for this job_type."""
+        with self._engine().connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT status, COUNT(*) AS n FROM feature_job "
+                    "WHERE job_type = :job_type GROUP BY status"
+                ),
+                {"job_type": self.job_type},
+            ).fetchall()
+        counts = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+        counts.update({row.status: row.n for row in rows})
+        return counts
+
+
+def format_summary(counts):
+    return "%d done, %d failed, %d queued, %d running" % (
+        counts[DONE],
+        counts[FAILED],
+        counts[QUEUED],
+        counts[RUNNING],
+    )
@@ -0,0 +1,99 @@
+"""On-disk cache of trait-extraction mel spectrograms.
+
+Re-extraction (TRAIT_VERSION bumps, backfill_genre_mood, retry_failed_traits)
+otherwise decodes every file and recomputes the same 96-band mel. Entries are
+keyed by the file's real path, size and mtime plus the mel parameters, so an
+edited file or a preprocessing change simply misses. Each entry is a .npy
+array (loaded memory-mapped) and a small .json sidecar holding the librosa
+extras computed from the same decode (onset_density, spectral_flatness), so a
+hit skips audio decoding entirely.
+
+Writes go to a temporary file and are renamed into place, so concurrent
+workers never observe a partially written entry.
+
+Usage:
+    cache = MelCache(params={"n_mels": 96, ...})
+    hit = cache.get(path)
+    if hit is None:
+        ...
+        cache.put(path, mel, {"onset_density": 1.2, "spectral_flatness": 0.01})
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from src.feature_extraction.config import TRAIT_MEL_CACHE_DIR, resolve_project_path
+
+
+# Bump when the on-disk entry layout changes
+_FORMAT_VERSION = 1
+
+
+class MelCache:
+    """Memory-mappable mel spectrogram cache keyed by file signature.
+
+    params describes everything that shapes the cached values (mel settings,
+    extras definitions); changing any of it changes every key.
+    """
+
+    def __init__(self, params: dict, cache_dir: str = TRAIT_MEL_CACHE_DIR):
+        self.cache_dir = resolve_project_path(cache_dir)
+        self._params_signature = json.dumps(
+            {"format": _FORMAT_VERSION, "params": params}, sort_keys=True
+        )
+
+    def key(self, audio_path: str) -> str:
+        """Return the cache key for audio_path.
+
+        Raises:
+            OSError: If the file cannot be stat'ed (e.g. it does not exist).
+        """
+        real_path = os.path.realpath(audio_path)
+        st = os.stat(real_path)
+        payload = "\0".join(
+            [real_path, str(st.st_size), str(st.st_mtime_ns), self._params_signature]
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _entry_paths(self, key: str) -> tuple:
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".npy", base + ".json"
+
+    def get(self, audio_path: str):
+        """Return (mel, extras) for audio_path, or None on a miss.
+
+        mel is a read-only memory-mapped (96, T) float32 array.
+        """
+        try:
+            npy_path, json_path = self._entry_paths(self.key(audio_path))
+            with open(json_path) as f:
+                extras = json.load(f)
+            mel = np.load(npy_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        return mel, extras
+
+    def put(self, audio_path: str, mel: np.ndarray, extras: dict) -> None:
+        """Store mel and extras for audio_path, replacing any existing entry."""
+        npy_path, json_path = self._entry_paths(self.key(audio_path))
+        os.makedirs(os.path.dirname(npy_path), exist_ok=True)
+
+        # .npy first: get() only reads an entry once its .json exists
+        _atomic_write(npy_path, lambda f: np.save(f, np.asarray(mel, dtype=np.float32)))
+        _atomic_write(json_path, lambda f: f.write(json.dumps(extras).encode("utf-8")))
+
+
+def _atomic_write(path: str, write) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
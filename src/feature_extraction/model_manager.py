@@ -4,18 +4,46 @@ Downloads Essentia pre-trained ONNX models from essentia.upf.edu on first use
 and caches them in models/traits/ (gitignored). Returns onnxruntime
 InferenceSession objects; sessions are cached in-process after first load.
 
+Models exported with a fixed batch dimension (MAEST) can be loaded as a
+dynamic-batch variant: the graph's input/output batch dim is rewritten to a
+symbolic "batch" (requires the optional onnx package), validated against the
+original, and cached next to it as <name>.dynbatch.onnx.
+
+Sessions are created with options from config (TRAIT_ORT_*): intra-op
+threads default to an even split of the cores across trait workers, and the
+optimized graph is saved next to the model (<name>.opt-<level>-ort<version>.onnx)
+so later worker starts load it without re-running graph optimization.
+
+Any model can also be loaded as a dynamically quantized INT8 variant
+(<name>.int8.onnx, or <name>.dynbatch.int8.onnx), derived locally with
+onnxruntime.quantization. TRAIT_QUANTIZED_MODELS selects which models use it
+by default; check the accuracy impact with compare_quantized_models first.
+
 Usage:
     from src.feature_extraction.model_manager import load_model
     session = load_model("discogs-effnet-bsdynamic")
+    maest = load_model("discogs-maest-30s-pw-519l", dynamic_batch=True)
+    effnet_int8 = load_model("discogs-effnet-bsdynamic", quantized=True)
 """
 
 import os
 import urllib.request
 from typing import Dict, Optional
 
+import numpy as np
 import onnxruntime as ort
 
-from src.feature_extraction.config import TRAIT_MODELS_DIR
+from src.feature_extraction.config import (
+    TRAIT_INFERENCE_SERVER,
+    TRAIT_MODELS_DIR,
+    TRAIT_ORT_EXECUTION_MODE,
+    TRAIT_ORT_GRAPH_OPTIMIZATION,
+    TRAIT_ORT_INTER_OP_THREADS,
+    TRAIT_ORT_INTRA_OP_THREADS,
+    TRAIT_ORT_OPTIMIZED_CACHE,
+    TRAIT_QUANTIZED_MODELS,
+    TRAIT_WORKERS,
+)
 
 
 _BASE_URL = "https://essentia.upf.edu/models"
@@ -73,6 +101,30 @@ _MANIFEST: Dict[str, tuple] = {
     ),
 }
 
+# Suffixes for locally derived dynamic-batch variants and their failure marker
+_DYNBATCH_SUFFIX = ".dynbatch.onnx"
+_DYNBATCH_FAILED_SUFFIX = ".dynbatch.failed"
+
+# Suffix for locally derived dynamically quantized (INT8) variants
+_INT8_SUFFIX = ".int8.onnx"
+
+# Max absolute difference allowed between the original and rewritten graph
+_DYNBATCH_TOLERANCE = 1e-4
+
+_EXECUTION_MODES = {
+    "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+    "parallel": ort.ExecutionMode.ORT_PARALLEL,
+}
+
+_GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+_PROVIDERS = ["CPUExecutionProvider"]
+
 # In-process session cache: model name -> InferenceSession
 _session_cache: Dict[str, Optional[ort.InferenceSession]] = {}
 
@@ -133,7 +185,227 @@ def _download_model(name: str, url_path: str, local_filename: str) -> str:
     return local_path
 
 
-def load_model(name: str) -> ort.InferenceSession:
+def _intra_op_threads() -> int:
+    """Return intra-op threads per session, splitting cores across workers when unset."""
+    if TRAIT_ORT_INTRA_OP_THREADS > 0:
+        return TRAIT_ORT_INTRA_OP_THREADS
+    processes = 1 if TRAIT_INFERENCE_SERVER else max(TRAIT_WORKERS, 1)
+    return max((os.cpu_count() or 1) // processes, 1)
+
+
+def _session_options() -> ort.SessionOptions:
+    """Build SessionOptions from the TRAIT_ORT_* settings.
+
+    Raises:
+        ValueError: If the execution mode or optimization level is unknown.
+    """
+    if TRAIT_ORT_EXECUTION_MODE not in _EXECUTION_MODES:
+        raise ValueError(
+            "Unknown TRAIT_ORT_EXECUTION_MODE '%s'. Expected one of: %s"
+            % (TRAIT_ORT_EXECUTION_MODE, list(_EXECUTION_MODES.keys()))
+        )
+    if TRAIT_ORT_GRAPH_OPTIMIZATION not in _GRAPH_OPTIMIZATION_LEVELS:
+        raise ValueError(
+            "Unknown TRAIT_ORT_GRAPH_OPTIMIZATION '%s'. Expected one of: %s"
+            % (TRAIT_ORT_GRAPH_OPTIMIZATION, list(_GRAPH_OPTIMIZATION_LEVELS.keys()))
+        )
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = _intra_op_threads()
+    options.inter_op_num_threads = max(TRAIT_ORT_INTER_OP_THREADS, 1)
+    options.execution_mode = _EXECUTION_MODES[TRAIT_ORT_EXECUTION_MODE]
+    options.graph_optimization_level = _GRAPH_OPTIMIZATION_LEVELS[
+        TRAIT_ORT_GRAPH_OPTIMIZATION
+    ]
+    return options
+
+
+def _optimized_path(model_path: str) -> str:
+    """Return where the optimized graph for model_path is cached.
+
+    The optimization level and onnxruntime version are part of the name:
+    optimized graphs may contain runtime-specific fused ops.
+    """
+    return "%s.opt-%s-ort%s.onnx" % (
+        os.path.splitext(model_path)[0],
+        TRAIT_ORT_GRAPH_OPTIMIZATION,
+        ort.__version__,
+    )
+
+
+def _create_session(model_path: str) -> ort.InferenceSession:
+    """Create a tuned InferenceSession, reusing or writing the optimized graph."""
+    options = _session_options()
+    if not TRAIT_ORT_OPTIMIZED_CACHE or TRAIT_ORT_GRAPH_OPTIMIZATION == "disable":
+        return ort.InferenceSession(model_path, options, providers=_PROVIDERS)
+
+    opt_path = _optimized_path(model_path)
+    if os.path.exists(opt_path) and os.path.getmtime(opt_path) >= os.path.getmtime(
+        model_path
+    ):
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return ort.InferenceSession(opt_path, options, providers=_PROVIDERS)
+        except Exception:
+            # Corrupt or incompatible cache entry: rebuild it below
+            os.remove(opt_path)
+            options = _session_options()
+
+    # Written under a per-process name and renamed into place so concurrent
+    # workers never load a partially written graph.
+    tmp_path = "%s.%d.tmp" % (opt_path, os.getpid())
+    options.optimized_model_filepath = tmp_path
+    try:
+        session = ort.InferenceSession(model_path, options, providers=_PROVIDERS)
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, opt_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return session
+
+
+def _remove_model_files(model_path: str) -> None:
+    """Remove a locally derived model and its optimized-graph cache."""
+    for path in (model_path, _optimized_path(model_path)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _make_batch_dynamic(src_path: str, dst_path: str) -> None:
+    """Write a copy of src_path whose graph inputs/outputs have a symbolic batch dim.
+
+    Only the declared dim 0 of graph inputs and outputs is rewritten; stale
+    intermediate shape annotations are dropped so onnxruntime re-infers them.
+    Graphs that hard-code the batch size internally (e.g. in Reshape
+    constants) still fail, which _validate_dynamic_batch() catches.
+    """
+    try:
+        import onnx
+    except ImportError as exc:
+        raise RuntimeError(
+            "the onnx package is required to derive a dynamic-batch model"
+        ) from exc
+
+    model = onnx.load(src_path)
+    initializers = {init.name for init in model.graph.initializer}
+    for value in list(model.graph.input) + list(model.graph.output):
+        if value.name in initializers:
+            continue
+        dims = value.type.tensor_type.shape.dim
+        if len(dims) > 0:
+            dims[0].dim_param = "batch"
+    del model.graph.value_info[:]
+    onnx.save(model, dst_path)
+
+
+def _validate_dynamic_batch(
+    original: ort.InferenceSession, dynamic: ort.InferenceSession
+) -> None:
+    """Check that dynamic runs at batch 2 and matches original on each row.
+
+    Raises:
+        RuntimeError: If the rewritten graph fails or diverges.
+    """
+    inp = original.get_inputs()[0]
+    sample_shape = [d if isinstance(d, int) and d > 0 else 1 for d in inp.shape[1:]]
+    rng = np.random.default_rng(0)
+    batch = rng.standard_normal([2] + sample_shape).astype(np.float32)
+
+    outputs = dynamic.run(None, {dynamic.get_inputs()[0].name: batch})
+    for k in range(2):
+        expected = original.run(None, {inp.name: batch[k : k + 1]})
+        for got, want in zip(outputs, expected):
+            if got.shape[0] != 2:
+                raise RuntimeError(
+                    "dynamic-batch output has batch dim %d, expected 2" % got.shape[0]
+                )
+            diff = float(np.max(np.abs(got[k : k + 1] - want)))
+            if diff > _DYNBATCH_TOLERANCE:
+                raise RuntimeError(
+                    "dynamic-batch output diverges from original (max diff %.2e)"
+                    % diff
+                )
+
+
+def _derive_dynamic_batch(name: str, local_path: str) -> str:
+    """Derive (once) and validate the dynamic-batch variant of a model; return its path."""
+    stem = os.path.splitext(local_path)[0]
+    dyn_path = stem + _DYNBATCH_SUFFIX
+    failed_marker = stem + _DYNBATCH_FAILED_SUFFIX
+
+    if os.path.exists(failed_marker):
+        with open(failed_marker) as f:
+            raise RuntimeError(
+                "dynamic-batch variant of '%s' previously failed: %s"
+                % (name, f.read().strip())
+            )
+
+    if _is_valid_onnx(dyn_path):
+        return dyn_path
+
+    try:
+        _make_batch_dynamic(local_path, dyn_path)
+        # Uncached on purpose: only needed once, for the comparison
+        original = _create_session(local_path)
+        _validate_dynamic_batch(original, _create_session(dyn_path))
+        del original
+        return dyn_path
+    except Exception as exc:
+        _remove_model_files(dyn_path)
+        # Only a failed rewrite/validation is permanent; a missing onnx
+        # package is not, so no marker is written for it.
+        if not isinstance(exc.__cause__, ImportError):
+            with open(failed_marker, "w") as f:
+                f.write(str(exc))
+        raise
+
+
+def _quantize_int8(src_path: str, dst_path: str) -> None:
+    """Write a dynamically quantized (INT8 weights) copy of src_path.
+
+    Weights are quantized offline; activations are quantized per call, so no
+    calibration data is needed. Requires the optional onnx package.
+    """
+    try:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+    except ImportError as exc:
+        raise RuntimeError(
+            "the onnx package is required to derive an INT8 model"
+        ) from exc
+
+    tmp_path = "%s.%d.tmp" % (dst_path, os.getpid())
+    try:
+        quantize_dynamic(src_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, dst_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _derive_quantized(model_path: str) -> str:
+    """Quantize model_path (once, or again when it changes); return the INT8 path."""
+    int8_path = os.path.splitext(model_path)[0] + _INT8_SUFFIX
+    if _is_valid_onnx(int8_path) and os.path.getmtime(int8_path) >= os.path.getmtime(
+        model_path
+    ):
+        return int8_path
+    try:
+        _quantize_int8(model_path, int8_path)
+    except Exception:
+        _remove_model_files(int8_path)
+        raise
+    return int8_path
+
+
+def _quantize_by_default(name: str) -> bool:
+    """Return True if TRAIT_QUANTIZED_MODELS selects the INT8 variant of name."""
+    return "all" in TRAIT_QUANTIZED_MODELS or name in TRAIT_QUANTIZED_MODELS
+
+
+def load_model(
+    name: str, dynamic_batch: bool = False, quantized: Optional[bool] = None
+) -> ort.InferenceSession:
     """Return a cached InferenceSession for the named model.
 
     Downloads the ONNX file on first call if not present in models/traits/.
@@ -141,13 +413,29 @@ def load_model(name: str) -> ort.InferenceSession:
 
     Args:
         name: Model name key from the manifest (e.g. "discogs-effnet-bsdynamic").
+        dynamic_batch: Load a variant whose batch dimension is symbolic, derived
+            locally from the downloaded graph on first use. Callers should fall
+            back to the plain model when this raises.
+        quantized: Load the dynamically quantized INT8 variant, derived locally
+            on first use. None follows TRAIT_QUANTIZED_MODELS. Never falls back
+            to fp32: TRAIT_VERSION and TRAIT_EMBEDDING_VERSION already name the
+            selected models as INT8.
 
     Raises:
         KeyError: If name is not in the model manifest.
-        RuntimeError: If the ONNX file cannot be downloaded or loaded.
+        RuntimeError: If the ONNX file cannot be downloaded or loaded, or a
+            requested variant cannot be derived.
     """
-    if name in _session_cache:
-        return _session_cache[name]
+    if quantized is None:
+        quantized = _quantize_by_default(name)
+
+    cache_key = name
+    if dynamic_batch:
+        cache_key += "@dynamic_batch"
+    if quantized:
+        cache_key += "@int8"
+    if cache_key in _session_cache:
+        return _session_cache[cache_key]
 
     if name not in _MANIFEST:
         raise KeyError(
@@ -156,16 +444,17 @@ def load_model(name: str) -> ort.InferenceSession:
 
     url_path, local_filename = _MANIFEST[name]
     try:
-        local_path = _download_model(name, url_path, local_filename)
-        session = ort.InferenceSession(
-            local_path,
-            providers=["CPUExecutionProvider"],
-        )
-        _session_cache[name] = session
+        model_path = _download_model(name, url_path, local_filename)
+        if dynamic_batch:
+            model_path = _derive_dynamic_batch(name, model_path)
+        if quantized:
+            model_path = _derive_quantized(model_path)
+        session = _create_session(model_path)
+        _session_cache[cache_key] = session
         return session
     except Exception as exc:
         raise RuntimeError(
-            "Failed to load ONNX model '%s': %s" % (name, exc)
+            "Failed to load ONNX model '%s': %s" % (cache_key, exc)
         ) from exc
 
 
@@ -0,0 +1,222 @@
+"""Optional per-stage timing of descriptor and trait extraction.
+
+Extraction code wraps its expensive steps in stage() and each analysed file
+in track_file(); with FEATURE_TIMING off both return a shared no-op context,
+so the instrumentation costs one attribute check per call. When on, a stage
+that runs inside a file context (possibly several times, e.g. once per
+descriptor zone) is summed into that file's entry; stages outside one (e.g.
+batched inference) are recorded per call. File contexts are per thread and
+do not nest: an inner track_file() joins the outer file.
+
+Worker processes send drain() snapshots back to the parent, which passes
+them to report() at the end of a run.
+
+Usage:
+    with profiling.track_file(path):
+        with profiling.stage("hpss"):
+            ...
+    snapshot = profiling.drain()        # in the worker
+    profiling.report(snapshots)         # in the parent
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from src.feature_extraction.config import FEATURE_TIMING, FEATURE_TIMING_OUTPUT
+
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+# Slowest files listed in a summary
+_SLOWEST_FILES = 5
+
+
+class StageTimer:
+    """Collects stage and per-file timings for one process."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._files = []
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._timed_stage(name)
+
+    def track_file(self, label):
+        if not self.enabled or getattr(self._local, "file", None) is not None:
+            return _NULL_CONTEXT
+        return self._timed_file(label)
+
+    @contextlib.contextmanager
+    def _timed_stage(self, name):
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - began
+            current = getattr(self._local, "file", None)
+            if current is not None:
+                current[name] = current.get(name, 0.0) + elapsed
+            else:
+                with self._lock:
+                    self._stages.setdefault(name, []).append(elapsed)
+
+    @contextlib.contextmanager
+    def _timed_file(self, label):
+        stages = {}
+        self._local.file = stages
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - began
+            self._local.file = None
+            with self._lock:
+                self._files.append({"file": str(label), "seconds": elapsed, "stages": stages})
+                for name, seconds in stages.items():
+                    self._stages.setdefault(name, []).append(seconds)
+
+    def drain(self):
+        """Return and clear what was collected; None when disabled.
+
+        The snapshot is {"pid", "stages": {name: [seconds]}, "files":
+        [{"file", "seconds", "stages"}]} and pickles cheaply.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            snapshot = {"pid": os.getpid(), "stages": self._stages, "files": self._files}
+            self._stages = {}
+            self._files = []
+        return snapshot
+
+
+timer = StageTimer(FEATURE_TIMING)
+
+
+def stage(name):
+    """Context manager timing one stage (no-op unless FEATURE_TIMING)."""
+    return timer.stage(name)
+
+
+def track_file(label):
+    """Context manager timing one file and the stages run inside it."""
+    return timer.track_file(label)
+
+
+def drain():
+    return timer.drain()
+
+
+def merge(snapshots):
+    """Combine snapshots (None entries are skipped) into one."""
+    merged = {"stages": {}, "files": []}
+    for snapshot in snapshots:
+        if snapshot is None:
+            continue
+        for name, samples in snapshot["stages"].items():
+            merged["stages"].setdefault(name, []).extend(samples)
+        merged["files"].extend(snapshot["files"])
+    return merged
+
+
+def _distribution(samples):
+    values = np.asarray(samples, dtype=np.float64)
+    return {
+        "count": int(len(values)),
+        "total_s": float(values.sum()),
+        "mean_s": float(values.mean()),
+        "p50_s": float(np.percentile(values, 50)),
+        "p95_s": float(np.percentile(values, 95)),
+    }
+
+
+def summarize(snapshot):
+    """p50/p95 per stage (busiest first) and per file, plus the slowest files."""
+    stages = sorted(
+        ((name, _distribution(samples)) for name, samples in snapshot["stages"].items() if samples),
+        key=lambda item: -item[1]["total_s"],
+    )
+    summary = {"stages": dict(stages)}
+    files = snapshot["files"]
+    if files:
+        summary["files"] = _distribution([f["seconds"] for f in files])
+        summary["files"]["slowest"] = [
+            {"file": f["file"], "seconds": f["seconds"]}
+            for f in sorted(files, key=lambda f: -f["seconds"])[:_SLOWEST_FILES]
+        ]
+    return summary
+
+
+def format_summary(summary):
+    """Multi-line table of a summarize() result."""
+    lines = ["%-14s %7s %10s %9s %9s" % ("stage", "count", "total", "p50", "p95")]
+    for name, stats in summary["stages"].items():
+        lines.append(
+            "%-14s %7d %9.1fs %8.3fs %8.3fs"
+            % (name, stats["count"], stats["total_s"], stats["p50_s"], stats["p95_s"])
+        )
+    files = summary.get("files")
+    if files:
+        lines.append(
+            "%-14s %7d %9.1fs %8.3fs %8.3fs"
+            % ("per file", files["count"], files["total_s"], files["p50_s"], files["p95_s"])
+        )
+        for f in files["slowest"]:
+            lines.append("  %8.2fs  %s" % (f["seconds"], f["file"]))
+    return "\n".join(lines)
+
+
+def report(snapshots, output_path=None):
+    """Print per-worker and combined timings for drain() snapshots.
+
+    Snapshots from the same process are combined first, so recycled or
+    long-lived workers each get one entry. Writes the report as JSON to
+    output_path (default FEATURE_TIMING_OUTPUT) when set. Returns the report,
+    or None if there was nothing to report.
+    """
+    by_worker = {}
+    for snapshot in snapshots:
+        if snapshot is not None:
+            by_worker.setdefault(snapshot["pid"], []).append(snapshot)
+    if not by_worker:
+        return None
+
+    workers = {pid: summarize(merge(group)) for pid, group in sorted(by_worker.items())}
+    combined = summarize(merge(s for group in by_worker.values() for s in group))
+
+    print("\nStage timings per worker:")
+    for pid, summary in workers.items():
+        busiest = next(iter(summary["stages"]), None)
+        files = summary.get("files", {})
+        print(
+            "  [%d] %d file(s), p50 %.2fs, p95 %.2fs per file; busiest stage: %s"
+            % (
+                pid,
+                files.get("count", 0),
+                files.get("p50_s", 0.0),
+                files.get("p95_s", 0.0),
+                busiest,
+            )
+        )
+    print("\nStage timings across workers:\n%s" % format_summary(combined))
+
+    result = {"workers": {str(pid): s for pid, s in workers.items()}, "combined": combined}
+    output_path = output_path or FEATURE_TIMING_OUTPUT
+    if output_path:
+        directory = os.path.dirname(output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(output_path, "w") as f:
+            json.dump(result, f, indent=2)
+        print("Timing report written to %s" % output_path)
+    return result
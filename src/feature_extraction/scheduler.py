@@ -0,0 +1,34 @@
+"""Work ordering for the feature-extraction batch scripts.
+
+The scripts used to split their track list into one static chunk per worker.
+Track lengths vary widely, so one worker would often still be decoding long
+files after the others had gone idle. Instead, workers now claim small
+batches from the feature_job ledger (see job_ledger.py), largest files first,
+and keep claiming until it is drained:
+
+- the expensive tracks start early instead of landing at the end of one
+  worker's chunk
+- the small tracks at the end fill in the gaps, so all workers finish at
+  about the same time
+
+The ledger orders claims by each job's priority, and file_size() supplies
+it: file size stands in for decode and inference cost.
+
+Usage:
+    from src.feature_extraction.scheduler import file_size
+
+    ledger.enqueue(
+        (track_id, file_size(join(PROCESSED_MUSIC_DIR, file_name)))
+        for track_id, file_name in todo
+    )
+"""
+
+import os
+
+
+def file_size(path: str) -> int:
+    """Return path's size in bytes, or 0 when it cannot be read."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
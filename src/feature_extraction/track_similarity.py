@@ -3,6 +3,8 @@
 Provides multiple scoring strategies over the 75-D compact descriptor vectors,
 from a simple flat cosine baseline through a structured late-fusion scorer that
 compares descriptor blocks (harmonic, rhythm, timbre, energy) separately.
+score_many() scores one vector against a matrix of candidates with batched
+versions of the same scorers.
 
 Descriptor layout (75 dims):
     [0:12]   chroma mean        (harmonic)
@@ -66,6 +68,9 @@ class ScorerName(str, Enum):
 
 _SCORER_REGISTRY: Dict[ScorerName, Callable] = {}
 
+# One-vs-many versions: fn(query (75,), matrix (N, 75), **kw) -> (N,) float64
+_BATCH_REGISTRY: Dict[ScorerName, Callable] = {}
+
 
 def _register(name: ScorerName):
     def decorator(fn):
@@ -74,6 +79,13 @@ def _register(name: ScorerName):
     return decorator
 
 
+def _register_batch(name: ScorerName):
+    def decorator(fn):
+        _BATCH_REGISTRY[name] = fn
+        return fn
+    return decorator
+
+
 def get_scorer(name: ScorerName) -> Callable:
     """Return the scorer function for *name*."""
     return _SCORER_REGISTRY[name]
@@ -284,7 +296,7 @@ def _energy_similarity(blocks_a: dict, blocks_b: dict, **kw) -> float:
     return _dist_to_sim(d, tau)
 
 
-def _get_live_fusion_weights():
+def get_live_fusion_weights():
     """Read fusion weights from WeightService if available; fall back to constants."""
     try:
         from src.harmonic_mixing.weight_service import WeightService
@@ -304,7 +316,9 @@ def late_fusion_v1(vec_a: np.ndarray, vec_b: np.ndarray, **kw) -> float:
     """Block-wise late-fusion scorer with configurable weights.
 
     Computes per-block similarities for harmonic, rhythm, timbre, and
-    energy_brightness, then fuses with a weighted sum.
+    energy_brightness, then fuses with a weighted sum. The weights come from
+    WeightService unless kw carries fusion_weights, a (harmonic, rhythm,
+    timbre, energy) tuple.
     """
     blocks_a = extract_blocks(vec_a)
     blocks_b = extract_blocks(vec_b)
@@ -314,7 +328,7 @@ def late_fusion_v1(vec_a: np.ndarray, vec_b: np.ndarray, **kw) -> float:
     t = _timbre_similarity(blocks_a, blocks_b, **kw)
     e = _energy_similarity(blocks_a, blocks_b, **kw)
 
-    wh, wr, wt, we = _get_live_fusion_weights()
+    wh, wr, wt, we = kw.get("fusion_weights") or get_live_fusion_weights()
     score = (
         wh * h
         + wr * r
@@ -328,18 +342,209 @@ def late_fusion_v1(vec_a: np.ndarray, vec_b: np.ndarray, **kw) -> float:
 
 
 # ---------------------------------------------------------------------------
-# Convenience entry point
+# Batched scorers (one query vector against the rows of a matrix)
 # ---------------------------------------------------------------------------
 
+def _safe_cosine_many(a: np.ndarray, m: np.ndarray) -> np.ndarray:
+    """Row-wise _safe_cosine(a, m[i])."""
+    n1 = np.linalg.norm(a)
+    n2 = np.linalg.norm(m, axis=1)
+    if n1 < _EPS:
+        return np.zeros(len(m))
+    ok = n2 >= _EPS
+    return np.where(ok, (m @ a) / (n1 * np.where(ok, n2, 1.0)), 0.0)
+
+
+def _rowwise_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """_safe_cosine(a[i], b[i]) for two equally shaped matrices."""
+    n1 = np.linalg.norm(a, axis=1)
+    n2 = np.linalg.norm(b, axis=1)
+    ok = (n1 >= _EPS) & (n2 >= _EPS)
+    denom = np.where(ok, n1 * n2, 1.0)
+    return np.where(ok, np.einsum("ij,ij->i", a, b) / denom, 0.0)
+
+
+def _standardized_euclidean_many(
+    a: np.ndarray,
+    m: np.ndarray,
+    variance: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    diff = m - a
+    if variance is not None:
+        safe_var = np.where(variance < _EPS, 1.0, variance)
+        return np.sqrt(np.sum(diff ** 2 / safe_var, axis=1))
+    return np.linalg.norm(diff, axis=1)
+
+
+def _dist_to_sim_many(distance: np.ndarray, tau: float = 1.0) -> np.ndarray:
+    with np.errstate(invalid="ignore"):
+        sim = np.exp(-distance / max(tau, _EPS))
+    return np.where(np.isfinite(distance), sim, 0.0)
+
+
+@_register_batch(ScorerName.CURRENT_COSINE_CLAMPED)
+def _current_cosine_clamped_many(a: np.ndarray, m: np.ndarray, **kw) -> np.ndarray:
+    return np.maximum(_safe_cosine_many(a, m), 0.0)
+
+
+@_register_batch(ScorerName.RAW_COSINE_UNCAPPED)
+def _raw_cosine_uncapped_many(a: np.ndarray, m: np.ndarray, **kw) -> np.ndarray:
+    return _safe_cosine_many(a, m)
+
+
+@_register_batch(ScorerName.COSINE_AFTER_GLOBAL_ZSCORE)
+def _cosine_after_global_zscore_many(a: np.ndarray, m: np.ndarray, **kw) -> np.ndarray:
+    corpus_mean = kw.get("corpus_mean")
+    corpus_std = kw.get("corpus_std")
+    if corpus_mean is not None and corpus_std is not None:
+        safe_sigma = np.where(corpus_std < _EPS, 1.0, corpus_std)
+        return _safe_cosine_many((a - corpus_mean) / safe_sigma, (m - corpus_mean) / safe_sigma)
+    # Per-pair stats: the mean and (population) std of two values
+    mu = 0.5 * (a + m)
+    sigma = 0.5 * np.abs(a - m)
+    safe_sigma = np.where(sigma < _EPS, 1.0, sigma)
+    return _rowwise_cosine((a - mu) / safe_sigma, (m - mu) / safe_sigma)
+
+
+@_register_batch(ScorerName.CORRELATION_OR_CENTERED_COSINE)
+def _correlation_or_centered_cosine_many(a: np.ndarray, m: np.ndarray, **kw) -> np.ndarray:
+    return _safe_cosine_many(a - a.mean(), m - m.mean(axis=1, keepdims=True))
+
+
+@_register_batch(ScorerName.STANDARDIZED_EUCLIDEAN)
+def _standardized_euclidean_many_scorer(a: np.ndarray, m: np.ndarray, **kw) -> np.ndarray:
+    d = _standardized_euclidean_many(a, m, kw.get("corpus_variance"))
+    return _dist_to_sim_many(d, kw.get("euclidean_tau", 3.0))
+
+
+# _SHIFT_INDEX[s] gathers np.roll(x, -s), so shifting the query by every
+# offset turns the 12 circular-shift comparisons into one (N, 12) @ (12, 12)
+# product: dot(a, roll(b, s)) == dot(roll(a, -s), b).
+_SHIFT_INDEX = (np.arange(12)[None, :] + np.arange(12)[:, None]) % 12
+
+
+def _best_circular_shift_sim_many(a: np.ndarray, m: np.ndarray) -> np.ndarray:
+    """Row-wise _best_circular_shift_sim(a, m[i]) for 12-bin blocks."""
+    ac = a - a.mean()
+    mc = m - m.mean(axis=1, keepdims=True)
+    n1 = np.linalg.norm(ac)
+    n2 = np.linalg.norm(mc, axis=1)
+    if n1 < _EPS:
+        return np.zeros(len(m))
+    ok = n2 >= _EPS
+    best = (mc @ ac[_SHIFT_INDEX].T).max(axis=1)
+    return np.where(ok, best / (n1 * np.where(ok, n2, 1.0)), 0.0)
+
+
+def _tempogram_similarity_many(hist_a: np.ndarray, hist_m: np.ndarray) -> np.ndarray:
+    """Row-wise _tempogram_similarity(hist_a, hist_m[i])."""
+    sa = hist_a.sum()
+    sb = hist_m.sum(axis=1)
+    pa = hist_a / max(sa, _EPS)
+    pb = hist_m / np.maximum(sb, _EPS)[:, None]
+    m = 0.5 * (pa + pb)
+    safe_m = np.where(m < _EPS, 1.0, m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_a_m = np.log(pa / safe_m)
+        log_b_m = np.log(pb / safe_m)
+    kl_a = np.where(pa > _EPS, pa * np.where(np.isfinite(log_a_m), log_a_m, 0.0), 0.0)
+    kl_b = np.where(pb > _EPS, pb * np.where(np.isfinite(log_b_m), log_b_m, 0.0), 0.0)
+    jsd = np.clip(0.5 * (kl_a.sum(axis=1) + kl_b.sum(axis=1)), 0.0, np.log(2))
+    sim = 1.0 - jsd / np.log(2)
+    if sa < _EPS:
+        sim = np.where(sb < _EPS, 1.0, sim)
+    return sim
+
+
+def _bpm_similarity_many(bpm_a: float, bpm_m: np.ndarray) -> np.ndarray:
+    penalty = np.abs(np.log2((bpm_a + _EPS) / (bpm_m + _EPS)))
+    sim = np.exp(-penalty / 0.15)
+    if bpm_a < _EPS:
+        sim = np.where(bpm_m < _EPS, 1.0, sim)
+    return sim
+
+
+@_register_batch(ScorerName.LATE_FUSION_V1)
+def _late_fusion_v1_many(a: np.ndarray, m: np.ndarray, **kw) -> np.ndarray:
+    h = (
+        HARMONIC_MEAN_WEIGHT * _best_circular_shift_sim_many(a[CHROMA_MEAN], m[:, CHROMA_MEAN])
+        + HARMONIC_STD_WEIGHT * _best_circular_shift_sim_many(a[CHROMA_STD], m[:, CHROMA_STD])
+    )
+    r = (
+        RHYTHM_BPM_WEIGHT * _bpm_similarity_many(a[BPM_IDX], m[:, BPM_IDX])
+        + RHYTHM_TEMPOGRAM_WEIGHT * _tempogram_similarity_many(a[TEMPOGRAM], m[:, TEMPOGRAM])
+    )
+    timbre = slice(MFCC_MEAN.start, MFCC_STD.stop)
+    t = _dist_to_sim_many(
+        _standardized_euclidean_many(a[timbre], m[:, timbre], kw.get("timbre_variance")),
+        kw.get("timbre_tau", TIMBRE_TAU),
+    )
+    e = _dist_to_sim_many(
+        _standardized_euclidean_many(
+            a[ENERGY_BRIGHTNESS], m[:, ENERGY_BRIGHTNESS], kw.get("energy_variance")
+        ),
+        kw.get("energy_tau", ENERGY_TAU),
+    )
+
+    wh, wr, wt, we = kw.get("fusion_weights") or get_live_fusion_weights()
+    score = wh * h + wr * r + wt * t + we * e
+    return np.where(np.isfinite(score), np.clip(score, 0.0, 1.0), 0.0)
+
+
+# ---------------------------------------------------------------------------
+# Convenience entry points
+# ---------------------------------------------------------------------------
+
+def _with_corpus_stats(kw: dict) -> dict:
+    """*kw* plus the persisted corpus statistics for any the caller left out."""
+    from src.feature_extraction.corpus_stats import default_scorer_kwargs
+
+    defaults = default_scorer_kwargs()
+    if not defaults:
+        return kw
+    merged = dict(defaults)
+    merged.update(kw)
+    return merged
+
+
 def compute_similarity(
     vec_a: np.ndarray,
     vec_b: np.ndarray,
     scorer: ScorerName = ScorerName.LATE_FUSION_V1,
     **kw,
 ) -> float:
-    """Compute similarity between two 75-D descriptor vectors using *scorer*."""
+    """Compute similarity between two 75-D descriptor vectors using *scorer*.
+
+    Corpus statistics not passed in *kw* come from the persisted
+    corpus_stats artifact, when there is one.
+    """
     fn = get_scorer(scorer)
-    return fn(vec_a, vec_b, **kw)
+    return fn(vec_a, vec_b, **_with_corpus_stats(kw))
+
+
+def score_many(
+    query_vec: np.ndarray,
+    matrix: np.ndarray,
+    scorer: ScorerName = ScorerName.LATE_FUSION_V1,
+    **kw,
+) -> np.ndarray:
+    """Score *query_vec* against every row of *matrix* (N x 75) using *scorer*.
+
+    Returns an (N,) float64 array equal (to within 1e-6) to calling
+    compute_similarity(query_vec, row) for each row, computed in a few array
+    operations instead of N Python calls. Corpus statistics are filled in
+    the same way.
+    """
+    query = np.asarray(query_vec, dtype=np.float64)
+    rows = np.asarray(matrix, dtype=np.float64).reshape(-1, len(query))
+    if len(rows) == 0:
+        return np.empty(0, dtype=np.float64)
+    kw = _with_corpus_stats(kw)
+    batch = _BATCH_REGISTRY.get(scorer)
+    if batch is None:
+        fn = get_scorer(scorer)
+        return np.array([fn(query_vec, row, **kw) for row in matrix], dtype=np.float64)
+    return batch(query, rows, **kw)
 
 
 # ---------------------------------------------------------------------------
@@ -355,6 +560,10 @@ class BenchmarkHarness:
         Descriptor vectors to compare pairwise (or a sample thereof).
     max_pairs : int or None
         Cap on total pairs to evaluate. If None, computes all n*(n-1)/2.
+
+    All pairs are scored tile by tile with the blocked engine in all_pairs
+    (on a process pool for large libraries); a max_pairs sample is scored
+    with one score_many() call per source vector.
     """
 
     def __init__(
@@ -365,21 +574,42 @@ class BenchmarkHarness:
     ):
         self.vectors = vectors
         self.n = len(vectors)
-        self.pairs = self._build_pairs(max_pairs, seed)
+        total = self.n * (self.n - 1) // 2
+        self.all_pairs = max_pairs is None or max_pairs >= total
+        self._sampled_pairs = None if self.all_pairs else self._sample_pairs(max_pairs, seed)
+        self._pairs: Optional[List[Tuple[int, int]]] = None
         self._corpus_stats: Optional[dict] = None
 
-    def _build_pairs(self, max_pairs, seed):
+    def _sample_pairs(self, max_pairs, seed):
+        """max_pairs random (i, j) pairs, i < j, in row-major order."""
+        from src.feature_extraction.all_pairs import condensed_offsets
+
         total = self.n * (self.n - 1) // 2
-        all_pairs = [
-            (i, j)
-            for i in range(self.n)
-            for j in range(i + 1, self.n)
-        ]
-        if max_pairs is not None and max_pairs < total:
-            rng = np.random.default_rng(seed)
-            indices = rng.choice(total, size=max_pairs, replace=False)
-            return [all_pairs[idx] for idx in sorted(indices)]
-        return all_pairs
+        rng = np.random.default_rng(seed)
+        indices = np.sort(rng.choice(total, size=max_pairs, replace=False))
+        offsets = condensed_offsets(self.n)
+        rows = np.searchsorted(offsets, indices, side="right") - 1
+        cols = indices - offsets[rows] + rows + 1
+        return list(zip(rows.tolist(), cols.tolist()))
+
+    @property
+    def pairs(self) -> List[Tuple[int, int]]:
+        """Evaluated (i, j) pairs, aligned with pair_scores().
+
+        For all pairs the list is only built on first access; scoring
+        itself never needs it.
+        """
+        if self._sampled_pairs is not None:
+            return self._sampled_pairs
+        if self._pairs is None:
+            self._pairs = [(i, j) for i in range(self.n) for j in range(i + 1, self.n)]
+        return self._pairs
+
+    @property
+    def num_pairs(self) -> int:
+        if self._sampled_pairs is not None:
+            return len(self._sampled_pairs)
+        return self.n * (self.n - 1) // 2
 
     def corpus_stats(self) -> dict:
         """Compute corpus-level mean, std, variance across all vectors."""
@@ -397,19 +627,53 @@ class BenchmarkHarness:
         self._corpus_stats["energy_variance"] = energy_block.var(axis=0)
         return self._corpus_stats
 
-    def run_scorer(self, scorer_name: ScorerName) -> dict:
-        """Evaluate a single scorer and return distribution + hubness stats."""
-        fn = get_scorer(scorer_name)
+    def _score_all_pairs(self, scorer_name: ScorerName, top_k: int):
+        """Condensed scores of all pairs plus each vector's top_k neighbours,
+        from one pass over the all-pairs tiles."""
+        from src.feature_extraction import all_pairs
+
+        scores = np.empty(self.num_pairs, dtype=np.float64)
+        offsets = all_pairs.condensed_offsets(self.n)
+        neighbours = all_pairs.TopK(self.n, top_k)
+        for tile in all_pairs.iter_tiles(
+            np.array(self.vectors), scorer_name, **self.corpus_stats()
+        ):
+            all_pairs.fill_condensed(scores, tile, offsets)
+            neighbours.add(tile)
+        return scores, neighbours.result()[0]
+
+    def pair_scores(self, scorer_name: ScorerName) -> np.ndarray:
+        """Scores of the evaluated pairs, aligned with self.pairs."""
+        if self.all_pairs:
+            return self._score_all_pairs(scorer_name, 0)[0]
+
         stats = self.corpus_stats()
+        pairs = np.array(self._sampled_pairs, dtype=np.int64).reshape(-1, 2)
+        scores = np.empty(len(pairs), dtype=np.float64)
+        # Pairs are sorted by their first index: one score_many() per source
+        sources, starts = np.unique(pairs[:, 0], return_index=True)
+        stops = np.append(starts[1:], len(pairs))
+        for i, start, stop in zip(sources.tolist(), starts.tolist(), stops.tolist()):
+            scores[start:stop] = score_many(
+                self.vectors[i],
+                np.array([self.vectors[j] for j in pairs[start:stop, 1].tolist()]),
+                scorer=scorer_name,
+                **stats,
+            )
+        return scores
 
-        scores = np.empty(len(self.pairs), dtype=np.float64)
-        for idx, (i, j) in enumerate(self.pairs):
-            scores[idx] = fn(self.vectors[i], self.vectors[j], **stats)
+    def run_scorer(self, scorer_name: ScorerName) -> dict:
+        """Evaluate a single scorer and return distribution + hubness stats."""
+        top_k = min(25, self.n - 1)
+        if self.all_pairs:
+            scores, neighbours = self._score_all_pairs(scorer_name, top_k)
+        else:
+            scores, neighbours = self.pair_scores(scorer_name), None
 
         result = self._distribution_stats(scores)
-        result["hubness"] = self._hubness_stats(scores, top_k=min(25, self.n - 1))
+        result["hubness"] = self._hubness_stats(scores, top_k=top_k, neighbours=neighbours)
         result["scorer"] = scorer_name.value
-        result["num_pairs"] = len(self.pairs)
+        result["num_pairs"] = self.num_pairs
         return result
 
     def run_all(self, scorers: Optional[List[ScorerName]] = None) -> List[dict]:
@@ -432,25 +696,39 @@ class BenchmarkHarness:
             },
         }
 
-    def _hubness_stats(self, scores: np.ndarray, top_k: int = 25) -> dict:
-        """Compute hubness metrics from pairwise scores."""
+    def _hubness_stats(
+        self,
+        scores: np.ndarray,
+        top_k: int = 25,
+        neighbours: Optional[np.ndarray] = None,
+    ) -> dict:
+        """Compute hubness metrics from pairwise scores.
+
+        neighbours, when given, holds each vector's top_k neighbour indices
+        (from the all-pairs pass) and replaces the per-pair neighbour lists.
+        """
         if self.n < 2 or top_k < 1:
             return {}
 
-        neighbor_scores: Dict[int, List[Tuple[float, int]]] = {
-            i: [] for i in range(self.n)
-        }
-        for idx, (i, j) in enumerate(self.pairs):
-            s = scores[idx]
-            neighbor_scores[i].append((s, j))
-            neighbor_scores[j].append((s, i))
-
         top_k_actual = min(top_k, self.n - 1)
-        occurrence = np.zeros(self.n, dtype=np.int64)
-        for node, neighbors in neighbor_scores.items():
-            neighbors.sort(key=lambda x: -x[0])
-            for _, neighbor in neighbors[:top_k_actual]:
-                occurrence[neighbor] += 1
+        if neighbours is not None:
+            occurrence = np.bincount(
+                neighbours[:, :top_k_actual].ravel(), minlength=self.n
+            ).astype(np.int64)
+        else:
+            neighbor_scores: Dict[int, List[Tuple[float, int]]] = {
+                i: [] for i in range(self.n)
+            }
+            for idx, (i, j) in enumerate(self.pairs):
+                s = scores[idx]
+                neighbor_scores[i].append((s, j))
+                neighbor_scores[j].append((s, i))
+
+            occurrence = np.zeros(self.n, dtype=np.int64)
+            for node, neighbors in neighbor_scores.items():
+                neighbors.sort(key=lambda x: -x[0])
+                for _, neighbor in neighbors[:top_k_actual]:
+                    occurrence[neighbor] += 1
 
         max_hub = int(np.max(occurrence))
         never_in_topk = int(np.sum(occurrence == 0))
@@ -12,8 +12,20 @@ one instance per worker process and reuse it across tracks.
 Usage:
     extractor = TraitExtractor()
     traits = extractor.compute("/path/to/track.mp3")
+
+    # Backfills: one EffNet call and one call per head for several tracks
+    results = extractor.compute_batch(["/path/a.mp3", "/path/b.mp3"])
+
+    # Keep the backbone outputs so heads can later be re-run without audio
+    traits, embedding = extractor.compute(path, with_embedding=True)
+    heads = TraitExtractor(heads_only=True)
+    traits = heads.compute_from_embeddings(
+        [(embedding.effnet, embedding.genre_probs, onset_density, flatness)]
+    )[0]
 """
 
+from collections import namedtuple
+
 import numpy as np
 
 try:
@@ -21,12 +33,22 @@ try:
 except ImportError as exc:
     raise ImportError("librosa is required for trait extraction") from exc
 
-from src.feature_extraction import model_manager
+from src.feature_extraction import model_manager, profiling
+from src.feature_extraction.mel_cache import MelCache
 from src.feature_extraction.config import (
+    TRAIT_ANALYSIS_EXCERPTS,
+    TRAIT_ANALYSIS_POLICY,
+    TRAIT_ANALYSIS_SECONDS,
+    TRAIT_ANALYSIS_TAG,
     TRAIT_CLASSIFIER_MAEST,
     TRAIT_CLASSIFIERS_EFFNET,
+    TRAIT_EFFNET_MAX_PATCHES,
+    TRAIT_MAEST_DYNAMIC_BATCH,
+    TRAIT_MAEST_MAX_BATCH,
+    TRAIT_MEL_CACHE,
     TRAIT_SAMPLE_RATE,
     TRAIT_STORAGE_THRESHOLD,
+    TRAIT_STREAM_MIN_SECONDS,
     TRAIT_VERSION,
 )
 
@@ -41,6 +63,25 @@ _MAEST_FRAMES = 1876
 # Step between windows (no overlap — one patch per 30 s segment)
 _MAEST_HOP = 1875
 
+# Mel preprocessing (Essentia TensorflowInputMusiCNN); also part of the
+# mel cache key, so any change here invalidates cached mels
+_MEL_PARAMS = {
+    "sr": TRAIT_SAMPLE_RATE,
+    "n_fft": 512,
+    "hop_length": 256,
+    "n_mels": 96,
+    "fmax": 8000,
+    "norm": None,
+    "power": 1.0,  # amplitude (not power=2.0) to match Essentia TensorflowInputMusiCNN
+    "htk": False,
+}
+_MEL_LOG_SCALE = 10000.0
+
+# Identifies how _prepare_signal derives the cached librosa extras
+_EXTRAS_VERSION = "onset_density+spectral_flatness/1"
+
+_ANALYSIS_POLICIES = ("full", "excerpts", "center")
+
 # ------------------------------------------------------------------ #
 # Label constants (fetched from essentia.upf.edu JSON metadata)       #
 # ------------------------------------------------------------------ #
@@ -681,18 +722,8 @@ def _compute_mel_from_signal(y: np.ndarray) -> np.ndarray:
     Returns:
         ndarray of shape (96, T) — float32
     """
-    mel = librosa.feature.melspectrogram(
-        y=y,
-        sr=TRAIT_SAMPLE_RATE,
-        n_fft=512,
-        hop_length=256,
-        n_mels=96,
-        fmax=8000,
-        norm=None,
-        power=1.0,  # amplitude (not power=2.0) to match Essentia TensorflowInputMusiCNN
-        htk=False,
-    )
-    return np.log(10000.0 * mel + 1.0).astype(np.float32)
+    mel = librosa.feature.melspectrogram(y=y, **_MEL_PARAMS)
+    return np.log(_MEL_LOG_SCALE * mel + 1.0).astype(np.float32)
 
 
 def compute_mel_spectrogram(audio_path: str) -> np.ndarray:
@@ -710,6 +741,29 @@ def compute_mel_spectrogram(audio_path: str) -> np.ndarray:
     return _compute_mel_from_signal(y)
 
 
+def _mel_windows(mel: np.ndarray, width: int, hop: int) -> np.ndarray:
+    """Return the overlapping (N, width, 96) windows of a (96, T) mel as a view.
+
+    The mel is transposed once into a C-contiguous (T, 96) float32 array
+    (zero-padded to width frames when shorter); each window is then a strided
+    view into it, already in the (time, mel) layout the ONNX models expect,
+    so no per-window copy is made. Windows start every hop frames and a
+    trailing partial window is dropped. The view is read-only; slicing a
+    batch of rows and passing it to onnxruntime copies only that batch.
+    """
+    frames = np.ascontiguousarray(mel.T, dtype=np.float32)  # (T, 96)
+    if frames.shape[0] < width:
+        frames = np.pad(frames, ((0, width - frames.shape[0]), (0, 0)))
+    n = 1 + (frames.shape[0] - width) // hop
+    row_stride, col_stride = frames.strides
+    return np.lib.stride_tricks.as_strided(
+        frames,
+        shape=(n, width, frames.shape[1]),
+        strides=(hop * row_stride, row_stride, col_stride),
+        writeable=False,
+    )
+
+
 def _patch_mel_for_effnet(mel: np.ndarray) -> np.ndarray:
     """Slice mel spectrogram into overlapping EffNet input windows.
 
@@ -720,103 +774,131 @@ def _patch_mel_for_effnet(mel: np.ndarray) -> np.ndarray:
         mel: (96, T) mel spectrogram
 
     Returns:
-        ndarray of shape (N, 128, 96) — float32
+        read-only strided view of shape (N, 128, 96) — float32
     """
-    _, T = mel.shape
-    if T < _EFFNET_FRAMES:
-        mel = np.pad(mel, ((0, 0), (0, _EFFNET_FRAMES - T)))
-        T = _EFFNET_FRAMES
-
-    patches = []
-    for start in range(0, T - _EFFNET_FRAMES + 1, _EFFNET_HOP):
-        patch = mel[:, start : start + _EFFNET_FRAMES].T  # (128, 96)
-        patches.append(patch)
-
-    return np.stack(patches, axis=0).astype(np.float32)  # (N, 128, 96)
+    return _mel_windows(mel, _EFFNET_FRAMES, _EFFNET_HOP)
 
 
 def _patch_mel_for_maest(mel: np.ndarray) -> list:
     """Slice mel spectrogram into 30-second MAEST input windows.
 
-    MAEST ONNX expects shape (1, 1876, 96) — batch_size is fixed at 1.
+    MAEST ONNX expects shape (batch, 1876, 96). The published export fixes
+    batch at 1, so patches come one per call; _run_maest() batches the
+    underlying windows itself when the session has a dynamic batch dimension.
     mel is (96, T), so each patch is mel[:, start:start+1876].T → (1876, 96).
 
     Args:
         mel: (96, T) mel spectrogram
 
     Returns:
-        list of ndarrays each of shape (1, 1876, 96) — float32
+        list of contiguous read-only views each of shape (1, 1876, 96) — float32
     """
-    _, T = mel.shape
-    if T < _MAEST_FRAMES:
-        mel = np.pad(mel, ((0, 0), (0, _MAEST_FRAMES - T)))
-        T = _MAEST_FRAMES
-
-    patches = []
-    for start in range(0, T - _MAEST_FRAMES + 1, _MAEST_HOP):
-        patch = mel[:, start : start + _MAEST_FRAMES].T  # (1876, 96)
-        patches.append(patch[np.newaxis, :, :].astype(np.float32))  # (1, 1876, 96)
+    windows = _mel_windows(mel, _MAEST_FRAMES, _MAEST_HOP)
+    return [windows[i : i + 1] for i in range(len(windows))]
 
-    return patches
 
-
-def _run_maest(session, mel: np.ndarray) -> np.ndarray:
+def _run_maest(
+    session, mel: np.ndarray, max_batch: int = TRAIT_MAEST_MAX_BATCH
+) -> np.ndarray:
     """Run standalone MAEST 519l backbone, returning mean 519-class genre probabilities.
 
     Requests only the 'activations' output (sigmoid genre predictions) to avoid
     computing the 12 intermediate layer embedding tensors that onnxruntime would
     otherwise materialise when output_names=None.
 
-    Processes the mel in 30s patches (batch_size=1 each) and averages predictions.
+    Processes the mel in 30s patches and averages predictions. Sessions with a
+    fixed batch dimension (the published export) get one patch per call; a
+    dynamic-batch variant (model_manager.load_model(..., dynamic_batch=True))
+    gets up to max_batch patches per call.
 
     Returns:
         mean_genre_probs ndarray (519,)
     """
-    patches = _patch_mel_for_maest(mel)
-    input_name = session.get_inputs()[0].name
+    windows = _mel_windows(mel, _MAEST_FRAMES, _MAEST_HOP)
+
+    inp = session.get_inputs()[0]
+    batch_dim = inp.shape[0] if inp.shape else None
+    step = 1 if isinstance(batch_dim, int) else max(int(max_batch), 1)
 
     all_probs = []
-    for patch in patches:
-        outputs = session.run(["activations"], {input_name: patch})
-        all_probs.append(outputs[0].squeeze())  # (519,)
+    for i in range(0, len(windows), step):
+        batch = windows[i : i + step]  # (n, 1876, 96)
+        outputs = session.run(["activations"], {inp.name: batch})
+        all_probs.append(outputs[0].reshape(len(batch), -1))  # (n, 519)
 
-    return np.mean(all_probs, axis=0) if all_probs else np.zeros(519, dtype=np.float32)
+    return np.concatenate(all_probs, axis=0).mean(axis=0)
 
 
-def _run_effnet(session, mel: np.ndarray) -> np.ndarray:
-    """Run EffNet backbone, returning mean embeddings.
+def _run_effnet_batch(
+    session, mels: list, max_patches: int = TRAIT_EFFNET_MAX_PATCHES
+) -> np.ndarray:
+    """Run EffNet over the patches of several tracks, returning per-track means.
 
-    EffNet ONNX outputs:
-      [0] activations  (batch, 400) — Discogs 400-class predictions (unused)
-      [1] embeddings   (batch, 1280) — embedding vectors for classifier heads
+    Patches from all mels are fed through the backbone in calls of at most
+    max_patches rows; embeddings are then split back out by track.
+    Patches are independent at inference time, so each row matches the
+    mean over that mel's patches run on their own.
 
     Returns:
-        mean_embedding  ndarray (1280,)
+        ndarray (len(mels), 1280) — mean embedding per track
     """
-    patches = _patch_mel_for_effnet(mel)
+    windows = [_patch_mel_for_effnet(mel) for mel in mels]
+    counts = [len(w) for w in windows]
     input_name = session.get_inputs()[0].name
-    outputs = session.run(None, {input_name: patches})
-    embeddings = outputs[1]  # (N, 1280)
-    return embeddings.mean(axis=0)
+    step = max(int(max_patches), 1)
+
+    # Fill each call with up to step rows, crossing track boundaries; only
+    # the rows of the current call are ever copied out of the views.
+    embeddings = []
+    parts = []
+    size = 0
+    for w in windows:
+        pos = 0
+        while pos < len(w):
+            take = min(step - size, len(w) - pos)
+            parts.append(w[pos : pos + take])
+            size += take
+            pos += take
+            if size == step:
+                embeddings.append(_run_effnet_rows(session, input_name, parts))
+                parts = []
+                size = 0
+    if parts:
+        embeddings.append(_run_effnet_rows(session, input_name, parts))
+    embeddings = np.concatenate(embeddings, axis=0)  # (sum(counts), 1280)
+
+    offsets = np.cumsum([0] + counts)
+    return np.stack(
+        [embeddings[offsets[k] : offsets[k + 1]].mean(axis=0) for k in range(len(mels))]
+    )
 
 
-def _run_classifier(session, embedding: np.ndarray) -> np.ndarray:
-    """Run a classification head on a single mean embedding vector.
+def _run_effnet_rows(session, input_name: str, parts: list) -> np.ndarray:
+    """Run EffNet on window slices joined into one batch; returns embeddings."""
+    batch = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=0)
+    return session.run(None, {input_name: batch})[1]
 
-    Args:
-        session: onnxruntime.InferenceSession for the classification head
-        embedding: (1280,) mean embedding
 
-    Returns:
-        ndarray of probabilities (n_classes,)
-    """
-    input_name = session.get_inputs()[0].name
-    x = embedding[np.newaxis, :].astype(np.float32)  # (1, 1280)
-    output = session.run(None, {input_name: x})[0]  # (1, n_classes) predictions
-    return output.squeeze()  # (n_classes,)
+def _run_classifier_batch(session, embeddings: np.ndarray) -> np.ndarray:
+    """Run a classification head once on a (num_tracks, 1280) embedding matrix.
 
+    Heads exported with a fixed batch dimension are fed one row at a time.
 
-def _binary_prob(probs: np.ndarray) -> float:
+    Returns:
+        ndarray (num_tracks, n_classes)
+    """
+    inp = session.get_inputs()[0]
+    x = np.ascontiguousarray(embeddings, dtype=np.float32)
+    batch_dim = inp.shape[0] if inp.shape else None
+    if isinstance(batch_dim, int) and batch_dim != len(x):
+        outputs = [session.run(None, {inp.name: x[k : k + 1]})[0] for k in range(len(x))]
+        output = np.concatenate(outputs, axis=0)
+    else:
+        output = session.run(None, {inp.name: x})[0]
+    return output.reshape(len(x), -1)
+
+
+def binary_prob(probs: np.ndarray) -> float:
     """P(positive class) from a 2-class Softmax or single Sigmoid output."""
     if probs.ndim == 0:
         return float(probs)
@@ -843,6 +925,198 @@ def _multilabel_dict(
     }
 
 
+def _prepare_signal(y: np.ndarray, source: str = "<signal>") -> tuple:
+    """Compute the model input mel and the librosa extras for one signal.
+
+    Everything that needs the raw waveform happens here, so batched callers
+    only hold the (96, T) mel per track while waiting for inference.
+
+    Returns:
+        (mel, onset_density, spectral_flatness)
+    """
+    if len(y) == 0:
+        raise ValueError("Audio file loaded with zero samples: %s" % source)
+    with profiling.stage("mel"):
+        mel = _compute_mel_from_signal(y)
+
+    with profiling.stage("extras"):
+        onset_density, spectral_flatness = _signal_extras(y, mel)
+    return mel, onset_density, spectral_flatness
+
+
+def _signal_extras(y: np.ndarray, mel: np.ndarray) -> tuple:
+    """(onset_density, spectral_flatness) of a signal under TRAIT_ANALYSIS_POLICY."""
+    if TRAIT_ANALYSIS_POLICY != "full":
+        hop = _MEL_PARAMS["hop_length"]
+        return _excerpt_extras(
+            [(y[a:b], mel[:, a // hop : b // hop]) for a, b in _analysis_spans(len(y))]
+        )
+
+    onset_env = librosa.onset.onset_strength(y=y, sr=TRAIT_SAMPLE_RATE)
+    onset_frames = librosa.onset.onset_detect(
+        onset_envelope=onset_env, sr=TRAIT_SAMPLE_RATE
+    )
+    duration_sec = len(y) / TRAIT_SAMPLE_RATE
+    onset_density = (
+        round(float(len(onset_frames) / duration_sec), 4)
+        if duration_sec > 0
+        else 0.0
+    )
+    if np.max(np.abs(y)) < 1e-10:
+        spectral_flatness = 0.0
+    else:
+        _sf_raw = float(np.nanmean(librosa.feature.spectral_flatness(y=y)))
+        spectral_flatness = round(
+            min(_sf_raw, 1.0) if not np.isnan(_sf_raw) else 0.0, 6
+        )
+
+    return onset_density, spectral_flatness
+
+
+def _analysis_spans(n_samples: int) -> list:
+    """Return the (start, stop) sample ranges TRAIT_ANALYSIS_POLICY analyzes.
+
+    "excerpts" spreads TRAIT_ANALYSIS_EXCERPTS windows of
+    TRAIT_ANALYSIS_SECONDS evenly from the start to the end of the track;
+    "center" takes one window around the midpoint. Starts are aligned to the
+    mel hop so each excerpt maps onto whole frames of the model mel. Signals
+    too short to hold the windows are analyzed whole.
+
+    Raises:
+        ValueError: On an unknown policy or a non-positive excerpt count.
+    """
+    if TRAIT_ANALYSIS_POLICY not in _ANALYSIS_POLICIES:
+        raise ValueError(
+            "Unknown TRAIT_ANALYSIS_POLICY %r (expected one of %s)"
+            % (TRAIT_ANALYSIS_POLICY, ", ".join(_ANALYSIS_POLICIES))
+        )
+    if TRAIT_ANALYSIS_POLICY == "full":
+        return [(0, n_samples)]
+
+    count = TRAIT_ANALYSIS_EXCERPTS if TRAIT_ANALYSIS_POLICY == "excerpts" else 1
+    if count < 1:
+        raise ValueError("TRAIT_ANALYSIS_EXCERPTS must be positive, got %d" % count)
+    hop = _MEL_PARAMS["hop_length"]
+    length = int(TRAIT_ANALYSIS_SECONDS * TRAIT_SAMPLE_RATE) // hop * hop
+    if length <= 0 or count * length >= n_samples:
+        return [(0, n_samples)]
+
+    if TRAIT_ANALYSIS_POLICY == "center":
+        starts = [(n_samples - length) // 2]
+    else:
+        starts = np.linspace(0, n_samples - length, count)
+    return [(int(s) // hop * hop, int(s) // hop * hop + length) for s in starts]
+
+
+def _excerpt_extras(excerpts: list) -> tuple:
+    """Compute (onset_density, spectral_flatness) over (signal, mel) excerpts.
+
+    The onset envelope is taken from the model mel, which is already the
+    log-compressed spectrogram onset_strength expects, instead of a second
+    mel pass over the waveform. Flatness needs the linear power spectrum,
+    so it is computed on the excerpt samples only. Onsets are counted per
+    excerpt and divided by the total excerpt duration.
+    """
+    hop = _MEL_PARAMS["hop_length"]
+    n_onsets = 0
+    n_samples = 0
+    flatness = []
+    silent = True
+    for y, mel in excerpts:
+        n_samples += len(y)
+        onset_env = librosa.onset.onset_strength(
+            S=mel, sr=TRAIT_SAMPLE_RATE, hop_length=hop, n_fft=_MEL_PARAMS["n_fft"]
+        )
+        n_onsets += len(
+            librosa.onset.onset_detect(
+                onset_envelope=onset_env, sr=TRAIT_SAMPLE_RATE, hop_length=hop
+            )
+        )
+        silent = silent and np.max(np.abs(y)) < 1e-10
+        flatness.append(librosa.feature.spectral_flatness(y=y)[0])
+
+    duration_sec = n_samples / TRAIT_SAMPLE_RATE
+    onset_density = (
+        round(float(n_onsets / duration_sec), 4) if duration_sec > 0 else 0.0
+    )
+    if silent:
+        return onset_density, 0.0
+    _sf_raw = float(np.nanmean(np.concatenate(flatness)))
+    return onset_density, round(min(_sf_raw, 1.0) if not np.isnan(_sf_raw) else 0.0, 6)
+
+
+def _excerpt_extras_from_path(audio_path: str, duration: float) -> tuple:
+    """Run _excerpt_extras() on excerpts decoded straight from audio_path.
+
+    Used by the streaming path, which never holds the whole signal or mel;
+    each excerpt's mel is computed from the excerpt alone.
+    """
+    excerpts = []
+    for start, stop in _analysis_spans(int(round(duration * TRAIT_SAMPLE_RATE))):
+        y, _ = librosa.load(
+            audio_path,
+            sr=TRAIT_SAMPLE_RATE,
+            mono=True,
+            offset=start / TRAIT_SAMPLE_RATE,
+            duration=(stop - start) / TRAIT_SAMPLE_RATE,
+        )
+        if len(y) > 0:
+            excerpts.append((y, _compute_mel_from_signal(y)))
+    return _excerpt_extras(excerpts)
+
+
+def _build_trait_dict(
+    head_probs: dict,
+    genre_probs,
+    onset_density: float,
+    spectral_flatness: float,
+) -> dict:
+    """Assemble the TrackTrait-shaped result from raw model outputs.
+
+    head_probs maps classifier name to its probability vector for this
+    track, or None when the head failed to load.
+    """
+    vi_probs = head_probs.get("voice_instrumental-discogs-effnet-1")
+    dance_probs = head_probs.get("danceability-discogs-effnet-1")
+    timbre_probs = head_probs.get("timbre-discogs-effnet-1")
+    ac_el_probs = head_probs.get("nsynth_acoustic_electronic-discogs-effnet-1")
+    tonal_probs = head_probs.get("tonal_atonal-discogs-effnet-1")
+    reverb_probs = head_probs.get("nsynth_reverb-discogs-effnet-1")
+    mood_probs = head_probs.get("mtg_jamendo_moodtheme-discogs-effnet-1")
+    instr_probs = head_probs.get("mtg_jamendo_instrument-discogs-effnet-1")
+
+    return {
+        "voice_instrumental": binary_prob(vi_probs)
+        if vi_probs is not None
+        else None,
+        "danceability": binary_prob(dance_probs)
+        if dance_probs is not None
+        else None,
+        "bright_dark": binary_prob(timbre_probs)
+        if timbre_probs is not None
+        else None,
+        "acoustic_electronic": binary_prob(ac_el_probs)
+        if ac_el_probs is not None
+        else None,
+        "tonal_atonal": binary_prob(tonal_probs)
+        if tonal_probs is not None
+        else None,
+        "reverb": binary_prob(reverb_probs) if reverb_probs is not None else None,
+        "onset_density": onset_density,
+        "spectral_flatness": spectral_flatness,
+        "mood_theme": _multilabel_dict(mood_probs, LABELS_MOOD_THEME)
+        if mood_probs is not None
+        else None,
+        "genre": _multilabel_dict(genre_probs, LABELS_GENRE_DISCOGS519)
+        if genre_probs is not None
+        else None,
+        "instruments": _multilabel_dict(instr_probs, LABELS_INSTRUMENT)
+        if instr_probs is not None
+        else None,
+        "trait_version": TRAIT_VERSION,
+    }
+
+
 # ------------------------------------------------------------------ #
 # Display-layer filters — applied by consumers, not at storage time    #
 # ------------------------------------------------------------------ #
@@ -913,30 +1187,54 @@ def filter_instruments(raw: dict) -> dict:
     return filter_multilabel(raw, threshold=INSTRUMENT_DISPLAY_THRESHOLD)
 
 
+def _default_mel_cache():
+    """Return a MelCache when TRAIT_MEL_CACHE is enabled, else None."""
+    if not TRAIT_MEL_CACHE:
+        return None
+    return MelCache(
+        params={
+            "mel": _MEL_PARAMS,
+            "log_scale": _MEL_LOG_SCALE,
+            "extras": "%s+%s" % (_EXTRAS_VERSION, TRAIT_ANALYSIS_TAG)
+            if TRAIT_ANALYSIS_TAG
+            else _EXTRAS_VERSION,
+        }
+    )
+
+
+# Backbone outputs the heads and genre post-processing depend on: the mean
+# EffNet embedding (1280,) and mean MAEST probabilities (519,) or None.
+TraitEmbedding = namedtuple("TraitEmbedding", ["effnet", "genre_probs"])
+
+
 class TraitExtractor:
     """Loads ONNX sessions once and computes all Phase I traits per track.
 
     Instantiate once per worker process; reuse across tracks. Classifier
     sessions that could not be loaded (missing/corrupt ONNX file) are stored
     as None, and the corresponding trait is returned as None in compute().
+
+    With heads_only=True the EffNet and MAEST backbones are not loaded; only
+    compute_from_embeddings() is usable. quantized selects the INT8 or fp32
+    model variants explicitly; None follows TRAIT_QUANTIZED_MODELS.
     """
 
-    def __init__(self):
-        self._effnet = model_manager.load_model("discogs-effnet-bsdynamic")
-        # MAEST loaded with graceful degradation — genre will be None if it fails
-        try:
-            self._maest = model_manager.load_model(TRAIT_CLASSIFIER_MAEST)
-        except (RuntimeError, KeyError) as exc:
-            print(
-                "Warning: could not load MAEST model '%s': %s — genre will be None"
-                % (TRAIT_CLASSIFIER_MAEST, exc),
-                flush=True,
-            )
-            self._maest = None
+    # Set per instance from TRAIT_MEL_CACHE; None disables the mel cache
+    _mel_cache = None
+
+    def __init__(self, heads_only: bool = False, quantized: bool = None):
+        self._mel_cache = _default_mel_cache()
+        self._quantized = quantized
+        self._effnet = None
+        self._maest = None
+        if not heads_only:
+            self._load_backbones()
         self._classifiers = {}
         for name in TRAIT_CLASSIFIERS_EFFNET:
             try:
-                self._classifiers[name] = model_manager.load_model(name)
+                self._classifiers[name] = model_manager.load_model(
+                    name, quantized=self._quantized
+                )
             except (RuntimeError, KeyError) as exc:
                 print(
                     "Warning: could not load classifier '%s': %s — trait will be None"
@@ -945,79 +1243,265 @@ class TraitExtractor:
                 )
                 self._classifiers[name] = None
 
-    def compute(self, audio_path: str) -> dict:
+    def _load_backbones(self):
+        self._effnet = model_manager.load_model(
+            "discogs-effnet-bsdynamic", quantized=self._quantized
+        )
+        # MAEST loaded with graceful degradation — genre will be None if it fails
+        if TRAIT_MAEST_DYNAMIC_BATCH:
+            try:
+                self._maest = model_manager.load_model(
+                    TRAIT_CLASSIFIER_MAEST, dynamic_batch=True, quantized=self._quantized
+                )
+            except (RuntimeError, KeyError) as exc:
+                print(
+                    "Warning: dynamic-batch MAEST unavailable (%s) — "
+                    "running one patch per call" % exc,
+                    flush=True,
+                )
+        try:
+            if self._maest is None:
+                self._maest = model_manager.load_model(
+                    TRAIT_CLASSIFIER_MAEST, quantized=self._quantized
+                )
+        except (RuntimeError, KeyError) as exc:
+            print(
+                "Warning: could not load MAEST model '%s': %s — genre will be None"
+                % (TRAIT_CLASSIFIER_MAEST, exc),
+                flush=True,
+            )
+            self._maest = None
+
+    def compute(self, audio_path: str, with_embedding: bool = False):
         """Compute all traits for an audio file.
 
         Returns a dict with keys matching TrackTrait columns. Traits whose
-        classifier model failed to load are set to None.
+        classifier model failed to load are set to None. With
+        with_embedding=True, returns (traits, TraitEmbedding) instead.
         """
-        y, _ = librosa.load(audio_path, sr=TRAIT_SAMPLE_RATE, mono=True)
-        if len(y) == 0:
-            raise ValueError("Audio file loaded with zero samples: %s" % audio_path)
-        mel = _compute_mel_from_signal(y)
-
-        effnet_emb = _run_effnet(self._effnet, mel)
-        genre_probs = _run_maest(self._maest, mel) if self._maest is not None else None
-
-        def _run(key):
-            sess = self._classifiers.get(key)
-            return _run_classifier(sess, effnet_emb) if sess is not None else None
-
-        vi_probs = _run("voice_instrumental-discogs-effnet-1")
-        dance_probs = _run("danceability-discogs-effnet-1")
-        timbre_probs = _run("timbre-discogs-effnet-1")
-        ac_el_probs = _run("nsynth_acoustic_electronic-discogs-effnet-1")
-        tonal_probs = _run("tonal_atonal-discogs-effnet-1")
-        reverb_probs = _run("nsynth_reverb-discogs-effnet-1")
-        mood_probs = _run("mtg_jamendo_moodtheme-discogs-effnet-1")
-        instr_probs = _run("mtg_jamendo_instrument-discogs-effnet-1")
-
-        # librosa extras
-        onset_env = librosa.onset.onset_strength(y=y, sr=TRAIT_SAMPLE_RATE)
-        onset_frames = librosa.onset.onset_detect(
-            onset_envelope=onset_env, sr=TRAIT_SAMPLE_RATE
+        with profiling.track_file(audio_path):
+            if self._should_stream(audio_path):
+                return self.compute_streaming(audio_path, with_embedding)
+            return self._compute_prepared(
+                [self._prepare_path(audio_path)], with_embedding
+            )[0]
+
+    def compute_streaming(self, audio_path: str, with_embedding: bool = False):
+        """Compute all traits while decoding audio_path in blocks.
+
+        Peak memory does not grow with track length (see trait_streaming);
+        compute() switches to this for files longer than
+        TRAIT_STREAM_MIN_SECONDS. Skips the mel cache.
+        """
+        from src.feature_extraction.trait_streaming import (
+            stream_backbone_outputs,
+            stream_duration,
         )
-        duration_sec = len(y) / TRAIT_SAMPLE_RATE
-        onset_density = (
-            round(float(len(onset_frames) / duration_sec), 4)
-            if duration_sec > 0
-            else 0.0
+
+        if self._effnet is None:
+            raise RuntimeError("TraitExtractor was created with heads_only=True")
+        full = TRAIT_ANALYSIS_POLICY == "full"
+        with profiling.track_file(audio_path):
+            with profiling.stage("streaming"):
+                embedding, genre_probs, onset_density, flatness = stream_backbone_outputs(
+                    audio_path, self._effnet, self._maest, extras=full
+                )
+            if not full:
+                with profiling.stage("extras"):
+                    onset_density, flatness = _excerpt_extras_from_path(
+                        audio_path, stream_duration(audio_path)
+                    )
+            head_probs = _row(self._run_heads(embedding[np.newaxis, :]), 0)
+        traits = _build_trait_dict(head_probs, genre_probs, onset_density, flatness)
+        if with_embedding:
+            return traits, TraitEmbedding(embedding, genre_probs)
+        return traits
+
+    def compute_from_signal(
+        self, y: np.ndarray, source: str = "<signal>", with_embedding: bool = False
+    ):
+        """Compute all traits from a mono signal already at TRAIT_SAMPLE_RATE.
+
+        Lets callers that decode once for several feature sets (see
+        audio_loader.decode_audio) skip the extra librosa.load. source is
+        only used in error messages.
+        """
+        with profiling.track_file(source):
+            return self._compute_prepared([_prepare_signal(y, source)], with_embedding)[0]
+
+    def compute_batch(self, audio_paths: list, with_embedding: bool = False) -> list:
+        """Compute traits for several audio files with batched ONNX inference.
+
+        Mel patches from every track go through EffNet together (see
+        _run_effnet_batch) and each head runs once on the stacked embeddings.
+
+        Files long enough to be streamed are computed one at a time with
+        compute_streaming() instead of joining the batch.
+
+        Returns a list aligned with audio_paths: each entry is either what
+        compute() would return, or the exception raised while loading or
+        analysing that file. If batched inference itself fails, tracks are
+        retried one at a time so a single bad input only fails its own entry.
+        """
+        return self._finish_batch(
+            self._prepare_batch(audio_paths, with_embedding), with_embedding
         )
-        if np.max(np.abs(y)) < 1e-10:
-            spectral_flatness = 0.0
-        else:
-            _sf_raw = float(np.nanmean(librosa.feature.spectral_flatness(y=y)))
-            spectral_flatness = round(
-                min(_sf_raw, 1.0) if not np.isnan(_sf_raw) else 0.0, 6
+
+    def _prepare_batch(self, audio_paths: list, with_embedding: bool = False) -> tuple:
+        """Decode and prepare a compute_batch() input without batched inference.
+
+        Streamed files are computed here in full. Returns (results, prepared,
+        indices) for _finish_batch(); the split lets pipelined callers decode
+        the next batch while the previous one is being inferred.
+        """
+        results = [None] * len(audio_paths)
+        prepared = []
+        indices = []
+        for i, path in enumerate(audio_paths):
+            try:
+                if self._should_stream(path):
+                    results[i] = self.compute_streaming(path, with_embedding)
+                    continue
+                prepared.append(self._prepare_path(path))
+                indices.append(i)
+            except Exception as exc:
+                results[i] = exc
+        return results, prepared, indices
+
+    def _finish_batch(self, state: tuple, with_embedding: bool = False) -> list:
+        """Run batched inference on a _prepare_batch() result; see compute_batch()."""
+        results, prepared, indices = state
+        if not prepared:
+            return results
+
+        try:
+            computed = self._compute_prepared(prepared, with_embedding)
+        except Exception:
+            computed = []
+            for item in prepared:
+                try:
+                    computed.append(self._compute_prepared([item], with_embedding)[0])
+                except Exception as exc:
+                    computed.append(exc)
+
+        for i, traits in zip(indices, computed):
+            results[i] = traits
+        return results
+
+    def compute_from_embeddings(self, items: list) -> list:
+        """Re-run the classification heads on stored backbone outputs.
+
+        items is a list of (effnet_embedding, genre_probs, onset_density,
+        spectral_flatness) tuples; genre_probs may be None. No audio is
+        decoded and no backbone runs, so a head or threshold change can be
+        applied to a whole library in seconds.
+
+        Returns one trait dict per item, as compute() would.
+        """
+        if not items:
+            return []
+        embeddings = np.stack([np.asarray(item[0], dtype=np.float32) for item in items])
+        head_probs = self._run_heads(embeddings)
+        return [
+            _build_trait_dict(
+                _row(head_probs, k), genre_probs, onset_density, spectral_flatness
             )
+            for k, (_, genre_probs, onset_density, spectral_flatness) in enumerate(items)
+        ]
 
-        return {
-            "voice_instrumental": _binary_prob(vi_probs)
-            if vi_probs is not None
-            else None,
-            "danceability": _binary_prob(dance_probs)
-            if dance_probs is not None
-            else None,
-            "bright_dark": _binary_prob(timbre_probs)
-            if timbre_probs is not None
-            else None,
-            "acoustic_electronic": _binary_prob(ac_el_probs)
-            if ac_el_probs is not None
-            else None,
-            "tonal_atonal": _binary_prob(tonal_probs)
-            if tonal_probs is not None
-            else None,
-            "reverb": _binary_prob(reverb_probs) if reverb_probs is not None else None,
-            "onset_density": onset_density,
-            "spectral_flatness": spectral_flatness,
-            "mood_theme": _multilabel_dict(mood_probs, LABELS_MOOD_THEME)
-            if mood_probs is not None
-            else None,
-            "genre": _multilabel_dict(genre_probs, LABELS_GENRE_DISCOGS519)
-            if genre_probs is not None
-            else None,
-            "instruments": _multilabel_dict(instr_probs, LABELS_INSTRUMENT)
-            if instr_probs is not None
-            else None,
-            "trait_version": TRAIT_VERSION,
-        }
+    def _should_stream(self, audio_path: str) -> bool:
+        if TRAIT_STREAM_MIN_SECONDS <= 0 or self._effnet is None:
+            return False
+        from src.feature_extraction.trait_streaming import stream_duration
+
+        duration = stream_duration(audio_path)
+        return duration is not None and duration > TRAIT_STREAM_MIN_SECONDS
+
+    def _prepare_path(self, audio_path: str) -> tuple:
+        """Return (mel, onset_density, spectral_flatness) for an audio file.
+
+        Served from the mel cache when enabled and the file is unchanged;
+        otherwise the file is decoded and the result written to the cache.
+        """
+        with profiling.track_file(audio_path):
+            if self._mel_cache is not None:
+                hit = self._mel_cache.get(audio_path)
+                if hit is not None:
+                    mel, extras = hit
+                    return mel, extras["onset_density"], extras["spectral_flatness"]
+
+            with profiling.stage("decode"):
+                y, _ = librosa.load(audio_path, sr=TRAIT_SAMPLE_RATE, mono=True)
+            prepared = _prepare_signal(y, audio_path)
+            del y
+
+            if self._mel_cache is not None:
+                mel, onset_density, spectral_flatness = prepared
+                try:
+                    self._mel_cache.put(
+                        audio_path,
+                        mel,
+                        {
+                            "onset_density": onset_density,
+                            "spectral_flatness": spectral_flatness,
+                        },
+                    )
+                except OSError as exc:
+                    print(
+                        "Warning: could not write mel cache entry for %s: %s"
+                        % (audio_path, exc),
+                        flush=True,
+                    )
+            return prepared
+
+    def _compute_prepared(self, prepared: list, with_embedding: bool = False) -> list:
+        """Run model inference for (mel, onset_density, spectral_flatness) tuples."""
+        outputs = self._infer([mel for mel, _, _ in prepared])
+        results = []
+        for (embedding, head_probs, genre_probs), (_, onset_density, flatness) in zip(
+            outputs, prepared
+        ):
+            traits = _build_trait_dict(head_probs, genre_probs, onset_density, flatness)
+            if with_embedding:
+                traits = (traits, TraitEmbedding(embedding, genre_probs))
+            results.append(traits)
+        return results
+
+    def _run_heads(self, embeddings: np.ndarray) -> dict:
+        """Run every loaded head once on a (num_tracks, 1280) matrix."""
+        with profiling.stage("heads"):
+            return {
+                name: _run_classifier_batch(sess, embeddings) if sess is not None else None
+                for name, sess in self._classifiers.items()
+            }
+
+    def _infer(self, mels: list) -> list:
+        """Run EffNet, the heads and MAEST on a list of (96, T) mels.
+
+        Returns one (embedding, head_probs, genre_probs) triple per mel, where
+        embedding is the mean EffNet embedding (1280,), head_probs maps
+        classifier name to a probability vector (None for heads that failed
+        to load) and genre_probs is None when MAEST is unavailable.
+        """
+        if self._effnet is None:
+            raise RuntimeError("TraitExtractor was created with heads_only=True")
+        with profiling.stage("effnet"):
+            embeddings = _run_effnet_batch(self._effnet, mels)
+        head_probs = self._run_heads(embeddings)
+
+        outputs = []
+        with profiling.stage("maest"):
+            for k, mel in enumerate(mels):
+                genre_probs = (
+                    _run_maest(self._maest, mel) if self._maest is not None else None
+                )
+                outputs.append((embeddings[k], _row(head_probs, k), genre_probs))
+        return outputs
+
+
+def _row(head_probs: dict, k: int) -> dict:
+    """Select track k from {name: (num_tracks, n_classes) or None}."""
+    return {
+        name: probs[k] if probs is not None else None
+        for name, probs in head_probs.items()
+    }
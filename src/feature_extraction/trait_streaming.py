@@ -0,0 +1,403 @@
+"""Bounded-memory trait extraction for very long audio files.
+
+TraitExtractor.compute() decodes the whole file with librosa.load and builds
+the full mel before inference, so a DJ mix or hour-long recording costs
+hundreds of MB per worker. This module decodes the file in blocks with
+soundfile, resamples each block with a streaming soxr resampler (the same
+"soxr_hq" filter librosa.load uses), and feeds every consumer incrementally:
+
+- the 96-band model mel, framed exactly as librosa's center=True STFT
+  (zero padding at both ends), turned into EffNet and MAEST windows as soon
+  as each window fills; embeddings and genre probabilities are averaged
+  online
+- spectral flatness, averaged online with the same framing
+- the onset-strength envelope (one float per 32 ms), kept whole because
+  onset_detect normalizes and peak-picks it globally
+
+Peak memory is bounded by the block size and the inference batch caps, not
+by track length. Results match the in-memory path up to float rounding,
+except onset density: onset_strength clips each dB mel at 80 dB below the
+track's global peak, which is not known while streaming. The first minute is
+recomputed against the final peak; later frames use the running peak (both
+compared frames share the same floor), which only differs for bins more than
+80 dB below a peak that has not been reached yet.
+
+Only formats soundfile can read are streamed; see stream_duration().
+
+Usage:
+    from src.feature_extraction.trait_streaming import stream_backbone_outputs
+    embedding, genre_probs, onset_density, spectral_flatness = (
+        stream_backbone_outputs(path, effnet_session, maest_session)
+    )
+"""
+
+import librosa
+import numpy as np
+import soundfile as sf
+import soxr
+
+from src.feature_extraction.config import (
+    TRAIT_EFFNET_MAX_PATCHES,
+    TRAIT_MAEST_MAX_BATCH,
+    TRAIT_SAMPLE_RATE,
+    TRAIT_STREAM_BLOCK_SECONDS,
+)
+from src.feature_extraction.trait_extractor import (
+    _EFFNET_FRAMES,
+    _EFFNET_HOP,
+    _MAEST_FRAMES,
+    _MAEST_HOP,
+    _MEL_LOG_SCALE,
+    _MEL_PARAMS,
+    _mel_windows,
+)
+
+
+# librosa.onset.onset_strength / spectral_flatness framing defaults
+_EXTRAS_N_FFT = 2048
+_EXTRAS_HOP = 512
+_ONSET_TOP_DB = 80.0
+_AMIN = 1e-10
+# onset_strength pads lag (1) + n_fft // (2 * hop) frames at the start
+_ONSET_PAD = 1 + _EXTRAS_N_FFT // (2 * _EXTRAS_HOP)
+# dB frames kept from the start of the track (60 s, ~1 MB) so the envelope
+# there is recomputed against the final peak: quiet intros are where the
+# running peak differs most from the global one
+_ONSET_HEAD_FRAMES = int(60 * TRAIT_SAMPLE_RATE / _EXTRAS_HOP)
+
+# Resampled samples held back so the final length can be fixed the way
+# librosa.resample(fix=True) does
+_RESAMPLE_RESERVE = 64
+
+
+def stream_duration(audio_path: str):
+    """Return the file's duration in seconds, or None if soundfile cannot read it."""
+    try:
+        info = sf.info(audio_path)
+    except (RuntimeError, OSError):
+        return None
+    if info.samplerate <= 0:
+        return None
+    return info.frames / float(info.samplerate)
+
+
+def iter_signal_blocks(
+    audio_path: str, block_seconds: float = TRAIT_STREAM_BLOCK_SECONDS
+):
+    """Yield the file as mono float32 blocks at TRAIT_SAMPLE_RATE.
+
+    The concatenated blocks match librosa.load(audio_path,
+    sr=TRAIT_SAMPLE_RATE, mono=True) up to float rounding.
+
+    Raises:
+        RuntimeError/OSError: If soundfile cannot open the file.
+    """
+    with sf.SoundFile(audio_path) as f:
+        native_sr = f.samplerate
+        blocksize = max(int(block_seconds * native_sr), 1)
+        blocks = f.blocks(blocksize=blocksize, dtype="float32", always_2d=True)
+
+        if native_sr == TRAIT_SAMPLE_RATE:
+            for block in blocks:
+                yield block.mean(axis=1, dtype=np.float32)
+            return
+
+        resampler = soxr.ResampleStream(
+            native_sr, TRAIT_SAMPLE_RATE, 1, dtype="float32", quality="soxr_hq"
+        )
+        n_in = 0
+        n_yielded = 0
+        held = np.zeros(0, dtype=np.float32)
+        for block in blocks:
+            mono = block.mean(axis=1, dtype=np.float32)
+            n_in += len(mono)
+            held = np.concatenate([held, resampler.resample_chunk(mono)])
+            if len(held) > _RESAMPLE_RESERVE:
+                yield held[:-_RESAMPLE_RESERVE]
+                n_yielded += len(held) - _RESAMPLE_RESERVE
+                held = held[-_RESAMPLE_RESERVE:]
+
+        held = np.concatenate(
+            [held, resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)]
+        )
+        n_out = int(np.ceil(n_in * TRAIT_SAMPLE_RATE / float(native_sr)))
+        missing = n_out - n_yielded - len(held)
+        if missing > 0:
+            held = np.pad(held, (0, missing))
+        elif missing < 0:
+            held = held[: max(len(held) + missing, 0)]
+        if len(held):
+            yield held
+
+
+class _CenteredFramer:
+    """Cut a sample stream into STFT input with librosa's center=True framing.
+
+    center=True zero-pads n_fft // 2 samples at both ends of the signal and
+    yields 1 + len(y) // hop frames. push() returns a chunk that produces
+    the next frames under center=False, keeping the n_fft - hop overlap.
+    """
+
+    def __init__(self, n_fft: int, hop: int):
+        self._n_fft = n_fft
+        self._hop = hop
+        self._buf = np.zeros(n_fft // 2, dtype=np.float32)
+
+    def push(self, samples: np.ndarray, last: bool = False):
+        parts = [self._buf, samples]
+        if last:
+            parts.append(np.zeros(self._n_fft // 2, dtype=np.float32))
+        buf = np.concatenate(parts)
+        if len(buf) < self._n_fft:
+            self._buf = buf
+            return None
+        n_frames = 1 + (len(buf) - self._n_fft) // self._hop
+        chunk = buf[: (n_frames - 1) * self._hop + self._n_fft]
+        self._buf = buf[n_frames * self._hop :]
+        return chunk
+
+
+class _WindowStream:
+    """Emit fixed-width mel windows at a fixed hop as frames arrive.
+
+    Mirrors _patch_mel_for_effnet/_patch_mel_for_maest: windows start every
+    hop frames, a trailing partial window is dropped, and a mel shorter than
+    one window is zero-padded into a single window.
+    """
+
+    def __init__(self, width: int, hop: int):
+        self._width = width
+        self._hop = hop
+        self._buf = np.zeros((_MEL_PARAMS["n_mels"], 0), dtype=np.float32)
+        self.emitted = 0
+
+    def push(self, frames: np.ndarray) -> np.ndarray:
+        """Return the (n, width, n_mels) windows completed by frames."""
+        buf = np.concatenate([self._buf, frames], axis=1)
+        if buf.shape[1] < self._width:
+            self._buf = buf
+            return np.zeros((0, self._width, buf.shape[0]), dtype=np.float32)
+        n = 1 + (buf.shape[1] - self._width) // self._hop
+        windows = _mel_windows(
+            buf[:, : (n - 1) * self._hop + self._width], self._width, self._hop
+        )
+        self._buf = buf[:, n * self._hop :]
+        self.emitted += n
+        return windows
+
+    def finish(self) -> np.ndarray:
+        """Return the padded single window for mels shorter than one window."""
+        if self.emitted > 0:
+            return np.zeros((0, self._width, self._buf.shape[0]), dtype=np.float32)
+        self.emitted = 1
+        return _mel_windows(self._buf, self._width, self._hop)
+
+
+class _EffnetAccumulator:
+    """Run EffNet on windows in calls of max_patches and average embeddings online."""
+
+    def __init__(self, session, max_patches: int):
+        self._session = session
+        self._input_name = session.get_inputs()[0].name
+        self._max_patches = max(int(max_patches), 1)
+        self._pending = []
+        self._n_pending = 0
+        self._sum = np.zeros(0, dtype=np.float64)
+        self._count = 0
+
+    def add(self, windows: np.ndarray, flush: bool = False):
+        if len(windows):
+            self._pending.append(windows)
+            self._n_pending += len(windows)
+        if self._n_pending >= self._max_patches or (flush and self._n_pending):
+            patches = np.concatenate(self._pending, axis=0)
+            self._pending = []
+            self._n_pending = 0
+            for i in range(0, len(patches), self._max_patches):
+                emb = self._session.run(
+                    None, {self._input_name: patches[i : i + self._max_patches]}
+                )[1]
+                total = emb.sum(axis=0, dtype=np.float64)
+                self._sum = total if self._count == 0 else self._sum + total
+                self._count += len(emb)
+
+    def mean(self) -> np.ndarray:
+        return (self._sum / self._count).astype(np.float32)
+
+
+class _MaestAccumulator:
+    """Run MAEST on windows (batched when the graph allows) and average online."""
+
+    def __init__(self, session, max_batch: int):
+        self._session = session
+        inp = session.get_inputs()[0]
+        self._input_name = inp.name
+        batch_dim = inp.shape[0] if inp.shape else None
+        self._step = 1 if isinstance(batch_dim, int) else max(int(max_batch), 1)
+        self._pending = []
+        self._sum = None
+        self._count = 0
+
+    def add(self, windows: np.ndarray, flush: bool = False):
+        self._pending.extend(windows)
+        while len(self._pending) >= self._step or (flush and self._pending):
+            batch = np.stack(self._pending[: self._step])
+            del self._pending[: self._step]
+            probs = self._session.run(["activations"], {self._input_name: batch})[0]
+            total = probs.reshape(len(batch), -1).sum(axis=0, dtype=np.float64)
+            self._sum = total if self._sum is None else self._sum + total
+            self._count += len(batch)
+
+    def mean(self) -> np.ndarray:
+        return (self._sum / self._count).astype(np.float32)
+
+
+class _ExtrasAccumulator:
+    """Online onset envelope and spectral flatness (librosa defaults)."""
+
+    def __init__(self):
+        self._framer = _CenteredFramer(_EXTRAS_N_FFT, _EXTRAS_HOP)
+        self._envelope = []
+        self._head_db = []
+        self._n_frames = 0
+        self._prev_db = None
+        self._peak_db = -np.inf
+        self._flatness_sum = 0.0
+        self._flatness_count = 0
+        self.n_samples = 0
+        self.max_abs = 0.0
+
+    def push(self, samples: np.ndarray, last: bool = False):
+        self.n_samples += len(samples)
+        if len(samples):
+            self.max_abs = max(self.max_abs, float(np.max(np.abs(samples))))
+        chunk = self._framer.push(samples, last=last)
+        if chunk is None:
+            return
+
+        flatness = librosa.feature.spectral_flatness(
+            y=chunk, n_fft=_EXTRAS_N_FFT, hop_length=_EXTRAS_HOP, center=False
+        )[0]
+        valid = ~np.isnan(flatness)
+        self._flatness_sum += float(flatness[valid].sum())
+        self._flatness_count += int(valid.sum())
+
+        S = np.abs(
+            librosa.feature.melspectrogram(
+                y=chunk,
+                sr=TRAIT_SAMPLE_RATE,
+                n_fft=_EXTRAS_N_FFT,
+                hop_length=_EXTRAS_HOP,
+                center=False,
+                fmax=0.5 * TRAIT_SAMPLE_RATE,
+            )
+        )
+        db = 10.0 * np.log10(np.maximum(_AMIN, S))
+        # Running peak per frame stands in for onset_strength's global peak
+        peaks = np.maximum.accumulate(np.maximum(db.max(axis=0), self._peak_db))
+        self._peak_db = float(peaks[-1])
+        floors = peaks - _ONSET_TOP_DB
+
+        prev = db[:, :-1]
+        if self._prev_db is not None:
+            prev = np.concatenate([self._prev_db[:, np.newaxis], prev], axis=1)
+            cur, cur_floors = db, floors
+        else:
+            cur, cur_floors = db[:, 1:], floors[1:]
+        diff = np.maximum(cur, cur_floors) - np.maximum(prev, cur_floors)
+        self._envelope.append(np.maximum(0.0, diff).mean(axis=0))
+        self._prev_db = db[:, -1]
+        if self._n_frames < _ONSET_HEAD_FRAMES:
+            self._head_db.append(db[:, : _ONSET_HEAD_FRAMES - self._n_frames])
+        self._n_frames += db.shape[1]
+
+    def onset_density(self) -> float:
+        envelope = np.concatenate(
+            [np.zeros(_ONSET_PAD, dtype=np.float32)] + self._envelope
+        )[: self._n_frames]
+        if self._head_db:
+            head = np.concatenate(self._head_db, axis=1)
+            floor = self._peak_db - _ONSET_TOP_DB
+            diff = np.maximum(head[:, 1:], floor) - np.maximum(head[:, :-1], floor)
+            head_env = np.maximum(0.0, diff).mean(axis=0)
+            n = min(len(head_env), len(envelope) - _ONSET_PAD)
+            envelope[_ONSET_PAD : _ONSET_PAD + n] = head_env[:n]
+        onset_frames = librosa.onset.onset_detect(
+            onset_envelope=envelope, sr=TRAIT_SAMPLE_RATE
+        )
+        duration_sec = self.n_samples / TRAIT_SAMPLE_RATE
+        return (
+            round(float(len(onset_frames) / duration_sec), 4)
+            if duration_sec > 0
+            else 0.0
+        )
+
+    def spectral_flatness(self) -> float:
+        if self.max_abs < 1e-10 or self._flatness_count == 0:
+            return 0.0
+        raw = self._flatness_sum / self._flatness_count
+        return round(min(raw, 1.0), 6)
+
+
+def stream_backbone_outputs(
+    audio_path: str,
+    effnet,
+    maest=None,
+    max_patches: int = TRAIT_EFFNET_MAX_PATCHES,
+    maest_max_batch: int = TRAIT_MAEST_MAX_BATCH,
+    block_seconds: float = TRAIT_STREAM_BLOCK_SECONDS,
+    extras: bool = True,
+) -> tuple:
+    """Decode audio_path in blocks and run the backbones as windows fill.
+
+    With extras=False the full-track onset envelope and flatness are skipped
+    (see TRAIT_ANALYSIS_POLICY) and both are returned as None.
+
+    Returns:
+        (mean EffNet embedding (1280,), mean MAEST genre probabilities or
+        None when maest is None, onset_density, spectral_flatness)
+
+    Raises:
+        ValueError: If the file decodes to zero samples.
+        RuntimeError/OSError: If soundfile cannot open the file.
+    """
+    mel_framer = _CenteredFramer(_MEL_PARAMS["n_fft"], _MEL_PARAMS["hop_length"])
+    effnet_windows = _WindowStream(_EFFNET_FRAMES, _EFFNET_HOP)
+    maest_windows = _WindowStream(_MAEST_FRAMES, _MAEST_HOP)
+    effnet_acc = _EffnetAccumulator(effnet, max_patches)
+    maest_acc = _MaestAccumulator(maest, maest_max_batch) if maest is not None else None
+    extras_acc = _ExtrasAccumulator() if extras else None
+    n_samples = 0
+
+    def feed(samples, last=False):
+        if extras_acc is not None:
+            extras_acc.push(samples, last=last)
+        chunk = mel_framer.push(samples, last=last)
+        if chunk is not None:
+            mel = librosa.feature.melspectrogram(y=chunk, center=False, **_MEL_PARAMS)
+            mel = np.log(_MEL_LOG_SCALE * mel + 1.0).astype(np.float32)
+            effnet_acc.add(effnet_windows.push(mel))
+            if maest_acc is not None:
+                maest_acc.add(maest_windows.push(mel))
+
+    for block in iter_signal_blocks(audio_path, block_seconds):
+        n_samples += len(block)
+        feed(block)
+    if n_samples == 0:
+        raise ValueError("Audio file loaded with zero samples: %s" % audio_path)
+    feed(np.zeros(0, dtype=np.float32), last=True)
+
+    effnet_acc.add(effnet_windows.finish(), flush=True)
+    genre_probs = None
+    if maest_acc is not None:
+        maest_acc.add(maest_windows.finish(), flush=True)
+        genre_probs = maest_acc.mean()
+
+    if extras_acc is None:
+        return effnet_acc.mean(), genre_probs, None, None
+    return (
+        effnet_acc.mean(),
+        genre_probs,
+        extras_acc.onset_density(),
+        extras_acc.spectral_flatness(),
+    )
@@ -6,7 +6,9 @@ from typing import Dict, Optional, Set, Tuple
 
 from src.db import database
 from src.feature_extraction.config import DESCRIPTOR_VERSION
+from src.feature_extraction.track_similarity import ScorerName
 from src.models.track_cosine_similarity import TrackCosineSimilarity
+from src.models.track_neighbors import TrackNeighbors
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +26,22 @@ class CosineCache:
 
     Tracks hit/miss counts and recent entry/exit events for admin
     dashboard instrumentation.
+
+    With ``neighbor_table`` set, warm-ups first seed the cache from the
+    precomputed ``track_neighbors`` lists (two queries for depth 2), so the
+    closest neighbours are cached at once, then continue the BFS over
+    ``track_cosine_similarity`` for the candidate pairs outside those lists.
     """
 
-    def __init__(self, max_entries: int = _MAX_ENTRIES, warmup_delay: float = _WARMUP_DELAY):
+    def __init__(
+        self,
+        max_entries: int = _MAX_ENTRIES,
+        warmup_delay: float = _WARMUP_DELAY,
+        neighbor_table: bool = False,
+    ):
         self._max_entries = max_entries
         self._warmup_delay = warmup_delay
+        self._neighbor_table = neighbor_table
         self._lock = threading.Lock()
         self._store: OrderedDict[Tuple[int, int], float] = OrderedDict()
 
@@ -142,10 +155,14 @@ class CosineCache:
         Rows are stored in canonical order (id1 < id2), so a track can
         appear in either column; both must be checked.
 
+        Pairs already seeded from ``track_neighbors`` are not put again.
+
         Creates its own DB session so it never shares a session across threads.
         """
         session = database.create_session()
         try:
+            seeded = self._warm_from_neighbor_table(session, track_id)
+
             depth1_rows = (
                 session.query(TrackCosineSimilarity)
                 .filter(
@@ -158,7 +175,8 @@ class CosineCache:
 
             depth1_neighbors = []
             for row in depth1_rows:
-                self.put(row.id1, row.id2, row.cosine_similarity)
+                if self._key(row.id1, row.id2) not in seeded:
+                    self.put(row.id1, row.id2, row.cosine_similarity)
                 neighbor_id = row.id2 if row.id1 == track_id else row.id1
                 depth1_neighbors.append(neighbor_id)
 
@@ -173,13 +191,63 @@ class CosineCache:
                     .all()
                 )
                 for row in depth2_rows:
-                    self.put(row.id1, row.id2, row.cosine_similarity)
+                    if self._key(row.id1, row.id2) not in seeded:
+                        self.put(row.id1, row.id2, row.cosine_similarity)
 
         except Exception:
             logger.exception("Error warming cosine cache for track %s", track_id)
         finally:
             session.close()
 
+    def _warm_from_neighbor_table(
+        self, session, track_id: int, cancel: Optional[threading.Event] = None
+    ) -> Set[Tuple[int, int]]:
+        """Seed the cache to depth 2 from ``track_neighbors``.
+
+        One primary-key lookup for *track_id*, one ``IN`` query for its
+        neighbours. Returns the keys of the pairs put, so the pairwise BFS
+        that follows can skip them; empty when the table is not in use or
+        holds no current row for *track_id*.
+        """
+        seeded: Set[Tuple[int, int]] = set()
+        if not self._neighbor_table:
+            return seeded
+        current = (
+            TrackNeighbors.descriptor_version == DESCRIPTOR_VERSION,
+            TrackNeighbors.scorer == ScorerName.LATE_FUSION_V1.value,
+        )
+        try:
+            root = (
+                session.query(TrackNeighbors)
+                .filter(TrackNeighbors.track_id == track_id, *current)
+                .first()
+            )
+            if root is None:
+                return seeded
+            self._put_neighbors(root, seeded)
+            if cancel is not None and cancel.is_set():
+                return seeded
+            rows = (
+                session.query(TrackNeighbors)
+                .filter(TrackNeighbors.track_id.in_(root.neighbor_ids), *current)
+                .all()
+            )
+        except Exception:
+            session.rollback()
+            logger.debug("track_neighbors lookup failed for track %s", track_id)
+            return seeded
+
+        for row in rows:
+            if cancel is not None and cancel.is_set():
+                break
+            self._put_neighbors(row, seeded)
+        return seeded
+
+    def _put_neighbors(self, row, seeded: Set[Tuple[int, int]]) -> None:
+        for neighbor_id, score in zip(row.neighbor_ids, row.scores):
+            self.put(row.track_id, neighbor_id, float(score))
+            seeded.add(self._key(row.track_id, neighbor_id))
+
     # ------------------------------------------------------------------
     # Delayed BFS warm-up scheduler
     # ------------------------------------------------------------------
@@ -216,13 +284,16 @@ class CosineCache:
 
         Checks *cancel* between nodes and between rows so a superseding
         search can stop the traversal promptly.  Already-added cache
-        entries are never evicted on cancellation.
+        entries are never evicted on cancellation.  Pairs seeded from
+        ``track_neighbors`` first are not put again.
         """
         if cancel.is_set():
             return
 
         session = database.create_session()
         try:
+            seeded = self._warm_from_neighbor_table(session, track_id, cancel)
+
             explored: Set[int] = {track_id}
             queue: deque = deque()
             queue.append((track_id, 0))
@@ -246,7 +317,8 @@ class CosineCache:
                 for row in rows:
                     if cancel.is_set():
                         return
-                    self.put(row.id1, row.id2, row.cosine_similarity)
+                    if self._key(row.id1, row.id2) not in seeded:
+                        self.put(row.id1, row.id2, row.cosine_similarity)
                     neighbor_id = row.id2 if row.id1 == current_id else row.id1
                     if depth + 1 < _MAX_BFS_DEPTH and neighbor_id not in explored:
                         explored.add(neighbor_id)
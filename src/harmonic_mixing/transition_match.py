@@ -25,6 +25,7 @@ from src.harmonic_mixing.config import (
     MatchFactors,
 )
 from src.feature_extraction.compact_descriptor import compute_similarity, unpack_vector
+from src.feature_extraction.track_similarity import score_many
 
 logger = logging.getLogger(__name__)
 
@@ -48,9 +49,11 @@ class TransitionMatch:
     collection_metadata = None
     db_session = None
     cosine_cache = None
+    descriptor_store = None
     effective_weights = None
     _on_deck_descriptor_cache = {}
     _candidate_descriptor_cache = {}
+    _batch_similarity_cache = {}
     _on_deck_trait_cache = {}
     _candidate_trait_cache = {}
     result_column_header = "   ".join(["Total Score", "Cos Sim", " Track"])
@@ -60,9 +63,35 @@ class TransitionMatch:
         """Clear per-session caches. Call before each new track query."""
         cls._on_deck_descriptor_cache.clear()
         cls._candidate_descriptor_cache.clear()
+        cls._batch_similarity_cache.clear()
         cls._on_deck_trait_cache.clear()
         cls._candidate_trait_cache.clear()
 
+    @classmethod
+    def prime_similarities(cls, on_deck_id, candidate_ids):
+        """Score on_deck_id against all candidate_ids with one score_many() call.
+
+        The results stand in for per-pair scoring in _compute_similarity();
+        cached and persisted similarities still take precedence. Needs the
+        descriptor store; tracks it does not hold are scored per pair.
+        """
+        store = cls.descriptor_store
+        if store is None or on_deck_id is None:
+            return
+        query = store.vector(on_deck_id)
+        if query is None:
+            return
+        candidate_ids = np.asarray(
+            [c for c in candidate_ids if c is not None and c != on_deck_id], dtype=np.int64
+        )
+        rows = store.rows(candidate_ids)
+        found = rows >= 0
+        if not found.any():
+            return
+        scores = score_many(query, store.vectors[rows[found]])
+        for candidate_id, score in zip(candidate_ids[found].tolist(), scores.tolist()):
+            cls._batch_similarity_cache[(on_deck_id, candidate_id)] = score
+
     def _safe_rollback(self):
         """Roll back the shared session to clear PendingRollbackError state."""
         if self.db_session is not None:
@@ -260,6 +289,17 @@ class TransitionMatch:
             return None
 
     def _compute_similarity(self, on_deck_id: int, candidate_id: int):
+        primed = TransitionMatch._batch_similarity_cache.get((on_deck_id, candidate_id))
+        if primed is not None:
+            return primed
+
+        store = TransitionMatch.descriptor_store
+        if store is not None:
+            v1 = store.vector(on_deck_id)
+            v2 = store.vector(candidate_id)
+            if v1 is not None and v2 is not None:
+                return compute_similarity(v1, v2)
+
         try:
             if on_deck_id not in TransitionMatch._on_deck_descriptor_cache:
                 TransitionMatch._on_deck_descriptor_cache[on_deck_id] = (
@@ -15,6 +15,8 @@ from src.harmonic_mixing.config import (
     UP_KEY_UPPER_BOUND,
 )
 from src.data_management.service import load_tracks
+from src.feature_extraction import corpus_stats
+from src.feature_extraction.descriptor_store import DescriptorStore
 from src.harmonic_mixing.transition_match import TransitionMatch
 from src.errors import handle
 from src.utils.common import get_config_value
@@ -28,6 +30,31 @@ from src.harmonic_mixing.utils import (
 logger = logging.getLogger(__name__)
 
 
+def _open_descriptor_store(session):
+    """Open the descriptor store without the vectors recomputed since its export.
+
+    Similarities computed from it are persisted, so stale vectors are read
+    from track_descriptor instead. None when there is no usable store or it
+    cannot be checked against the database.
+    """
+    store = DescriptorStore.open()
+    if store is None:
+        return None
+    try:
+        n_stale = store.verify(session)
+    except Exception:
+        session.rollback()
+        logger.warning("Could not check the descriptor store; not using it", exc_info=True)
+        return None
+    if n_stale:
+        logger.info(
+            "Descriptor store %s: %d stale vector(s) read from the database instead",
+            store.directory,
+            n_stale,
+        )
+    return store
+
+
 class TransitionMatchFinder:
     """Encapsulates functionality for finding transition matches."""
 
@@ -48,6 +75,7 @@ class TransitionMatchFinder:
         TransitionMatch.db_session = self.session
         TransitionMatch.collection_metadata = self.collection_metadata
         TransitionMatch.cosine_cache = self.cosine_cache
+        TransitionMatch.descriptor_store = _open_descriptor_store(self.session)
         self._sync_effective_weights()
 
     def reload_track_data(self):
@@ -55,7 +83,9 @@ class TransitionMatchFinder:
         self.tracks = load_tracks(self.session)
         self.camelot_map, self.collection_metadata = generate_camelot_map(self.tracks)
         TransitionMatch.collection_metadata = self.collection_metadata
+        TransitionMatch.descriptor_store = _open_descriptor_store(self.session)
         TransitionMatch.clear_descriptor_caches()
+        corpus_stats.reset_default()
         self._sync_effective_weights()
 
     @staticmethod
@@ -225,6 +255,11 @@ class TransitionMatchFinder:
                 match = TransitionMatch(md, cur_track_md, priority)
                 lower_key.append(match)
 
+        TransitionMatch.prime_similarities(
+            source_id,
+            [m.metadata.get(TrackDBCols.ID) for m in same_key + higher_key + lower_key],
+        )
+
         if sort_results:
             same_key = sorted(same_key, reverse=True)
             higher_key = sorted(higher_key, reverse=True)
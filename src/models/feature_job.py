@@ -0,0 +1,45 @@
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    Sequence,
+    String,
+    Text,
+    UniqueConstraint,
+    func,
+)
+
+from src.db import Base
+
+
+class FeatureJob(Base):
+    __tablename__ = "feature_job"
+    __table_args__ = (
+        UniqueConstraint("job_type", "track_id", name="uq_feature_job_type_track"),
+        {"extend_existing": True},
+    )
+
+    id = Column(Integer, Sequence("feature_job_id_seq"), primary_key=True)
+    job_type = Column(String(64), nullable=False)   # e.g. "traits", "cosine:3"
+    track_id = Column(Integer, ForeignKey("track.id"), nullable=False)
+    status = Column(String(16), nullable=False)     # queued | running | done | failed
+    priority = Column(BigInteger, nullable=False)   # claimed highest first (file size)
+    attempts = Column(Integer, nullable=False)
+    error = Column(Text, nullable=True)             # last failure reason
+    worker = Column(String(128), nullable=True)     # host:pid of the last claimant
+    claimed_at = Column(DateTime, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)  # renewed by heartbeats
+    finished_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __eq__(self, other):
+        return (
+            self.job_type == other.job_type
+            and self.track_id == other.track_id
+            and self.__class__.__name__ == other.__class__.__name__
+        )
+
+    def __hash__(self):
+        return hash(self.__class__.__name__ + self.job_type + str(self.track_id))
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, LargeBinary, String, func
+
+from src.db import Base
+
+
+class TrackEmbedding(Base):
+    __tablename__ = "track_embedding"
+    __table_args__ = {"extend_existing": True}
+
+    track_id = Column(Integer, ForeignKey("track.id"), primary_key=True)
+    effnet_embedding = Column(LargeBinary, nullable=False)  # 1280 float32, mean EffNet
+    genre_probs = Column(LargeBinary, nullable=True)        # 519 float32, mean MAEST
+    embedding_version = Column(String(32), nullable=False)
+    computed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __eq__(self, other):
+        return (
+            self.track_id == other.track_id
+            and self.__class__.__name__ == other.__class__.__name__
+        )
+
+    def __hash__(self):
+        return hash(self.__class__.__name__ + str(self.track_id))
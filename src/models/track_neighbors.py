@@ -0,0 +1,25 @@
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, String, func
+from sqlalchemy.dialects.postgresql import ARRAY, REAL
+
+from src.db import Base
+
+
+class TrackNeighbors(Base):
+    __tablename__ = "track_neighbors"
+    __table_args__ = {"extend_existing": True}
+
+    track_id = Column(Integer, ForeignKey("track.id"), primary_key=True)
+    neighbor_ids = Column(ARRAY(Integer), nullable=False)  # best first
+    scores = Column(ARRAY(REAL), nullable=False)           # aligned with neighbor_ids
+    descriptor_version = Column(String(32), nullable=False)
+    scorer = Column(String(64), nullable=False)
+    computed_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    def __eq__(self, other):
+        return (
+            self.track_id == other.track_id
+            and self.__class__.__name__ == other.__class__.__name__
+        )
+
+    def __hash__(self):
+        return hash(self.__class__.__name__ + str(self.track_id))
@@ -4,12 +4,23 @@ Finds all track_trait rows whose trait_version is not the current version
 (e.g. 'outdated' after the migration), recomputes traits via the full ONNX
 pipeline, and updates existing rows in place.
 
-Each worker loads ONNX sessions once (~430 MB) then processes its chunk,
-committing per-row. A crash only loses the track currently being computed.
-Safe to re-run — only processes rows where trait_version != current version.
+Each worker loads ONNX sessions once (~430 MB) then claims small batches of
+tracks from the feature_job ledger, largest files first (see
+feature_extraction.job_ledger), committing per-row. A crash only loses the
+batch currently being computed, and the next run resumes from the ledger;
+several runs can share it. Safe to re-run — only processes rows where
+trait_version != current version.
+
+With --heads-only, no audio is decoded: the classification heads are re-run
+on the stored EffNet embeddings and MAEST genre probabilities (track_embedding)
+in a single process. Use it after adding a head or changing
+TRAIT_STORAGE_THRESHOLD; rows without a current embedding, or whose
+onset_density/spectral_flatness came from a different TRAIT_ANALYSIS_POLICY,
+are reported and left for a full backfill.
 
 Usage:
     python -m src.scripts.feature_extraction.backfill_genre_mood
+    python -m src.scripts.feature_extraction.backfill_genre_mood --heads-only
 
 Environment:
     TRAIT_WORKERS  Number of parallel worker processes (default: 2). Each
@@ -17,6 +28,7 @@ Environment:
                    memory-constrained machines.
 """
 
+import argparse
 import datetime
 import gc
 import os
@@ -30,20 +42,63 @@ from os.path import join, splitext  # noqa: E402
 
 from src.db import database  # noqa: E402
 from src.models.track import Track  # noqa: E402
+from src.models.track_embedding import TrackEmbedding  # noqa: E402
 from src.models.track_trait import TrackTrait  # noqa: E402
 from src.config import PROCESSED_MUSIC_DIR  # noqa: E402
-from src.feature_extraction.config import TRAIT_VERSION, TRAIT_WORKERS  # noqa: E402
+from src.feature_extraction.config import (  # noqa: E402
+    TRAIT_ANALYSIS_TAG,
+    TRAIT_EMBEDDING_VERSION,
+    TRAIT_VERSION,
+    TRAIT_WORKERS,
+    split_trait_version,
+)
+from src.feature_extraction.job_ledger import (  # noqa: E402
+    DONE,
+    JobLedger,
+    format_summary,
+)
+from src.feature_extraction.scheduler import file_size  # noqa: E402
 from src.utils.file_operations import AUDIO_TYPES  # noqa: E402
 from src.scripts.feature_extraction.compute_track_traits import (  # noqa: E402
-    _chunkify,
     _resolve_audio_path,
+    _save_embedding,
 )
 
 _PROGRESS_INTERVAL = 10
 
+# One ledger per target version, so a version bump starts a fresh backfill
+_JOB_TYPE = "trait_backfill:%s" % TRAIT_VERSION
+
+# Rows per claimed batch in the full backfill
+_WORK_BATCH_SIZE = 4
+
+# Rows per heads-only inference call and commit
+_HEADS_ONLY_BATCH = 512
+
+
+def _apply_traits(row, traits):
+    """Overwrite a TrackTrait row's trait columns with a compute() result."""
+    row.voice_instrumental = traits["voice_instrumental"]
+    row.danceability = traits["danceability"]
+    row.bright_dark = traits["bright_dark"]
+    row.acoustic_electronic = traits["acoustic_electronic"]
+    row.tonal_atonal = traits["tonal_atonal"]
+    row.reverb = traits["reverb"]
+    row.onset_density = traits["onset_density"]
+    row.spectral_flatness = traits["spectral_flatness"]
+    row.mood_theme = traits["mood_theme"]
+    row.genre = traits["genre"]
+    row.instruments = traits["instruments"]
+    row.trait_version = traits["trait_version"]
+    row.computed_at = datetime.datetime.utcnow()
 
-def _backfill_chunk(chunk, result_transmitter):
-    """Worker: load ONNX sessions once, recompute and update one trait row per track."""
+
+def _backfill_chunk(ledger, result_transmitter):
+    """Worker: load ONNX sessions once, recompute and update one trait row per track.
+
+    ledger hands out batches of (track_id, file_name) tuples (see
+    job_ledger.JobLedger.batches).
+    """
     from src.feature_extraction.trait_extractor import TraitExtractor
 
     pid = os.getpid()
@@ -54,59 +109,55 @@ def _backfill_chunk(chunk, result_transmitter):
     try:
         extractor = TraitExtractor()
     except Exception:
+        # The other workers drain the ledger
         print("  [%d] Failed to load models:\n%s" % (pid, traceback.format_exc()), flush=True)
-        result_transmitter.send((0, len(chunk)))
+        result_transmitter.send((0, 0))
         result_transmitter.close()
         return
-    print("  [%d] Sessions ready, backfilling %d tracks." % (pid, len(chunk)), flush=True)
+    print("  [%d] Sessions ready, backfilling queued tracks." % pid, flush=True)
 
     worker_session = database.create_session()
     try:
-        for trait_id, track_id, file_name in chunk:
-            try:
-                audio_path = join(PROCESSED_MUSIC_DIR, file_name)
-                try:
-                    traits = extractor.compute(audio_path)
-                except (FileNotFoundError, OSError):
-                    fallback = _resolve_audio_path(PROCESSED_MUSIC_DIR, file_name)
-                    if fallback is None:
-                        print("  [%d] track %d: file not found: %s" % (pid, track_id, file_name), flush=True)
+        with ledger.keep_alive():
+            for batch in ledger.batches():
+                for track_id, file_name in batch:
+                    try:
+                        row = worker_session.query(TrackTrait).filter_by(track_id=track_id).first()
+                        if row is None or row.trait_version == TRAIT_VERSION:
+                            # Deleted, or already backfilled outside the ledger
+                            ledger.done([track_id])
+                            continue
+
+                        audio_path = join(PROCESSED_MUSIC_DIR, file_name)
+                        try:
+                            traits, embedding = extractor.compute(audio_path, with_embedding=True)
+                        except (FileNotFoundError, OSError):
+                            fallback = _resolve_audio_path(PROCESSED_MUSIC_DIR, file_name)
+                            if fallback is None:
+                                print("  [%d] track %d: file not found: %s" % (pid, track_id, file_name), flush=True)
+                                n_fail += 1
+                                ledger.failed(track_id, "file not found: %s" % file_name)
+                                continue
+                            traits, embedding = extractor.compute(fallback, with_embedding=True)
+
+                        _apply_traits(row, traits)
+                        worker_session.commit()
+                        _save_embedding(worker_session, track_id, embedding)
+                        ledger.done([track_id])
+                        n_ok += 1
+
+                        if n_ok % _PROGRESS_INTERVAL == 0:
+                            print("  [%d] backfilled %d so far" % (pid, n_ok), flush=True)
+
+                        del traits, embedding
+                        if n_ok % _PROGRESS_INTERVAL == 0:
+                            gc.collect()
+
+                    except Exception as exc:
+                        worker_session.rollback()
                         n_fail += 1
-                        continue
-                    traits = extractor.compute(fallback)
-
-                row = worker_session.query(TrackTrait).filter_by(id=trait_id).first()
-                if row is None:
-                    n_fail += 1
-                    continue
-
-                row.voice_instrumental = traits["voice_instrumental"]
-                row.danceability = traits["danceability"]
-                row.bright_dark = traits["bright_dark"]
-                row.acoustic_electronic = traits["acoustic_electronic"]
-                row.tonal_atonal = traits["tonal_atonal"]
-                row.reverb = traits["reverb"]
-                row.onset_density = traits["onset_density"]
-                row.spectral_flatness = traits["spectral_flatness"]
-                row.mood_theme = traits["mood_theme"]
-                row.genre = traits["genre"]
-                row.instruments = traits["instruments"]
-                row.trait_version = traits["trait_version"]
-                row.computed_at = datetime.datetime.utcnow()
-                worker_session.commit()
-                n_ok += 1
-
-                if n_ok % _PROGRESS_INTERVAL == 0:
-                    print("  [%d] backfilled %d so far" % (pid, n_ok), flush=True)
-
-                del traits
-                if n_ok % _PROGRESS_INTERVAL == 0:
-                    gc.collect()
-
-            except Exception:
-                worker_session.rollback()
-                n_fail += 1
-                print("  [%d] track %d: exception:\n%s" % (pid, track_id, traceback.format_exc()), flush=True)
+                        print("  [%d] track %d: exception:\n%s" % (pid, track_id, traceback.format_exc()), flush=True)
+                        ledger.failed(track_id, exc)
     finally:
         worker_session.close()
 
@@ -115,7 +166,63 @@ def _backfill_chunk(chunk, result_transmitter):
     result_transmitter.close()
 
 
-def run():
+def _backfill_heads_only(session, outdated):
+    """Recompute outdated rows from stored embeddings; returns (ok, failed, missing)."""
+    from src.feature_extraction.compact_descriptor import unpack_vector
+    from src.feature_extraction.trait_extractor import TraitExtractor
+
+    embeddings = {
+        e.track_id: e
+        for e in session.query(TrackEmbedding)
+        .filter(TrackEmbedding.embedding_version == TRAIT_EMBEDDING_VERSION)
+        .all()
+    }
+    # The stored extras are reused, so they must come from the current policy
+    rows = [
+        row
+        for row in outdated
+        if row.track_id in embeddings
+        and split_trait_version(row.trait_version)[1] == TRAIT_ANALYSIS_TAG
+    ]
+    n_missing = len(outdated) - len(rows)
+    print(
+        "Heads-only backfill of %d rows (%d without a current embedding or "
+        "analysis policy)" % (len(rows), n_missing)
+    )
+    if not rows:
+        return 0, 0, n_missing
+
+    extractor = TraitExtractor(heads_only=True)
+    n_ok = 0
+    n_fail = 0
+    for start in range(0, len(rows), _HEADS_ONLY_BATCH):
+        batch = rows[start : start + _HEADS_ONLY_BATCH]
+        try:
+            items = []
+            for row in batch:
+                stored = embeddings[row.track_id]
+                items.append((
+                    unpack_vector(stored.effnet_embedding),
+                    unpack_vector(stored.genre_probs)
+                    if stored.genre_probs is not None
+                    else None,
+                    row.onset_density,
+                    row.spectral_flatness,
+                ))
+            for row, traits in zip(batch, extractor.compute_from_embeddings(items)):
+                _apply_traits(row, traits)
+            session.commit()
+            n_ok += len(batch)
+            print("  backfilled %d so far" % n_ok, flush=True)
+        except Exception:
+            session.rollback()
+            n_fail += len(batch)
+            print("  batch at %d: exception:\n%s" % (start, traceback.format_exc()), flush=True)
+
+    return n_ok, n_fail, n_missing
+
+
+def run(heads_only=False):
     session = database.create_session()
     try:
         outdated = (
@@ -123,6 +230,15 @@ def run():
             .filter(TrackTrait.trait_version != TRAIT_VERSION)
             .all()
         )
+
+        if heads_only:
+            n_ok, n_fail, n_missing = _backfill_heads_only(session, outdated)
+            print(
+                "\nDone. %d backfilled, %d failed, %d need a full backfill."
+                % (n_ok, n_fail, n_missing)
+            )
+            return
+
         track_map = {
             t.id: t.file_name
             for t in session.query(Track).all()
@@ -139,10 +255,22 @@ def run():
             if ext not in AUDIO_TYPES:
                 skipped += 1
                 continue
-            work_items.append((row.id, row.track_id, file_name))
+            work_items.append((row.track_id, file_name))
+
+        if not work_items:
+            print("Backfilling 0 rows (%d skipped — missing track or non-audio)" % skipped)
+            return
 
-        total = len(work_items)
-        print("Backfilling %d rows (%d skipped — missing track or non-audio)" % (total, skipped))
+        ledger = JobLedger(_JOB_TYPE, _WORK_BATCH_SIZE)
+        # A done job whose row was marked outdated again is redone
+        total = ledger.prepare(
+            (
+                (track_id, file_size(join(PROCESSED_MUSIC_DIR, file_name)))
+                for track_id, file_name in work_items
+            ),
+            requeue=(DONE,),
+        )
+        print("Backfilling %d queued rows (%d skipped — missing track or non-audio)" % (total, skipped))
         if total == 0:
             return
     finally:
@@ -151,14 +279,12 @@ def run():
     n_workers = min(TRAIT_WORKERS, total)
     print("Using %d worker(s) (TRAIT_WORKERS=%d)\n" % (n_workers, TRAIT_WORKERS))
 
-    chunks = _chunkify(work_items, n_workers)
-
     workers = []
     aggregators = []
-    for chunk in chunks:
+    for _ in range(n_workers):
         receiver, transmitter = Pipe(duplex=False)
         aggregators.append(receiver)
-        worker = Process(target=_backfill_chunk, args=(chunk, transmitter))
+        worker = Process(target=_backfill_chunk, args=(ledger, transmitter))
         worker.daemon = True
         workers.append(worker)
         worker.start()
@@ -175,7 +301,18 @@ def run():
     total_fail = sum(n for _, n in worker_results)
 
     print("\nDone. %d backfilled, %d failed." % (total_ok, total_fail))
+    print("Ledger: %s" % format_summary(ledger.summary()))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Backfill outdated trait rows")
+    parser.add_argument(
+        "--heads-only",
+        action="store_true",
+        help="Re-run classification heads on stored embeddings; no audio decoding",
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    run()
+    run(heads_only=_parse_args().heads_only)
@@ -0,0 +1,118 @@
+"""Benchmark MAEST per-track latency: fixed batch (one patch per call) vs dynamic batch.
+
+Loads the published fixed-batch MAEST export and its locally derived
+dynamic-batch variant (see model_manager.load_model(..., dynamic_batch=True)),
+runs _run_maest on the same mels with both, and reports per-track latency and
+the largest difference in genre probabilities.
+
+Usage:
+    # Synthetic mels for 3, 7 and 12 minute tracks (no audio needed):
+    python -m src.scripts.feature_extraction.benchmark_maest_batching
+
+    # Real audio files:
+    python -m src.scripts.feature_extraction.benchmark_maest_batching a.mp3 b.aiff
+
+    # Tune the dynamic batch cap and repetitions:
+    python -m src.scripts.feature_extraction.benchmark_maest_batching --max-batch 8 --repeats 5
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from src.feature_extraction import model_manager
+from src.feature_extraction.config import (
+    TRAIT_CLASSIFIER_MAEST,
+    TRAIT_MAEST_MAX_BATCH,
+    TRAIT_SAMPLE_RATE,
+)
+from src.feature_extraction.trait_extractor import (
+    _patch_mel_for_maest,
+    _run_maest,
+    compute_mel_spectrogram,
+)
+
+
+_SYNTHETIC_MINUTES = (3, 7, 12)
+
+# Mel frames per second at TRAIT_SAMPLE_RATE with hop 256
+_FRAMES_PER_SECOND = TRAIT_SAMPLE_RATE / 256
+
+
+def _synthetic_mels(minutes=_SYNTHETIC_MINUTES, seed=42):
+    rng = np.random.default_rng(seed)
+    return [
+        ("synthetic-%dmin" % m, rng.random((96, int(m * 60 * _FRAMES_PER_SECOND))).astype(np.float32))
+        for m in minutes
+    ]
+
+
+def _time_maest(session, mel, repeats, max_batch):
+    timings = []
+    probs = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        probs = _run_maest(session, mel, max_batch=max_batch)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)), probs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MAEST fixed vs dynamic batch")
+    parser.add_argument("paths", nargs="*", help="Audio files (default: synthetic mels)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per track (median reported)")
+    parser.add_argument(
+        "--max-batch", type=int, default=TRAIT_MAEST_MAX_BATCH,
+        help="Max patches per dynamic-batch call",
+    )
+    parser.add_argument(
+        "--output-dir", type=str, default=None,
+        help="Directory to write maest_batching_results.json",
+    )
+    args = parser.parse_args()
+
+    fixed = model_manager.load_model(TRAIT_CLASSIFIER_MAEST)
+    dynamic = model_manager.load_model(TRAIT_CLASSIFIER_MAEST, dynamic_batch=True)
+
+    if args.paths:
+        tracks = [(os.path.basename(p), compute_mel_spectrogram(p)) for p in args.paths]
+    else:
+        tracks = _synthetic_mels()
+
+    results = []
+    for name, mel in tracks:
+        n_patches = len(_patch_mel_for_maest(mel))
+        fixed_s, fixed_probs = _time_maest(fixed, mel, args.repeats, args.max_batch)
+        dynamic_s, dynamic_probs = _time_maest(dynamic, mel, args.repeats, args.max_batch)
+        results.append({
+            "track": name,
+            "duration_s": round(mel.shape[1] / _FRAMES_PER_SECOND, 1),
+            "patches": n_patches,
+            "fixed_s": round(fixed_s, 4),
+            "dynamic_s": round(dynamic_s, 4),
+            "speedup": round(fixed_s / dynamic_s, 2) if dynamic_s > 0 else None,
+            "max_abs_diff": float(np.max(np.abs(fixed_probs - dynamic_probs))),
+        })
+
+    print("%-28s %8s %7s %9s %9s %7s %10s" % (
+        "track", "dur(s)", "patches", "fixed(s)", "dyn(s)", "speedup", "max|diff|",
+    ))
+    for r in results:
+        print("%-28s %8.1f %7d %9.3f %9.3f %7.2f %10.2e" % (
+            r["track"][:28], r["duration_s"], r["patches"], r["fixed_s"],
+            r["dynamic_s"], r["speedup"] or 0.0, r["max_abs_diff"],
+        ))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        out_path = os.path.join(args.output_dir, "maest_batching_results.json")
+        with open(out_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Results written to %s" % out_path)
+
+
+if __name__ == "__main__":
+    main()
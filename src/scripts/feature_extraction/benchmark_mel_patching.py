@@ -0,0 +1,171 @@
+"""Benchmark EffNet/MAEST mel patching: per-patch loop vs strided views.
+
+The previous patchers built every window with a transpose, np.stack and an
+astype copy, then _run_effnet_batch concatenated all tracks' patches before
+inference. The strided version transposes the mel once and hands out views,
+copying only the rows of each ONNX call. This script times both and records
+their peak traced allocation (tracemalloc) on synthetic mels, including the
+per-call batch materialization onnxruntime would otherwise do.
+
+Usage:
+    # Synthetic mels for 3, 12, 60 and 120 minute tracks:
+    python -m src.scripts.feature_extraction.benchmark_mel_patching
+
+    # Custom durations (minutes) and repetitions:
+    python -m src.scripts.feature_extraction.benchmark_mel_patching --minutes 5 90 --repeats 5
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from src.feature_extraction.config import (
+    TRAIT_EFFNET_MAX_PATCHES,
+    TRAIT_MAEST_MAX_BATCH,
+    TRAIT_SAMPLE_RATE,
+)
+from src.feature_extraction.trait_extractor import (
+    _EFFNET_FRAMES,
+    _EFFNET_HOP,
+    _MAEST_FRAMES,
+    _MAEST_HOP,
+    _mel_windows,
+    _patch_mel_for_effnet,
+)
+
+
+_DEFAULT_MINUTES = (3, 12, 60, 120)
+
+# Mel frames per second at TRAIT_SAMPLE_RATE with hop 256
+_FRAMES_PER_SECOND = TRAIT_SAMPLE_RATE / 256
+
+
+def _loop_patch_effnet(mel):
+    """The per-patch implementation the strided views replaced."""
+    _, T = mel.shape
+    if T < _EFFNET_FRAMES:
+        mel = np.pad(mel, ((0, 0), (0, _EFFNET_FRAMES - T)))
+        T = _EFFNET_FRAMES
+    patches = []
+    for start in range(0, T - _EFFNET_FRAMES + 1, _EFFNET_HOP):
+        patches.append(mel[:, start : start + _EFFNET_FRAMES].T)
+    return np.stack(patches, axis=0).astype(np.float32)
+
+
+def _loop_patch_maest(mel):
+    _, T = mel.shape
+    if T < _MAEST_FRAMES:
+        mel = np.pad(mel, ((0, 0), (0, _MAEST_FRAMES - T)))
+        T = _MAEST_FRAMES
+    patches = []
+    for start in range(0, T - _MAEST_FRAMES + 1, _MAEST_HOP):
+        patch = mel[:, start : start + _MAEST_FRAMES].T
+        patches.append(patch[np.newaxis, :, :].astype(np.float32))
+    return patches
+
+
+def _loop_effnet_batches(mel, step):
+    # Old _run_effnet_batch: concatenate every patch set, then slice calls
+    patches = np.concatenate([_loop_patch_effnet(mel)], axis=0)
+    return sum(
+        float(patches[i : i + step][0, 0, 0]) for i in range(0, len(patches), step)
+    )
+
+
+def _strided_effnet_batches(mel, step):
+    windows = _patch_mel_for_effnet(mel)
+    return sum(
+        float(np.ascontiguousarray(windows[i : i + step])[0, 0, 0])
+        for i in range(0, len(windows), step)
+    )
+
+
+def _loop_maest_batches(mel, step):
+    patches = _loop_patch_maest(mel)
+    return sum(
+        float(np.concatenate(patches[i : i + step], axis=0)[0, 0, 0])
+        for i in range(0, len(patches), step)
+    )
+
+
+def _strided_maest_batches(mel, step):
+    # _run_maest slices the window view directly
+    windows = _mel_windows(mel, _MAEST_FRAMES, _MAEST_HOP)
+    return sum(
+        float(np.ascontiguousarray(windows[i : i + step])[0, 0, 0])
+        for i in range(0, len(windows), step)
+    )
+
+
+def _measure(fn, mel, step, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(mel, step)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(mel, step)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return float(np.median(timings)), peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark mel patching")
+    parser.add_argument(
+        "--minutes", type=float, nargs="*", default=list(_DEFAULT_MINUTES),
+        help="Synthetic track durations in minutes",
+    )
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per case (median reported)")
+    parser.add_argument(
+        "--output-dir", type=str, default=None,
+        help="Directory to write mel_patching_results.json",
+    )
+    args = parser.parse_args()
+
+    cases = (
+        ("effnet", _loop_effnet_batches, _strided_effnet_batches, TRAIT_EFFNET_MAX_PATCHES),
+        ("maest", _loop_maest_batches, _strided_maest_batches, TRAIT_MAEST_MAX_BATCH),
+    )
+
+    rng = np.random.default_rng(42)
+    results = []
+    for minutes in args.minutes:
+        mel = rng.random((96, int(minutes * 60 * _FRAMES_PER_SECOND))).astype(np.float32)
+        for model, loop_fn, strided_fn, step in cases:
+            loop_s, loop_mb = _measure(loop_fn, mel, step, args.repeats)
+            strided_s, strided_mb = _measure(strided_fn, mel, step, args.repeats)
+            results.append({
+                "model": model,
+                "minutes": minutes,
+                "loop_s": round(loop_s, 4),
+                "strided_s": round(strided_s, 4),
+                "speedup": round(loop_s / strided_s, 2) if strided_s > 0 else None,
+                "loop_peak_mb": round(loop_mb, 1),
+                "strided_peak_mb": round(strided_mb, 1),
+            })
+        del mel
+
+    print("%-7s %7s %9s %11s %7s %12s %14s" % (
+        "model", "minutes", "loop(s)", "strided(s)", "speedup", "loop peak MB", "strided peak MB",
+    ))
+    for r in results:
+        print("%-7s %7.1f %9.4f %11.4f %7.2f %12.1f %14.1f" % (
+            r["model"], r["minutes"], r["loop_s"], r["strided_s"], r["speedup"] or 0.0,
+            r["loop_peak_mb"], r["strided_peak_mb"],
+        ))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        out_path = os.path.join(args.output_dir, "mel_patching_results.json")
+        with open(out_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Results written to %s" % out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 """Benchmark track-similarity scorers on fixture or DB-loaded descriptors.
 
 Runs all registered scorers through the BenchmarkHarness and writes a
-JSON summary of distribution + hubness diagnostics.
+JSON summary of distribution + hubness diagnostics. Without --max-pairs every
+pair is scored, tile by tile on a process pool (see
+feature_extraction.all_pairs). It also measures recall@k of the approximate
+nearest-neighbour index (feature_extraction.ann_index) against brute-force
+late_fusion_v1 rankings for a range of n_probe values, written to
+ann_recall.json.
 
 Usage:
     # With synthetic fixture data (no DB required):
@@ -12,6 +17,11 @@ Usage:
 
     # Write output to a specific directory:
     python -m src.scripts.feature_extraction.benchmark_track_similarity --fixture --output-dir .harness/runs/xxx
+
+Environment:
+    ALL_PAIRS_WORKERS    Processes scoring similarity tiles (default: CPU count).
+    ALL_PAIRS_MEMORY_MB  Memory budget for the score tiles in flight (default: 256).
+    ANN_LISTS            Inverted lists in the ANN index (default: 0, about sqrt(N)).
 """
 
 import argparse
@@ -47,7 +57,15 @@ def _generate_fixture_vectors(n: int = 50, dims: int = 75, seed: int = 42):
 
 
 def _load_db_vectors(limit: int):
-    """Load descriptor vectors from the database."""
+    """Load descriptor vectors from the descriptor store, or the database
+    when nothing has been exported."""
+    from src.feature_extraction.descriptor_store import DescriptorStore
+
+    store = DescriptorStore.open()
+    if store is not None and len(store):
+        print("Using descriptor store %s (%d vectors)" % (store.directory, len(store)))
+        return list(store.vectors[:limit] if limit > 0 else store.vectors)
+
     from src.db import database
     from src.models.track_descriptor import TrackDescriptor
     from src.feature_extraction.config import DESCRIPTOR_VERSION
@@ -77,6 +95,11 @@ def main():
         "--output-dir", type=str, default=".",
         help="Directory to write benchmark results",
     )
+    parser.add_argument("--ann-k", type=int, default=10, help="k for ANN recall@k")
+    parser.add_argument(
+        "--ann-queries", type=int, default=200,
+        help="Query tracks sampled for ANN recall (0 skips it)",
+    )
     args = parser.parse_args()
 
     from src.feature_extraction.track_similarity import BenchmarkHarness
@@ -120,6 +143,28 @@ def main():
                 hub.get("occurrence_std", 0),
             ))
 
+    if args.ann_queries > 0:
+        _report_ann_recall(vectors, args.ann_k, args.ann_queries, args.output_dir)
+
+
+def _report_ann_recall(vectors, k, n_queries, output_dir):
+    """Measure ANN recall@k against brute force and write ann_recall.json."""
+    from src.feature_extraction.ann_index import measure_recall
+
+    recall = measure_recall(np.asarray(vectors), k=k, n_queries=n_queries)
+    out_path = os.path.join(output_dir, "ann_recall.json")
+    with open(out_path, "w") as f:
+        json.dump(recall, f, indent=2)
+
+    print("\n--- ANN recall@%d (%d lists, %d queries) ---" % (
+        recall["k"], recall["n_lists"], recall["queries"],
+    ))
+    for n_probe, value in recall["recall"].items():
+        print("  n_probe=%-3d recall=%.3f  re-ranked=%.1f%%" % (
+            n_probe, value, recall["probed_fraction"][n_probe] * 100,
+        ))
+    print("ANN recall written to %s" % out_path)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,226 @@
+"""Compare the "full" and "fast" compact descriptor profiles on a sample of tracks.
+
+Computes both profiles' global vectors for each track from one decode and
+reports:
+
+- per-block cosine between the two profiles' vectors (harmonic, rhythm,
+  timbre, energy) and the BPM scalar's mean absolute delta
+- for every scorer of the similarity benchmark (BenchmarkHarness): the
+  score distribution under each profile, the mean absolute delta and rank
+  correlation of the pair scores, and the mean top-K neighbour overlap
+- the median extraction time of each profile
+
+Use it before switching a library to DESCRIPTOR_PROFILE=fast.
+
+Usage:
+    # Random sample of 50 tracks from the DB
+    python -m src.scripts.feature_extraction.compare_descriptor_profiles --sample 50
+
+    # Specific audio files
+    python -m src.scripts.feature_extraction.compare_descriptor_profiles a.mp3 b.aiff
+
+    # Top-K for neighbour overlap, and a JSON report
+    python -m src.scripts.feature_extraction.compare_descriptor_profiles --top-k 10 --output-dir out/
+"""
+
+import argparse
+import json
+import os
+import time
+import warnings
+
+warnings.simplefilter("ignore")
+
+import librosa  # noqa: E402
+import numpy as np  # noqa: E402
+
+from src.feature_extraction.compact_descriptor import (  # noqa: E402
+    CompactDescriptor,
+    cosine_similarity,
+)
+from src.feature_extraction.config import SAMPLE_RATE  # noqa: E402
+from src.feature_extraction.track_similarity import (  # noqa: E402
+    BenchmarkHarness,
+    list_scorers,
+)
+from src.scripts.feature_extraction.compare_quantized_models import (  # noqa: E402
+    _sample_paths,
+)
+
+
+_PROFILES = ("full", "fast")
+
+# Descriptor block -> slice of the 75-d layout (see compact_descriptor)
+_BLOCKS = {
+    "harmonic": slice(0, 24),
+    "rhythm": slice(24, 41),
+    "timbre": slice(41, 67),
+    "energy": slice(67, 75),
+}
+
+_BPM_INDEX = 24
+
+
+def _rank(values):
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[np.argsort(values, kind="stable")] = np.arange(len(values))
+    return ranks
+
+
+def _spearman(a, b):
+    """Spearman rank correlation (ties broken by order); 0.0 if either side
+    is constant."""
+    ra, rb = _rank(a), _rank(b)
+    ra -= ra.mean()
+    rb -= rb.mean()
+    norm = float(np.linalg.norm(ra) * np.linalg.norm(rb))
+    return float(np.dot(ra, rb) / norm) if norm > 0 else 0.0
+
+
+def _neighbours(n, pairs, scores, top_k):
+    """Top-k neighbour sets per track from pairwise scores."""
+    candidates = [[] for _ in range(n)]
+    for (i, j), score in zip(pairs, scores):
+        candidates[i].append((score, j))
+        candidates[j].append((score, i))
+    return [
+        set(j for _, j in sorted(c, key=lambda x: -x[0])[:top_k]) for c in candidates
+    ]
+
+
+def _compare_vectors(full, fast):
+    """Per-block cosine and BPM delta between two profiles' vectors of one
+    track."""
+    row = {
+        block: cosine_similarity(full[dims], fast[dims]) for block, dims in _BLOCKS.items()
+    }
+    row["bpm_abs_delta"] = abs(float(full[_BPM_INDEX]) - float(fast[_BPM_INDEX]))
+    return row
+
+
+def _compare_scorers(full_vectors, fast_vectors, top_k, max_pairs=None):
+    """Run the benchmark scorers on both profiles' vectors over the same pairs.
+
+    Returns {scorer: {"full": stats, "fast": stats, "mean_abs_delta",
+    "spearman", "topk_overlap"}}.
+    """
+    full = BenchmarkHarness(full_vectors, max_pairs=max_pairs)
+    fast = BenchmarkHarness(fast_vectors, max_pairs=max_pairs)
+    top_k = max(min(top_k, len(full_vectors) - 1), 1)
+
+    results = {}
+    for scorer in list_scorers():
+        full_scores = full.pair_scores(scorer)
+        fast_scores = fast.pair_scores(scorer)
+        full_nn = _neighbours(full.n, full.pairs, full_scores, top_k)
+        fast_nn = _neighbours(fast.n, fast.pairs, fast_scores, top_k)
+        results[scorer.value] = {
+            "full": BenchmarkHarness._distribution_stats(full_scores),
+            "fast": BenchmarkHarness._distribution_stats(fast_scores),
+            "mean_abs_delta": float(np.mean(np.abs(full_scores - fast_scores))),
+            "spearman": _spearman(full_scores, fast_scores),
+            "topk_overlap": float(
+                np.mean([len(a & b) / float(top_k) for a, b in zip(full_nn, fast_nn)])
+            ),
+        }
+    return results
+
+
+def _summarize(rows):
+    """Aggregate _compare_vectors() rows into per-block statistics."""
+    summary = {"tracks": len(rows), "blocks": {}}
+    for block in _BLOCKS:
+        values = [r[block] for r in rows]
+        if values:
+            summary["blocks"][block] = {
+                "mean_cosine": float(np.mean(values)),
+                "min_cosine": float(np.min(values)),
+            }
+    if rows:
+        summary["bpm_mean_abs_delta"] = float(np.mean([r["bpm_abs_delta"] for r in rows]))
+    return summary
+
+
+def _timed_compute(y, profile):
+    desc = CompactDescriptor(None, profile=profile)
+    start = time.perf_counter()
+    desc.compute(y=y)
+    return desc.global_vector, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and fast descriptor profiles")
+    parser.add_argument("paths", nargs="*", help="Audio files (default: DB sample)")
+    parser.add_argument("--sample", type=int, default=25, help="Tracks to sample from the DB")
+    parser.add_argument("--seed", type=int, default=42, help="Sampling seed")
+    parser.add_argument("--top-k", type=int, default=5, help="K for neighbour overlap")
+    parser.add_argument("--max-pairs", type=int, default=None, help="Cap on pairwise comparisons")
+    parser.add_argument(
+        "--output-dir", type=str, default=None,
+        help="Directory to write descriptor_profile_report.json",
+    )
+    args = parser.parse_args()
+
+    paths = args.paths or _sample_paths(args.sample, args.seed)
+    vectors = {profile: [] for profile in _PROFILES}
+    times = {profile: [] for profile in _PROFILES}
+    rows = []
+    for path in paths:
+        try:
+            y, _ = librosa.load(path, sr=SAMPLE_RATE, mono=True)
+            computed = {profile: _timed_compute(y, profile) for profile in _PROFILES}
+        except Exception as exc:
+            print("  skipped %s: %s" % (os.path.basename(path), exc), flush=True)
+            continue
+        for profile, (vector, seconds) in computed.items():
+            vectors[profile].append(vector)
+            times[profile].append(seconds)
+        rows.append(_compare_vectors(computed["full"][0], computed["fast"][0]))
+        print("  %s" % os.path.basename(path), flush=True)
+
+    if not rows:
+        print("No tracks compared.")
+        return
+    summary = _summarize(rows)
+    for profile in _PROFILES:
+        summary["%s_median_s" % profile] = float(np.median(times[profile]))
+    summary["top_k"] = args.top_k
+    if len(rows) > 1:
+        summary["scorers"] = _compare_scorers(
+            vectors["full"], vectors["fast"], args.top_k, args.max_pairs
+        )
+
+    print("\n%d track(s); median extraction full %.2fs, fast %.2fs (%.2fx)" % (
+        summary["tracks"], summary["full_median_s"], summary["fast_median_s"],
+        summary["full_median_s"] / summary["fast_median_s"]
+        if summary["fast_median_s"] > 0 else 0.0,
+    ))
+    print("BPM scalar mean |delta|: %.4f\n" % summary["bpm_mean_abs_delta"])
+    print("%-10s %12s %12s" % ("block", "mean cosine", "min cosine"))
+    for block, stats in summary["blocks"].items():
+        print("%-10s %12.5f %12.5f" % (block, stats["mean_cosine"], stats["min_cosine"]))
+
+    if "scorers" in summary:
+        print("\n%-32s %10s %10s %10s %10s %12s" % (
+            "scorer", "full p50", "fast p50", "mean|d|", "spearman", "top-%d overlap" % args.top_k,
+        ))
+        for scorer, stats in summary["scorers"].items():
+            print("%-32s %10.4f %10.4f %10.4f %10.4f %12.3f" % (
+                scorer,
+                stats["full"]["percentiles"]["50"],
+                stats["fast"]["percentiles"]["50"],
+                stats["mean_abs_delta"],
+                stats["spearman"],
+                stats["topk_overlap"],
+            ))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        out_path = os.path.join(args.output_dir, "descriptor_profile_report.json")
+        with open(out_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print("\nReport written to %s" % out_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""Compare fp32 and INT8 trait models on a sample of tracks.
+
+Runs the fp32 and dynamically quantized INT8 variants of EffNet, MAEST and
+the classification heads (see model_manager.load_model(..., quantized=True))
+on the same mels and reports, per trait, how far the INT8 outputs drift:
+
+- binary traits (danceability, reverb, ...): mean and max absolute delta of
+  the stored probability
+- genre, mood_theme, instruments: top-1 agreement and mean top-K overlap
+- the EffNet embedding: mean cosine similarity (heads-only recomputes use it)
+
+plus the median inference time of each variant. Use it before adding a model
+to TRAIT_QUANTIZED_MODELS.
+
+Usage:
+    # Random sample of 50 tracks from the DB
+    python -m src.scripts.feature_extraction.compare_quantized_models --sample 50
+
+    # Specific audio files
+    python -m src.scripts.feature_extraction.compare_quantized_models a.mp3 b.aiff
+
+    # Top-K for the multilabel traits, and a JSON report
+    python -m src.scripts.feature_extraction.compare_quantized_models --top-k 3 --output-dir out/
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import warnings
+
+warnings.simplefilter("ignore")
+
+import numpy as np  # noqa: E402
+
+from src.config import PROCESSED_MUSIC_DIR  # noqa: E402
+from src.db import database  # noqa: E402
+from src.feature_extraction.trait_extractor import (  # noqa: E402
+    TraitExtractor,
+    binary_prob,
+)
+from src.models.track import Track  # noqa: E402
+from src.scripts.feature_extraction.compute_track_traits import (  # noqa: E402
+    _resolve_audio_path,
+)
+from src.utils.file_operations import AUDIO_TYPES  # noqa: E402
+
+
+# Trait name -> classifier whose positive-class probability is stored
+_BINARY_TRAITS = {
+    "voice_instrumental": "voice_instrumental-discogs-effnet-1",
+    "danceability": "danceability-discogs-effnet-1",
+    "bright_dark": "timbre-discogs-effnet-1",
+    "acoustic_electronic": "nsynth_acoustic_electronic-discogs-effnet-1",
+    "tonal_atonal": "tonal_atonal-discogs-effnet-1",
+    "reverb": "nsynth_reverb-discogs-effnet-1",
+}
+
+# Trait name -> classifier for multilabel heads; genre comes from MAEST
+_MULTILABEL_TRAITS = {
+    "mood_theme": "mtg_jamendo_moodtheme-discogs-effnet-1",
+    "instruments": "mtg_jamendo_instrument-discogs-effnet-1",
+}
+
+
+def _top_k(probs, k):
+    return set(np.argsort(np.asarray(probs))[::-1][:k].tolist())
+
+
+def _compare_outputs(fp32, int8, top_k):
+    """Compare one track's (embedding, head_probs, genre_probs) triples.
+
+    Returns {"deltas": {trait: abs delta}, "top1": {trait: bool},
+    "topk": {trait: overlap fraction}, "embedding_cosine": float}. Traits
+    missing from either variant are left out.
+    """
+    fp32_emb, fp32_heads, fp32_genre = fp32
+    int8_emb, int8_heads, int8_genre = int8
+
+    deltas = {}
+    for trait, classifier in _BINARY_TRAITS.items():
+        a, b = fp32_heads.get(classifier), int8_heads.get(classifier)
+        if a is not None and b is not None:
+            deltas[trait] = abs(binary_prob(a) - binary_prob(b))
+
+    multilabel = {
+        trait: (fp32_heads.get(classifier), int8_heads.get(classifier))
+        for trait, classifier in _MULTILABEL_TRAITS.items()
+    }
+    multilabel["genre"] = (fp32_genre, int8_genre)
+
+    top1 = {}
+    topk = {}
+    for trait, (a, b) in multilabel.items():
+        if a is None or b is None:
+            continue
+        top1[trait] = int(np.argmax(a)) == int(np.argmax(b))
+        topk[trait] = len(_top_k(a, top_k) & _top_k(b, top_k)) / float(top_k)
+
+    norm = float(np.linalg.norm(fp32_emb) * np.linalg.norm(int8_emb))
+    cosine = float(np.dot(fp32_emb, int8_emb) / norm) if norm > 0 else 0.0
+
+    return {"deltas": deltas, "top1": top1, "topk": topk, "embedding_cosine": cosine}
+
+
+def _summarize(rows):
+    """Aggregate _compare_outputs() rows into per-trait statistics."""
+    summary = {"tracks": len(rows), "binary": {}, "multilabel": {}}
+    for trait in _BINARY_TRAITS:
+        values = [r["deltas"][trait] for r in rows if trait in r["deltas"]]
+        if values:
+            summary["binary"][trait] = {
+                "mean_abs_delta": float(np.mean(values)),
+                "max_abs_delta": float(np.max(values)),
+            }
+    for trait in list(_MULTILABEL_TRAITS) + ["genre"]:
+        matches = [r["top1"][trait] for r in rows if trait in r["top1"]]
+        if matches:
+            summary["multilabel"][trait] = {
+                "top1_agreement": float(np.mean(matches)),
+                "topk_overlap": float(
+                    np.mean([r["topk"][trait] for r in rows if trait in r["topk"]])
+                ),
+            }
+    if rows:
+        summary["embedding_cosine"] = float(
+            np.mean([r["embedding_cosine"] for r in rows])
+        )
+    return summary
+
+
+def _sample_paths(sample, seed):
+    session = database.create_session()
+    try:
+        file_names = [
+            t.file_name
+            for t in session.query(Track).all()
+            if os.path.splitext(t.file_name)[1].lower() in AUDIO_TYPES
+        ]
+    finally:
+        session.close()
+    file_names.sort()
+    picked = random.Random(seed).sample(file_names, min(sample, len(file_names)))
+    return [os.path.join(PROCESSED_MUSIC_DIR, f) for f in picked]
+
+
+def _prepare(extractor, path):
+    try:
+        return extractor._prepare_path(path)[0]
+    except OSError:
+        fallback = _resolve_audio_path(
+            os.path.dirname(path), os.path.basename(path)
+        )
+        if fallback is None:
+            raise
+        return extractor._prepare_path(fallback)[0]
+
+
+def _timed_infer(extractor, mel):
+    start = time.perf_counter()
+    output = extractor._infer([mel])[0]
+    return output, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fp32 and INT8 trait models")
+    parser.add_argument("paths", nargs="*", help="Audio files (default: DB sample)")
+    parser.add_argument("--sample", type=int, default=25, help="Tracks to sample from the DB")
+    parser.add_argument("--seed", type=int, default=42, help="Sampling seed")
+    parser.add_argument("--top-k", type=int, default=5, help="K for top-K agreement")
+    parser.add_argument(
+        "--output-dir", type=str, default=None,
+        help="Directory to write quantization_report.json",
+    )
+    args = parser.parse_args()
+
+    paths = args.paths or _sample_paths(args.sample, args.seed)
+    print("Loading fp32 and INT8 models...", flush=True)
+    fp32 = TraitExtractor(quantized=False)
+    int8 = TraitExtractor(quantized=True)
+
+    rows = []
+    fp32_times = []
+    int8_times = []
+    for path in paths:
+        try:
+            mel = _prepare(fp32, path)
+            fp32_out, fp32_s = _timed_infer(fp32, mel)
+            int8_out, int8_s = _timed_infer(int8, mel)
+        except Exception as exc:
+            print("  skipped %s: %s" % (os.path.basename(path), exc), flush=True)
+            continue
+        rows.append(_compare_outputs(fp32_out, int8_out, args.top_k))
+        fp32_times.append(fp32_s)
+        int8_times.append(int8_s)
+        print("  %s" % os.path.basename(path), flush=True)
+
+    summary = _summarize(rows)
+    if not rows:
+        print("No tracks compared.")
+        return
+    summary["fp32_median_s"] = float(np.median(fp32_times))
+    summary["int8_median_s"] = float(np.median(int8_times))
+    summary["top_k"] = args.top_k
+
+    print("\n%d track(s); median inference fp32 %.3fs, int8 %.3fs (%.2fx)" % (
+        summary["tracks"], summary["fp32_median_s"], summary["int8_median_s"],
+        summary["fp32_median_s"] / summary["int8_median_s"]
+        if summary["int8_median_s"] > 0 else 0.0,
+    ))
+    print("EffNet embedding cosine: %.5f\n" % summary["embedding_cosine"])
+    print("%-22s %12s %12s" % ("trait", "mean|delta|", "max|delta|"))
+    for trait, stats in summary["binary"].items():
+        print("%-22s %12.4f %12.4f" % (trait, stats["mean_abs_delta"], stats["max_abs_delta"]))
+    print("\n%-22s %12s %12s" % ("trait", "top-1 agree", "top-%d overlap" % args.top_k))
+    for trait, stats in summary["multilabel"].items():
+        print("%-22s %12.3f %12.3f" % (trait, stats["top1_agreement"], stats["topk_overlap"]))
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        out_path = os.path.join(args.output_dir, "quantization_report.json")
+        with open(out_path, "w") as f:
+            json.dump(summary, f, indent=2)
+        print("\nReport written to %s" % out_path)
+
+
+if __name__ == "__main__":
+    main()
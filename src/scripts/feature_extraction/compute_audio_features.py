@@ -0,0 +1,340 @@
+"""Batch script: compute traits and compact descriptors from a single decode.
+
+compute_track_traits and compute_compact_descriptors each decode every file
+(at 16 kHz and 44.1 kHz respectively). This runner decodes each file once at
+its native rate, resamples in memory to both rates, and persists whichever of
+the two feature sets the track is missing. Safe to re-run — tracks that
+already have both a TrackTrait and a current-version TrackDescriptor row are
+skipped (a descriptor row from another DESCRIPTOR_VERSION is overwritten).
+
+Workers claim tracks from the feature_job ledger, largest files first (see
+feature_extraction.job_ledger), so an interrupted run resumes where it
+stopped and several runs, on one machine or several, can share the work. A
+failed track is retried up to FEATURE_JOB_MAX_ATTEMPTS times. Tracks are
+decoded and inferred one at a time; for large trait backfills the batched,
+pipelined compute_track_traits is faster despite the second decode.
+
+At the end it reports the decode time spent and the estimated decode time
+saved versus running the two scripts separately, and refreshes the
+memory-mapped descriptor store if any descriptor was saved.
+
+Usage:
+    # Process all tracks missing traits and/or descriptors
+    python -m src.scripts.feature_extraction.compute_audio_features
+
+    # Queue specific track IDs (again, if done or failed); only missing
+    # feature sets are computed
+    python -m src.scripts.feature_extraction.compute_audio_features 42 101 200
+
+Environment:
+    TRAIT_WORKERS  Number of parallel worker processes (default: 2). Each worker
+                   loads the full ONNX model set when any of its tracks need
+                   traits.
+"""
+
+import gc
+import os
+import sys
+import warnings
+
+warnings.simplefilter("ignore")
+
+from multiprocessing import Pipe, Process  # noqa: E402
+from os.path import join, splitext  # noqa: E402
+
+from src.db import database  # noqa: E402
+from src.models.track import Track  # noqa: E402
+from src.models.track_descriptor import TrackDescriptor  # noqa: E402
+from src.models.track_trait import TrackTrait  # noqa: E402
+from src.config import PROCESSED_MUSIC_DIR  # noqa: E402
+from src.feature_extraction.config import (  # noqa: E402
+    DESCRIPTOR_VERSION,
+    SAMPLE_RATE,
+    TRAIT_SAMPLE_RATE,
+    TRAIT_WORKERS,
+)
+from src.feature_extraction import profiling  # noqa: E402
+from src.feature_extraction.audio_loader import decode_audio  # noqa: E402
+from src.feature_extraction.compact_descriptor import CompactDescriptor  # noqa: E402
+from src.feature_extraction.job_ledger import (  # noqa: E402
+    DONE,
+    FAILED,
+    JobLedger,
+    format_summary,
+)
+from src.feature_extraction.scheduler import file_size  # noqa: E402
+from src.scripts.feature_extraction.compute_compact_descriptors import (  # noqa: E402
+    _build_descriptor_row,
+)
+from src.scripts.feature_extraction.export_descriptor_store import (  # noqa: E402
+    refresh_store,
+)
+from src.scripts.feature_extraction.compute_track_traits import (  # noqa: E402
+    _build_trait_row,
+    _resolve_audio_path,
+    _save_embedding,
+)
+from src.utils.file_operations import AUDIO_TYPES  # noqa: E402
+from src.errors import handle  # noqa: E402
+
+
+_PROGRESS_INTERVAL = 10
+
+_JOB_TYPE = "audio_features"
+
+
+def _sample_rates(need_traits, need_descriptor):
+    rates = []
+    if need_traits:
+        rates.append(TRAIT_SAMPLE_RATE)
+    if need_descriptor:
+        rates.append(SAMPLE_RATE)
+    return rates
+
+
+def _missing_features(session, track_ids):
+    """Map track_id -> (need_traits, need_descriptor) for the given tracks."""
+    track_ids = list(track_ids)
+    trait_ids = {
+        row.track_id
+        for row in session.query(TrackTrait.track_id)
+        .filter(TrackTrait.track_id.in_(track_ids))
+        .all()
+    }
+    descriptor_ids = {
+        row.track_id
+        for row in session.query(TrackDescriptor.track_id)
+        .filter(
+            TrackDescriptor.track_id.in_(track_ids),
+            TrackDescriptor.descriptor_version == DESCRIPTOR_VERSION,
+        )
+        .all()
+    }
+    return {
+        track_id: (track_id not in trait_ids, track_id not in descriptor_ids)
+        for track_id in track_ids
+    }
+
+
+def _compute_track(session, extractor, track_id, file_name, needs, counts):
+    """Decode one track once and persist the rows it is missing.
+
+    needs is (need_traits, need_descriptor); counts accumulates the rows
+    saved and the decode seconds spent and saved. Returns None, or the
+    reason the track failed.
+    """
+    need_traits, need_descriptor = needs
+    rates = _sample_rates(need_traits, need_descriptor)
+    try:
+        with profiling.stage("decode"):
+            decoded = decode_audio(join(PROCESSED_MUSIC_DIR, file_name), rates)
+    except (FileNotFoundError, OSError):
+        fallback = _resolve_audio_path(PROCESSED_MUSIC_DIR, file_name)
+        if fallback is None:
+            return "file not found: %s" % file_name
+        with profiling.stage("decode"):
+            decoded = decode_audio(fallback, rates)
+
+    counts["decode"] += decoded.decode_seconds
+    counts["saved_decode"] += decoded.saved_decode_seconds()
+    failure = None
+
+    if need_descriptor:
+        desc = CompactDescriptor(None)
+        desc.compute(y=decoded.signal(SAMPLE_RATE))
+        if desc.global_vector is not None:
+            row = session.query(TrackDescriptor).filter_by(track_id=track_id).first()
+            if session.guarded_add(_build_descriptor_row(track_id, desc, row)):
+                counts["descriptors"] += 1
+            else:
+                failure = "descriptor row insert failed"
+
+    if need_traits:
+        traits, embedding = extractor.compute_from_signal(
+            decoded.signal(TRAIT_SAMPLE_RATE),
+            source=file_name,
+            with_embedding=True,
+        )
+        if session.guarded_add(_build_trait_row(track_id, traits)):
+            _save_embedding(session, track_id, embedding)
+            counts["traits"] += 1
+        else:
+            failure = "trait row insert failed"
+
+    return failure
+
+
+def _compute_features(ledger, result_transmitter):
+    """Worker: decode each claimed track once and persist its missing feature rows.
+
+    ledger hands out batches of (track_id, file_name) tuples (see
+    job_ledger.JobLedger.batches); what each track is missing is looked up
+    when it is claimed, and every claimed track is reported back as done or
+    failed. The ONNX sessions are loaded on the first track that needs
+    traits. Sends (traits_saved, descriptors_saved, failed, decode_seconds,
+    saved_seconds, profile) back to the parent, where profile is the
+    per-stage profiling snapshot (None unless FEATURE_TIMING).
+    """
+    from src.feature_extraction.trait_extractor import TraitExtractor
+
+    pid = os.getpid()
+    counts = {"traits": 0, "descriptors": 0, "failed": 0, "decode": 0.0, "saved_decode": 0.0}
+    extractor = None
+    worker_session = database.create_session()
+    try:
+        with ledger.keep_alive():
+            for batch in ledger.batches():
+                needs = _missing_features(worker_session, [t for t, _ in batch])
+                for track_id, file_name in batch:
+                    if not any(needs[track_id]):
+                        ledger.done([track_id])
+                        continue
+                    print("  [%d] track %d: %s" % (pid, track_id, file_name), flush=True)
+                    before = counts["traits"]
+                    try:
+                        if needs[track_id][0] and extractor is None:
+                            print("  [%d] Loading ONNX sessions..." % pid, flush=True)
+                            extractor = TraitExtractor()
+                        with profiling.track_file(file_name):
+                            failure = _compute_track(
+                                worker_session, extractor, track_id, file_name,
+                                needs[track_id], counts,
+                            )
+                    except Exception as exc:
+                        handle(exc)
+                        failure = exc
+
+                    if failure is None:
+                        ledger.done([track_id])
+                    else:
+                        print("  [%d] track %d: %s" % (pid, track_id, failure), flush=True)
+                        counts["failed"] += 1
+                        ledger.failed(track_id, failure)
+                    if counts["traits"] // _PROGRESS_INTERVAL > before // _PROGRESS_INTERVAL:
+                        print(
+                            "  [%d] saved %d traits so far" % (pid, counts["traits"]), flush=True
+                        )
+                        gc.collect()
+    finally:
+        worker_session.close()
+
+    print(
+        "<<< Worker %d done: %d traits, %d descriptors, %d failed >>>"
+        % (pid, counts["traits"], counts["descriptors"], counts["failed"]),
+        flush=True,
+    )
+    result_transmitter.send(
+        (
+            counts["traits"],
+            counts["descriptors"],
+            counts["failed"],
+            counts["decode"],
+            counts["saved_decode"],
+            profiling.drain(),
+        )
+    )
+    result_transmitter.close()
+
+
+def _get_work_items(track_ids, session):
+    """Return (track_id, file_name, need_traits, need_descriptor) per track."""
+    trait_ids = {row.track_id for row in session.query(TrackTrait.track_id).all()}
+    descriptor_ids = {
+        row.track_id
+        for row in session.query(TrackDescriptor.track_id)
+        .filter(TrackDescriptor.descriptor_version == DESCRIPTOR_VERSION)
+        .all()
+    }
+
+    items = []
+    for t in session.query(Track).all():
+        if len(track_ids) > 0 and t.id not in track_ids:
+            continue
+        if splitext(t.file_name)[1].lower() not in AUDIO_TYPES:
+            continue
+        need_traits = t.id not in trait_ids
+        need_descriptor = t.id not in descriptor_ids
+        if need_traits or need_descriptor:
+            items.append((t.id, t.file_name, need_traits, need_descriptor))
+    return items
+
+
+def run(track_ids, session):
+    try:
+        items = _get_work_items(track_ids, session)
+        print(
+            "Computing features for %d track(s): %d need traits, %d need descriptors"
+            % (
+                len(items),
+                sum(1 for i in items if i[2]),
+                sum(1 for i in items if i[3]),
+            )
+        )
+        if not items:
+            return
+
+        ledger = JobLedger(_JOB_TYPE)
+        num_tracks = ledger.prepare(
+            (
+                (track_id, file_size(join(PROCESSED_MUSIC_DIR, file_name)))
+                for track_id, file_name, _, _ in items
+            ),
+            # A done job whose rows have since been deleted is redone
+            requeue=(DONE, FAILED) if len(track_ids) > 0 else (DONE,),
+        )
+        del items
+        print("%d track(s) queued" % num_tracks)
+        if num_tracks == 0:
+            return
+
+        n_workers = min(TRAIT_WORKERS, num_tracks)
+        print("Using %d worker(s) (TRAIT_WORKERS=%d)\n" % (n_workers, TRAIT_WORKERS))
+
+        workers = []
+        aggregators = []
+        for _ in range(n_workers):
+            receiver, transmitter = Pipe(duplex=False)
+            aggregators.append(receiver)
+            worker = Process(target=_compute_features, args=(ledger, transmitter))
+            worker.daemon = True
+            workers.append(worker)
+            worker.start()
+            transmitter.close()
+
+        worker_results = [agg.recv() for agg in aggregators]
+
+        for worker in workers:
+            worker.join()
+        for agg in aggregators:
+            agg.close()
+
+        total_traits = sum(r[0] for r in worker_results)
+        total_descriptors = sum(r[1] for r in worker_results)
+        total_failed = sum(r[2] for r in worker_results)
+        total_decode = sum(r[3] for r in worker_results)
+        total_saved = sum(r[4] for r in worker_results)
+
+        print(
+            "\nDone. %d traits saved, %d descriptors saved, %d failed."
+            % (total_traits, total_descriptors, total_failed)
+        )
+        print(
+            "Decoding took %.1fs; single-decode saved an estimated %.1fs."
+            % (total_decode, total_saved)
+        )
+        print("Ledger: %s" % format_summary(ledger.summary()))
+        profiling.report([r[5] for r in worker_results])
+        if total_descriptors:
+            refresh_store(session)
+
+    except Exception as exc:
+        handle(exc)
+        session.rollback()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    _session = database.create_session()
+    _args = sys.argv
+    run(set(int(t) for t in _args[1:]) if len(_args) > 1 else set(), _session)
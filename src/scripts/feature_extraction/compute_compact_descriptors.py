@@ -1,139 +1,310 @@
 """Batch script: compute compact audio descriptors for all unprocessed tracks.
 
-Each worker saves descriptors directly to the DB as it goes, so progress is
-visible in real time and a crash only loses the track currently being computed.
-The script is safe to re-run — already-processed tracks are skipped.
+The parent claims small batches of tracks from the feature_job ledger,
+largest files first (see feature_extraction.job_ledger), and feeds them to a
+process pool of DESCRIPTOR_WORKERS workers. Workers only receive
+(track_id, file_name) tuples and return the computed descriptor; each is
+replaced after DESCRIPTOR_MAX_TASKS_PER_CHILD tracks so memory held by the
+44.1 kHz decodes and HPSS copies cannot build up. At most two tracks per
+worker are in flight, and the parent writes finished rows in groups of
+DESCRIPTOR_WRITE_BATCH, so progress is visible in real time and a crash only
+loses the tracks in flight. The script is safe to re-run — tracks that
+already have a descriptor at the current DESCRIPTOR_VERSION are skipped and
+an interrupted run resumes from the ledger; several runs can share it. A
+track's row from another descriptor version (e.g. after switching
+DESCRIPTOR_PROFILE) is overwritten in place.
 
 Usage:
-    # Process all tracks that have no descriptor yet
+    # Process all tracks that have no current-version descriptor yet
     python -m src.scripts.feature_extraction.compute_compact_descriptors
 
-    # Process specific track IDs
+    # Queue specific track IDs (again, if done or failed) and work the queue
     python -m src.scripts.feature_extraction.compute_compact_descriptors 42 101 200
+
+Environment:
+    DESCRIPTOR_WORKERS              Pool size (default: min(4, CPU count)).
+    DESCRIPTOR_MAX_TASKS_PER_CHILD  Tracks per worker before it is replaced
+                                    (default: 25).
+    DESCRIPTOR_WRITE_BATCH          Descriptor rows per commit (default: 32).
+    DESCRIPTOR_TASK_TIMEOUT         Seconds before an unfinished track is
+                                    failed (default: 1800).
+    FEATURE_TIMING                  Set to 1 to print per-stage timings (p50/p95
+                                    per stage and per file) at the end.
+
+When any descriptor was saved, the memory-mapped descriptor store is
+refreshed at the end (see export_descriptor_store).
 """
 
 import datetime
+import queue
 import sys
+import time
 import warnings
 
 warnings.simplefilter("ignore")
 
-from multiprocessing import Pipe, Process  # noqa: E402
-from os import getpid  # noqa: E402
+from multiprocessing import Pool  # noqa: E402
 from os.path import join, splitext  # noqa: E402
 
-import numpy as np  # noqa: E402
-
 from src.db import database  # noqa: E402
 from src.models.track import Track  # noqa: E402
 from src.models.track_descriptor import TrackDescriptor  # noqa: E402
-from src.config import NUM_CORES, PROCESSED_MUSIC_DIR  # noqa: E402
+from src.config import PROCESSED_MUSIC_DIR  # noqa: E402
 from src.utils.file_operations import AUDIO_TYPES  # noqa: E402
 from src.errors import handle  # noqa: E402
+from src.feature_extraction import profiling  # noqa: E402
 from src.feature_extraction.compact_descriptor import CompactDescriptor  # noqa: E402
+from src.feature_extraction.config import (  # noqa: E402
+    DESCRIPTOR_MAX_TASKS_PER_CHILD,
+    DESCRIPTOR_TASK_TIMEOUT,
+    DESCRIPTOR_VERSION,
+    DESCRIPTOR_WORKERS,
+    DESCRIPTOR_WRITE_BATCH,
+)
+from src.feature_extraction.job_ledger import (  # noqa: E402
+    DONE,
+    FAILED,
+    JobLedger,
+    format_summary,
+)
+from src.feature_extraction.scheduler import file_size  # noqa: E402
+from src.scripts.feature_extraction.export_descriptor_store import (  # noqa: E402
+    refresh_store,
+)
 
 
 _PROGRESS_INTERVAL = 100
 
+# Per descriptor version, so jobs finished under one profile do not block
+# the other
+_JOB_TYPE = "descriptors:%s" % DESCRIPTOR_VERSION
+
+# Tracks per claimed batch; small so the tail of the run stays balanced
+_WORK_BATCH_SIZE = 4
+
+# Seconds between checks for overdue tracks while waiting on the pool
+_POLL_SECONDS = 10
+
+
+def _build_descriptor_row(track_id, desc, row=None):
+    """Fill a TrackDescriptor row from a computed CompactDescriptor.
+
+    row is the track's existing row, if any (track_id is unique, so a row
+    from another descriptor version is overwritten in place); None builds a
+    new one.
+    """
+    if row is None:
+        row = TrackDescriptor(track_id=track_id)
+    row.global_vector = desc.pack_global()
+    row.intro_vector = desc.pack_intro()
+    row.outro_vector = desc.pack_outro()
+    row.descriptor_version = desc.version
+    row.computed_at = datetime.datetime.utcnow()
+    return row
+
+
+def _existing_rows(session, track_ids):
+    """Map track_id -> existing TrackDescriptor row for the given tracks."""
+    return {
+        row.track_id: row
+        for row in session.query(TrackDescriptor)
+        .filter(TrackDescriptor.track_id.in_(list(track_ids)))
+        .all()
+    }
+
+
+def _describe(item):
+    """Pool task: compute the descriptor for one (track_id, file_name) tuple.
 
-def _compute_descriptors(chunk, result_transmitter):
-    """Worker: compute and immediately persist one descriptor per track."""
-    worker_session = database.create_session()
-    n_saved = 0
-    n_skipped = 0
-    n_failed = 0
-    pid = getpid()
-    recent_saved_ids = []
-
-    for track in chunk:
-        try:
-            audio_path = join(PROCESSED_MUSIC_DIR, track.file_name)
-            print("  [%d] track %d: %s" % (pid, track.id, track.file_name), flush=True)
-
-            desc = CompactDescriptor(track)
-            desc.compute(audio_path=audio_path)
-
-            if desc.global_vector is None:
-                n_skipped += 1
-                continue
-
-            row = TrackDescriptor(
-                track_id=track.id,
-                global_vector=desc.pack_global(),
-                intro_vector=desc.pack_intro(),
-                outro_vector=desc.pack_outro(),
-                descriptor_version=desc.version,
-                computed_at=datetime.datetime.utcnow(),
-            )
-            if worker_session.guarded_add(row):
-                n_saved += 1
-                recent_saved_ids.append(track.id)
-                if n_saved % _PROGRESS_INTERVAL == 0:
-                    print(
-                        "  [%d] saved %d so far — last %d IDs: %s"
-                        % (pid, n_saved, len(recent_saved_ids[-_PROGRESS_INTERVAL:]),
-                           recent_saved_ids[-_PROGRESS_INTERVAL:]),
-                        flush=True,
-                    )
-            else:
-                n_failed += 1
-
-        except Exception as exc:
-            handle(exc)
-            n_failed += 1
-
-    worker_session.close()
-    print(
-        "<<< Worker %d done: %d saved, %d skipped, %d failed >>>"
-        % (pid, n_saved, n_skipped, n_failed),
-        flush=True,
-    )
-    result_transmitter.send((n_saved, n_skipped, n_failed))
-
-
-def run(track_ids):
+    Returns (track_id, descriptor, error, timings). descriptor is None when
+    nothing could be computed, with error set if an exception was raised; the
+    task itself never raises, so one bad file cannot break the pool. timings
+    is the worker's profiling snapshot for this track (None unless
+    FEATURE_TIMING), returned per task since pool workers are recycled.
+    """
+    track_id, file_name = item
     try:
+        desc = CompactDescriptor(None)
+        desc.compute(audio_path=join(PROCESSED_MUSIC_DIR, file_name))
+    except Exception as exc:
+        return track_id, None, "%s: %s" % (type(exc).__name__, exc), profiling.drain()
+    if desc.global_vector is None:
+        return track_id, None, None, profiling.drain()
+    return track_id, desc, None, profiling.drain()
+
+
+def _commit_descriptors(session, ledger, items, counts):
+    """Write (track_id, descriptor) items with one commit, then mark their
+    jobs done.
+
+    If the group fails (e.g. a duplicate track_id), it is rolled back and
+    retried row by row with guarded_add, so one bad row only fails itself.
+    Ledger errors are raised to the caller; they never trigger the retry.
+    """
+    existing = {}
+    try:
+        existing = _existing_rows(session, [track_id for track_id, _ in items])
+        for track_id, desc in items:
+            session.add(_build_descriptor_row(track_id, desc, existing.get(track_id)))
+        session.commit()
+    except Exception as exc:
+        handle(
+            exc,
+            "Failed to insert %d descriptor rows; retrying one at a time" % len(items),
+            print,
+            False,
+        )
+        session.rollback()
+    else:
+        counts["saved"] += len(items)
+        ledger.done(track_id for track_id, _ in items)
+        return
+
+    saved = []
+    for track_id, desc in items:
+        row = _build_descriptor_row(track_id, desc, existing.get(track_id))
+        if session.guarded_add(row):
+            counts["saved"] += 1
+            saved.append(track_id)
+        else:
+            counts["failed"] += 1
+            ledger.failed(track_id, "descriptor row insert failed")
+    ledger.done(saved)
+
+
+def _work_ledger(ledger, n_workers):
+    """Compute descriptors for every claimable track on a process pool.
+
+    Runs in the calling process, which claims from the ledger, renews its
+    leases and writes the rows; returns (saved, skipped, failed, timings),
+    where timings lists the workers' profiling snapshots.
+    """
+    counts = {"saved": 0, "skipped": 0, "failed": 0}
+    timings = []
+    finished = queue.Queue()
+    in_flight = {}  # track_id -> submit time
+    pending_rows = []
+    batches = ledger.batches()
+    claiming = True
+    abandoned = False
+    session = database.create_session()
+    pool = Pool(n_workers, maxtasksperchild=max(DESCRIPTOR_MAX_TASKS_PER_CHILD, 1))
+
+    try:
+        with ledger.keep_alive():
+            while True:
+                while claiming and len(in_flight) < 2 * n_workers:
+                    batch = next(batches, None)
+                    if batch is None:
+                        claiming = False
+                        break
+                    for item in batch:
+                        in_flight[item[0]] = time.monotonic()
+                        pool.apply_async(_describe, (item,), callback=finished.put)
+                if not in_flight:
+                    break
+
+                try:
+                    track_id, desc, error, snapshot = finished.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    # A worker that died mid-task never reports back
+                    cutoff = time.monotonic() - DESCRIPTOR_TASK_TIMEOUT
+                    for track_id in [t for t, began in in_flight.items() if began < cutoff]:
+                        del in_flight[track_id]
+                        abandoned = True
+                        counts["failed"] += 1
+                        ledger.failed(track_id, "timed out after %gs" % DESCRIPTOR_TASK_TIMEOUT)
+                    # The last task may have timed out with rows still pending
+                    if pending_rows and not in_flight:
+                        _commit_descriptors(session, ledger, pending_rows, counts)
+                        pending_rows = []
+                    continue
+
+                if snapshot is not None:
+                    timings.append(snapshot)
+                if in_flight.pop(track_id, None) is None:
+                    continue  # already timed out
+                if desc is not None:
+                    pending_rows.append((track_id, desc))
+                elif error is None:
+                    counts["skipped"] += 1
+                    ledger.failed(track_id, "no descriptor computed")
+                else:
+                    print("  track %d: %s" % (track_id, error), flush=True)
+                    counts["failed"] += 1
+                    ledger.failed(track_id, error)
+
+                if len(pending_rows) >= max(DESCRIPTOR_WRITE_BATCH, 1) or (
+                    pending_rows and not in_flight
+                ):
+                    before = counts["saved"]
+                    _commit_descriptors(session, ledger, pending_rows, counts)
+                    pending_rows = []
+                    if counts["saved"] // _PROGRESS_INTERVAL > before // _PROGRESS_INTERVAL:
+                        print("  saved %d descriptors so far" % counts["saved"], flush=True)
+    finally:
+        if abandoned or in_flight:
+            pool.terminate()
+        else:
+            pool.close()
+        pool.join()
+        session.close()
+
+    return counts["saved"], counts["skipped"], counts["failed"], timings
+
+
+def run(track_ids, session):
+    try:
+        tracks = session.query(Track.id, Track.file_name).all()
         if len(track_ids) > 0:
-            tracks_to_process = [t for t in tracks if t.id in track_ids]
+            tracks_to_process = [(t.id, t.file_name) for t in tracks if t.id in track_ids]
+            requeue = (DONE, FAILED)
         else:
             existing_ids = {
-                row.track_id for row in session.query(TrackDescriptor).all()
+                row.track_id
+                for row in session.query(TrackDescriptor.track_id)
+                .filter(TrackDescriptor.descriptor_version == DESCRIPTOR_VERSION)
+                .all()
             }
             tracks_to_process = [
-                t for t in tracks
+                (t.id, t.file_name) for t in tracks
                 if t.id not in existing_ids
                 and splitext(t.file_name)[1].lower() in AUDIO_TYPES
             ]
+            # A done job whose row has since been deleted is redone
+            requeue = (DONE,)
+        del tracks
+        if not tracks_to_process:
+            print("Computing compact descriptors for 0 track(s)\n")
+            return
 
-        num_tracks = len(tracks_to_process)
-        print("Computing compact descriptors for %d track(s)\n" % num_tracks)
+        ledger = JobLedger(_JOB_TYPE, _WORK_BATCH_SIZE)
+        num_tracks = ledger.prepare(
+            (
+                (track_id, file_size(join(PROCESSED_MUSIC_DIR, file_name)))
+                for track_id, file_name in tracks_to_process
+            ),
+            requeue=requeue,
+        )
+        print("Computing compact descriptors for %d queued track(s)" % num_tracks)
         if num_tracks == 0:
             return
 
-        chunks = np.array_split(tracks_to_process, min(NUM_CORES, num_tracks))
-        workers = []
-        aggregators = []
-
-        for chunk in chunks:
-            receiver, transmitter = Pipe()
-            aggregators.append(receiver)
-            worker = Process(
-                target=_compute_descriptors,
-                args=(chunk, transmitter),
-            )
-            worker.daemon = True
-            workers.append(worker)
-            worker.start()
-
-        worker_results = [agg.recv() for agg in aggregators]
-        total_saved = sum(n for n, _, _ in worker_results)
-        total_skipped = sum(n for _, n, _ in worker_results)
-        total_failed = sum(n for _, _, n in worker_results)
+        n_workers = max(min(DESCRIPTOR_WORKERS, num_tracks), 1)
+        print(
+            "Using a pool of %d worker(s) (DESCRIPTOR_WORKERS=%d)\n"
+            % (n_workers, DESCRIPTOR_WORKERS)
+        )
+        total_saved, total_skipped, total_failed, timings = _work_ledger(ledger, n_workers)
 
         print(
             "\nDone. %d saved, %d skipped, %d failed."
             % (total_saved, total_skipped, total_failed)
         )
+        print("Ledger: %s" % format_summary(ledger.summary()))
+        profiling.report(timings)
+        if total_saved:
+            refresh_store(session)
 
     except Exception as exc:
         handle(exc)
@@ -144,8 +315,6 @@ def run(track_ids):
 
 
 if __name__ == "__main__":
-    session = database.create_session()
-    tracks = list(session.query(Track).all())
-
-    args = sys.argv
-    run(set(int(t) for t in args[1:]) if len(args) > 1 else set())
+    _session = database.create_session()
+    _args = sys.argv
+    run(set(int(t) for t in _args[1:]) if len(_args) > 1 else set(), _session)
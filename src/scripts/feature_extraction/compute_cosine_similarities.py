@@ -2,14 +2,20 @@
 
 For each track, finds harmonic-match candidates via TransitionMatchFinder,
 computes cosine similarity between compact descriptor vectors, and stores
-one row per unordered pair (min_id, max_id). Already-computed pairs are
-skipped, so the script is safe to re-run.
+one row per unordered pair (min_id, max_id). Source tracks are claimed from
+the feature_job ledger (see feature_extraction.job_ledger), so an interrupted
+run resumes where it stopped and several runs can share the work.
+Already-computed pairs are skipped, so the script is safe to re-run.
+Descriptor vectors are read from the memory-mapped descriptor store, which
+is refreshed before the workers start (see export_descriptor_store); vectors
+recomputed since then (e.g. by run_worker on another node) are read from
+track_descriptor.
 
 Usage:
     # Process all tracks that have current-version descriptors
     python -m src.scripts.feature_extraction.compute_cosine_similarities
 
-    # Process specific track IDs
+    # Queue specific track IDs (again, if done or failed) and work the queue
     python -m src.scripts.feature_extraction.compute_cosine_similarities 42 101 200
 
     # Force recompute all existing pairs (e.g. after changing the default scorer)
@@ -29,6 +35,8 @@ warnings.simplefilter("ignore")
 
 from multiprocessing import Pipe, Process  # noqa: E402
 
+import numpy as np  # noqa: E402
+
 from sqlalchemy import or_  # noqa: E402
 from sqlalchemy.dialects.postgresql import insert as pg_insert  # noqa: E402
 
@@ -38,27 +46,30 @@ from src.models.track_descriptor import TrackDescriptor  # noqa: E402
 from src.models.track_cosine_similarity import TrackCosineSimilarity  # noqa: E402
 from src.feature_extraction.config import COSINE_WORKERS, DESCRIPTOR_VERSION  # noqa: E402
 from src.feature_extraction.compact_descriptor import unpack_vector  # noqa: E402
-from src.feature_extraction.track_similarity import ScorerName, compute_similarity  # noqa: E402
+from src.feature_extraction.descriptor_store import DescriptorStore  # noqa: E402
+from src.feature_extraction.job_ledger import (  # noqa: E402
+    DONE,
+    FAILED,
+    JobLedger,
+    format_summary,
+)
+from src.feature_extraction.track_similarity import ScorerName, score_many  # noqa: E402
 from src.harmonic_mixing.transition_match_finder import TransitionMatchFinder  # noqa: E402
 from src.data_management.config import TrackDBCols  # noqa: E402
+from src.scripts.feature_extraction.export_descriptor_store import (  # noqa: E402
+    refresh_store,
+)
 from src.errors import handle  # noqa: E402
 
 
 _PROGRESS_INTERVAL = 10
 
+# One ledger per descriptor version, so a version bump starts a fresh run
+_JOB_TYPE = "cosine:%s" % DESCRIPTOR_VERSION
 
-def _chunkify(lst, n):
-    """Split lst into n roughly equal non-empty chunks."""
-    if not lst:
-        return []
-    n = min(n, len(lst))
-    size, rem = divmod(len(lst), n)
-    chunks, i = [], 0
-    for k in range(n):
-        extra = 1 if k < rem else 0
-        chunks.append(lst[i : i + size + extra])
-        i += size + extra
-    return [c for c in chunks if c]
+# Track IDs per claimed batch. Cost follows the number of harmonic
+# candidates rather than file size, so IDs are queued in order.
+_WORK_BATCH_SIZE = 8
 
 
 def _extract_candidate_ids(matches_result, source_track_id):
@@ -93,10 +104,43 @@ def _classify_existing_pairs(rows, descriptor_version):
     return existing, stale
 
 
-def _compute_cosine_batch(chunk, all_track_ids, result_transmitter, scorer_name=None, force=False):
-    """Worker: compute cosine similarities for a chunk of track IDs.
+def _load_vectors(session, store, track_ids):
+    """{track_id: global vector} from the descriptor store, falling back to
+    track_descriptor rows for IDs the store does not hold."""
+    vectors = store.vectors_for(track_ids) if store is not None else {}
+    missing = [track_id for track_id in track_ids if track_id not in vectors]
+    if missing:
+        for row in (
+            session.query(TrackDescriptor.track_id, TrackDescriptor.global_vector)
+            .filter(
+                TrackDescriptor.track_id.in_(missing),
+                TrackDescriptor.descriptor_version == DESCRIPTOR_VERSION,
+            )
+            .all()
+        ):
+            vectors[row.track_id] = unpack_vector(row.global_vector)
+    return vectors
+
+
+def _score_candidates(source_vec, cand_vecs, scorer_name=None):
+    """{candidate_id: similarity} for every vector in cand_vecs, from one
+    score_many() call."""
+    if not cand_vecs:
+        return {}
+    cand_ids = list(cand_vecs)
+    scores = score_many(
+        source_vec,
+        np.stack([cand_vecs[cand_id] for cand_id in cand_ids]),
+        scorer=scorer_name or ScorerName.LATE_FUSION_V1,
+    )
+    return dict(zip(cand_ids, scores.tolist()))
+
+
+def _compute_cosine_batch(ledger, all_track_ids, result_transmitter, scorer_name=None, force=False):
+    """Worker: compute cosine similarities for track IDs claimed from ledger.
 
-    all_track_ids is the full set of IDs being processed across all workers.
+    all_track_ids is the full set of IDs queued for this run across all
+    workers.
     When a candidate is also in all_track_ids, only the source with the
     smaller ID inserts the pair — this eliminates cross-worker races on
     symmetric harmonic matches.
@@ -107,159 +151,170 @@ def _compute_cosine_batch(chunk, all_track_ids, result_transmitter, scorer_name=
     n_failed = 0
     print("  [%d] Initializing TransitionMatchFinder..." % pid, flush=True)
     worker_session = database.create_session()
+    store = DescriptorStore.open()
 
     try:
+        if store is not None:
+            store.verify(worker_session)
         finder = TransitionMatchFinder(session=worker_session)
     except Exception as exc:
+        # The other workers drain the ledger
         handle(exc)
-        result_transmitter.send((0, 0, len(chunk)))
+        result_transmitter.send((0, 0, 0))
         result_transmitter.close()
         return
 
-    print("  [%d] Ready, processing %d tracks." % (pid, len(chunk)), flush=True)
+    print("  [%d] Ready, processing queued tracks." % pid, flush=True)
 
     try:
-        for idx, track_id in enumerate(chunk):
-            try:
-                track = worker_session.query(Track).filter_by(id=track_id).first()
-                if track is None:
-                    print(
-                        "  [%d] track %d: not found in DB" % (pid, track_id),
-                        flush=True,
-                    )
-                    n_failed += 1
-                    continue
-
-                source_desc = (
-                    worker_session.query(TrackDescriptor)
-                    .filter_by(track_id=track_id, descriptor_version=DESCRIPTOR_VERSION)
-                    .first()
-                )
-                if source_desc is None:
-                    print(
-                        "  [%d] track %d: no descriptor (v%s)"
-                        % (pid, track_id, DESCRIPTOR_VERSION),
-                        flush=True,
-                    )
-                    n_skipped += 1
-                    continue
-
-                source_vec = unpack_vector(source_desc.global_vector)
-
-                result = finder.get_transition_matches(track, sort_results=False)
-                if result is None:
-                    n_failed += 1
-                    continue
-
-                candidates = _extract_candidate_ids(result, track_id)
-                if not candidates:
-                    continue
-
-                cosine_rows = (
-                    worker_session.query(TrackCosineSimilarity)
-                    .filter(
-                        or_(
-                            TrackCosineSimilarity.id1 == track_id,
-                            TrackCosineSimilarity.id2 == track_id,
-                        )
-                    )
-                    .all()
-                )
-                existing_pairs, stale_pair_keys = _classify_existing_pairs(
-                    cosine_rows, DESCRIPTOR_VERSION
-                )
-                if force:
-                    stale_pair_keys |= existing_pairs
-                    existing_pairs = set()
-
-                cand_descs = {
-                    d.track_id: d
-                    for d in worker_session.query(TrackDescriptor)
-                    .filter(
-                        TrackDescriptor.track_id.in_(list(candidates)),
-                        TrackDescriptor.descriptor_version == DESCRIPTOR_VERSION,
-                    )
-                    .all()
-                }
-
-                track_saved = 0
-                for cand_id in candidates:
+        with ledger.keep_alive():
+            for batch in ledger.batches():
+                for track_id, _ in batch:
                     try:
-                        if cand_id in all_track_ids and cand_id < track_id:
-                            n_skipped += 1
+                        track = worker_session.query(Track).filter_by(id=track_id).first()
+                        if track is None:
+                            print(
+                                "  [%d] track %d: not found in DB" % (pid, track_id),
+                                flush=True,
+                            )
+                            n_failed += 1
+                            ledger.failed(track_id, "track not found")
                             continue
 
-                        id1, id2 = _ordered_pair(track_id, cand_id)
-
-                        if (id1, id2) in existing_pairs:
+                        source_vec = _load_vectors(worker_session, store, [track_id]).get(
+                            track_id
+                        )
+                        if source_vec is None:
+                            print(
+                                "  [%d] track %d: no descriptor (v%s)"
+                                % (pid, track_id, DESCRIPTOR_VERSION),
+                                flush=True,
+                            )
                             n_skipped += 1
+                            ledger.done([track_id])
                             continue
 
-                        cand_desc = cand_descs.get(cand_id)
-                        if cand_desc is None:
+                        result = finder.get_transition_matches(track, sort_results=False)
+                        if result is None:
+                            n_failed += 1
+                            ledger.failed(track_id, "no transition matches")
                             continue
 
-                        cand_vec = unpack_vector(cand_desc.global_vector)
-                        if scorer_name is not None:
-                            sim = compute_similarity(source_vec, cand_vec, scorer=scorer_name)
-                        else:
-                            sim = compute_similarity(source_vec, cand_vec)
+                        candidates = _extract_candidate_ids(result, track_id)
+                        if not candidates:
+                            ledger.done([track_id])
+                            continue
 
-                        if (id1, id2) in stale_pair_keys:
-                            try:
-                                worker_session.query(TrackCosineSimilarity).filter_by(
-                                    id1=id1, id2=id2
-                                ).update(
-                                    {
-                                        "cosine_similarity": sim,
-                                        "descriptor_version": DESCRIPTOR_VERSION,
-                                    }
+                        cosine_rows = (
+                            worker_session.query(TrackCosineSimilarity)
+                            .filter(
+                                or_(
+                                    TrackCosineSimilarity.id1 == track_id,
+                                    TrackCosineSimilarity.id2 == track_id,
                                 )
-                                worker_session.commit()
-                                n_saved += 1
-                                track_saved += 1
-                                stale_pair_keys.discard((id1, id2))
-                                existing_pairs.add((id1, id2))
-                            except Exception as exc:
-                                handle(exc)
-                                worker_session.rollback()
-                                n_failed += 1
-                        else:
-                            stmt = pg_insert(TrackCosineSimilarity).values(
-                                id1=id1,
-                                id2=id2,
-                                cosine_similarity=sim,
-                                descriptor_version=DESCRIPTOR_VERSION,
-                            ).on_conflict_do_nothing(
-                                index_elements=["id1", "id2"]
                             )
+                            .all()
+                        )
+                        existing_pairs, stale_pair_keys = _classify_existing_pairs(
+                            cosine_rows, DESCRIPTOR_VERSION
+                        )
+                        if force:
+                            stale_pair_keys |= existing_pairs
+                            existing_pairs = set()
+
+                        cand_vecs = _load_vectors(worker_session, store, list(candidates))
+                        cand_scores = _score_candidates(
+                            source_vec,
+                            {
+                                cand_id: vec
+                                for cand_id, vec in cand_vecs.items()
+                                if not (cand_id in all_track_ids and cand_id < track_id)
+                                and _ordered_pair(track_id, cand_id) not in existing_pairs
+                            },
+                            scorer_name,
+                        )
+
+                        track_saved = 0
+                        failed_before = n_failed
+                        for cand_id in candidates:
                             try:
-                                result = worker_session.session.execute(stmt)
-                                worker_session.commit()
-                                if result.rowcount > 0:
-                                    n_saved += 1
-                                    track_saved += 1
-                                else:
+                                if cand_id in all_track_ids and cand_id < track_id:
                                     n_skipped += 1
-                                existing_pairs.add((id1, id2))
+                                    continue
+
+                                id1, id2 = _ordered_pair(track_id, cand_id)
+
+                                if (id1, id2) in existing_pairs:
+                                    n_skipped += 1
+                                    continue
+
+                                sim = cand_scores.get(cand_id)
+                                if sim is None:
+                                    continue
+
+                                if (id1, id2) in stale_pair_keys:
+                                    try:
+                                        worker_session.query(TrackCosineSimilarity).filter_by(
+                                            id1=id1, id2=id2
+                                        ).update(
+                                            {
+                                                "cosine_similarity": sim,
+                                                "descriptor_version": DESCRIPTOR_VERSION,
+                                            }
+                                        )
+                                        worker_session.commit()
+                                        n_saved += 1
+                                        track_saved += 1
+                                        stale_pair_keys.discard((id1, id2))
+                                        existing_pairs.add((id1, id2))
+                                    except Exception as exc:
+                                        handle(exc)
+                                        worker_session.rollback()
+                                        n_failed += 1
+                                else:
+                                    stmt = pg_insert(TrackCosineSimilarity).values(
+                                        id1=id1,
+                                        id2=id2,
+                                        cosine_similarity=sim,
+                                        descriptor_version=DESCRIPTOR_VERSION,
+                                    ).on_conflict_do_nothing(
+                                        index_elements=["id1", "id2"]
+                                    )
+                                    try:
+                                        result = worker_session.session.execute(stmt)
+                                        worker_session.commit()
+                                        if result.rowcount > 0:
+                                            n_saved += 1
+                                            track_saved += 1
+                                        else:
+                                            n_skipped += 1
+                                        existing_pairs.add((id1, id2))
+                                    except Exception as exc:
+                                        handle(exc)
+                                        worker_session.rollback()
+                                        n_failed += 1
+
                             except Exception as exc:
                                 handle(exc)
-                                worker_session.rollback()
                                 n_failed += 1
 
+                        print(
+                            "  [%d] track %d: %d candidates, %d new"
+                            % (pid, track_id, len(candidates), track_saved),
+                            flush=True,
+                        )
+                        if n_failed > failed_before:
+                            # Pairs already stored are skipped on the retry
+                            ledger.failed(
+                                track_id, "%d pair(s) failed" % (n_failed - failed_before)
+                            )
+                        else:
+                            ledger.done([track_id])
+
                     except Exception as exc:
                         handle(exc)
                         n_failed += 1
-
-                print(
-                    "  [%d] track %d: %d candidates, %d new"
-                    % (pid, track_id, len(candidates), track_saved),
-                    flush=True,
-                )
-
-            except Exception as exc:
-                handle(exc)
-                n_failed += 1
+                        ledger.failed(track_id, exc)
 
     finally:
         worker_session.close()
@@ -274,10 +329,11 @@ def _compute_cosine_batch(chunk, all_track_ids, result_transmitter, scorer_name=
 
 
 def _get_tracks_for_processing(track_ids, session):
-    """Determine which track IDs to process.
+    """Determine which track IDs to queue.
 
     When explicit IDs are provided, uses those directly. In batch mode,
-    selects all tracks with current-version descriptors; per-pair
+    selects all tracks with current-version descriptors; tracks whose job
+    is already done are left alone by the ledger, and per-pair
     deduplication in the worker handles already-computed pairs.
     """
     if track_ids:
@@ -293,26 +349,35 @@ def _get_tracks_for_processing(track_ids, session):
 def run(track_ids, session, scorer_name=None, force=False):
     try:
         tracks_to_process = _get_tracks_for_processing(track_ids, session)
+        if not tracks_to_process:
+            print("Computing cosine similarities for 0 track(s)")
+            return
 
-        num_tracks = len(tracks_to_process)
-        print("Computing cosine similarities for %d track(s)" % num_tracks)
+        ledger = JobLedger(_JOB_TYPE, _WORK_BATCH_SIZE)
+        num_tracks = ledger.prepare(
+            ((track_id, 0) for track_id in tracks_to_process),
+            requeue=(DONE, FAILED) if track_ids or force else (),
+        )
+        print("Computing cosine similarities for %d queued track(s)" % num_tracks)
         if num_tracks == 0:
             return
 
+        # Workers read vectors from the store; rows it lacks come from the DB
+        refresh_store(session)
+
         n_workers = min(COSINE_WORKERS, num_tracks)
         print("Using %d worker(s) (COSINE_WORKERS=%d)\n" % (n_workers, COSINE_WORKERS))
-        chunks = _chunkify(tracks_to_process, n_workers)
-        all_track_ids = frozenset(tracks_to_process)
+        all_track_ids = frozenset(ledger.pending_track_ids())
 
         workers = []
         aggregators = []
 
-        for chunk in chunks:
+        for _ in range(n_workers):
             receiver, transmitter = Pipe(duplex=False)
             aggregators.append(receiver)
             worker = Process(
                 target=_compute_cosine_batch,
-                args=(chunk, all_track_ids, transmitter, scorer_name, force),
+                args=(ledger, all_track_ids, transmitter, scorer_name, force),
             )
             worker.daemon = True
             workers.append(worker)
@@ -335,6 +400,7 @@ def run(track_ids, session, scorer_name=None, force=False):
             "\nDone. %d saved, %d skipped, %d failed."
             % (total_saved, total_skipped, total_failed)
         )
+        print("Ledger: %s" % format_summary(ledger.summary()))
 
     except Exception as exc:
         handle(exc)
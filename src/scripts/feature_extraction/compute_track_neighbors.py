@@ -0,0 +1,189 @@
+"""Batch script: precompute every track's top-K most similar tracks.
+
+Scores the whole library against itself with the tiled all-pairs engine
+(see feature_extraction.all_pairs) over the memory-mapped descriptor store,
+which is refreshed first, and writes one track_neighbors row per track: the
+IDs and scores of its TRACK_NEIGHBORS_K best-scoring other tracks, best
+first. Unlike track_cosine_similarity (one row per pair, only for harmonic
+match candidates), a track's neighbourhood is a single primary-key lookup;
+the mixing assistant's cosine cache seeds its warm-up from it with two
+queries before scanning pairs. Lists are always scored with late_fusion_v1,
+the scorer the cache reads, since rows are keyed by track alone. Rows this
+run did not write (tracks that no longer have a current-version descriptor)
+are deleted. Safe to re-run.
+
+Usage:
+    # Exact top-K over every pair
+    python -m src.scripts.feature_extraction.compute_track_neighbors
+
+    # Keep 100 neighbours per track
+    python -m src.scripts.feature_extraction.compute_track_neighbors --k 100
+
+    # Search the ANN index per track instead of scoring every pair
+    python -m src.scripts.feature_extraction.compute_track_neighbors --approximate
+
+Environment:
+    TRACK_NEIGHBORS_K    Neighbours per track (default: 50).
+    ALL_PAIRS_WORKERS    Processes scoring similarity tiles (default: CPU count).
+    ALL_PAIRS_MEMORY_MB  Memory budget for the score tiles in flight (default: 256).
+    ANN_N_PROBE          Lists searched per track with --approximate (default: 8).
+
+Create the table first with
+python -m src.scripts.migrations.20261018_create_track_neighbors.
+"""
+
+import argparse
+import time
+import warnings
+
+warnings.simplefilter("ignore")
+
+from sqlalchemy import delete, func  # noqa: E402
+from sqlalchemy.dialects.postgresql import insert as pg_insert  # noqa: E402
+
+from src.db import database  # noqa: E402
+from src.models.track_neighbors import TrackNeighbors  # noqa: E402
+from src.feature_extraction import ann_index  # noqa: E402
+from src.feature_extraction.all_pairs import top_k_neighbours  # noqa: E402
+from src.feature_extraction.config import (  # noqa: E402
+    ANN_N_PROBE,
+    DESCRIPTOR_VERSION,
+    TRACK_NEIGHBORS_K,
+)
+from src.feature_extraction.track_similarity import ScorerName  # noqa: E402
+from src.scripts.feature_extraction.export_descriptor_store import (  # noqa: E402
+    refresh_store,
+)
+from src.errors import handle  # noqa: E402
+
+# track_neighbors rows per INSERT ... ON CONFLICT statement
+_WRITE_BATCH = 500
+
+# The only scorer track_neighbors holds (see CosineCache._warm_from_neighbor_table)
+_SCORER = ScorerName.LATE_FUSION_V1
+
+
+def neighbor_lists(store, k=TRACK_NEIGHBORS_K, approximate=False, n_probe=ANN_N_PROBE):
+    """Yield (track_id, neighbor_ids, scores) for every track in store, best first.
+
+    Exact lists come from one tiled all-pairs pass; approximate ones from
+    an ANN index search (over n_probe lists) per track, after the index is
+    synced with store.
+    """
+    if approximate:
+        index, _ = ann_index.sync(store)
+        for track_id, vector in zip(store.track_ids.tolist(), store.vectors):
+            hits = index.search(vector, k=k, n_probe=n_probe, scorer=_SCORER, exclude=[track_id])
+            yield track_id, [hit_id for hit_id, _ in hits], [score for _, score in hits]
+        return
+
+    indices, scores = top_k_neighbours(store.vectors, k, _SCORER)
+    neighbor_ids = store.track_ids[indices]
+    for track_id, ids, row_scores in zip(store.track_ids.tolist(), neighbor_ids, scores):
+        yield track_id, ids.tolist(), row_scores.tolist()
+
+
+def write_neighbors(executor, lists, on_batch=None):
+    """Upsert track_neighbors rows from (track_id, neighbor_ids, scores) lists.
+
+    executor is a SQLAlchemy session or connection; on_batch (e.g. a commit)
+    is called after every _WRITE_BATCH rows. Returns the track IDs written.
+    """
+    written = []
+    batch = []
+
+    def flush():
+        stmt = pg_insert(TrackNeighbors).values(batch)
+        executor.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["track_id"],
+                set_={
+                    "neighbor_ids": stmt.excluded.neighbor_ids,
+                    "scores": stmt.excluded.scores,
+                    "descriptor_version": stmt.excluded.descriptor_version,
+                    "scorer": stmt.excluded.scorer,
+                    "computed_at": func.now(),
+                },
+            )
+        )
+        if on_batch is not None:
+            on_batch()
+        del batch[:]
+
+    for track_id, neighbor_ids, scores in lists:
+        batch.append({
+            "track_id": track_id,
+            "neighbor_ids": neighbor_ids,
+            "scores": scores,
+            "descriptor_version": DESCRIPTOR_VERSION,
+            "scorer": _SCORER.value,
+        })
+        written.append(track_id)
+        if len(batch) >= _WRITE_BATCH:
+            flush()
+    if batch:
+        flush()
+    return written
+
+
+def remove_stale(executor, started):
+    """Delete rows last written before started, a database timestamp taken at
+    the start of the run; returns the number deleted."""
+    return executor.execute(
+        delete(TrackNeighbors).where(TrackNeighbors.computed_at < started)
+    ).rowcount
+
+
+def run(session, k=TRACK_NEIGHBORS_K, approximate=False, n_probe=ANN_N_PROBE):
+    try:
+        store = refresh_store(session)
+        if store is None:
+            return
+        if len(store) < 2:
+            print("Need at least 2 descriptors to compute neighbours. Got %d." % len(store))
+            return
+
+        print(
+            "Computing %s top-%d neighbours for %d track(s) with %s..."
+            % ("approximate" if approximate else "exact", k, len(store), _SCORER.value)
+        )
+        start = time.perf_counter()
+        # The database clock, which also stamps computed_at
+        started = session.query(func.now()).scalar()
+        lists = neighbor_lists(store, k, approximate, n_probe)
+        written = write_neighbors(session.session, lists, on_batch=session.commit)
+        removed = remove_stale(session.session, started)
+        session.commit()
+        print(
+            "Done. %d row(s) written, %d stale row(s) removed in %.1fs."
+            % (len(written), removed, time.perf_counter() - start)
+        )
+    except Exception as exc:
+        handle(exc)
+        session.rollback()
+    finally:
+        session.close()
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Precompute per-track top-K neighbour lists")
+    parser.add_argument("--k", type=int, default=TRACK_NEIGHBORS_K, help="Neighbours per track")
+    parser.add_argument(
+        "--approximate", action="store_true",
+        help="Search the ANN index per track instead of scoring every pair",
+    )
+    parser.add_argument(
+        "--n-probe", type=int, default=ANN_N_PROBE,
+        help="ANN lists searched per track with --approximate",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    _args = _parse_args()
+    run(
+        database.create_session(),
+        k=_args.k,
+        approximate=_args.approximate,
+        n_probe=_args.n_probe,
+    )
@@ -1,27 +1,51 @@
 """Batch script: compute semantic traits for all unprocessed tracks.
 
-Each worker loads ONNX sessions once (expensive) then processes its chunk of
-tracks, saving results to DB as it goes. Progress is visible in real time; a
-crash only loses the track currently being computed. Safe to re-run — tracks
-with an existing TrackTrait row are skipped.
+Each worker loads ONNX sessions once (expensive) then claims batches of tracks
+from the feature_job ledger, largest files first (see
+feature_extraction.job_ledger), and processes them as a three-stage pipeline: a
+decode thread prepares the next batches' mels while the current batch is
+inferred, and a writer thread commits the finished rows in small groups.
+Progress is visible in real time. Safe to re-run — tracks with an existing
+TrackTrait row are skipped, and an interrupted run resumes from the ledger; a
+failed track is retried up to FEATURE_JOB_MAX_ATTEMPTS times. Several runs,
+on one machine or several, can share the ledger. Each worker reports the
+time spent per stage so the bottleneck is visible.
 
 Usage:
     # Process all tracks that have no trait row yet
     python -m src.scripts.feature_extraction.compute_track_traits
 
-    # Process specific track IDs
+    # Queue specific track IDs (again, if done or failed) and work the queue
     python -m src.scripts.feature_extraction.compute_track_traits 42 101 200
 
 Environment:
-    TRAIT_WORKERS  Number of parallel worker processes (default: 2). Each worker
-                   loads the full ONNX model set (~430 MB); keep this low on
-                   memory-constrained machines.
+    TRAIT_WORKERS     Number of parallel worker processes (default: 2). Each
+                      worker loads the full ONNX model set (~430 MB); keep this
+                      low on memory-constrained machines.
+    TRAIT_BATCH_SIZE  Tracks per batched inference call (default: 8). EffNet
+                      and the classifier heads run once per batch.
+    TRAIT_PREFETCH_BATCHES
+                      Batches decoded ahead of inference (default: 2).
+    TRAIT_WRITE_BATCH Trait rows per writer commit (default: 32).
+    TRAIT_INFERENCE_SERVER
+                      Set to 1 to load the ONNX sessions once in a dedicated
+                      inference process; workers then only decode audio and
+                      compute mels, sending them over shared memory.
+    TRAIT_DECODE_WORKERS
+                      Decode workers in inference-server mode (default: CPU
+                      count). Replaces TRAIT_WORKERS when the server is on.
+    FEATURE_TIMING    Set to 1 to print per-stage timings (p50/p95 per stage
+                      and per file) at the end; inference-server stages are
+                      not included.
 """
 
 import datetime
 import gc
 import os
+import queue
 import sys
+import threading
+import time
 import warnings
 
 warnings.simplefilter("ignore")
@@ -31,28 +55,38 @@ from os.path import join, splitext  # noqa: E402
 
 from src.db import database  # noqa: E402
 from src.models.track import Track  # noqa: E402
+from src.models.track_embedding import TrackEmbedding  # noqa: E402
 from src.models.track_trait import TrackTrait  # noqa: E402
 from src.config import PROCESSED_MUSIC_DIR  # noqa: E402
-from src.feature_extraction.config import TRAIT_WORKERS  # noqa: E402
+from src.feature_extraction.config import (  # noqa: E402
+    TRAIT_BATCH_SIZE,
+    TRAIT_DECODE_WORKERS,
+    TRAIT_EMBEDDING_VERSION,
+    TRAIT_INFERENCE_SERVER,
+    TRAIT_PREFETCH_BATCHES,
+    TRAIT_WORKERS,
+    TRAIT_WRITE_BATCH,
+)
+from src.feature_extraction import profiling  # noqa: E402
+from src.feature_extraction.compact_descriptor import pack_vector  # noqa: E402
+from src.feature_extraction.job_ledger import (  # noqa: E402
+    DONE,
+    FAILED,
+    JobLedger,
+    format_summary,
+)
+from src.feature_extraction.scheduler import file_size  # noqa: E402
 from src.utils.file_operations import AUDIO_TYPES  # noqa: E402
 from src.errors import handle  # noqa: E402
 
 
 _PROGRESS_INTERVAL = 10
 
+# Seconds between checks that the writer thread is still running while the
+# write queue is full
+_WRITER_POLL_SECONDS = 5.0
 
-def _chunkify(lst, n):
-    """Split lst into n roughly equal non-empty chunks."""
-    if not lst:
-        return []
-    n = min(n, len(lst))
-    size, rem = divmod(len(lst), n)
-    chunks, i = [], 0
-    for k in range(n):
-        extra = 1 if k < rem else 0
-        chunks.append(lst[i : i + size + extra])
-        i += size + extra
-    return [c for c in chunks if c]
+_JOB_TYPE = "traits"
 
 
 def _resolve_audio_path(music_dir, file_name):
@@ -92,104 +126,325 @@ def _resolve_audio_path(music_dir, file_name):
     return None
 
 
-def _compute_traits(chunk, result_transmitter):
-    """Worker: load ONNX sessions once, compute and persist one trait row per track.
+def _build_trait_row(track_id, traits):
+    """Build a TrackTrait row from a TraitExtractor.compute() result dict."""
+    return TrackTrait(
+        track_id=track_id,
+        voice_instrumental=traits["voice_instrumental"],
+        danceability=traits["danceability"],
+        bright_dark=traits["bright_dark"],
+        acoustic_electronic=traits["acoustic_electronic"],
+        tonal_atonal=traits["tonal_atonal"],
+        reverb=traits["reverb"],
+        onset_density=traits["onset_density"],
+        spectral_flatness=traits["spectral_flatness"],
+        mood_theme=traits["mood_theme"],
+        genre=traits["genre"],
+        instruments=traits["instruments"],
+        trait_version=traits["trait_version"],
+        computed_at=datetime.datetime.utcnow(),
+    )
+
+
+def _build_embedding_row(track_id, embedding):
+    """Build a TrackEmbedding row from a TraitEmbedding."""
+    return TrackEmbedding(
+        track_id=track_id,
+        effnet_embedding=pack_vector(embedding.effnet),
+        genre_probs=pack_vector(embedding.genre_probs)
+        if embedding.genre_probs is not None
+        else None,
+        embedding_version=TRAIT_EMBEDDING_VERSION,
+        computed_at=datetime.datetime.utcnow(),
+    )
 
-    chunk is a list of (track_id, file_name) tuples — full ORM objects are not
-    passed across the process boundary to keep pickling overhead and memory low.
+
+def _save_embedding(session, track_id, embedding):
+    """Insert or replace a track's stored backbone outputs.
+
+    A failure is logged but does not fail the track: the trait row is
+    already committed and only heads-only recomputes depend on this row.
     """
-    from src.feature_extraction.trait_extractor import TraitExtractor
+    try:
+        session.session.merge(_build_embedding_row(track_id, embedding))
+        session.commit()
+        return True
+    except Exception as exc:
+        handle(exc, "Failed to save embedding for track %d" % track_id, print, False)
+        session.rollback()
+        return False
 
-    pid = os.getpid()
-    n_saved = 0
-    n_skipped = 0
-    n_failed = 0
 
-    print("  [%d] Loading ONNX sessions..." % pid, flush=True)
+def _prefetch_batches(extractor, ledger, decoded, timings):
+    """Decode thread: prepare each batch's mels ahead of inference.
+
+    Claims batches from the job ledger and puts (batch, state) on the
+    bounded decoded queue, where state is the extractor's _prepare_batch()
+    result or the exception it raised, then None once the ledger is drained.
+    """
     try:
-        extractor = TraitExtractor()
+        for batch in ledger.batches():
+            began = time.perf_counter()
+            try:
+                state = extractor._prepare_batch(
+                    [join(PROCESSED_MUSIC_DIR, file_name) for _, file_name in batch],
+                    with_embedding=True,
+                )
+            except Exception as exc:
+                state = exc
+            timings["decode"] += time.perf_counter() - began
+            decoded.put((batch, state))
+    finally:
+        decoded.put(None)
+
+
+def _commit_rows(session, ledger, items, counts):
+    """Insert (track_id, traits, embedding) items with one commit, then mark
+    their jobs done.
+
+    If the group fails (e.g. a duplicate track_id), it is rolled back and
+    retried row by row with guarded_add, so one bad row only fails itself.
+    Ledger errors are raised to the caller; they never trigger the retry.
+    """
+    try:
+        for track_id, traits, embedding in items:
+            session.add(_build_trait_row(track_id, traits))
+            session.session.merge(_build_embedding_row(track_id, embedding))
+        session.commit()
     except Exception as exc:
-        handle(exc)
-        result_transmitter.send((0, 0, len(chunk)))
-        result_transmitter.close()
+        handle(
+            exc,
+            "Failed to insert %d trait rows; retrying one at a time" % len(items),
+            print,
+            False,
+        )
+        session.rollback()
+    else:
+        counts["saved"] += len(items)
+        ledger.done(track_id for track_id, _, _ in items)
         return
-    print(
-        "  [%d] Sessions ready, processing %d tracks." % (pid, len(chunk)), flush=True
-    )
 
-    worker_session = database.create_session()
+    saved = []
+    for track_id, traits, embedding in items:
+        if session.guarded_add(_build_trait_row(track_id, traits)):
+            _save_embedding(session, track_id, embedding)
+            counts["saved"] += 1
+            saved.append(track_id)
+        else:
+            counts["failed"] += 1
+            ledger.failed(track_id, "trait row insert failed")
+    ledger.done(saved)
+
+
+def _write_rows(ledger, written, counts, timings):
+    """Writer thread: commit finished rows in groups of up to TRAIT_WRITE_BATCH.
+
+    Whatever is queued is committed as soon as the queue drains, so rows are
+    only held back while inference is producing them faster than they are
+    written. Stops at a None item. An error writing a group is reported and
+    its unaccounted rows counted as failed; their jobs stay leased until the
+    worker exits and are then reclaimed, so the thread keeps draining the
+    queue.
+    """
+    pid = os.getpid()
+    session = database.create_session()
     try:
-        for track_id, file_name in chunk:
+        done = False
+        while not done:
+            items = [written.get()]
+            while items[-1] is not None and len(items) < TRAIT_WRITE_BATCH:
+                try:
+                    items.append(written.get_nowait())
+                except queue.Empty:
+                    break
+            if items[-1] is None:
+                done = True
+                items.pop()
+            if not items:
+                continue
+
+            began = time.perf_counter()
+            before = counts["saved"]
+            accounted = counts["saved"] + counts["failed"]
             try:
-                audio_path = join(PROCESSED_MUSIC_DIR, file_name)
-                print("  [%d] track %d: %s" % (pid, track_id, file_name), flush=True)
+                _commit_rows(session, ledger, items, counts)
+            except Exception as exc:
+                handle(exc, "Failed to write %d trait rows" % len(items), print, False)
+                session.rollback()
+                counts["failed"] += len(items) - (
+                    counts["saved"] + counts["failed"] - accounted
+                )
+            timings["write"] += time.perf_counter() - began
+            if counts["saved"] // _PROGRESS_INTERVAL > before // _PROGRESS_INTERVAL:
+                print("  [%d] saved %d traits so far" % (pid, counts["saved"]), flush=True)
+    finally:
+        session.close()
+
+
+def _put_written(written, writer, item):
+    """Queue item for the writer thread; False if the writer has stopped."""
+    while True:
+        try:
+            written.put(item, timeout=_WRITER_POLL_SECONDS)
+            return True
+        except queue.Full:
+            if not writer.is_alive():
+                return False
+
 
+def _compute_traits(ledger, result_transmitter, extractor=None):
+    """Worker: load ONNX sessions once, compute and persist one trait row per track.
+
+    ledger hands out batches of (track_id, file_name) tuples (see
+    job_ledger.JobLedger.batches); every claimed track is reported back to it
+    as done or failed.
+    extractor is a RemoteTraitExtractor in inference-server mode; otherwise the
+    worker loads its own TraitExtractor.
+
+    Decoding (_prefetch_batches), inference (this thread) and DB writes
+    (_write_rows) overlap through bounded queues. Sends (saved, skipped,
+    failed, timings, profile) back to the parent, where timings holds the
+    seconds spent decoding, inferring, writing, and waiting on the decode
+    stage, and profile is the per-stage profiling snapshot (None unless
+    FEATURE_TIMING).
+    """
+    from src.feature_extraction.trait_extractor import TraitExtractor
+
+    pid = os.getpid()
+    n_skipped = 0
+    n_failed = 0
+    timings = {"decode": 0.0, "infer": 0.0, "write": 0.0, "infer_idle": 0.0}
+
+    if extractor is None:
+        print("  [%d] Loading ONNX sessions..." % pid, flush=True)
+        try:
+            extractor = TraitExtractor()
+        except Exception as exc:
+            # The other workers drain the ledger
+            handle(exc)
+            result_transmitter.send((0, 0, 0, timings, profiling.drain()))
+            result_transmitter.close()
+            return
+    print("  [%d] Sessions ready, processing queued tracks." % pid, flush=True)
+
+    counts = {"saved": 0, "failed": 0}
+    decoded = queue.Queue(maxsize=max(TRAIT_PREFETCH_BATCHES, 1))
+    written = queue.Queue(maxsize=max(TRAIT_WRITE_BATCH, 1) * 2)
+    decoder = threading.Thread(
+        target=_prefetch_batches,
+        args=(extractor, ledger, decoded, timings),
+        daemon=True,
+    )
+    writer = threading.Thread(
+        target=_write_rows, args=(ledger, written, counts, timings), daemon=True
+    )
+    with ledger.keep_alive():
+        decoder.start()
+        writer.start()
+
+        try:
+            while True:
+                began = time.perf_counter()
+                item = decoded.get()
+                timings["infer_idle"] += time.perf_counter() - began
+                if item is None:
+                    decoder.join()
+                    break
+                batch, state = item
+                for track_id, file_name in batch:
+                    print("  [%d] track %d: %s" % (pid, track_id, file_name), flush=True)
+
+                began = time.perf_counter()
                 try:
-                    traits = extractor.compute(audio_path)
-                except (FileNotFoundError, OSError):
-                    fallback = _resolve_audio_path(PROCESSED_MUSIC_DIR, file_name)
-                    if fallback is None:
-                        print(
-                            "  [%d] track %d: file not found: %s"
-                            % (pid, track_id, file_name),
-                            flush=True,
-                        )
+                    if isinstance(state, Exception):
+                        raise state
+                    results = extractor._finish_batch(state, with_embedding=True)
+                except Exception as exc:
+                    handle(exc)
+                    n_failed += len(batch)
+                    for track_id, _ in batch:
+                        ledger.failed(track_id, exc)
+                    continue
+                finally:
+                    timings["infer"] += time.perf_counter() - began
+                del state, item
+
+                for (track_id, file_name), result in zip(batch, results):
+                    try:
+                        if isinstance(result, OSError):
+                            fallback = _resolve_audio_path(PROCESSED_MUSIC_DIR, file_name)
+                            if fallback is None:
+                                print(
+                                    "  [%d] track %d: file not found: %s"
+                                    % (pid, track_id, file_name),
+                                    flush=True,
+                                )
+                                n_failed += 1
+                                ledger.failed(track_id, "file not found: %s" % file_name)
+                                continue
+                            result = extractor.compute(fallback, with_embedding=True)
+                        elif isinstance(result, Exception):
+                            raise result
+
+                        traits, embedding = result
+                    except Exception as exc:
+                        handle(exc)
                         n_failed += 1
+                        ledger.failed(track_id, exc)
                         continue
-                    traits = extractor.compute(fallback)
-
-                row = TrackTrait(
-                    track_id=track_id,
-                    voice_instrumental=traits["voice_instrumental"],
-                    danceability=traits["danceability"],
-                    bright_dark=traits["bright_dark"],
-                    acoustic_electronic=traits["acoustic_electronic"],
-                    tonal_atonal=traits["tonal_atonal"],
-                    reverb=traits["reverb"],
-                    onset_density=traits["onset_density"],
-                    spectral_flatness=traits["spectral_flatness"],
-                    mood_theme=traits["mood_theme"],
-                    genre=traits["genre"],
-                    instruments=traits["instruments"],
-                    trait_version=traits["trait_version"],
-                    computed_at=datetime.datetime.utcnow(),
-                )
-                if worker_session.guarded_add(row):
-                    n_saved += 1
-                    if n_saved % _PROGRESS_INTERVAL == 0:
-                        print(
-                            "  [%d] saved %d traits so far" % (pid, n_saved),
-                            flush=True,
-                        )
-                else:
-                    n_failed += 1
-
-                del traits, row
-                if n_saved % _PROGRESS_INTERVAL == 0:
-                    gc.collect()
-
-            except Exception as exc:
-                handle(exc)
-                n_failed += 1
-    finally:
-        worker_session.close()
 
+                    if not _put_written(written, writer, (track_id, traits, embedding)):
+                        break
+                    del result, traits, embedding
+
+                del results
+                gc.collect()
+                if not writer.is_alive():
+                    # Unwritten claimed tracks are reclaimed once their leases expire
+                    print("  [%d] writer thread stopped; stopping early" % pid, flush=True)
+                    break
+        finally:
+            _put_written(written, writer, None)
+            writer.join()
+
+    n_saved = counts["saved"]
+    n_failed += counts["failed"]
     print(
         "<<< Worker %d done: %d saved, %d skipped, %d failed >>>"
         % (pid, n_saved, n_skipped, n_failed),
         flush=True,
     )
-    result_transmitter.send((n_saved, n_skipped, n_failed))
+    print("  [%d] %s" % (pid, _format_timings(timings)), flush=True)
+    result_transmitter.send((n_saved, n_skipped, n_failed, timings, profiling.drain()))
     result_transmitter.close()
 
 
+def _format_timings(timings):
+    """One-line per-stage summary naming the busiest stage."""
+    stages = ("decode", "infer", "write")
+    bottleneck = max(stages, key=lambda stage: timings[stage])
+    return (
+        "decode %.1fs, inference %.1fs (%.1fs waiting for decode), write %.1fs; "
+        "bottleneck: %s"
+        % (
+            timings["decode"],
+            timings["infer"],
+            timings["infer_idle"],
+            timings["write"],
+            bottleneck,
+        )
+    )
+
+
 def run(track_ids, session):
+    server = None
     try:
         all_tracks = session.query(Track).all()
         if len(track_ids) > 0:
             tracks_to_process = [
                 (t.id, t.file_name) for t in all_tracks if t.id in track_ids
             ]
+            requeue = (DONE, FAILED)
         else:
             existing_ids = {
                 row.track_id for row in session.query(TrackTrait.track_id).all()
@@ -200,28 +455,51 @@ def run(track_ids, session):
                 if t.id not in existing_ids
                 and splitext(t.file_name)[1].lower() in AUDIO_TYPES
             ]
+            # A done job whose row has since been deleted is redone
+            requeue = (DONE,)
         del all_tracks
+        if not tracks_to_process:
+            print("Computing traits for 0 track(s)")
+            return
 
-        num_tracks = len(tracks_to_process)
-        print("Computing traits for %d track(s)" % num_tracks)
+        ledger = JobLedger(_JOB_TYPE, TRAIT_BATCH_SIZE)
+        num_tracks = ledger.prepare(
+            (
+                (track_id, file_size(join(PROCESSED_MUSIC_DIR, file_name)))
+                for track_id, file_name in tracks_to_process
+            ),
+            requeue=requeue,
+        )
+        del tracks_to_process
+        print("Computing traits for %d queued track(s)" % num_tracks)
         if num_tracks == 0:
             return
 
-        n_workers = min(TRAIT_WORKERS, num_tracks)
-        print("Using %d worker(s) (TRAIT_WORKERS=%d)\n" % (n_workers, TRAIT_WORKERS))
+        if TRAIT_INFERENCE_SERVER:
+            from src.feature_extraction.inference_server import InferenceServer
 
-        chunks = _chunkify(tracks_to_process, n_workers)
-        del tracks_to_process
+            n_workers = min(TRAIT_DECODE_WORKERS, num_tracks)
+            print(
+                "Using %d decode worker(s) and one inference server "
+                "(TRAIT_DECODE_WORKERS=%d)\n" % (n_workers, TRAIT_DECODE_WORKERS)
+            )
+            server = InferenceServer(n_workers)
+            server.start()
+        else:
+            n_workers = min(TRAIT_WORKERS, num_tracks)
+            print(
+                "Using %d worker(s) (TRAIT_WORKERS=%d)\n" % (n_workers, TRAIT_WORKERS)
+            )
 
         workers = []
         aggregators = []
 
-        for chunk in chunks:
+        for i in range(n_workers):
             receiver, transmitter = Pipe(duplex=False)
             aggregators.append(receiver)
             worker = Process(
                 target=_compute_traits,
-                args=(chunk, transmitter),
+                args=(ledger, transmitter, server.client(i) if server else None),
             )
             worker.daemon = True
             workers.append(worker)
@@ -236,19 +514,28 @@ def run(track_ids, session):
         for agg in aggregators:
             agg.close()
 
-        total_saved = sum(n for n, _, _ in worker_results)
-        total_skipped = sum(n for _, n, _ in worker_results)
-        total_failed = sum(n for _, _, n in worker_results)
+        total_saved = sum(r[0] for r in worker_results)
+        total_skipped = sum(r[1] for r in worker_results)
+        total_failed = sum(r[2] for r in worker_results)
+        total_timings = {
+            stage: sum(r[3][stage] for r in worker_results)
+            for stage in worker_results[0][3]
+        }
 
         print(
             "\nDone. %d saved, %d skipped, %d failed."
             % (total_saved, total_skipped, total_failed)
         )
+        print("Stage time across workers: %s" % _format_timings(total_timings))
+        print("Ledger: %s" % format_summary(ledger.summary()))
+        profiling.report([r[4] for r in worker_results])
 
     except Exception as exc:
         handle(exc)
         session.rollback()
     finally:
+        if server is not None:
+            server.stop()
         session.close()
 
 
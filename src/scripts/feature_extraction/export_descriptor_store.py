@@ -0,0 +1,146 @@
+"""Export current-version global descriptor vectors to the memory-mapped store.
+
+Writes (or incrementally refreshes) DESCRIPTOR_STORE_DIR/<DESCRIPTOR_VERSION>/,
+the contiguous float32 array plus track-ID index that TransitionMatch, the
+cosine similarity script and the similarity benchmark read instead of
+unpacking track_descriptor rows one at a time (see
+feature_extraction.descriptor_store). Only rows that are new or were
+recomputed since the last export are read from the database.
+compute_compact_descriptors and compute_audio_features refresh the store
+when they finish; run this script after descriptors were written any other
+way (e.g. by run_worker on another machine).
+
+Each refresh also brings the approximate nearest-neighbour index saved next
+to the store up to date (see feature_extraction.ann_index), which backs
+GET /api/tracks/{track_id}/similar, and applies the added, recomputed and
+removed vectors to the running corpus statistics (see
+feature_extraction.corpus_stats). The standardised scorers use a frozen copy
+of them, taken once per descriptor version; --refreeze-stats replaces it with
+the current statistics, after which stored similarity scores are stale.
+
+Usage:
+    # Refresh the store
+    python -m src.scripts.feature_extraction.export_descriptor_store
+
+    # Rebuild it (and retrain the ANN index, recompute corpus statistics) from scratch
+    python -m src.scripts.feature_extraction.export_descriptor_store --full
+
+    # Let the scorers use the current corpus statistics; then re-run
+    # compute_cosine_similarities --force and compute_track_neighbors
+    python -m src.scripts.feature_extraction.export_descriptor_store --refreeze-stats
+
+Environment:
+    DESCRIPTOR_STORE_DIR  Store directory, relative to the project root unless
+                          absolute (default: models/descriptors).
+    ANN_LISTS             Inverted lists in the ANN index (default: 0, about
+                          sqrt(library size)).
+"""
+
+import argparse
+import time
+
+from src.db import database
+from src.feature_extraction import ann_index, corpus_stats, descriptor_store
+from src.errors import handle
+
+# Relative standard-deviation drift from the frozen scoring statistics that
+# is worth reporting
+_DRIFT_WARNING = 0.1
+
+
+def refresh_store(session, full=False, refreeze_stats=False):
+    """Refresh the descriptor store and print what changed; None on failure."""
+    start = time.perf_counter()
+    previous = descriptor_store.DescriptorStore.open()
+    try:
+        store, counts = descriptor_store.refresh(session, full=full)
+    except Exception as exc:
+        handle(exc)
+        session.rollback()
+        return None
+    print(
+        "Descriptor store %s (generation %d): %d vector(s); %d added, %d updated, "
+        "%d removed in %.2fs."
+        % (
+            store.directory,
+            store.generation,
+            len(store),
+            counts["added"],
+            counts["updated"],
+            counts["removed"],
+            time.perf_counter() - start,
+        )
+    )
+    sync_ann_index(store, rebuild=full)
+    sync_corpus_stats(store, previous, rebuild=full, refreeze=refreeze_stats)
+    return store
+
+
+def sync_ann_index(store, rebuild=False):
+    """Sync the ANN index with store and print what changed; None on failure."""
+    start = time.perf_counter()
+    try:
+        index, counts = ann_index.sync(store, rebuild=rebuild)
+    except Exception as exc:
+        handle(exc)
+        return None
+    print(
+        "ANN index %s: %d vector(s) in %d list(s); %s%d added, %d updated, %d removed in %.2fs."
+        % (
+            index.path,
+            len(index),
+            index.n_lists,
+            "retrained, " if counts["trained"] else "",
+            counts["added"],
+            counts["updated"],
+            counts["removed"],
+            time.perf_counter() - start,
+        )
+    )
+    return index
+
+
+def sync_corpus_stats(store, previous, rebuild=False, refreeze=False):
+    """Sync the corpus statistics with store and print what changed; None on failure."""
+    try:
+        stats, counts = corpus_stats.sync(store, previous, rebuild=rebuild, refreeze=refreeze)
+    except Exception as exc:
+        handle(exc)
+        return None
+    if counts["rebuilt"]:
+        print("Corpus statistics rebuilt from %d vector(s)." % stats.count)
+    elif counts["added"] or counts["removed"]:
+        print(
+            "Corpus statistics: %d vector(s) folded in, %d taken out (%d total)."
+            % (counts["added"], counts["removed"], stats.count)
+        )
+    if counts["frozen"]:
+        print(
+            "Scoring statistics frozen from %d vector(s); re-run "
+            "compute_cosine_similarities --force and compute_track_neighbors." % stats.count
+        )
+    elif counts["drift"] >= _DRIFT_WARNING:
+        print(
+            "Corpus statistics drifted %.0f%% from the frozen scoring statistics; "
+            "consider --refreeze-stats." % (100 * counts["drift"])
+        )
+    return stats
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Export descriptors to the memory-mapped store")
+    parser.add_argument("--full", action="store_true", help="Rebuild instead of refreshing")
+    parser.add_argument(
+        "--refreeze-stats", action="store_true",
+        help="Replace the scoring statistics with the current corpus statistics",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    _args = _parse_args()
+    _session = database.create_session()
+    try:
+        refresh_store(_session, full=_args.full, refreeze_stats=_args.refreeze_stats)
+    finally:
+        _session.close()
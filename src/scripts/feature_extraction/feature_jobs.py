@@ -0,0 +1,81 @@
+"""Inspect and reset the feature_job ledger used by the feature-extraction scripts.
+
+Job types are "traits", "descriptors:<DESCRIPTOR_VERSION>", "audio_features",
+"trait_backfill:<TRAIT_VERSION>" and "cosine:<DESCRIPTOR_VERSION>".
+
+Usage:
+    # Job counts per type and status, plus the most recent failures
+    python -m src.scripts.feature_extraction.feature_jobs status
+
+    # Queue a job type's failed jobs again with a fresh attempt count
+    python -m src.scripts.feature_extraction.feature_jobs retry-failed traits
+
+    # Release running jobs whose lease ran out or whose local worker died
+    python -m src.scripts.feature_extraction.feature_jobs requeue-stale traits
+"""
+
+import argparse
+
+from sqlalchemy import text
+
+from src.db import database
+from src.feature_extraction.job_ledger import JobLedger, format_summary
+
+
+_RECENT_FAILURES = 10
+
+
+def status():
+    with database.get_engine().connect() as conn:
+        job_types = [
+            row.job_type
+            for row in conn.execute(
+                text("SELECT DISTINCT job_type FROM feature_job ORDER BY job_type")
+            ).fetchall()
+        ]
+        failures = conn.execute(
+            text(
+                "SELECT job_type, track_id, attempts, error FROM feature_job "
+                "WHERE status = 'failed' ORDER BY finished_at DESC LIMIT :n"
+            ),
+            {"n": _RECENT_FAILURES},
+        ).fetchall()
+
+    if not job_types:
+        print("No feature jobs.")
+        return
+    width = max(len(job_type) for job_type in job_types)
+    for job_type in job_types:
+        print("%-*s  %s" % (width, job_type, format_summary(JobLedger(job_type).summary())))
+
+    if failures:
+        print("\nMost recent failures:")
+        for row in failures:
+            reason = (row.error or "").strip().splitlines()
+            print(
+                "  %s track %d (%d attempts): %s"
+                % (row.job_type, row.track_id, row.attempts, reason[-1] if reason else "")
+            )
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Inspect and reset the feature_job ledger")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="Job counts per type and recent failures")
+    for name, help_text in (
+        ("retry-failed", "Queue failed jobs again"),
+        ("requeue-stale", "Queue running jobs whose worker is gone"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("job_type")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    _args = _parse_args()
+    if _args.command == "status":
+        status()
+    elif _args.command == "retry-failed":
+        print("Requeued %d failed job(s)." % JobLedger(_args.job_type).retry_failed())
+    else:
+        print("Requeued %d stale job(s)." % JobLedger(_args.job_type).requeue_stale())
@@ -0,0 +1,241 @@
+"""Worker entry point: join a feature-extraction run from any machine.
+
+Works the feature_job ledger (see feature_extraction.job_ledger) that the
+batch scripts fill, so idle machines can share a backfill. Each node needs
+the same Postgres and the music library mounted at PROCESSED_MUSIC_DIR.
+Workers lease batches of tracks, renew the leases with heartbeats while
+they compute, and write results straight to the DB. If a node dies, its
+leases run out after FEATURE_JOB_LEASE_SECONDS and the other nodes pick the
+tracks up.
+
+Several nodes can run on one machine (e.g. to try a setup locally); each
+invocation is a separate node. A descriptors node refreshes its descriptor
+store (see export_descriptor_store) whenever it saved descriptors.
+
+Usage:
+    # Queue the work on one machine (the script also works the queue)
+    python -m src.scripts.feature_extraction.compute_track_traits
+
+    # On every other node
+    python -m src.scripts.feature_extraction.run_worker traits
+    python -m src.scripts.feature_extraction.run_worker descriptors --processes 4
+
+    # Stay up and wait for new work instead of exiting when the queue is empty
+    python -m src.scripts.feature_extraction.run_worker cosine --follow
+
+Kinds: traits, descriptors, trait_backfill, cosine. --processes defaults to
+the kind's usual worker count (TRAIT_WORKERS, DESCRIPTOR_WORKERS or
+COSINE_WORKERS).
+"""
+
+import argparse
+import time
+import warnings
+from collections import namedtuple
+
+warnings.simplefilter("ignore")
+
+from multiprocessing import Pipe, Process  # noqa: E402
+
+from src.db import database  # noqa: E402
+from src.feature_extraction.config import (  # noqa: E402
+    COSINE_WORKERS,
+    DESCRIPTOR_WORKERS,
+    TRAIT_BATCH_SIZE,
+    TRAIT_DECODE_WORKERS,
+    TRAIT_INFERENCE_SERVER,
+    TRAIT_WORKERS,
+)
+from src.feature_extraction.job_ledger import JobLedger, format_summary  # noqa: E402
+from src.feature_extraction.track_similarity import ScorerName  # noqa: E402
+from src.scripts.feature_extraction import (  # noqa: E402
+    backfill_genre_mood,
+    compute_compact_descriptors,
+    compute_cosine_similarities,
+    compute_track_traits,
+)
+from src.scripts.feature_extraction.export_descriptor_store import (  # noqa: E402
+    refresh_store,
+)
+
+
+_POLL_SECONDS = 30
+
+# worker_args(ledger, transmitter, context, i) builds the i-th worker's
+# arguments; the worker sends back a tuple of counts named by labels (extra
+# trailing items, e.g. stage timings, are ignored). Kinds that manage their
+# own process pool set node_runner(ledger, n_processes) instead, which runs in
+# the node process (daemonic processes cannot start pools) and returns the
+# counts directly. Kinds with refreshes_store set refresh the descriptor
+# store after every round whose first count (rows saved) is nonzero.
+_Kind = namedtuple(
+    "_Kind",
+    [
+        "job_type",
+        "batch_size",
+        "processes",
+        "target",
+        "worker_args",
+        "labels",
+        "node_runner",
+        "refreshes_store",
+    ],
+    defaults=(None, False),
+)
+
+_KINDS = {
+    "traits": _Kind(
+        compute_track_traits._JOB_TYPE,
+        TRAIT_BATCH_SIZE,
+        TRAIT_DECODE_WORKERS if TRAIT_INFERENCE_SERVER else TRAIT_WORKERS,
+        compute_track_traits._compute_traits,
+        lambda ledger, tx, context, i: (
+            ledger,
+            tx,
+            context.server.client(i) if context.server is not None else None,
+        ),
+        ("saved", "skipped", "failed"),
+    ),
+    "descriptors": _Kind(
+        compute_compact_descriptors._JOB_TYPE,
+        compute_compact_descriptors._WORK_BATCH_SIZE,
+        DESCRIPTOR_WORKERS,
+        None,
+        None,
+        ("saved", "skipped", "failed"),
+        compute_compact_descriptors._work_ledger,
+        True,
+    ),
+    "trait_backfill": _Kind(
+        backfill_genre_mood._JOB_TYPE,
+        backfill_genre_mood._WORK_BATCH_SIZE,
+        TRAIT_WORKERS,
+        backfill_genre_mood._backfill_chunk,
+        lambda ledger, tx, context, i: (ledger, tx),
+        ("backfilled", "failed"),
+    ),
+    "cosine": _Kind(
+        compute_cosine_similarities._JOB_TYPE,
+        compute_cosine_similarities._WORK_BATCH_SIZE,
+        COSINE_WORKERS,
+        compute_cosine_similarities._compute_cosine_batch,
+        lambda ledger, tx, context, i: (
+            ledger,
+            context.pending,
+            tx,
+            context.options.scorer,
+            context.options.force,
+        ),
+        ("saved", "skipped", "failed"),
+    ),
+}
+
+_Context = namedtuple("_Context", ["options", "pending", "server"])
+
+
+def _work_round(kind, ledger, n_processes, options):
+    """Run n_processes workers until the ledger has nothing to claim; returns
+    the summed counts."""
+    if kind.node_runner is not None:
+        return list(kind.node_runner(ledger, n_processes))[: len(kind.labels)]
+
+    server = None
+    if kind.target is compute_track_traits._compute_traits and TRAIT_INFERENCE_SERVER:
+        from src.feature_extraction.inference_server import InferenceServer
+
+        server = InferenceServer(n_processes)
+        server.start()
+
+    try:
+        context = _Context(options, frozenset(ledger.pending_track_ids()), server)
+        workers = []
+        aggregators = []
+        for i in range(n_processes):
+            receiver, transmitter = Pipe(duplex=False)
+            aggregators.append(receiver)
+            worker = Process(
+                target=kind.target, args=kind.worker_args(ledger, transmitter, context, i)
+            )
+            worker.daemon = True
+            workers.append(worker)
+            worker.start()
+            transmitter.close()
+
+        results = []
+        for receiver in aggregators:
+            try:
+                results.append(receiver.recv())
+            except EOFError:
+                # The worker died; its leases expire and are reclaimed
+                pass
+        for worker in workers:
+            worker.join()
+        for receiver in aggregators:
+            receiver.close()
+    finally:
+        if server is not None:
+            server.stop()
+
+    return [sum(result[i] for result in results) for i in range(len(kind.labels))]
+
+
+def _refresh_store():
+    session = database.create_session()
+    try:
+        refresh_store(session)
+    finally:
+        session.close()
+
+
+def run(kind_name, n_processes=None, follow=False, options=None):
+    kind = _KINDS[kind_name]
+    options = options or argparse.Namespace(scorer=ScorerName.LATE_FUSION_V1, force=False)
+    n_processes = max(int(n_processes or kind.processes), 1)
+    ledger = JobLedger(kind.job_type, kind.batch_size)
+    totals = [0] * len(kind.labels)
+
+    print("Working %s jobs with %d process(es)" % (kind.job_type, n_processes))
+    while True:
+        n_claimable = ledger.claimable()
+        if n_claimable == 0:
+            if not follow:
+                break
+            time.sleep(_POLL_SECONDS)
+            continue
+
+        print("%d job(s) to claim" % n_claimable, flush=True)
+        counts = _work_round(kind, ledger, min(n_processes, n_claimable), options)
+        totals = [total + n for total, n in zip(totals, counts)]
+        if kind.refreshes_store and counts[0]:
+            _refresh_store()
+
+    print(
+        "\nDone. %s."
+        % ", ".join("%d %s" % (n, label) for n, label in zip(totals, kind.labels))
+    )
+    print("Ledger: %s" % format_summary(ledger.summary()))
+    return totals
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description="Work a feature-extraction job ledger")
+    parser.add_argument("kind", choices=sorted(_KINDS))
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes on this node")
+    parser.add_argument("--follow", action="store_true", help="Wait for new jobs instead of exiting")
+    parser.add_argument(
+        "--scorer",
+        type=ScorerName,
+        default=ScorerName.LATE_FUSION_V1,
+        help="Similarity scorer for cosine jobs",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Cosine jobs recompute pairs that already exist at the current version",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    _args = _parse_args()
+    run(_args.kind, _args.processes, _args.follow, _args)
@@ -0,0 +1,42 @@
+"""Migration: add lease expiry to feature_job.
+
+Run once, after 20261018_create_feature_job:
+    python -m src.scripts.migrations.20261018_add_feature_job_lease
+
+Claimed jobs now hold a lease that the claiming worker renews with
+heartbeats (see feature_extraction/job_ledger.py). A job whose lease has run
+out belongs to a dead worker or node and is claimed again. Jobs already
+running when this migration runs get an expired lease, so they are reclaimed
+by the next worker. Safe to re-run.
+"""
+
+import sys
+
+from src.db import database
+
+
+ALTER_TABLE_SQL = """
+ALTER TABLE feature_job
+    ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP;
+"""
+
+CREATE_INDICES_SQL = [
+    "CREATE INDEX IF NOT EXISTS feature_job_lease_idx "
+    "ON feature_job (job_type, lease_expires_at) WHERE status = 'running';",
+]
+
+
+def run():
+    engine = database.engine
+    engine.execute(ALTER_TABLE_SQL)
+    for sql in CREATE_INDICES_SQL:
+        engine.execute(sql)
+    print("Migration complete: feature_job.lease_expires_at added.")
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except Exception as exc:
+        print("Migration failed: %s" % exc, file=sys.stderr)
+        sys.exit(1)
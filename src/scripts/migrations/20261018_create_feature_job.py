@@ -0,0 +1,57 @@
+"""Migration: create the feature_job table.
+
+Run once:
+    python -m src.scripts.migrations.20261018_create_feature_job
+
+Persistent work ledger for the feature-extraction scripts (see
+feature_extraction/job_ledger.py): one row per (job_type, track_id) with its
+state (queued, running, done, failed), attempt count and last failure reason.
+Workers claim queued rows with FOR UPDATE SKIP LOCKED, so several processes
+or machines can share one run and an interrupted run resumes where it
+stopped. Safe to re-run.
+"""
+
+import sys
+
+from src.db import database
+
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS feature_job (
+    id           SERIAL PRIMARY KEY,
+    job_type     VARCHAR(64) NOT NULL,
+    track_id     INTEGER NOT NULL REFERENCES track(id) ON DELETE CASCADE,
+    status       VARCHAR(16) NOT NULL DEFAULT 'queued',
+    priority     BIGINT NOT NULL DEFAULT 0,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    error        TEXT,
+    worker       VARCHAR(128),
+    claimed_at   TIMESTAMP,
+    finished_at  TIMESTAMP,
+    created_at   TIMESTAMP NOT NULL DEFAULT NOW(),
+    CONSTRAINT uq_feature_job_type_track UNIQUE (job_type, track_id),
+    CONSTRAINT ck_feature_job_status
+        CHECK (status IN ('queued', 'running', 'done', 'failed'))
+);
+"""
+
+CREATE_INDICES_SQL = [
+    "CREATE INDEX IF NOT EXISTS feature_job_claim_idx "
+    "ON feature_job (job_type, status, priority DESC, id);",
+]
+
+
+def run():
+    engine = database.engine
+    engine.execute(CREATE_TABLE_SQL)
+    for sql in CREATE_INDICES_SQL:
+        engine.execute(sql)
+    print("Migration complete: feature_job table and indices created.")
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except Exception as exc:
+        print("Migration failed: %s" % exc, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,39 @@
+"""Migration: create the track_embedding table.
+
+Run once:
+    python -m src.scripts.migrations.20261018_create_track_embedding
+
+Stores the mean EffNet embedding (1280 float32) and mean MAEST genre
+probabilities (519 float32) per track, so classification heads and storage
+thresholds can be re-applied without decoding audio or re-running the
+backbones. Safe to re-run.
+"""
+
+import sys
+
+from src.db import database
+
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS track_embedding (
+    track_id           INTEGER PRIMARY KEY REFERENCES track(id),
+    effnet_embedding   BYTEA NOT NULL,
+    genre_probs        BYTEA,
+    embedding_version  VARCHAR(32) NOT NULL,
+    computed_at        TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+
+def run():
+    engine = database.engine
+    engine.execute(CREATE_TABLE_SQL)
+    print("Migration complete: track_embedding table created.")
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except Exception as exc:
+        print("Migration failed: %s" % exc, file=sys.stderr)
+        sys.exit(1)
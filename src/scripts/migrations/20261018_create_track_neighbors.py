@@ -0,0 +1,40 @@
+"""Migration: create the track_neighbors table.
+
+Run once:
+    python -m src.scripts.migrations.20261018_create_track_neighbors
+
+Stores each track's top-K most similar tracks as one row (neighbour IDs and
+scores as aligned arrays, best first), written by compute_track_neighbors.
+A track's neighbourhood is a single primary-key lookup instead of a scan of
+track_cosine_similarity. Safe to re-run.
+"""
+
+import sys
+
+from src.db import database
+
+
+CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS track_neighbors (
+    track_id            INTEGER PRIMARY KEY REFERENCES track(id),
+    neighbor_ids        INTEGER[] NOT NULL,
+    scores              REAL[] NOT NULL,
+    descriptor_version  VARCHAR(32) NOT NULL,
+    scorer              VARCHAR(64) NOT NULL,
+    computed_at         TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+
+
+def run():
+    engine = database.engine
+    engine.execute(CREATE_TABLE_SQL)
+    print("Migration complete: track_neighbors table created.")
+
+
+if __name__ == "__main__":
+    try:
+        run()
+    except Exception as exc:
+        print("Migration failed: %s" % exc, file=sys.stderr)
+        sys.exit(1)
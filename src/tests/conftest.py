@@ -0,0 +1,99 @@
+import contextlib
+import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.feature_extraction import corpus_stats, descriptor_store
+from src.feature_extraction.config import DESCRIPTOR_DIMS
+from src.models.track_descriptor import TrackDescriptor
+
+STORE_VERSION = "test"
+T0 = datetime.datetime(2026, 10, 18, 12, 0, 0)
+
+
+@pytest.fixture(scope="session")
+def _empty_store_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp("descriptor_store"))
+
+
+@pytest.fixture(autouse=True)
+def _no_saved_scoring_stats(monkeypatch, _empty_store_dir):
+    """Keep scorer calls from picking up a real scoring_stats.json."""
+    monkeypatch.setattr(corpus_stats, "DESCRIPTOR_STORE_DIR", _empty_store_dir)
+    corpus_stats.reset_default()
+    yield
+    corpus_stats.reset_default()
+
+
+@pytest.fixture
+def session():
+    """In-memory sqlite session holding only the track_descriptor table."""
+    engine = create_engine("sqlite://")
+    TrackDescriptor.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def store_vector(track_id):
+    return np.full(DESCRIPTOR_DIMS, float(track_id), dtype=np.float32)
+
+
+def put_descriptor(session, track_id, vector=None, computed_at=T0, version=STORE_VERSION):
+    """Insert or update track_id's descriptor row (vector defaults to store_vector)."""
+    row = session.query(TrackDescriptor).filter_by(track_id=track_id).first()
+    if row is None:
+        row = TrackDescriptor(id=track_id, track_id=track_id)
+        session.add(row)
+    if vector is None:
+        vector = store_vector(track_id)
+    row.global_vector = np.asarray(vector, dtype=np.float32).tobytes()
+    row.descriptor_version = version
+    row.computed_at = computed_at
+    session.commit()
+
+
+def refresh_store(session, store_dir, **kwargs):
+    """descriptor_store.refresh() at STORE_VERSION; returns (store, counts)."""
+    return descriptor_store.refresh(
+        session, store_dir=str(store_dir), descriptor_version=STORE_VERSION, **kwargs
+    )
+
+
+class FakeLedger:
+    """In-memory stand-in for job_ledger.JobLedger handing out fixed batches."""
+
+    def __init__(self, batches):
+        self._batches = list(batches)
+        self.done_ids = []
+        self.failures = {}
+
+    def batches(self):
+        return iter(self._batches)
+
+    def done(self, track_ids):
+        self.done_ids.extend(track_ids)
+
+    def failed(self, track_id, reason):
+        self.failures[track_id] = str(reason)
+
+    @contextlib.contextmanager
+    def keep_alive(self):
+        yield self
+
+
+class FakeTransmitter:
+    """Stand-in for the worker end of a Pipe; keeps what was sent."""
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, value):
+        self.sent.append(value)
+
+    def close(self):
+        pass
@@ -0,0 +1,128 @@
+"""Unit tests for src/feature_extraction/all_pairs.py
+
+Run with:
+    python -m pytest src/tests/test_all_pairs.py -v
+"""
+
+import numpy as np
+import pytest
+
+from src.feature_extraction import all_pairs
+from src.feature_extraction.all_pairs import (
+    TopK,
+    condensed_scores,
+    iter_tiles,
+    tile_bounds,
+    tile_size,
+    top_k_neighbours,
+)
+from src.feature_extraction.track_similarity import ScorerName, compute_similarity
+from src.scripts.feature_extraction.benchmark_track_similarity import (
+    _generate_fixture_vectors,
+)
+
+
+@pytest.fixture(scope="module")
+def matrix():
+    return np.array(_generate_fixture_vectors(n=30))
+
+
+def _brute_force(matrix, scorer=ScorerName.LATE_FUSION_V1):
+    n = len(matrix)
+    full = np.full((n, n), -np.inf)
+    for i in range(n):
+        for j in range(n):
+            if i != j:
+                full[i, j] = compute_similarity(matrix[i], matrix[j], scorer=scorer)
+    return full
+
+
+class TestTiling:
+    def test_upper_triangle_is_covered_once(self):
+        covered = np.zeros((23, 23), dtype=int)
+        for r0, r1, c0, c1 in tile_bounds(23, 5):
+            covered[r0:r1, c0:c1] += 1
+        assert (covered[np.triu_indices(23)] == 1).all()
+
+    def test_tile_size_follows_the_memory_budget(self):
+        assert tile_size(10) == 10
+        small = tile_size(100000, memory_mb=16, workers=1)
+        large = tile_size(100000, memory_mb=256, workers=1)
+        assert all_pairs._MIN_TILE <= small < large <= all_pairs._MAX_TILE
+        # Each in-flight tile fits the budget
+        assert 8 * small * small * 3 <= 16 * 1024 * 1024
+        assert tile_size(100000, memory_mb=256, workers=8) < large
+
+
+class TestScores:
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_condensed_matches_pairwise_scoring(self, matrix, workers):
+        expected = _brute_force(matrix)[np.triu_indices(len(matrix), 1)]
+        got = condensed_scores(matrix, tile=7, workers=workers)
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-6)
+
+    def test_scorer_keywords_are_passed_through(self, matrix):
+        variance = matrix.var(axis=0)
+        got = condensed_scores(
+            matrix, ScorerName.STANDARDIZED_EUCLIDEAN, tile=8, workers=1,
+            corpus_variance=variance,
+        )
+        expected = [
+            compute_similarity(
+                matrix[i], matrix[j], scorer=ScorerName.STANDARDIZED_EUCLIDEAN,
+                corpus_variance=variance,
+            )
+            for i, j in zip(*np.triu_indices(len(matrix), 1))
+        ]
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-6)
+
+    def test_pool_workers_get_the_parents_fusion_weights(self, matrix, monkeypatch):
+        import os
+
+        from src.feature_extraction import track_similarity
+
+        parent = os.getpid()
+
+        def harmonic_only():
+            # Workers must not reach WeightService (and its DB session)
+            assert os.getpid() == parent
+            return 1.0, 0.0, 0.0, 0.0
+
+        monkeypatch.setattr(all_pairs, "get_live_fusion_weights", harmonic_only)
+        monkeypatch.setattr(track_similarity, "get_live_fusion_weights", harmonic_only)
+        got = condensed_scores(matrix[:12], tile=4, workers=2)
+        expected = condensed_scores(
+            matrix[:12], tile=4, workers=1, fusion_weights=(1.0, 0.0, 0.0, 0.0)
+        )
+        np.testing.assert_allclose(got, expected, rtol=0, atol=1e-12)
+
+    def test_stopping_early_shuts_the_pool_down(self, matrix):
+        tiles = iter_tiles(matrix, tile=5, workers=2)
+        first = next(tiles)
+        assert first.is_diagonal and first.scores.shape == (5, 5)
+        tiles.close()
+
+    def test_empty_matrix(self):
+        assert list(iter_tiles(np.empty((0, 75)))) == []
+        assert condensed_scores(np.empty((1, 75))).shape == (0,)
+
+
+class TestTopK:
+    def test_matches_brute_force(self, matrix):
+        full = _brute_force(matrix)
+        indices, scores = top_k_neighbours(matrix, 4, tile=6, workers=1)
+
+        assert indices.shape == (len(matrix), 4)
+        np.testing.assert_allclose(scores, -np.sort(-full, axis=1)[:, :4], atol=1e-6)
+        assert (indices != np.arange(len(matrix))[:, None]).all()
+        np.testing.assert_allclose(
+            np.take_along_axis(full, indices, axis=1), scores, atol=1e-6
+        )
+
+    def test_k_is_capped_by_library_size(self, matrix):
+        top = TopK(3, 10)
+        assert top.k == 2
+        for tile in iter_tiles(matrix[:3], workers=1):
+            top.add(tile)
+        indices, _ = top.result()
+        assert sorted(indices[0]) == [1, 2]
@@ -0,0 +1,147 @@
+"""Unit tests for src/feature_extraction/ann_index.py
+
+Run with:
+    python -m pytest src/tests/test_ann_index.py -v
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from src.feature_extraction import ann_index
+from src.feature_extraction.ann_index import AnnIndex, measure_recall
+from src.feature_extraction.track_similarity import ScorerName, score_many
+from src.scripts.feature_extraction.benchmark_track_similarity import (
+    _generate_fixture_vectors,
+)
+
+
+def _clustered_vectors(n_clusters=12, per_cluster=25, seed=7):
+    """Fixture-like vectors scattered tightly around a few centres."""
+    rng = np.random.default_rng(seed)
+    centres = np.array(_generate_fixture_vectors(n=n_clusters, seed=seed))
+    spread = 0.05 * centres.std(axis=0)
+    rows = [centre + rng.normal(0.0, 1.0, (per_cluster, centre.size)) * spread for centre in centres]
+    return np.concatenate(rows).astype(np.float32)
+
+
+class _FakeStore:
+    def __init__(self, directory, track_ids, vectors):
+        order = np.argsort(track_ids)
+        self.directory = str(directory)
+        self.track_ids = np.asarray(track_ids, dtype=np.int64)[order]
+        self.vectors = np.asarray(vectors, dtype=np.float32)[order]
+
+    def rows(self, track_ids):
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.track_ids, track_ids), len(self.track_ids) - 1)
+        return np.where(self.track_ids[pos] == track_ids, pos, -1)
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return _clustered_vectors()
+
+
+class TestSearch:
+    def test_all_lists_probed_matches_brute_force(self, vectors):
+        index = AnnIndex.build(np.arange(len(vectors)), vectors, n_lists=6)
+        hits = index.search(vectors[0], k=5, n_probe=index.n_lists, exclude=[0])
+
+        scores = score_many(vectors[0], vectors)
+        scores[0] = -np.inf
+        expected = np.argsort(-scores, kind="stable")[:5]
+        assert [t for t, _ in hits] == expected.tolist()
+        np.testing.assert_allclose([s for _, s in hits], scores[expected], atol=1e-6)
+
+    def test_recall_on_clustered_library(self, vectors):
+        result = measure_recall(vectors, k=10, n_probes=(1, 4), n_queries=50, n_lists=12)
+        assert result["n_lists"] == 12
+        assert result["recall"][4] >= 0.9
+        assert result["recall"][1] <= result["recall"][4]
+        assert result["probed_fraction"][4] < 0.6
+
+    def test_transposed_chroma_lands_in_the_same_list(self, vectors):
+        index = AnnIndex.build(np.arange(len(vectors)), vectors, n_lists=6)
+        shifted = vectors[0].copy()
+        shifted[0:12] = np.roll(shifted[0:12], 5)
+        shifted[12:24] = np.roll(shifted[12:24], 5)
+        np.testing.assert_allclose(index._embed(shifted), index._embed(vectors[0]), atol=1e-5)
+
+    def test_scorer_is_used_for_reranking(self, vectors):
+        index = AnnIndex.build(np.arange(len(vectors)), vectors, n_lists=4)
+        hits = index.search(
+            vectors[3], k=3, n_probe=4, scorer=ScorerName.RAW_COSINE_UNCAPPED, exclude=[3]
+        )
+        expected = score_many(vectors[3], vectors[[t for t, _ in hits]], ScorerName.RAW_COSINE_UNCAPPED)
+        np.testing.assert_allclose([s for _, s in hits], expected, atol=1e-6)
+
+    def test_empty_index(self):
+        index = AnnIndex.build([], np.empty((0, 75)))
+        assert len(index) == 0 and index.n_lists == 0
+        assert index.search(np.zeros(75), k=5) == []
+        assert index.vector(1) is None
+
+
+class TestUpdates:
+    def test_add_replaces_and_remove_drops(self, vectors):
+        index = AnnIndex.build(np.arange(100), vectors[:100], n_lists=5)
+        index.add([200, 5], vectors[[150, 160]])
+        assert len(index) == 101
+        np.testing.assert_array_equal(index.vector(200), vectors[150])
+        np.testing.assert_array_equal(index.vector(5), vectors[160])
+
+        index.remove([200, 7, 12345])
+        assert len(index) == 99
+        assert index.vector(200) is None and index.vector(7) is None
+        assert sorted(index.track_ids.tolist()) == sorted(set(range(100)) - {7})
+        assert index.offsets[-1] == len(index)
+
+    def test_save_load_round_trip(self, vectors, tmp_path):
+        path = str(tmp_path / "ann_index.npz")
+        index = AnnIndex.build(np.arange(len(vectors)), vectors, n_lists=6)
+        index.save(path)
+        loaded = AnnIndex.load(path)
+
+        assert not loaded.is_stale()
+        np.testing.assert_array_equal(loaded.track_ids, index.track_ids)
+        np.testing.assert_array_equal(loaded.offsets, index.offsets)
+        assert loaded.search(vectors[9], k=4) == index.search(vectors[9], k=4)
+
+        os.utime(path, ns=(loaded._mtime_ns + 10 ** 9, loaded._mtime_ns + 10 ** 9))
+        assert loaded.is_stale()
+
+    def test_load_missing_or_corrupt_returns_none(self, tmp_path):
+        assert AnnIndex.load(str(tmp_path / "missing.npz")) is None
+        corrupt = tmp_path / "corrupt.npz"
+        corrupt.write_bytes(b"not an index")
+        assert AnnIndex.load(str(corrupt)) is None
+
+
+class TestSync:
+    def test_incremental_sync(self, vectors, tmp_path):
+        store = _FakeStore(tmp_path, np.arange(100), vectors[:100])
+        index, counts = ann_index.sync(store)
+        assert counts["trained"] == 1 and counts["added"] == 100
+
+        _, counts = ann_index.sync(store)
+        assert counts == {"added": 0, "updated": 0, "removed": 0, "trained": 0}
+
+        ids = np.concatenate([np.arange(1, 100), [500, 501]])
+        changed = vectors[:100].copy()
+        changed[4] = vectors[180]
+        store = _FakeStore(tmp_path, ids, np.concatenate([changed[1:], vectors[[190, 191]]]))
+        index, counts = ann_index.sync(store)
+
+        assert counts == {"added": 2, "updated": 1, "removed": 1, "trained": 0}
+        reloaded = AnnIndex.load(index.path)
+        assert sorted(reloaded.track_ids.tolist()) == ids.tolist()
+        np.testing.assert_array_equal(reloaded.vector(4), vectors[180])
+        np.testing.assert_array_equal(reloaded.vector(501), vectors[191])
+
+    def test_growth_triggers_retraining(self, vectors, tmp_path):
+        ann_index.sync(_FakeStore(tmp_path, np.arange(50), vectors[:50]))
+        index, counts = ann_index.sync(_FakeStore(tmp_path, np.arange(150), vectors[:150]))
+        assert counts["trained"] == 1
+        assert index.trained_count == 150
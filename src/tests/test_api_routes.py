@@ -2,6 +2,7 @@
 
 Covers:
     GET  /api/admin/cache-stats
+    GET  /api/tracks/{track_id}/similar
     GET  /api/weights
     PUT  /api/weights
 
@@ -192,6 +193,64 @@ class TestTrackTraitsEndpoint:
         assert resp.json() == []
 
 
+# ---------------------------------------------------------------------------
+# GET /api/tracks/{track_id}/similar
+# ---------------------------------------------------------------------------
+
+
+def _mock_track(track_id):
+    track = MagicMock()
+    track.id = track_id
+    track.title = "Track %d" % track_id
+    track.bpm = 124.0
+    track.key = "Am"
+    track.camelot_code = "08A"
+    track.genre = None
+    track.label = None
+    track.energy = None
+    return track
+
+
+class TestSimilarTracksEndpoint:
+    @pytest.fixture()
+    def ann_index(self):
+        import numpy as np
+        from src.feature_extraction.ann_index import AnnIndex
+        from src.scripts.feature_extraction.benchmark_track_similarity import (
+            _generate_fixture_vectors,
+        )
+        return AnnIndex.build(np.arange(1, 41), _generate_fixture_vectors(n=40), n_lists=4)
+
+    def _get(self, client, path, index, mock_session=None):
+        with patch("src.api.routes._get_ann_index", return_value=index), \
+             patch("src.api.routes._get_session", return_value=mock_session or MagicMock()):
+            return client.get(path)
+
+    def test_returns_ranked_neighbours(self, client, ann_index):
+        mock_session = MagicMock()
+        mock_session.query.return_value.filter.return_value.all.return_value = [
+            _mock_track(i) for i in range(1, 41)
+        ]
+
+        resp = self._get(client, "/api/tracks/3/similar?k=5", ann_index, mock_session)
+
+        assert resp.status_code == 200
+        data = resp.json()
+        expected = ann_index.search(ann_index.vector(3), k=5, exclude=[3])
+        assert [row["id"] for row in data] == [hit_id for hit_id, _ in expected]
+        assert data[0]["similarity"] == pytest.approx(expected[0][1], abs=1e-4)
+        assert data[0]["camelot_code"] == "08A"
+        assert all(row["id"] != 3 for row in data)
+
+    def test_unknown_track_returns_404(self, client, ann_index):
+        resp = self._get(client, "/api/tracks/999/similar", ann_index)
+        assert resp.status_code == 404
+
+    def test_missing_index_returns_503(self, client):
+        resp = self._get(client, "/api/tracks/3/similar", None)
+        assert resp.status_code == 503
+
+
 # ---------------------------------------------------------------------------
 # GET /api/weights
 # ---------------------------------------------------------------------------
@@ -0,0 +1,67 @@
+"""Unit tests for src/feature_extraction/audio_loader.py
+
+Run with:
+    python -m pytest src/tests/test_audio_loader.py -v
+"""
+
+import librosa
+import numpy as np
+import pytest
+
+from src.feature_extraction.audio_loader import DecodedAudio, decode_audio
+from src.feature_extraction.config import SAMPLE_RATE, TRAIT_SAMPLE_RATE
+
+
+def _write_noise(path, duration_s=3.0, sr=SAMPLE_RATE, channels=1, seed=7):
+    import soundfile as sf
+
+    rng = np.random.default_rng(seed)
+    shape = (int(sr * duration_s), channels) if channels > 1 else int(sr * duration_s)
+    y = (0.3 * rng.standard_normal(shape)).astype(np.float32)
+    sf.write(str(path), y, sr)
+    return str(path)
+
+
+class TestDecodeAudio:
+    def test_returns_signal_per_rate(self, tmp_path):
+        path = _write_noise(tmp_path / "a.wav")
+        decoded = decode_audio(path, (TRAIT_SAMPLE_RATE, SAMPLE_RATE))
+        assert set(decoded.signals) == {TRAIT_SAMPLE_RATE, SAMPLE_RATE}
+        assert decoded.native_sr == SAMPLE_RATE
+        assert len(decoded.signal(TRAIT_SAMPLE_RATE)) == pytest.approx(
+            3.0 * TRAIT_SAMPLE_RATE, abs=1
+        )
+
+    @pytest.mark.parametrize("native_sr", [44100, 48000])
+    @pytest.mark.parametrize("channels", [1, 2])
+    def test_matches_librosa_load(self, tmp_path, native_sr, channels):
+        """Each resampled signal equals a dedicated librosa.load at that rate."""
+        path = _write_noise(tmp_path / "b.wav", sr=native_sr, channels=channels)
+        decoded = decode_audio(path, (TRAIT_SAMPLE_RATE, SAMPLE_RATE))
+        for sr in (TRAIT_SAMPLE_RATE, SAMPLE_RATE):
+            expected, _ = librosa.load(path, sr=sr, mono=True)
+            np.testing.assert_allclose(decoded.signal(sr), expected, atol=1e-6)
+
+    def test_unrequested_rate_raises(self, tmp_path):
+        path = _write_noise(tmp_path / "c.wav")
+        decoded = decode_audio(path, (TRAIT_SAMPLE_RATE,))
+        with pytest.raises(KeyError):
+            decoded.signal(SAMPLE_RATE)
+
+    def test_missing_file_raises(self, tmp_path):
+        with pytest.raises((FileNotFoundError, OSError)):
+            decode_audio(str(tmp_path / "missing.wav"), (TRAIT_SAMPLE_RATE,))
+
+
+class TestSavedDecodeSeconds:
+    def test_single_rate_saves_nothing(self):
+        decoded = DecodedAudio({16000: np.zeros(1)}, 44100, 2.0, 0.1)
+        assert decoded.saved_decode_seconds() == 0.0
+
+    def test_two_rates_save_one_decode_minus_resample(self):
+        decoded = DecodedAudio({16000: np.zeros(1), 44100: np.zeros(1)}, 44100, 2.0, 0.5)
+        assert decoded.saved_decode_seconds() == pytest.approx(1.5)
+
+    def test_never_negative(self):
+        decoded = DecodedAudio({16000: np.zeros(1), 44100: np.zeros(1)}, 48000, 0.1, 1.0)
+        assert decoded.saved_decode_seconds() == 0.0
@@ -259,3 +259,121 @@ class TestCompactDescriptor:
         assert len(desc.pack_global()) == DESCRIPTOR_DIMS * 4
         assert desc.pack_intro() is None
         assert desc.pack_outro() is None
+
+    def test_compute_from_signal_matches_path(self, tmp_path):
+        """compute(y=...) gives the same vector as decoding the file itself."""
+        import soundfile as sf
+
+        y, sr = _pink_noise(duration_s=10.0)
+        audio_file = tmp_path / "signal_track.wav"
+        sf.write(str(audio_file), y, sr)
+
+        class _FakeTrack:
+            id = 4
+            file_name = "signal_track.wav"
+
+        from_path = CompactDescriptor(_FakeTrack())
+        from_path.compute(audio_path=str(audio_file))
+
+        import librosa
+        loaded, _ = librosa.load(str(audio_file), sr=SAMPLE_RATE, mono=True)
+        from_signal = CompactDescriptor(_FakeTrack())
+        from_signal.compute(y=loaded)
+
+        np.testing.assert_array_equal(from_path.global_vector, from_signal.global_vector)
+
+
+# ---------------------------------------------------------------------------
+# Single-pass zones: compute() shares frame features across zones
+# ---------------------------------------------------------------------------
+
+def _beat_loop(duration_s, sr=SAMPLE_RATE, bpm=124.0):
+    """Return float32 mono chords over decaying noise hits that grow louder."""
+    rng = np.random.default_rng(7)
+    t = np.arange(int(sr * duration_s)) / sr
+    y = sum(0.2 * np.sin(2 * np.pi * f * t) for f in (220.0, 277.2, 329.6))
+    for onset in np.arange(0.0, duration_s, 60.0 / bpm):
+        i = int(onset * sr)
+        n = min(2000, len(y) - i)
+        y[i:i + n] += np.exp(-np.arange(n) / 300.0) * rng.standard_normal(n)
+    y *= 0.5 + 0.5 * t / duration_s
+    return (y / np.abs(y).max()).astype(np.float32), sr
+
+
+class TestSinglePassZones:
+    _BLOCKS = ((0, 24), (24, 41), (41, 67), (67, 75))
+
+    def test_zones_match_separate_extraction(self, monkeypatch):
+        from src.feature_extraction import compact_descriptor
+
+        monkeypatch.setattr(compact_descriptor, "DESCRIPTOR_ZONE_SECONDS", 4)
+        y, sr = _beat_loop(11.0)
+        zone_samples = 4 * sr
+
+        desc = CompactDescriptor(None)
+        desc.compute(y=y)
+
+        np.testing.assert_array_equal(desc.global_vector, _extract_zone_vector(y, sr))
+        for vector, segment in (
+            (desc.intro_vector, y[:zone_samples]),
+            (desc.outro_vector, y[-zone_samples:]),
+        ):
+            expected = _extract_zone_vector(segment, sr)
+            # Only frames at the zone edges differ (real audio instead of
+            # padding), so every feature block stays nearly identical; the
+            # short zones here weight the edges far more than 60 s zones do
+            for lo, hi in self._BLOCKS:
+                assert cosine_similarity(vector[lo:hi], expected[lo:hi]) > 0.995
+            np.testing.assert_allclose(vector[41:67], expected[41:67], rtol=0.02, atol=0.5)
+
+
+# ---------------------------------------------------------------------------
+# Descriptor profiles
+# ---------------------------------------------------------------------------
+
+class TestDescriptorProfiles:
+    def test_fast_profile_has_its_own_version(self):
+        from src.feature_extraction.config import DESCRIPTOR_BASE_VERSION
+
+        assert CompactDescriptor(None, profile="full").version == DESCRIPTOR_BASE_VERSION
+        assert CompactDescriptor(None, profile="fast").version == DESCRIPTOR_BASE_VERSION + "+fast"
+
+    def test_unknown_profile_is_rejected(self):
+        y, sr = _sine_wave(duration_s=2.0)
+        with pytest.raises(ValueError, match="Unknown descriptor profile"):
+            _extract_zone_vector(y, sr, profile="turbo")
+
+    def test_fast_profile_stays_close_to_full(self):
+        y, sr = _beat_loop(8.0)
+        full = _extract_zone_vector(y, sr, profile="full")
+        fast = _extract_zone_vector(y, sr, profile="fast")
+
+        assert fast.shape == (DESCRIPTOR_DIMS,)
+        assert fast.dtype == np.float32
+        # Timbre and energy come from the full-rate STFT in both profiles
+        np.testing.assert_array_equal(fast[41:75], full[41:75])
+        assert cosine_similarity(fast[0:24], full[0:24]) > 0.98
+        assert cosine_similarity(fast[24:41], full[24:41]) > 0.95
+
+    def test_profile_report_on_identical_vectors(self):
+        from src.scripts.feature_extraction.benchmark_track_similarity import (
+            _generate_fixture_vectors,
+        )
+        from src.scripts.feature_extraction.compare_descriptor_profiles import (
+            _compare_scorers,
+            _compare_vectors,
+            _summarize,
+        )
+
+        vectors = _generate_fixture_vectors(n=12)
+        report = _compare_scorers(vectors, [v.copy() for v in vectors], top_k=3)
+        for stats in report.values():
+            assert stats["mean_abs_delta"] == pytest.approx(0.0)
+            assert stats["spearman"] == pytest.approx(1.0)
+            assert stats["topk_overlap"] == pytest.approx(1.0)
+
+        shifted = vectors[0].copy()
+        shifted[24] += 0.1
+        summary = _summarize([_compare_vectors(vectors[0], shifted)])
+        assert summary["blocks"]["harmonic"]["mean_cosine"] == pytest.approx(1.0)
+        assert summary["bpm_mean_abs_delta"] == pytest.approx(0.1, abs=1e-6)
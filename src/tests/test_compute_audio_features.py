@@ -0,0 +1,31 @@
+"""Unit tests for the compute_audio_features ledger worker."""
+
+from unittest.mock import MagicMock
+
+from src.scripts.feature_extraction import compute_audio_features as caf
+from src.tests.conftest import FakeLedger, FakeTransmitter
+
+
+def test_claimed_tracks_are_reported_to_the_ledger(monkeypatch):
+    needs = {1: (False, False), 2: (False, True), 3: (False, True), 4: (False, True)}
+    outcomes = {2: None, 3: "file not found: c.mp3"}
+
+    def compute_track(session, extractor, track_id, file_name, track_needs, counts):
+        if track_id == 4:
+            raise ValueError("cannot decode")
+        if outcomes[track_id] is None:
+            counts["descriptors"] += 1
+        return outcomes[track_id]
+
+    monkeypatch.setattr(caf.database, "create_session", MagicMock)
+    monkeypatch.setattr(caf, "_missing_features", lambda session, ids: {t: needs[t] for t in ids})
+    monkeypatch.setattr(caf, "_compute_track", compute_track)
+    ledger = FakeLedger([[(1, "a.mp3"), (2, "b.mp3")], [(3, "c.mp3"), (4, "d.mp3")]])
+    transmitter = FakeTransmitter()
+
+    caf._compute_features(ledger, transmitter)
+
+    # Track 1 needed nothing by the time it was claimed
+    assert ledger.done_ids == [1, 2]
+    assert ledger.failures == {3: "file not found: c.mp3", 4: "cannot decode"}
+    assert transmitter.sent[0][:3] == (0, 1, 2)
@@ -0,0 +1,151 @@
+"""Unit tests for the compute_compact_descriptors process pool."""
+
+import os
+import time
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+
+from src.scripts.feature_extraction import compute_compact_descriptors as ccd
+from src.tests.conftest import FakeLedger
+
+
+class _FakeDescriptor:
+    """Picklable stand-in for CompactDescriptor; file names pick the outcome."""
+
+    def __init__(self, track):
+        self.global_vector = None
+        self.intro_vector = None
+        self.outro_vector = None
+        self.version = "test"
+
+    def compute(self, audio_path=None, y=None):
+        if audio_path.endswith("broken.mp3"):
+            raise ValueError("cannot decode")
+        if audio_path.endswith("hung.mp3"):
+            time.sleep(60)
+        if not audio_path.endswith("silent.mp3"):
+            self.global_vector = np.ones(4, dtype=np.float32)
+
+    def pack_global(self):
+        return self.global_vector.tobytes()
+
+    def pack_intro(self):
+        return None
+
+    def pack_outro(self):
+        return None
+
+
+@pytest.fixture
+def fake_descriptor(monkeypatch):
+    monkeypatch.setattr(ccd, "CompactDescriptor", _FakeDescriptor)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = MagicMock()
+    session.guarded_add.return_value = True
+    monkeypatch.setattr(ccd.database, "create_session", lambda: session)
+    return session
+
+
+class TestDescribe:
+    def test_returns_descriptor(self, fake_descriptor):
+        track_id, desc, error, _ = ccd._describe((3, "a.mp3"))
+        assert (track_id, error) == (3, None)
+        assert desc.global_vector is not None
+
+    def test_skip_and_error_are_reported_not_raised(self, fake_descriptor):
+        assert ccd._describe((4, "silent.mp3"))[:3] == (4, None, None)
+        track_id, desc, error, _ = ccd._describe((5, "broken.mp3"))
+        assert (track_id, desc) == (5, None)
+        assert error == "ValueError: cannot decode"
+
+
+class TestWorkLedger:
+    def test_results_are_written_in_batches(self, fake_descriptor, session, monkeypatch):
+        monkeypatch.setattr(ccd, "DESCRIPTOR_WRITE_BATCH", 3)
+        monkeypatch.setattr(ccd, "DESCRIPTOR_MAX_TASKS_PER_CHILD", 2)
+        ledger = FakeLedger([[(i, "t%d.mp3" % i) for i in range(b, b + 4)] for b in (1, 5)])
+
+        assert ccd._work_ledger(ledger, 2)[:3] == (8, 0, 0)
+        assert sorted(ledger.done_ids) == list(range(1, 9))
+        assert session.add.call_count == 8
+        # Two full batches of 3 and the remaining 2 rows
+        assert session.commit.call_count == 3
+        session.close.assert_called_once()
+
+    def test_skipped_and_failed_tracks_go_to_the_ledger(self, fake_descriptor, session):
+        ledger = FakeLedger([[(1, "a.mp3"), (2, "silent.mp3"), (3, "broken.mp3")]])
+
+        assert ccd._work_ledger(ledger, 2)[:3] == (1, 1, 1)
+        assert ledger.done_ids == [1]
+        assert ledger.failures[2] == "no descriptor computed"
+        assert ledger.failures[3] == "ValueError: cannot decode"
+
+    def test_failed_group_commit_falls_back_to_single_rows(self, fake_descriptor, session):
+        session.commit.side_effect = RuntimeError("duplicate key")
+        session.guarded_add.side_effect = lambda row: row.track_id != 2
+        ledger = FakeLedger([[(1, "a.mp3"), (2, "b.mp3")]])
+
+        assert ccd._work_ledger(ledger, 1)[:3] == (1, 0, 1)
+        session.rollback.assert_called_once()
+        assert ledger.done_ids == [1]
+        assert ledger.failures == {2: "descriptor row insert failed"}
+
+    def test_ledger_error_after_commit_is_not_retried_row_by_row(
+        self, fake_descriptor, session, monkeypatch
+    ):
+        def done(track_ids):
+            raise RuntimeError("ledger unavailable")
+
+        ledger = FakeLedger([[(1, "a.mp3"), (2, "b.mp3")]])
+        monkeypatch.setattr(ledger, "done", done)
+
+        with pytest.raises(RuntimeError, match="ledger unavailable"):
+            ccd._work_ledger(ledger, 1)
+        session.commit.assert_called_once()
+        session.guarded_add.assert_not_called()
+        assert ledger.failures == {}
+
+    def test_rows_are_written_when_the_last_task_times_out(
+        self, fake_descriptor, session, monkeypatch
+    ):
+        monkeypatch.setattr(ccd, "DESCRIPTOR_TASK_TIMEOUT", 1.0)
+        monkeypatch.setattr(ccd, "_POLL_SECONDS", 0.05)
+        ledger = FakeLedger([[(1, "a.mp3"), (2, "hung.mp3")]])
+
+        assert ccd._work_ledger(ledger, 2)[:3] == (1, 0, 1)
+        assert ledger.done_ids == [1]
+        assert ledger.failures == {2: "timed out after 1s"}
+        session.commit.assert_called_once()
+
+    def test_row_from_another_version_is_overwritten(self, fake_descriptor, session):
+        from src.models.track_descriptor import TrackDescriptor
+
+        old = TrackDescriptor(track_id=1, global_vector=b"old", descriptor_version="1")
+        session.query.return_value.filter.return_value.all.return_value = [old]
+        ledger = FakeLedger([[(1, "a.mp3"), (2, "b.mp3")]])
+
+        assert ccd._work_ledger(ledger, 1)[:3] == (2, 0, 0)
+        rows = {row.track_id: row for row in (c.args[0] for c in session.add.call_args_list)}
+        assert rows[1] is old
+        assert old.descriptor_version == "test"
+        assert old.global_vector == np.ones(4, dtype=np.float32).tobytes()
+        assert rows[2] is not old and rows[2].descriptor_version == "test"
+
+    def test_empty_ledger(self, fake_descriptor, session):
+        assert ccd._work_ledger(FakeLedger([]), 2)[:3] == (0, 0, 0)
+        session.add.assert_not_called()
+
+    def test_worker_timings_come_back_per_track(self, fake_descriptor, session, monkeypatch):
+        from src.feature_extraction import profiling
+
+        monkeypatch.setattr(profiling.timer, "enabled", True)
+        ledger = FakeLedger([[(1, "a.mp3"), (2, "silent.mp3"), (3, "broken.mp3")]])
+
+        timings = ccd._work_ledger(ledger, 2)[3]
+        assert len(timings) == 3
+        assert all(snapshot["pid"] != os.getpid() for snapshot in timings)
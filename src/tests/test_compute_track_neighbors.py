@@ -0,0 +1,134 @@
+"""Tests for src/scripts/feature_extraction/compute_track_neighbors.py
+
+The write path runs against the configured Postgres server in a throwaway
+schema (track_neighbors uses array columns and ON CONFLICT); those tests are
+skipped when the server is unreachable.
+
+Run with:
+    python -m pytest src/tests/test_compute_track_neighbors.py -v
+"""
+
+import importlib
+import uuid
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from src.db import database
+from src.feature_extraction import descriptor_store
+from src.feature_extraction.config import DESCRIPTOR_VERSION
+from src.feature_extraction.track_similarity import ScorerName, score_many
+from src.models.track_descriptor import TrackDescriptor
+from src.scripts.feature_extraction import compute_track_neighbors as ctn
+from src.scripts.feature_extraction.benchmark_track_similarity import (
+    _generate_fixture_vectors,
+)
+
+_migration = importlib.import_module("src.scripts.migrations.20261018_create_track_neighbors")
+
+_TRACK_IDS = [3 * i + 7 for i in range(24)]
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    engine = create_engine("sqlite://")
+    TrackDescriptor.__table__.create(engine)
+    session = sessionmaker(bind=engine)()
+    for track_id, vector in zip(_TRACK_IDS, _generate_fixture_vectors(n=len(_TRACK_IDS))):
+        session.add(TrackDescriptor(
+            id=track_id,
+            track_id=track_id,
+            global_vector=vector.tobytes(),
+            descriptor_version=DESCRIPTOR_VERSION,
+        ))
+    session.commit()
+    store, _ = descriptor_store.refresh(
+        session, store_dir=str(tmp_path_factory.mktemp("store")),
+        descriptor_version=DESCRIPTOR_VERSION,
+    )
+    session.close()
+    engine.dispose()
+    return store
+
+
+@pytest.fixture
+def engine():
+    schema = "test_track_neighbors_%s" % uuid.uuid4().hex[:8]
+    try:
+        with database.engine.begin() as conn:
+            conn.execute(text("CREATE SCHEMA %s" % schema))
+    except Exception as exc:
+        pytest.skip("Postgres unavailable: %s" % exc)
+
+    engine = create_engine(
+        database.engine.url, connect_args={"options": "-csearch_path=%s" % schema}
+    )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE track (id INTEGER PRIMARY KEY)"))
+        conn.execute(text(_migration.CREATE_TABLE_SQL))
+        conn.execute(
+            text("INSERT INTO track (id) VALUES %s" % ", ".join("(%d)" % i for i in _TRACK_IDS))
+        )
+    yield engine
+
+    engine.dispose()
+    with database.engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA %s CASCADE" % schema))
+
+
+class TestNeighborLists:
+    def test_exact_lists_match_brute_force(self, store):
+        lists = list(ctn.neighbor_lists(store, k=4))
+        assert [track_id for track_id, _, _ in lists] == _TRACK_IDS
+
+        for row, (track_id, neighbor_ids, scores) in enumerate(lists):
+            all_scores = score_many(store.vectors[row], store.vectors)
+            all_scores[row] = -np.inf
+            best = np.argsort(-all_scores, kind="stable")[:4]
+            assert neighbor_ids == store.track_ids[best].tolist()
+            np.testing.assert_allclose(scores, all_scores[best], atol=1e-6)
+
+    def test_approximate_lists_with_every_list_probed(self, store):
+        exact = {t: ids for t, ids, _ in ctn.neighbor_lists(store, k=4)}
+        approximate = {
+            t: ids
+            for t, ids, _ in ctn.neighbor_lists(store, k=4, approximate=True, n_probe=len(store))
+        }
+        assert approximate == exact
+
+
+class TestWriteNeighbors:
+    def test_upsert_and_read_back(self, engine, store):
+        with engine.begin() as conn:
+            written = ctn.write_neighbors(conn, ctn.neighbor_lists(store, k=3))
+        assert written == _TRACK_IDS
+
+        with engine.begin() as conn:
+            ctn.write_neighbors(conn, [(_TRACK_IDS[0], [_TRACK_IDS[1]], [0.5])])
+
+        with engine.connect() as conn:
+            rows = {
+                row.track_id: row
+                for row in conn.execute(text("SELECT * FROM track_neighbors")).fetchall()
+            }
+        assert len(rows) == len(_TRACK_IDS)
+        assert rows[_TRACK_IDS[0]].neighbor_ids == [_TRACK_IDS[1]]
+        assert rows[_TRACK_IDS[0]].scorer == ScorerName.LATE_FUSION_V1.value
+        assert len(rows[_TRACK_IDS[1]].neighbor_ids) == 3
+        assert rows[_TRACK_IDS[1]].scores == sorted(rows[_TRACK_IDS[1]].scores, reverse=True)
+        assert rows[_TRACK_IDS[1]].descriptor_version == DESCRIPTOR_VERSION
+
+    def test_rows_not_rewritten_since_the_run_started_are_removed(self, engine, store):
+        with engine.begin() as conn:
+            ctn.write_neighbors(conn, ctn.neighbor_lists(store, k=3))
+        with engine.begin() as conn:
+            started = conn.execute(text("SELECT clock_timestamp()")).scalar()
+        with engine.begin() as conn:
+            ctn.write_neighbors(conn, [(t, [_TRACK_IDS[0]], [0.5]) for t in _TRACK_IDS[1:5]])
+            assert ctn.remove_stale(conn, started) == len(_TRACK_IDS) - 4
+
+        with engine.connect() as conn:
+            kept = conn.execute(text("SELECT track_id FROM track_neighbors")).fetchall()
+        assert sorted(row.track_id for row in kept) == _TRACK_IDS[1:5]
@@ -1,51 +1,7 @@
 """Unit tests for compute_track_traits helpers."""
 
-from src.scripts.feature_extraction.compute_track_traits import (
-    _chunkify,
-    _resolve_audio_path,
-)
-
-
-# ---------------------------------------------------------------------------
-# _chunkify
-# ---------------------------------------------------------------------------
-
-
-class TestChunkify:
-    def test_even_split(self):
-        result = _chunkify([1, 2, 3, 4], 2)
-        assert len(result) == 2
-        assert result[0] == [1, 2]
-        assert result[1] == [3, 4]
-
-    def test_uneven_split_distributes_remainder(self):
-        result = _chunkify([1, 2, 3, 4, 5], 3)
-        assert len(result) == 3
-        total = sum(len(c) for c in result)
-        assert total == 5
-        assert len(result[0]) >= len(result[-1])
-
-    def test_n_larger_than_list_caps_at_list_length(self):
-        result = _chunkify([1, 2, 3], 10)
-        assert len(result) == 3
-        assert all(len(c) == 1 for c in result)
-
-    def test_n_equals_one_returns_single_chunk(self):
-        result = _chunkify([1, 2, 3], 1)
-        assert result == [[1, 2, 3]]
-
-    def test_empty_list_returns_empty(self):
-        result = _chunkify([], 3)
-        assert result == []
-
-    def test_single_element(self):
-        result = _chunkify([42], 1)
-        assert result == [[42]]
-
-    def test_all_items_present(self):
-        items = list(range(20))
-        chunks = _chunkify(items, 7)
-        assert sorted(i for c in chunks for i in c) == items
+from src.scripts.feature_extraction.compute_track_traits import _resolve_audio_path
+from src.tests.conftest import FakeLedger, FakeTransmitter
 
 
 # ---------------------------------------------------------------------------
@@ -137,3 +93,153 @@ class TestResolveAudioPath:
         stored_name = "AB\x80cd?ef.mp3"
         result = _resolve_audio_path(str(tmp_path), stored_name)
         assert result == str(actual)
+
+
+# ---------------------------------------------------------------------------
+# Pipelined worker: decode thread -> inference -> writer thread
+# ---------------------------------------------------------------------------
+
+
+def _traits(track_id):
+    return {
+        "voice_instrumental": 0.1,
+        "danceability": 0.2,
+        "bright_dark": 0.3,
+        "acoustic_electronic": 0.4,
+        "tonal_atonal": 0.5,
+        "reverb": 0.6,
+        "onset_density": float(track_id),
+        "spectral_flatness": 0.01,
+        "mood_theme": {},
+        "genre": {},
+        "instruments": {},
+        "trait_version": "test",
+    }
+
+
+class _StubExtractor:
+    """Records which thread runs each stage; fails paths containing 'bad'."""
+
+    def __init__(self):
+        self.prepare_threads = set()
+        self.finish_threads = set()
+
+    def _prepare_batch(self, paths, with_embedding=False):
+        import threading
+
+        self.prepare_threads.add(threading.get_ident())
+        return paths
+
+    def _finish_batch(self, paths, with_embedding=False):
+        import threading
+
+        import numpy as np
+
+        from src.feature_extraction.trait_extractor import TraitEmbedding
+
+        self.finish_threads.add(threading.get_ident())
+        return [
+            ValueError("bad input")
+            if "bad" in path
+            else (_traits(int(path.rsplit("/", 1)[-1])), TraitEmbedding(np.zeros(4), None))
+            for path in paths
+        ]
+
+
+class TestPipelinedWorker:
+    def _run(self, chunk, session, monkeypatch):
+        import threading
+        from unittest.mock import MagicMock
+
+        from src.scripts.feature_extraction import compute_track_traits as ctt
+
+        mock_db = MagicMock()
+        mock_db.create_session.return_value = session
+        monkeypatch.setattr(ctt, "database", mock_db)
+        monkeypatch.setattr(ctt, "TRAIT_WRITE_BATCH", 3)
+
+        extractor = _StubExtractor()
+        transmitter = FakeTransmitter()
+        self.ledger = FakeLedger(chunk[i : i + 2] for i in range(0, len(chunk), 2))
+        ctt._compute_traits(self.ledger, transmitter, extractor)
+        assert threading.get_ident() in extractor.finish_threads
+        assert threading.get_ident() not in extractor.prepare_threads
+        return transmitter.sent[0]
+
+    def test_all_rows_written_with_stage_timings(self, monkeypatch):
+        from unittest.mock import MagicMock
+
+        session = MagicMock()
+        chunk = [(i, str(i)) for i in range(1, 8)]
+        saved, skipped, failed, timings, profile = self._run(chunk, session, monkeypatch)
+
+        assert (saved, skipped, failed) == (7, 0, 0)
+        added = [call.args[0].track_id for call in session.add.call_args_list]
+        assert sorted(added) == list(range(1, 8))
+        assert session.session.merge.call_count == 7
+        # Rows are grouped: never more commits than rows
+        assert 1 <= session.commit.call_count <= 7
+        assert set(timings) == {"decode", "infer", "write", "infer_idle"}
+        assert profile is None  # FEATURE_TIMING is off
+        assert sorted(self.ledger.done_ids) == list(range(1, 8))
+        assert self.ledger.failures == {}
+        session.close.assert_called_once()
+
+    def test_failed_group_falls_back_to_per_row_inserts(self, monkeypatch):
+        from unittest.mock import MagicMock
+
+        session = MagicMock()
+        pending = []
+        session.add.side_effect = lambda row: pending.append(row.track_id)
+
+        def commit():
+            # Any group containing track 2 (a duplicate) fails as a whole
+            failed = 2 in pending
+            pending.clear()
+            if failed:
+                raise RuntimeError("duplicate key")
+
+        session.commit.side_effect = commit
+        session.guarded_add.side_effect = lambda row: row.track_id != 2
+        chunk = [(1, "1"), (2, "2"), (3, "bad"), (4, "4")]
+        saved, _, failed, _, _ = self._run(chunk, session, monkeypatch)
+
+        assert saved == 2
+        assert failed == 2  # track 2 rejected, track 3 failed inference
+        assert sorted(self.ledger.done_ids) == [1, 4]
+        assert sorted(self.ledger.failures) == [2, 3]
+        session.rollback.assert_called()
+
+    def test_ledger_error_after_commit_is_not_retried_row_by_row(self, monkeypatch):
+        from unittest.mock import MagicMock
+
+        session = MagicMock()
+        chunk = [(i, str(i)) for i in range(1, 5)]
+        calls = []
+
+        def done(track_ids):
+            calls.append(list(track_ids))
+            if len(calls) == 1:
+                raise RuntimeError("ledger unavailable")
+
+        monkeypatch.setattr(FakeLedger, "done", lambda self, track_ids: done(track_ids))
+        saved, _, failed, _, _ = self._run(chunk, session, monkeypatch)
+
+        # The first group was committed; its ledger error neither re-inserts
+        # nor fails the rows, and the writer goes on with the next group
+        session.guarded_add.assert_not_called()
+        assert saved == 4 and failed == 0
+        assert len(calls) >= 2
+
+    def test_stopped_writer_does_not_block_inference(self, monkeypatch):
+        from unittest.mock import MagicMock
+
+        from src.scripts.feature_extraction import compute_track_traits as ctt
+
+        monkeypatch.setattr(ctt, "_write_rows", lambda *args: None)
+        monkeypatch.setattr(ctt, "_WRITER_POLL_SECONDS", 0.01)
+        chunk = [(i, str(i)) for i in range(1, 30)]
+        saved, _, _, _, _ = self._run(chunk, MagicMock(), monkeypatch)
+
+        assert saved == 0
+        assert self.ledger.done_ids == []
@@ -0,0 +1,195 @@
+"""Unit tests for src/feature_extraction/corpus_stats.py
+
+Run with:
+    python -m pytest src/tests/test_corpus_stats.py -v
+"""
+
+import datetime
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from src.feature_extraction import corpus_stats
+from src.feature_extraction.corpus_stats import CorpusStats
+from src.feature_extraction.track_similarity import (
+    ScorerName,
+    compute_similarity,
+    score_many,
+)
+from src.models.track_descriptor import TrackDescriptor
+from src.scripts.feature_extraction.benchmark_track_similarity import (
+    _generate_fixture_vectors,
+)
+from src.tests.conftest import STORE_VERSION, T0, put_descriptor, refresh_store
+
+
+@pytest.fixture(scope="module")
+def vectors():
+    return np.array(_generate_fixture_vectors(n=60, seed=3))
+
+
+def _assert_matches(stats, matrix):
+    matrix = np.asarray(matrix, dtype=np.float64)
+    assert stats.count == len(matrix)
+    np.testing.assert_allclose(stats.mean, matrix.mean(axis=0), rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(stats.variance, matrix.var(axis=0), rtol=1e-7, atol=1e-9)
+
+
+class TestWelford:
+    def test_chunked_updates_match_numpy(self, vectors):
+        stats = CorpusStats()
+        for chunk in np.split(vectors, [1, 7, 30]):
+            stats.update(chunk)
+        _assert_matches(stats, vectors)
+
+    def test_remove_undoes_update(self, vectors):
+        stats = CorpusStats.from_vectors(vectors)
+        stats.remove(vectors[[3, 10, 41]])
+        _assert_matches(stats, np.delete(vectors, [3, 10, 41], axis=0))
+
+        stats.remove(np.delete(vectors, [3, 10, 41], axis=0))
+        assert stats.count == 0 and not stats.m2.any()
+
+    def test_scorer_kwargs_match_the_benchmark_harness(self, vectors):
+        from src.feature_extraction.track_similarity import BenchmarkHarness
+
+        expected = BenchmarkHarness(list(vectors)).corpus_stats()
+        got = CorpusStats.from_vectors(vectors).scorer_kwargs()
+        assert set(got) == set(expected)
+        for key in expected:
+            np.testing.assert_allclose(got[key], expected[key], rtol=1e-6, atol=1e-9)
+
+        assert CorpusStats.from_vectors(vectors[:1]).scorer_kwargs() == {}
+
+    def test_save_load_round_trip(self, vectors, tmp_path):
+        path = str(tmp_path / "corpus_stats.json")
+        stats = CorpusStats.from_vectors(vectors, generation=4)
+        stats.save(path, "v1")
+
+        loaded = CorpusStats.load(path, "v1")
+        assert loaded.generation == 4
+        _assert_matches(loaded, vectors)
+        assert CorpusStats.load(path, "v2") is None
+        assert CorpusStats.load(str(tmp_path / "missing.json")) is None
+
+
+class TestSync:
+    def test_incremental_after_refresh(self, session, tmp_path, vectors):
+        for track_id in range(1, 41):
+            put_descriptor(session, track_id, vectors[track_id])
+        first, _ = refresh_store(session, tmp_path)
+        stats, counts = corpus_stats.sync(first)
+        assert (counts["added"], counts["removed"], counts["rebuilt"]) == (40, 0, 1)
+
+        _, counts = corpus_stats.sync(first, None)
+        assert (counts["added"], counts["removed"], counts["rebuilt"]) == (0, 0, 0)
+
+        # Two new tracks, one recomputed, one deleted
+        put_descriptor(session, 50, vectors[50])
+        put_descriptor(session, 51, vectors[51])
+        put_descriptor(session, 5, vectors[55], computed_at=T0 + datetime.timedelta(hours=1))
+        session.query(TrackDescriptor).filter_by(track_id=9).delete()
+        session.commit()
+        second, _ = refresh_store(session, tmp_path)
+
+        stats, counts = corpus_stats.sync(second, first)
+        assert (counts["added"], counts["removed"], counts["rebuilt"]) == (3, 2, 0)
+        _assert_matches(stats, second.vectors)
+        stats_path = corpus_stats.stats_path(str(tmp_path), STORE_VERSION)
+        assert CorpusStats.load(stats_path, STORE_VERSION).count == 41
+
+    def test_unknown_previous_generation_rebuilds(self, session, tmp_path, vectors):
+        for track_id in range(1, 11):
+            put_descriptor(session, track_id, vectors[track_id])
+        first, _ = refresh_store(session, tmp_path)
+        corpus_stats.sync(first)
+        put_descriptor(session, 20, vectors[20])
+        second, _ = refresh_store(session, tmp_path)
+
+        stats, counts = corpus_stats.sync(second, None)
+        assert counts["rebuilt"] == 1
+        _assert_matches(stats, second.vectors)
+
+
+class TestScoringStats:
+    def test_frozen_once_per_version(self, session, tmp_path, vectors):
+        for track_id in range(1, 21):
+            put_descriptor(session, track_id, vectors[track_id])
+        first, _ = refresh_store(session, tmp_path)
+        _, counts = corpus_stats.sync(first)
+        assert counts["frozen"] == 1
+        scoring_path = corpus_stats.scoring_stats_path(str(tmp_path), STORE_VERSION)
+        _assert_matches(CorpusStats.load(scoring_path, STORE_VERSION), first.vectors)
+
+        # Growing the library moves the running statistics, not the frozen ones
+        for track_id in range(21, 50):
+            put_descriptor(session, track_id, vectors[track_id] * 3.0)
+        second, _ = refresh_store(session, tmp_path)
+        stats, counts = corpus_stats.sync(second, first)
+        assert counts["frozen"] == 0
+        assert counts["drift"] == pytest.approx(
+            corpus_stats.drift(stats, CorpusStats.from_vectors(first.vectors))
+        )
+        assert counts["drift"] > 0.1
+        _assert_matches(CorpusStats.load(scoring_path, STORE_VERSION), first.vectors)
+
+        _, counts = corpus_stats.sync(second, refreeze=True)
+        assert counts["frozen"] == 1
+        _assert_matches(CorpusStats.load(scoring_path, STORE_VERSION), second.vectors)
+
+    def test_scorers_load_the_frozen_statistics(self, session, tmp_path, vectors, monkeypatch):
+        for track_id in range(1, 21):
+            put_descriptor(session, track_id, vectors[track_id])
+        corpus_stats.sync(refresh_store(session, tmp_path)[0])
+        monkeypatch.setattr(corpus_stats, "DESCRIPTOR_STORE_DIR", str(tmp_path))
+        monkeypatch.setattr(corpus_stats, "DESCRIPTOR_VERSION", STORE_VERSION)
+
+        expected = CorpusStats.from_vectors(vectors[1:21]).scorer_kwargs()
+        got = corpus_stats.default_scorer_kwargs()
+        assert set(got) == set(expected)
+        np.testing.assert_allclose(got["corpus_variance"], expected["corpus_variance"], rtol=1e-6)
+
+    def test_scoring_does_not_need_the_database(self):
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        code = (
+            "import sys, numpy as np\n"
+            "from src.feature_extraction.track_similarity import compute_similarity\n"
+            "a = np.linspace(0.0, 1.0, 75)\n"
+            "print(compute_similarity(a, a), 'src.db' in sys.modules)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, capture_output=True, text=True,
+            env=dict(os.environ, DB_PORT="1"), timeout=120,
+        )
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.split() == ["1.0", "False"]
+
+
+class TestScorerInjection:
+    def test_saved_stats_reach_every_scorer_call(self, vectors, monkeypatch):
+        kwargs = CorpusStats.from_vectors(vectors).scorer_kwargs()
+        monkeypatch.setattr(corpus_stats, "_default_kwargs", kwargs)
+
+        for scorer in (ScorerName.STANDARDIZED_EUCLIDEAN, ScorerName.LATE_FUSION_V1):
+            explicit = compute_similarity(vectors[0], vectors[1], scorer, **kwargs)
+            assert compute_similarity(vectors[0], vectors[1], scorer) == pytest.approx(explicit)
+            np.testing.assert_allclose(
+                score_many(vectors[0], vectors[1:4], scorer),
+                score_many(vectors[0], vectors[1:4], scorer, **kwargs),
+            )
+
+    def test_explicit_stats_win(self, vectors, monkeypatch):
+        monkeypatch.setattr(
+            corpus_stats, "_default_kwargs", CorpusStats.from_vectors(vectors).scorer_kwargs()
+        )
+        unit = np.ones(vectors.shape[1])
+        with_unit = compute_similarity(
+            vectors[0], vectors[1], ScorerName.STANDARDIZED_EUCLIDEAN, corpus_variance=unit
+        )
+        monkeypatch.setattr(corpus_stats, "_default_kwargs", {})
+        assert with_unit == pytest.approx(
+            compute_similarity(vectors[0], vectors[1], ScorerName.STANDARDIZED_EUCLIDEAN)
+        )
@@ -266,6 +266,101 @@ class TestWarmFromDb:
 # ---------------------------------------------------------------------------
 
 
+def _make_neighbor_row(track_id, neighbor_ids, scores):
+    row = MagicMock()
+    row.track_id = track_id
+    row.neighbor_ids = neighbor_ids
+    row.scores = scores
+    return row
+
+
+class TestWarmFromNeighborTable:
+    @staticmethod
+    def _session(root, depth2_rows, pair_rows=()):
+        """Session whose track_neighbors and track_cosine_similarity queries
+        return the given rows."""
+        from src.models.track_neighbors import TrackNeighbors
+
+        neighbor_query = MagicMock()
+        neighbor_query.filter.return_value.first.return_value = root
+        neighbor_query.filter.return_value.all.return_value = depth2_rows
+        pair_query = MagicMock()
+        pair_query.filter.return_value.all.return_value = list(pair_rows)
+
+        session = MagicMock()
+        session.query.side_effect = (
+            lambda model: neighbor_query if model is TrackNeighbors else pair_query
+        )
+        return session, neighbor_query, pair_query
+
+    @patch("src.harmonic_mixing.cosine_cache.database")
+    def test_depth_2_from_two_queries(self, mock_db):
+        session, neighbor_query, _ = self._session(
+            _make_neighbor_row(10, [20, 30], [0.8, 0.7]),
+            [
+                _make_neighbor_row(20, [10, 40], [0.8, 0.6]),
+                _make_neighbor_row(30, [50], [0.5]),
+            ],
+        )
+        mock_db.create_session.return_value = session
+
+        cache = CosineCache(neighbor_table=True)
+        cache._warmup_worker(10, threading.Event())
+
+        assert cache.get(10, 20) == 0.8
+        assert cache.get(10, 30) == 0.7
+        assert cache.get(20, 40) == 0.6
+        assert cache.get(30, 50) == 0.5
+        assert cache.size() == 4
+        assert neighbor_query.filter.call_count == 2
+
+    @pytest.mark.parametrize("via_worker", [True, False])
+    @patch("src.harmonic_mixing.cosine_cache.database")
+    def test_bfs_continues_past_the_top_k(self, mock_db, via_worker):
+        # 60 is a harmonic candidate of 10 outside its persisted top-K
+        session, _, pair_query = self._session(
+            _make_neighbor_row(10, [20], [0.8]),
+            [],
+            [_make_sim_row(10, 20, 0.8), _make_sim_row(10, 60, 0.3)],
+        )
+        mock_db.create_session.return_value = session
+
+        cache = CosineCache(neighbor_table=True)
+        if via_worker:
+            cache._warmup_worker(10, threading.Event())
+        else:
+            cache.warm_from_db(10)
+
+        assert pair_query.filter.called
+        assert cache.get(10, 60) == 0.3
+        assert cache.get(10, 20) == 0.8
+        # The seeded pair was not put a second time
+        assert [e["pair"] for e in cache.get_stats()["recent_entries"]].count((10, 20)) == 1
+
+    @patch("src.harmonic_mixing.cosine_cache.database")
+    def test_falls_back_to_pairs_without_a_row(self, mock_db):
+        session, _, pair_query = self._session(None, [], [_make_sim_row(10, 20, 0.8)])
+        mock_db.create_session.return_value = session
+
+        cache = CosineCache(neighbor_table=True)
+        cache.warm_from_db(10)
+
+        assert cache.get(10, 20) == 0.8
+        assert pair_query.filter.called
+
+    @patch("src.harmonic_mixing.cosine_cache.database")
+    def test_falls_back_when_the_table_is_missing(self, mock_db):
+        session, neighbor_query, _ = self._session(None, [], [_make_sim_row(10, 20, 0.8)])
+        neighbor_query.filter.side_effect = RuntimeError("relation does not exist")
+        mock_db.create_session.return_value = session
+
+        cache = CosineCache(neighbor_table=True)
+        cache.warm_from_db(10)
+
+        session.rollback.assert_called_once()
+        assert cache.get(10, 20) == 0.8
+
+
 class TestScheduleWarmup:
     def test_delayed_start(self):
         """Warm-up must not start immediately; it waits for the configured delay."""
@@ -12,11 +12,11 @@ from src.data_management.config import TrackDBCols
 from src.feature_extraction.config import DESCRIPTOR_VERSION
 from src.models.track_cosine_similarity import TrackCosineSimilarity
 from src.scripts.feature_extraction.compute_cosine_similarities import (
-    _chunkify,
     _classify_existing_pairs,
     _extract_candidate_ids,
     _get_tracks_for_processing,
     _ordered_pair,
+    _score_candidates,
 )
 
 
@@ -144,22 +144,30 @@ class TestExtractCandidateIds:
 
 
 # ---------------------------------------------------------------------------
-# _chunkify (same logic as compute_track_traits, smoke-tested here)
+# _score_candidates
 # ---------------------------------------------------------------------------
 
 
-class TestChunkifyCosine:
-    def test_even_split(self):
-        result = _chunkify([1, 2, 3, 4], 2)
-        assert len(result) == 2
+class TestScoreCandidates:
+    def test_batch_scores_match_pairwise_scores(self):
+        import numpy as np
 
-    def test_empty_list(self):
-        assert _chunkify([], 3) == []
+        from src.feature_extraction.track_similarity import ScorerName, compute_similarity
 
-    def test_all_items_present(self):
-        items = list(range(15))
-        chunks = _chunkify(items, 4)
-        assert sorted(x for c in chunks for x in c) == items
+        rng = np.random.default_rng(1)
+        source = rng.uniform(0.0, 1.0, 75).astype(np.float32)
+        cands = {i: rng.uniform(0.0, 1.0, 75).astype(np.float32) for i in (5, 9, 12)}
+        for scorer in (None, ScorerName.CURRENT_COSINE_CLAMPED):
+            scores = _score_candidates(source, cands, scorer)
+            assert set(scores) == {5, 9, 12}
+            for cand_id, vec in cands.items():
+                expected = compute_similarity(
+                    source, vec, scorer=scorer or ScorerName.LATE_FUSION_V1
+                )
+                assert scores[cand_id] == pytest.approx(expected, abs=1e-6)
+
+    def test_no_candidates(self):
+        assert _score_candidates(None, {}) == {}
 
 
 # ---------------------------------------------------------------------------
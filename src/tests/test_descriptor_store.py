@@ -0,0 +1,147 @@
+"""Unit tests for src/feature_extraction/descriptor_store.py
+
+Run with:
+    python -m pytest src/tests/test_descriptor_store.py -v
+"""
+
+import datetime
+import json
+import os
+
+import numpy as np
+import pytest
+
+from src.feature_extraction import descriptor_store
+from src.feature_extraction.config import DESCRIPTOR_DIMS
+from src.feature_extraction.descriptor_store import DescriptorStore
+from src.models.track_descriptor import TrackDescriptor
+from src.tests.conftest import (
+    STORE_VERSION,
+    T0,
+    put_descriptor,
+    refresh_store,
+    store_vector,
+)
+
+
+class TestRefresh:
+    def test_export_and_open(self, session, tmp_path):
+        for track_id in (30, 10, 20):
+            put_descriptor(session, track_id)
+        put_descriptor(session, 40, version="other")
+
+        store, counts = refresh_store(session, tmp_path)
+        assert counts == {"added": 3, "updated": 0, "removed": 0, "unchanged": 0}
+
+        reopened = DescriptorStore.open(str(tmp_path), STORE_VERSION)
+        assert list(reopened.track_ids) == [10, 20, 30]
+        assert isinstance(reopened.vectors, np.memmap)
+        assert reopened.vectors.shape == (3, DESCRIPTOR_DIMS)
+        np.testing.assert_array_equal(reopened.vector(20), store_vector(20))
+        assert reopened.vector(40) is None
+        assert 30 in reopened and 25 not in reopened
+        assert sorted(reopened.vectors_for([10, 25, 30])) == [10, 30]
+
+    def test_only_changed_rows_are_fetched(self, session, tmp_path, monkeypatch):
+        for track_id in (1, 2, 3):
+            put_descriptor(session, track_id)
+        first, _ = refresh_store(session, tmp_path)
+
+        put_descriptor(session, 2, computed_at=T0 + datetime.timedelta(seconds=1),
+             vector=np.zeros(DESCRIPTOR_DIMS, dtype=np.float32))
+        put_descriptor(session, 4)
+        session.query(TrackDescriptor).filter_by(track_id=1).delete()
+        session.commit()
+
+        fetch = descriptor_store._fetch_vectors
+        fetched = []
+        monkeypatch.setattr(
+            descriptor_store,
+            "_fetch_vectors",
+            lambda s, ids, version: fetched.extend(ids) or fetch(s, ids, version),
+        )
+        store, counts = refresh_store(session, tmp_path)
+
+        assert sorted(fetched) == [2, 4]
+        assert counts == {"added": 1, "updated": 1, "removed": 1, "unchanged": 1}
+        assert store.generation == first.generation + 1
+        assert list(store.track_ids) == [2, 3, 4]
+        assert not store.vector(2).any()
+        np.testing.assert_array_equal(store.vector(3), store_vector(3))
+        # The old generation stays readable for processes that still map it
+        np.testing.assert_array_equal(first.vector(1), store_vector(1))
+
+    def test_nothing_written_when_unchanged(self, session, tmp_path):
+        put_descriptor(session, 1)
+        first, _ = refresh_store(session, tmp_path)
+        store, counts = refresh_store(session, tmp_path)
+        assert store.generation == first.generation
+        assert counts["unchanged"] == 1
+
+    def test_old_generations_are_pruned(self, session, tmp_path):
+        for i in range(4):
+            put_descriptor(session, 1, computed_at=T0 + datetime.timedelta(seconds=i))
+            store, _ = refresh_store(session, tmp_path)
+        names = sorted(os.listdir(store.directory))
+        assert names == [
+            "header.json", "index.3.npy", "index.4.npy", "vectors.3.npy", "vectors.4.npy",
+        ]
+
+    def test_full_rebuild_starts_a_new_generation(self, session, tmp_path):
+        put_descriptor(session, 1)
+        first, _ = refresh_store(session, tmp_path)
+        store, counts = refresh_store(session, tmp_path, full=True)
+        assert counts["added"] == 1
+        assert store.generation > first.generation
+
+    def test_empty_library(self, session, tmp_path):
+        store, counts = refresh_store(session, tmp_path)
+        assert len(store) == 0
+        assert store.vector(1) is None
+        assert counts["added"] == 0
+
+
+class TestVerify:
+    def test_recomputed_and_deleted_rows_are_not_served(self, session, tmp_path):
+        for track_id in (1, 2, 3):
+            put_descriptor(session, track_id)
+        refresh_store(session, tmp_path)
+        store = DescriptorStore.open(str(tmp_path), STORE_VERSION)
+
+        put_descriptor(session, 2, computed_at=T0 + datetime.timedelta(seconds=1))
+        session.query(TrackDescriptor).filter_by(track_id=3).delete()
+        session.commit()
+
+        assert store.verify(session) == 2
+        assert list(store.rows([1, 2, 3])) == [0, -1, -1]
+        assert store.vector(2) is None
+        assert sorted(store.vectors_for([1, 2, 3])) == [1]
+        np.testing.assert_array_equal(store.vector(1), store_vector(1))
+
+
+class TestOpen:
+    def test_missing_store(self, tmp_path):
+        assert DescriptorStore.open(str(tmp_path), STORE_VERSION) is None
+
+    def test_other_version_is_not_opened(self, session, tmp_path):
+        put_descriptor(session, 1)
+        store, _ = refresh_store(session, tmp_path)
+        header_path = os.path.join(store.directory, "header.json")
+        with open(header_path) as f:
+            header = json.load(f)
+        header["dims"] = DESCRIPTOR_DIMS + 1
+        with open(header_path, "w") as f:
+            json.dump(header, f)
+        assert DescriptorStore.open(str(tmp_path), STORE_VERSION) is None
+        assert DescriptorStore.open(str(tmp_path), "other") is None
+
+    def test_relative_store_dir_resolves_against_the_project_root(self):
+        from src.feature_extraction.config import descriptor_store_dir, resolve_project_path
+
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        assert resolve_project_path("models/descriptors") == os.path.join(
+            root, "models/descriptors"
+        )
+        assert descriptor_store_dir("/tmp/store", STORE_VERSION) == os.path.join(
+            "/tmp/store", STORE_VERSION
+        )
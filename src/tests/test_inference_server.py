@@ -0,0 +1,142 @@
+"""Tests for the shared-memory trait inference server.
+
+No ONNX models are needed: the server is built around the fake EffNet and
+head sessions from test_trait_extractor.
+
+Run with:
+    python -m pytest src/tests/test_inference_server.py -v
+"""
+
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from src.feature_extraction.config import TRAIT_SAMPLE_RATE
+from src.feature_extraction.inference_server import (
+    InferenceServer,
+    RemoteTraitExtractor,
+    _read_mels,
+    _serve_batch,
+)
+from src.tests.test_trait_extractor import _fake_extractor
+
+
+def _write_tones(tmp_path, n=3):
+    import soundfile as sf
+
+    paths = []
+    for i in range(n):
+        t = np.arange(int(TRAIT_SAMPLE_RATE * (2 + i))) / TRAIT_SAMPLE_RATE
+        y = (0.5 * np.sin(2 * np.pi * 220.0 * (i + 1) * t)).astype(np.float32)
+        path = tmp_path / ("tone_%d.wav" % i)
+        sf.write(str(path), y, TRAIT_SAMPLE_RATE)
+        paths.append(str(path))
+    return paths
+
+
+def _to_shm(mels):
+    shm = shared_memory.SharedMemory(create=True, size=sum(m.nbytes for m in mels))
+    offset = 0
+    for mel in mels:
+        dst = np.ndarray(mel.shape, dtype=np.float32, buffer=shm.buf, offset=offset)
+        dst[:] = mel
+        offset += mel.nbytes
+        del dst
+    return shm
+
+
+class TestSharedMemoryTransport:
+    def test_read_mels_round_trip(self):
+        rng = np.random.default_rng(0)
+        mels = [rng.random((96, T)).astype(np.float32) for T in (10, 200)]
+        shm = _to_shm(mels)
+        try:
+            out = _read_mels(shm.name, [m.shape for m in mels])
+        finally:
+            shm.close()
+            shm.unlink()
+        for a, b in zip(mels, out):
+            np.testing.assert_array_equal(a, b)
+
+
+class TestServeBatch:
+    def test_outputs_split_per_request(self):
+        extractor = _fake_extractor()
+        rng = np.random.default_rng(1)
+        requests = [
+            [rng.random((96, 300)).astype(np.float32)],
+            [rng.random((96, 150)).astype(np.float32), rng.random((96, 900)).astype(np.float32)],
+        ]
+        shms = [_to_shm(mels) for mels in requests]
+        responses = [queue.Queue(), queue.Queue()]
+        try:
+            pending = [
+                (i, 7, shm.name, [m.shape for m in mels])
+                for i, (shm, mels) in enumerate(zip(shms, requests))
+            ]
+            _serve_batch(extractor, pending, responses)
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
+        assert extractor._effnet.batch_sizes and len(extractor._effnet.batch_sizes) == 1
+        for i, mels in enumerate(requests):
+            seq, outputs = responses[i].get_nowait()
+            assert seq == 7
+            expected = extractor._infer(mels)
+            assert len(outputs) == len(mels)
+            for (emb, probs, genre), (exp_emb, exp_probs, exp_genre) in zip(outputs, expected):
+                assert genre is None and exp_genre is None
+                np.testing.assert_allclose(emb, exp_emb, rtol=1e-6)
+                for name in exp_probs:
+                    if exp_probs[name] is None:
+                        assert probs[name] is None
+                    else:
+                        np.testing.assert_allclose(probs[name], exp_probs[name], rtol=1e-6)
+
+    def test_missing_shared_memory_replies_error(self):
+        responses = [queue.Queue()]
+        _serve_batch(_fake_extractor(), [(0, 1, "no_such_block_xyz", [(96, 10)])], responses)
+        seq, result = responses[0].get_nowait()
+        assert seq == 1
+        assert isinstance(result, RuntimeError)
+
+
+def _broken_factory():
+    raise RuntimeError("models unavailable")
+
+
+class TestInferenceServerProcess:
+    def test_remote_matches_local(self, tmp_path):
+        paths = _write_tones(tmp_path)
+        server = InferenceServer(2, extractor_factory=_fake_extractor)
+        server.start()
+        try:
+            remote = server.client(0)
+            assert isinstance(remote, RemoteTraitExtractor)
+            remote_results = remote.compute_batch(paths)
+            single = server.client(1).compute(paths[0])
+        finally:
+            server.stop()
+
+        local_results = _fake_extractor().compute_batch(paths)
+        for remote_traits, local_traits in zip(remote_results, local_results):
+            assert remote_traits.keys() == local_traits.keys()
+            for key in ("voice_instrumental", "danceability", "onset_density"):
+                assert remote_traits[key] == pytest.approx(local_traits[key], abs=1e-6)
+        assert single["danceability"] == pytest.approx(
+            local_results[0]["danceability"], abs=1e-6
+        )
+
+    def test_server_init_failure_reaches_client(self, tmp_path):
+        paths = _write_tones(tmp_path, n=1)
+        server = InferenceServer(1, extractor_factory=_broken_factory)
+        server.start()
+        try:
+            with pytest.raises(RuntimeError, match="models unavailable"):
+                server.client(0).compute(paths[0])
+        finally:
+            server.stop()
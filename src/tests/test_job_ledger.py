@@ -0,0 +1,322 @@
+"""Tests for src/feature_extraction/job_ledger.py
+
+Runs against the configured Postgres server in a throwaway schema (the
+ledger relies on FOR UPDATE SKIP LOCKED and ON CONFLICT); skipped when the
+server is unreachable.
+
+Run with:
+    python -m pytest src/tests/test_job_ledger.py -v
+"""
+
+import functools
+import importlib
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.db import database
+from src.feature_extraction import job_ledger
+from src.feature_extraction.job_ledger import DONE, FAILED, QUEUED, RUNNING, JobLedger
+
+_migration = importlib.import_module("src.scripts.migrations.20261018_create_feature_job")
+_lease_migration = importlib.import_module("src.scripts.migrations.20261018_add_feature_job_lease")
+
+
+@pytest.fixture
+def engine():
+    schema = "test_feature_job_%s" % uuid.uuid4().hex[:8]
+    try:
+        with database.engine.begin() as conn:
+            conn.execute(text("CREATE SCHEMA %s" % schema))
+    except Exception as exc:
+        pytest.skip("Postgres unavailable: %s" % exc)
+
+    engine = create_engine(
+        database.engine.url, connect_args={"options": "-csearch_path=%s" % schema}
+    )
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE track (id INTEGER PRIMARY KEY, file_name TEXT)"))
+        conn.execute(text(_migration.CREATE_TABLE_SQL))
+        conn.execute(text(_lease_migration.ALTER_TABLE_SQL))
+        conn.execute(text("CREATE TABLE processed (track_id INTEGER, worker TEXT)"))
+        conn.execute(
+            text("INSERT INTO track (id, file_name) VALUES %s"
+                 % ", ".join("(%d, 'track_%d.mp3')" % (i, i) for i in range(1, 21)))
+        )
+    yield engine
+
+    engine.dispose()
+    with database.engine.begin() as conn:
+        conn.execute(text("DROP SCHEMA %s CASCADE" % schema))
+
+
+def _status(engine, track_id, job_type="traits"):
+    with engine.connect() as conn:
+        return conn.execute(
+            text("SELECT status, attempts, error FROM feature_job "
+                 "WHERE job_type = :job_type AND track_id = :track_id"),
+            {"job_type": job_type, "track_id": track_id},
+        ).first()
+
+
+class TestEnqueueAndClaim:
+    def test_claims_highest_priority_first_with_file_names(self, engine):
+        ledger = JobLedger("traits", batch_size=2, bind=engine)
+        assert ledger.enqueue([(1, 10), (2, 300), (3, 20)]) == 3
+
+        assert ledger.claim() == [(2, "track_2.mp3"), (3, "track_3.mp3")]
+        assert ledger.claim() == [(1, "track_1.mp3")]
+        assert ledger.claim() == []
+        assert ledger.summary()[RUNNING] == 3
+
+    def test_job_types_are_independent(self, engine):
+        JobLedger("traits", bind=engine).enqueue([(1, 0)])
+        other = JobLedger("descriptors", bind=engine)
+        other.enqueue([(1, 0)])
+        assert other.claim() == [(1, "track_1.mp3")]
+        assert _status(engine, 1).status == QUEUED
+
+    def test_enqueue_keeps_existing_jobs_unless_requeued(self, engine):
+        ledger = JobLedger("traits", bind=engine)
+        ledger.enqueue([(1, 0), (2, 0)])
+        ledger.claim(limit=2)
+        ledger.done([1])
+
+        assert ledger.enqueue([(1, 0), (2, 0), (3, 0)]) == 1
+        assert _status(engine, 1).status == DONE
+
+        # Running jobs are never reset, even when asked to
+        assert ledger.enqueue([(1, 0), (2, 0)], requeue=(DONE, RUNNING)) == 1
+        assert _status(engine, 1).status == QUEUED
+        assert _status(engine, 2).status == RUNNING
+
+    def test_concurrent_claims_are_disjoint(self, engine):
+        ledger = JobLedger("traits", batch_size=3, bind=engine)
+        ledger.enqueue((i, i) for i in range(1, 21))
+
+        claimed = [[] for _ in range(4)]
+
+        def drain(out):
+            for batch in ledger.batches():
+                out.extend(track_id for track_id, _ in batch)
+
+        threads = [threading.Thread(target=drain, args=(out,)) for out in claimed]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        everything = [track_id for out in claimed for track_id in out]
+        assert sorted(everything) == list(range(1, 21))
+
+    def test_skip_locked_passes_over_rows_held_by_another_claim(self, engine):
+        ledger = JobLedger("traits", batch_size=2, bind=engine)
+        ledger.enqueue([(1, 30), (2, 20), (3, 10)])
+
+        with engine.connect() as held:
+            txn = held.begin()
+            held.execute(text(
+                "SELECT id FROM feature_job WHERE track_id = 1 FOR UPDATE"
+            ))
+            assert [t for t, _ in ledger.claim()] == [2, 3]
+            txn.rollback()
+
+        assert [t for t, _ in ledger.claim()] == [1]
+
+
+class TestOutcomes:
+    def test_failure_is_retried_until_attempts_run_out(self, engine, monkeypatch):
+        monkeypatch.setattr(job_ledger, "FEATURE_JOB_MAX_ATTEMPTS", 2)
+        ledger = JobLedger("traits", bind=engine)
+        ledger.enqueue([(5, 0)])
+
+        ledger.claim()
+        assert ledger.failed(5, "decode error") == QUEUED
+        ledger.claim()
+        assert ledger.failed(5, ValueError("still broken")) == FAILED
+
+        row = _status(engine, 5)
+        assert (row.status, row.attempts, row.error) == (FAILED, 2, "still broken")
+        assert ledger.claim() == []
+
+        assert ledger.retry_failed() == 1
+        assert ledger.claim() == [(5, "track_5.mp3")]
+
+    def test_failed_ignores_jobs_this_process_does_not_hold(self, engine):
+        ledger = JobLedger("traits", bind=engine)
+        ledger.enqueue([(5, 0)])
+        assert ledger.failed(5, "not claimed") is None
+        assert _status(engine, 5).status == QUEUED
+
+    def test_interrupted_run_resumes_where_it_stopped(self, engine):
+        ledger = JobLedger("traits", batch_size=4, bind=engine)
+        ledger.enqueue((i, 0) for i in range(1, 11))
+        first = [t for t, _ in ledger.claim()]
+        ledger.done(first)
+        ledger.claim()  # this batch's worker dies before reporting back
+
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE feature_job SET worker = 'gone-host:1' WHERE status = 'running'"
+            ))
+        assert ledger.requeue_stale() == 0
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE feature_job SET lease_expires_at = NOW() - INTERVAL '1 second' "
+                "WHERE status = 'running'"
+            ))
+        assert ledger.requeue_stale() == 4
+
+        rest = [t for batch in ledger.batches() for t, _ in batch]
+        assert sorted(first + rest) == list(range(1, 11))
+        assert len(ledger.pending_track_ids()) == 6
+
+    def test_dead_local_worker_is_requeued_immediately(self, engine):
+        ledger = JobLedger("traits", bind=engine)
+        ledger.enqueue([(1, 0), (2, 0)])
+        ledger.claim(limit=2)
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE feature_job SET worker = :worker WHERE track_id = 1"
+            ), {"worker": "%s:%d" % (job_ledger.socket.gethostname(), 2 ** 22 + 1)})
+
+        assert ledger.requeue_stale() == 1
+        assert _status(engine, 1).status == QUEUED
+        assert _status(engine, 2).status == RUNNING
+
+
+class TestLeases:
+    def test_expired_lease_is_reclaimed_by_the_next_claim(self, engine):
+        ledger = JobLedger("traits", batch_size=2, bind=engine, lease_seconds=0.2)
+        ledger.enqueue([(1, 0), (2, 0)])
+        assert len(ledger.claim()) == 2
+        assert ledger.claim() == []
+
+        time.sleep(0.3)
+        assert ledger.claimable() == 2
+        assert sorted(t for t, _ in ledger.claim()) == [1, 2]
+        row = _status(engine, 1)
+        assert (row.status, row.attempts) == (RUNNING, 2)
+        assert row.error.startswith("lease expired")
+
+    def test_expired_lease_out_of_attempts_is_parked(self, engine, monkeypatch):
+        monkeypatch.setattr(job_ledger, "FEATURE_JOB_MAX_ATTEMPTS", 1)
+        ledger = JobLedger("traits", bind=engine, lease_seconds=0.1)
+        ledger.enqueue([(1, 0)])
+        ledger.claim()
+        time.sleep(0.2)
+        assert ledger.claim() == []
+        assert _status(engine, 1).status == FAILED
+
+    def test_heartbeat_keeps_jobs_past_the_lease(self, engine):
+        ledger = JobLedger("traits", batch_size=1, bind=engine, lease_seconds=0.3)
+        ledger.enqueue([(1, 10), (2, 0)])
+        with ledger.keep_alive():
+            assert ledger.claim() == [(1, "track_1.mp3")]
+            time.sleep(0.8)
+            # Track 1's lease was renewed, so only track 2 can be claimed
+            assert ledger.claim() == [(2, "track_2.mp3")]
+            assert ledger.heartbeat() == 2
+        assert _status(engine, 1).attempts == 1
+
+
+# ---------------------------------------------------------------------------
+# Several local nodes running run_worker against one ledger
+# ---------------------------------------------------------------------------
+
+_CRASH_TRACK = 7
+
+
+def _fake_worker(ledger, transmitter, marker, hold_seconds):
+    """Stands in for a feature worker; the first process to get
+    _CRASH_TRACK dies without reporting it."""
+    n_done = 0
+    with ledger.keep_alive():
+        for batch in ledger.batches():
+            track_ids = [track_id for track_id, _ in batch]
+            if _CRASH_TRACK in track_ids:
+                try:
+                    os.close(os.open(marker, os.O_CREAT | os.O_EXCL))
+                    os._exit(1)
+                except FileExistsError:
+                    pass
+            time.sleep(hold_seconds)
+            with ledger._engine().begin() as conn:
+                for track_id in track_ids:
+                    conn.execute(
+                        text("INSERT INTO processed VALUES (:track_id, :worker)"),
+                        {"track_id": track_id, "worker": job_ledger.worker_id()},
+                    )
+            ledger.done(track_ids)
+            n_done += len(track_ids)
+    transmitter.send((n_done, 0))
+    transmitter.close()
+
+
+def _run_node(run_worker, processes):
+    run_worker.run("fake", processes)
+
+
+class TestLocalNodes:
+    def test_nodes_share_the_ledger_and_reclaim_a_dead_nodes_leases(
+        self, engine, monkeypatch, tmp_path
+    ):
+        from src.scripts.feature_extraction import run_worker
+
+        lease = 0.6
+        # Each batch is held for longer than the lease, so without
+        # heartbeats other nodes would take it over and redo it
+        hold = 1.0
+        monkeypatch.setattr(
+            run_worker,
+            "JobLedger",
+            functools.partial(JobLedger, bind=engine, lease_seconds=lease),
+        )
+        monkeypatch.setattr(
+            run_worker,
+            "_KINDS",
+            {
+                "fake": run_worker._Kind(
+                    "fake",
+                    2,
+                    2,
+                    _fake_worker,
+                    lambda ledger, tx, context, i: (
+                        ledger, tx, str(tmp_path / "crashed"), hold
+                    ),
+                    ("done", "failed"),
+                )
+            },
+        )
+        JobLedger("fake", bind=engine).enqueue((i, 0) for i in range(1, 13))
+
+        fork = multiprocessing.get_context("fork")
+        nodes = [fork.Process(target=_run_node, args=(run_worker, 2)) for _ in range(2)]
+        for node in nodes:
+            node.start()
+        for node in nodes:
+            node.join(timeout=60)
+            assert node.exitcode == 0
+
+        # The nodes reclaim the crashed worker's batch once its lease runs
+        # out, unless they have already exited; a late node then finishes it
+        time.sleep(lease + 0.2)
+        run_worker.run("fake", 1)
+
+        with engine.connect() as conn:
+            processed = [
+                row.track_id
+                for row in conn.execute(text("SELECT track_id FROM processed")).fetchall()
+            ]
+            workers = conn.execute(
+                text("SELECT COUNT(DISTINCT worker) FROM processed")
+            ).scalar()
+        assert sorted(processed) == list(range(1, 13))
+        assert workers >= 3
+        assert JobLedger("fake", bind=engine).summary()[DONE] == 12
+        assert _status(engine, _CRASH_TRACK, "fake").attempts == 2
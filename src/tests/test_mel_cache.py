@@ -0,0 +1,104 @@
+"""Tests for the on-disk trait mel spectrogram cache.
+
+Run with:
+    python -m pytest src/tests/test_mel_cache.py -v
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from src.feature_extraction.config import TRAIT_SAMPLE_RATE
+from src.feature_extraction.mel_cache import MelCache
+from src.tests.test_trait_extractor import _fake_extractor
+
+_PARAMS = {"n_mels": 96, "hop_length": 256}
+
+
+def _write_tone(path, seconds=2.0, freq=440.0):
+    import soundfile as sf
+
+    t = np.arange(int(TRAIT_SAMPLE_RATE * seconds)) / TRAIT_SAMPLE_RATE
+    sf.write(str(path), (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32), TRAIT_SAMPLE_RATE)
+    return str(path)
+
+
+class TestMelCache:
+    def test_round_trip_is_memory_mapped(self, tmp_path):
+        audio = _write_tone(tmp_path / "a.wav")
+        cache = MelCache(_PARAMS, cache_dir=str(tmp_path / "cache"))
+        mel = np.random.default_rng(0).random((96, 50)).astype(np.float32)
+
+        assert cache.get(audio) is None
+        cache.put(audio, mel, {"onset_density": 1.5, "spectral_flatness": 0.01})
+        cached, extras = cache.get(audio)
+
+        assert isinstance(cached, np.memmap)
+        np.testing.assert_array_equal(cached, mel)
+        assert extras == {"onset_density": 1.5, "spectral_flatness": 0.01}
+
+    def test_modified_file_misses(self, tmp_path):
+        audio = _write_tone(tmp_path / "a.wav")
+        cache = MelCache(_PARAMS, cache_dir=str(tmp_path / "cache"))
+        cache.put(audio, np.zeros((96, 4), dtype=np.float32), {})
+
+        st = os.stat(audio)
+        os.utime(audio, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        assert cache.get(audio) is None
+
+    def test_param_change_misses(self, tmp_path):
+        audio = _write_tone(tmp_path / "a.wav")
+        MelCache(_PARAMS, cache_dir=str(tmp_path / "cache")).put(
+            audio, np.zeros((96, 4), dtype=np.float32), {}
+        )
+        other = MelCache(dict(_PARAMS, n_mels=128), cache_dir=str(tmp_path / "cache"))
+        assert other.get(audio) is None
+
+    def test_missing_file_misses(self, tmp_path):
+        cache = MelCache(_PARAMS, cache_dir=str(tmp_path / "cache"))
+        assert cache.get(str(tmp_path / "missing.wav")) is None
+
+    def test_no_temp_files_left(self, tmp_path):
+        audio = _write_tone(tmp_path / "a.wav")
+        cache = MelCache(_PARAMS, cache_dir=str(tmp_path / "cache"))
+        cache.put(audio, np.zeros((96, 4), dtype=np.float32), {})
+        leftovers = [
+            name
+            for _, _, names in os.walk(tmp_path / "cache")
+            for name in names
+            if name.endswith(".tmp")
+        ]
+        assert leftovers == []
+
+
+class TestTraitExtractorMelCache:
+    def test_hit_skips_decoding(self, tmp_path, monkeypatch):
+        from src.feature_extraction import trait_extractor
+
+        audio = _write_tone(tmp_path / "a.wav")
+        extractor = _fake_extractor()
+        extractor._mel_cache = MelCache(_PARAMS, cache_dir=str(tmp_path / "cache"))
+
+        first = extractor.compute(audio)
+
+        def _no_decode(*args, **kwargs):
+            raise AssertionError("audio decoded despite a cache hit")
+
+        monkeypatch.setattr(trait_extractor.librosa, "load", _no_decode)
+        second = extractor.compute(audio)
+        batched = extractor.compute_batch([audio])[0]
+
+        assert second == first
+        assert batched == first
+
+    def test_cached_mel_matches_computed(self, tmp_path):
+        from src.feature_extraction.trait_extractor import compute_mel_spectrogram
+
+        audio = _write_tone(tmp_path / "a.wav")
+        extractor = _fake_extractor()
+        extractor._mel_cache = MelCache(_PARAMS, cache_dir=str(tmp_path / "cache"))
+        extractor.compute(audio)
+
+        mel, _ = extractor._mel_cache.get(audio)
+        np.testing.assert_array_equal(mel, compute_mel_spectrogram(audio))
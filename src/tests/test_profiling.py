@@ -0,0 +1,119 @@
+"""Unit tests for src/feature_extraction/profiling.py
+
+Run with:
+    python -m pytest src/tests/test_profiling.py -v
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from src.feature_extraction import profiling
+from src.feature_extraction.profiling import StageTimer
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    timer = StageTimer(enabled=True)
+    monkeypatch.setattr(profiling, "timer", timer)
+    return timer
+
+
+class TestStageTimer:
+    def test_disabled_timer_is_a_no_op(self):
+        timer = StageTimer(enabled=False)
+        with timer.track_file("a.mp3"):
+            with timer.stage("hpss"):
+                pass
+        assert timer.stage("hpss") is timer.track_file("b.mp3")
+        assert timer.drain() is None
+
+    def test_stages_are_summed_per_file(self, enabled):
+        with profiling.track_file("a.mp3"):
+            for _ in range(3):
+                with profiling.stage("beat_track"):
+                    pass
+            with profiling.stage("hpss"):
+                pass
+        with profiling.stage("effnet"):
+            pass
+
+        snapshot = profiling.drain()
+        assert len(snapshot["stages"]["beat_track"]) == 1
+        assert len(snapshot["stages"]["effnet"]) == 1
+        [entry] = snapshot["files"]
+        assert entry["file"] == "a.mp3"
+        assert set(entry["stages"]) == {"beat_track", "hpss"}
+        assert entry["seconds"] >= sum(entry["stages"].values())
+        assert profiling.drain()["files"] == []
+
+    def test_inner_file_joins_the_outer_one(self, enabled):
+        with profiling.track_file("outer.mp3"):
+            with profiling.track_file("<signal>"):
+                with profiling.stage("mfcc"):
+                    pass
+        snapshot = profiling.drain()
+        assert [f["file"] for f in snapshot["files"]] == ["outer.mp3"]
+        assert "mfcc" in snapshot["files"][0]["stages"]
+
+    def test_file_is_recorded_when_it_raises(self, enabled):
+        with pytest.raises(ValueError):
+            with profiling.track_file("bad.mp3"):
+                with profiling.stage("decode"):
+                    raise ValueError("corrupt")
+        assert profiling.drain()["files"][0]["stages"].keys() == {"decode"}
+
+
+class TestReport:
+    @staticmethod
+    def _snapshot(pid, seconds):
+        return {
+            "pid": pid,
+            "stages": {"hpss": list(seconds), "mfcc": [s / 10 for s in seconds]},
+            "files": [
+                {"file": "t%d.mp3" % i, "seconds": s, "stages": {}}
+                for i, s in enumerate(seconds)
+            ],
+        }
+
+    def test_summary_percentiles(self):
+        summary = profiling.summarize(self._snapshot(1, np.arange(1.0, 101.0)))
+        assert list(summary["stages"]) == ["hpss", "mfcc"]
+        assert summary["stages"]["hpss"]["p50_s"] == pytest.approx(50.5)
+        assert summary["stages"]["hpss"]["p95_s"] == pytest.approx(95.05)
+        assert summary["files"]["count"] == 100
+        assert summary["files"]["slowest"][0] == {"file": "t99.mp3", "seconds": 100.0}
+
+    def test_report_groups_by_worker_and_writes_json(self, tmp_path, capsys):
+        out = tmp_path / "timings" / "report.json"
+        result = profiling.report(
+            [self._snapshot(7, [1.0, 2.0]), None, self._snapshot(7, [3.0]), self._snapshot(8, [4.0])],
+            output_path=str(out),
+        )
+
+        assert set(result["workers"]) == {"7", "8"}
+        assert result["workers"]["7"]["files"]["count"] == 3
+        assert result["combined"]["files"]["count"] == 4
+        assert json.loads(out.read_text()) == result
+        assert "busiest stage: hpss" in capsys.readouterr().out
+
+    def test_nothing_to_report_when_disabled(self, capsys):
+        assert profiling.report([None, None]) is None
+        assert capsys.readouterr().out == ""
+
+
+class TestInstrumentation:
+    def test_descriptor_stages_are_recorded(self, enabled):
+        from src.feature_extraction.compact_descriptor import CompactDescriptor
+        from src.feature_extraction.config import SAMPLE_RATE
+
+        t = np.arange(3 * SAMPLE_RATE) / SAMPLE_RATE
+        y = np.sin(2 * np.pi * 440.0 * t).astype(np.float32)
+        CompactDescriptor(None, profile="full").compute(y=y)
+
+        [entry] = profiling.drain()["files"]
+        assert entry["file"] == "<signal>"
+        assert {"stft", "hpss", "chroma_cqt", "beat_track", "tempogram", "mfcc"} <= set(
+            entry["stages"]
+        )
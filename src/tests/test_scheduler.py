@@ -0,0 +1,16 @@
+"""Unit tests for src/feature_extraction/scheduler.py
+
+Run with:
+    python -m pytest src/tests/test_scheduler.py -v
+"""
+
+from src.feature_extraction.scheduler import file_size
+
+
+class TestFileSize:
+    def test_returns_size_in_bytes(self, tmp_path):
+        (tmp_path / "a").write_bytes(b"x" * 300)
+        assert file_size(str(tmp_path / "a")) == 300
+
+    def test_missing_file_is_zero(self, tmp_path):
+        assert file_size(str(tmp_path / "gone")) == 0
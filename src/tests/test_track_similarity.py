@@ -28,6 +28,7 @@ from src.feature_extraction.track_similarity import (
     late_fusion_v1,
     list_scorers,
     raw_cosine_uncapped,
+    score_many,
 )
 from src.feature_extraction.compact_descriptor import cosine_similarity
 
@@ -325,7 +326,7 @@ class TestLateFusionDynamicWeights:
     def test_dynamic_weights_change_output(self):
         """Mocking WeightService fusion weights changes late_fusion_v1 output."""
         from unittest.mock import patch, MagicMock
-        from src.feature_extraction.track_similarity import _get_live_fusion_weights
+        from src.feature_extraction.track_similarity import get_live_fusion_weights
 
         mock_svc = MagicMock()
         mock_svc.get_fusion_weights.return_value = {
@@ -341,7 +342,7 @@ class TestLateFusionDynamicWeights:
             'sys.modules',
             {'src.harmonic_mixing.weight_service': MagicMock(WeightService=mock_ws_class)},
         ):
-            wh, wr, wt, we = _get_live_fusion_weights()
+            wh, wr, wt, we = get_live_fusion_weights()
             assert wh == 1.0
             assert wr == 0.0
 
@@ -353,13 +354,13 @@ class TestLateFusionDynamicWeights:
             FUSION_WEIGHT_RHYTHM,
             FUSION_WEIGHT_TIMBRE,
             FUSION_WEIGHT_ENERGY,
-            _get_live_fusion_weights,
+            get_live_fusion_weights,
         )
         with patch.dict(
             'sys.modules',
             {'src.harmonic_mixing.weight_service': None},
         ):
-            wh, wr, wt, we = _get_live_fusion_weights()
+            wh, wr, wt, we = get_live_fusion_weights()
         assert wh == FUSION_WEIGHT_HARMONIC
         assert wr == FUSION_WEIGHT_RHYTHM
         assert wt == FUSION_WEIGHT_TIMBRE
@@ -395,6 +396,57 @@ class TestScorerRegistry:
         assert default == pytest.approx(explicit, abs=1e-7)
 
 
+# ---------------------------------------------------------------------------
+# 8b. score_many matches the scalar scorers
+# ---------------------------------------------------------------------------
+
+def _candidate_matrix():
+    rows = [_random_descriptor(seed) for seed in range(40)]
+    rows.append(_zero_descriptor())
+    rows.append(_ones_descriptor())
+    silent_tempogram = _random_descriptor(100)
+    silent_tempogram[25:41] = 0.0
+    rows.append(silent_tempogram)
+    no_bpm = _random_descriptor(101)
+    no_bpm[24] = 0.0
+    rows.append(no_bpm)
+    return np.stack(rows)
+
+
+class TestScoreMany:
+    @pytest.mark.parametrize("name", list(ScorerName))
+    @pytest.mark.parametrize("with_corpus_stats", [False, True])
+    def test_matches_scalar_path(self, name, with_corpus_stats):
+        matrix = _candidate_matrix()
+        kw = BenchmarkHarness(list(matrix)).corpus_stats() if with_corpus_stats else {}
+        fn = get_scorer(name)
+        for query in (matrix[0], matrix[-4], matrix[-3], matrix[-2], matrix[-1]):
+            expected = np.array([fn(query, row, **kw) for row in matrix])
+            np.testing.assert_allclose(
+                score_many(query, matrix, scorer=name, **kw), expected, rtol=0, atol=1e-6
+            )
+
+    def test_harmonic_block_is_transposition_aware(self):
+        query = _random_descriptor(0)
+        shifted = query.copy()
+        shifted[0:12] = np.roll(query[0:12], 5)
+        shifted[12:24] = np.roll(query[12:24], 5)
+        scores = score_many(query, np.stack([query, shifted]))
+        assert scores[1] == pytest.approx(scores[0], abs=1e-6)
+
+    def test_empty_matrix(self):
+        scores = score_many(_random_descriptor(0), np.empty((0, DESCRIPTOR_DIMS)))
+        assert scores.shape == (0,)
+
+    def test_scorer_without_batch_version_falls_back(self, monkeypatch):
+        from src.feature_extraction import track_similarity
+
+        monkeypatch.delitem(track_similarity._BATCH_REGISTRY, ScorerName.LATE_FUSION_V1)
+        matrix = _candidate_matrix()
+        expected = [late_fusion_v1(matrix[0], row) for row in matrix]
+        np.testing.assert_allclose(score_many(matrix[0], matrix), expected)
+
+
 # ---------------------------------------------------------------------------
 # 9. Benchmark harness runs end-to-end on small fixture data
 # ---------------------------------------------------------------------------
@@ -15,6 +15,7 @@ Run unit tests only (no models needed):
     python -m pytest src/tests/test_trait_extractor.py -v -m "not integration"
 """
 
+import os
 import pathlib
 
 import numpy as np
@@ -32,11 +33,11 @@ from src.feature_extraction.trait_extractor import (
     LABELS_GENRE_DISCOGS519,
     LABELS_INSTRUMENT,
     LABELS_MOOD_THEME,
-    _binary_prob,
     _compute_mel_from_signal,
     _multilabel_dict,
     _patch_mel_for_effnet,
     _patch_mel_for_maest,
+    binary_prob,
     compute_mel_spectrogram,
     filter_genre,
     filter_mood,
@@ -232,6 +233,22 @@ class TestPatchMelForEffnet:
         expected = mel[:, :128].T
         np.testing.assert_array_equal(patches[0], expected)
 
+    @pytest.mark.parametrize("T", [50, 127, 128, 191, 192, 1000, 1001])
+    def test_every_window_matches_slice(self, T):
+        mel = self._make_mel(T)
+        padded = np.pad(mel, ((0, 0), (0, max(128 - T, 0))))
+        patches = _patch_mel_for_effnet(mel)
+        assert len(patches) == 1 + (padded.shape[1] - 128) // 64
+        for i, patch in enumerate(patches):
+            np.testing.assert_array_equal(patch, padded[:, i * 64 : i * 64 + 128].T)
+
+    def test_windows_are_read_only_views(self):
+        patches = _patch_mel_for_effnet(self._make_mel(1000))
+        assert not patches.flags.writeable
+        # Overlapping windows share one transposed buffer instead of copies
+        assert np.shares_memory(patches[0], patches[1])
+        assert patches.base is not None
+
 
 class TestPatchMelForMaest:
     def _make_mel(self, T: int) -> np.ndarray:
@@ -273,22 +290,29 @@ class TestPatchMelForMaest:
         expected = mel[:, :1876].T
         np.testing.assert_array_equal(patches[0][0], expected)
 
+    def test_patches_are_contiguous_read_only_views(self):
+        mel = self._make_mel(3751)
+        patches = _patch_mel_for_maest(mel)
+        assert all(p.flags.c_contiguous and not p.flags.writeable for p in patches)
+        assert patches[0].base is not None
+        np.testing.assert_array_equal(patches[1][0], mel[:, 1875:3751].T)
+
 
 class TestBinaryProb:
     def test_two_class_takes_index_1(self):
         probs = np.array([0.3, 0.7])
-        assert _binary_prob(probs) == pytest.approx(0.7)
+        assert binary_prob(probs) == pytest.approx(0.7)
 
     def test_single_value(self):
         probs = np.array([0.85])
-        assert _binary_prob(probs) == pytest.approx(0.85)
+        assert binary_prob(probs) == pytest.approx(0.85)
 
     def test_scalar_array(self):
         probs = np.float32(0.6)
-        assert _binary_prob(probs) == pytest.approx(0.6)
+        assert binary_prob(probs) == pytest.approx(0.6)
 
     def test_returns_float(self):
-        result = _binary_prob(np.array([0.2, 0.8]))
+        result = binary_prob(np.array([0.2, 0.8]))
         assert isinstance(result, float)
 
 
@@ -639,6 +663,158 @@ class TestZeroSampleGuard:
         assert traits["spectral_flatness"] == 0.0
 
 
+def _click_track(seconds, per_second=2, sr=TRAIT_SAMPLE_RATE):
+    """Short noise bursts at a fixed rate over a quiet noise floor."""
+    rng = np.random.default_rng(5)
+    y = 0.001 * rng.standard_normal(int(seconds * sr))
+    burst = int(0.02 * sr)
+    for start in range(0, len(y) - burst, sr // per_second):
+        y[start : start + burst] += 0.5 * rng.standard_normal(burst)
+    return y.astype(np.float32)
+
+
+class TestAnalysisPolicy:
+    """TRAIT_ANALYSIS_POLICY windows for onset_density / spectral_flatness."""
+
+    def _set(self, monkeypatch, policy, excerpts=3, seconds=30.0):
+        from src.feature_extraction import trait_extractor
+
+        monkeypatch.setattr(trait_extractor, "TRAIT_ANALYSIS_POLICY", policy)
+        monkeypatch.setattr(trait_extractor, "TRAIT_ANALYSIS_EXCERPTS", excerpts)
+        monkeypatch.setattr(trait_extractor, "TRAIT_ANALYSIS_SECONDS", seconds)
+
+    def test_full_covers_signal(self, monkeypatch):
+        from src.feature_extraction.trait_extractor import _analysis_spans
+
+        self._set(monkeypatch, "full")
+        assert _analysis_spans(1000) == [(0, 1000)]
+
+    def test_center_crop(self, monkeypatch):
+        from src.feature_extraction.trait_extractor import _analysis_spans
+
+        self._set(monkeypatch, "center", seconds=10.0)
+        n = TRAIT_SAMPLE_RATE * 100
+        [(start, stop)] = _analysis_spans(n)
+        assert stop - start == TRAIT_SAMPLE_RATE * 10
+        assert start % 256 == 0
+        assert abs((start + stop) / 2 - n / 2) <= 256
+
+    def test_excerpts_evenly_spaced(self, monkeypatch):
+        from src.feature_extraction.trait_extractor import _analysis_spans
+
+        self._set(monkeypatch, "excerpts", excerpts=3, seconds=10.0)
+        n = TRAIT_SAMPLE_RATE * 100
+        spans = _analysis_spans(n)
+        assert len(spans) == 3
+        assert spans[0][0] == 0
+        assert n - spans[-1][1] < 256
+        assert all(b - a == TRAIT_SAMPLE_RATE * 10 for a, b in spans)
+        assert all(a % 256 == 0 for a, _ in spans)
+
+    def test_short_signal_analyzed_whole(self, monkeypatch):
+        from src.feature_extraction.trait_extractor import _analysis_spans
+
+        self._set(monkeypatch, "excerpts", excerpts=3, seconds=10.0)
+        n = TRAIT_SAMPLE_RATE * 25
+        assert _analysis_spans(n) == [(0, n)]
+
+    @pytest.mark.parametrize("policy,excerpts", [("sampled", 3), ("excerpts", 0)])
+    def test_invalid_settings_raise(self, monkeypatch, policy, excerpts):
+        from src.feature_extraction.trait_extractor import _analysis_spans
+
+        self._set(monkeypatch, policy, excerpts=excerpts)
+        with pytest.raises(ValueError):
+            _analysis_spans(TRAIT_SAMPLE_RATE * 100)
+
+    @pytest.mark.parametrize("policy", ["excerpts", "center"])
+    def test_extras_close_to_full_track(self, monkeypatch, policy):
+        from src.feature_extraction.trait_extractor import _prepare_signal
+
+        y = _click_track(60)
+        self._set(monkeypatch, "full")
+        mel, _, full_flatness = _prepare_signal(y)
+
+        self._set(monkeypatch, policy, excerpts=3, seconds=10.0)
+        policy_mel, onsets, flatness = _prepare_signal(y)
+        np.testing.assert_array_equal(policy_mel, mel)
+        # Mel-derived onsets are not comparable to the full-track librosa
+        # defaults (hence the version tag), but must find the 2 Hz clicks
+        assert onsets == pytest.approx(2.0, abs=0.25)
+        assert flatness == pytest.approx(full_flatness, rel=0.1)
+
+    def test_silent_excerpts_have_zero_flatness(self, monkeypatch):
+        from src.feature_extraction.trait_extractor import _prepare_signal
+
+        self._set(monkeypatch, "center", seconds=1.0)
+        _, onsets, flatness = _prepare_signal(np.zeros(TRAIT_SAMPLE_RATE * 5, dtype=np.float32))
+        assert flatness == 0.0
+        assert onsets == 0.0
+
+    def test_policy_recorded_in_trait_version(self, monkeypatch):
+        import importlib
+
+        from src.feature_extraction import config
+
+        try:
+            monkeypatch.setenv("TRAIT_ANALYSIS_POLICY", "excerpts")
+            monkeypatch.setenv("TRAIT_ANALYSIS_EXCERPTS", "4")
+            monkeypatch.setenv("TRAIT_ANALYSIS_SECONDS", "20")
+            assert importlib.reload(config).TRAIT_VERSION == (
+                config.TRAIT_BASE_VERSION + "+excerpts-4x20s"
+            )
+            monkeypatch.setenv("TRAIT_ANALYSIS_POLICY", "center")
+            assert importlib.reload(config).TRAIT_VERSION == (
+                config.TRAIT_BASE_VERSION + "+center-20s"
+            )
+            assert len(config.TRAIT_VERSION) <= 32  # track_trait.trait_version
+        finally:
+            monkeypatch.undo()
+            importlib.reload(config)
+        assert config.TRAIT_VERSION == TRAIT_VERSION
+
+    def test_quantized_models_recorded_in_versions(self, monkeypatch):
+        import importlib
+
+        from src.feature_extraction import config
+
+        fp32_trait, fp32_embedding = config.TRAIT_VERSION, config.TRAIT_EMBEDDING_VERSION
+        try:
+            # A quantized head changes the traits but not the stored embeddings
+            monkeypatch.setenv("TRAIT_QUANTIZED_MODELS", "danceability-discogs-effnet-1")
+            importlib.reload(config)
+            assert config.TRAIT_VERSION.startswith(fp32_trait + "+int8-")
+            assert config.TRAIT_EMBEDDING_VERSION == fp32_embedding
+            head_only = config.TRAIT_VERSION
+
+            monkeypatch.setenv(
+                "TRAIT_QUANTIZED_MODELS",
+                "discogs-effnet-bsdynamic,danceability-discogs-effnet-1",
+            )
+            importlib.reload(config)
+            assert config.TRAIT_VERSION not in (fp32_trait, head_only)
+            assert config.TRAIT_EMBEDDING_VERSION.startswith(fp32_embedding + "+int8-")
+
+            monkeypatch.setenv("TRAIT_QUANTIZED_MODELS", "all")
+            monkeypatch.setenv("TRAIT_ANALYSIS_POLICY", "excerpts")
+            importlib.reload(config)
+            assert config.TRAIT_VERSION.endswith("+int8")
+            assert config.TRAIT_EMBEDDING_VERSION == fp32_embedding + "+int8"
+            assert len(config.TRAIT_VERSION) <= 32  # track_trait.trait_version
+        finally:
+            monkeypatch.undo()
+            importlib.reload(config)
+        assert config.TRAIT_VERSION == fp32_trait
+
+
+    def test_split_trait_version(self):
+        from src.feature_extraction.config import split_trait_version
+
+        assert split_trait_version("4") == ("4", "", "")
+        assert split_trait_version("4+int8-abc123") == ("4", "", "int8-abc123")
+        assert split_trait_version("4+excerpts-3x30s+int8") == ("4", "excerpts-3x30s", "int8")
+        assert split_trait_version("4+center-20s") == ("4", "center-20s", "")
+
+
 class TestMigrationAndBackfill:
     """Unit tests for migration/backfill correctness and idempotency."""
 
@@ -707,6 +883,276 @@ class TestMigrationAndBackfill:
 
         mock_process.assert_not_called()
 
+    def test_heads_only_backfill_skips_rows_without_embedding(self):
+        """Heads-only mode loads no extractor when no row has a stored embedding."""
+        import importlib
+        from unittest.mock import MagicMock, patch
+
+        backfill = importlib.import_module(
+            "src.scripts.feature_extraction.backfill_genre_mood"
+        )
+
+        mock_session = MagicMock()
+        mock_session.query.return_value.filter.return_value.all.side_effect = [
+            [MagicMock(track_id=1)],
+            [],
+        ]
+
+        with patch.object(backfill, "database") as mock_db, \
+             patch.object(backfill, "Process") as mock_process, \
+             patch("src.feature_extraction.trait_extractor.TraitExtractor") as mock_extractor:
+            mock_db.create_session.return_value = mock_session
+            backfill.run(heads_only=True)
+
+        mock_process.assert_not_called()
+        mock_extractor.assert_not_called()
+        mock_session.commit.assert_not_called()
+
+    def test_heads_only_backfill_skips_rows_from_other_policy(self):
+        """Rows whose extras came from another analysis policy need a full backfill."""
+        import importlib
+        from unittest.mock import MagicMock, patch
+
+        backfill = importlib.import_module(
+            "src.scripts.feature_extraction.backfill_genre_mood"
+        )
+
+        mock_session = MagicMock()
+        mock_session.query.return_value.filter.return_value.all.side_effect = [
+            [MagicMock(track_id=1, trait_version="3+center-17s")],
+            [MagicMock(track_id=1)],
+        ]
+
+        with patch.object(backfill, "database") as mock_db, \
+             patch.object(backfill, "Process") as mock_process, \
+             patch("src.feature_extraction.trait_extractor.TraitExtractor") as mock_extractor:
+            mock_db.create_session.return_value = mock_session
+            backfill.run(heads_only=True)
+
+        mock_process.assert_not_called()
+        mock_extractor.assert_not_called()
+        mock_session.commit.assert_not_called()
+
+
+    def test_heads_only_backfill_ignores_quantization_tag(self):
+        """An INT8-tagged row with the current analysis policy stays heads-only."""
+        import importlib
+        from unittest.mock import MagicMock, patch
+
+        backfill = importlib.import_module(
+            "src.scripts.feature_extraction.backfill_genre_mood"
+        )
+        row = MagicMock(track_id=1, trait_version="3+int8-abc123")
+        with patch.object(backfill, "TRAIT_ANALYSIS_TAG", ""):
+            mock_session = MagicMock()
+            mock_session.query.return_value.filter.return_value.all.return_value = [
+                MagicMock(track_id=1)
+            ]
+            with patch("src.feature_extraction.trait_extractor.TraitExtractor") as mock_extractor:
+                backfill._backfill_heads_only(mock_session, [row])
+
+        mock_extractor.assert_called_once_with(heads_only=True)
+
+
+class _FakeInput:
+    def __init__(self, shape):
+        self.name = "input"
+        self.shape = shape
+
+
+class _FakeEffnet:
+    """Stand-in for the EffNet session: embedding row = first 1280 patch values."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def get_inputs(self):
+        return [_FakeInput(["batch", 128, 96])]
+
+    def run(self, output_names, feed):
+        x = feed["input"]
+        self.batch_sizes.append(len(x))
+        flat = x.reshape(len(x), -1)
+        return [np.zeros((len(x), 400), dtype=np.float32), flat[:, :1280].copy()]
+
+
+def _effnet_reference(mel):
+    """Mean embedding _FakeEffnet yields for mel, computed from the patches directly."""
+    patches = _patch_mel_for_effnet(mel)
+    return patches.reshape(len(patches), -1)[:, :1280].mean(axis=0)
+
+
+class _FakeHead:
+    """Stand-in for a 2-class softmax head with an optional fixed batch dim."""
+
+    def __init__(self, batch_dim="batch", seed=0):
+        self.batch_dim = batch_dim
+        self.calls = 0
+        self._w = np.random.default_rng(seed).standard_normal((1280, 2)).astype(np.float32)
+
+    def get_inputs(self):
+        return [_FakeInput([self.batch_dim, 1280])]
+
+    def run(self, output_names, feed):
+        x = feed["input"]
+        if isinstance(self.batch_dim, int):
+            assert len(x) == self.batch_dim
+        self.calls += 1
+        logits = x @ self._w * 1e-3
+        e = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return [e / e.sum(axis=1, keepdims=True)]
+
+
+def _fake_extractor(head_batch_dim="batch"):
+    from src.feature_extraction.config import TRAIT_CLASSIFIERS_EFFNET
+    from src.feature_extraction.trait_extractor import TraitExtractor
+
+    extractor = TraitExtractor.__new__(TraitExtractor)
+    extractor._effnet = _FakeEffnet()
+    extractor._maest = None
+    extractor._classifiers = {
+        name: (
+            _FakeHead(head_batch_dim, seed=i)
+            if name != "mtg_jamendo_moodtheme-discogs-effnet-1"
+            and name != "mtg_jamendo_instrument-discogs-effnet-1"
+            else None
+        )
+        for i, name in enumerate(TRAIT_CLASSIFIERS_EFFNET)
+    }
+    return extractor
+
+
+class TestBatchedInference:
+    """compute_batch() must match per-track compute() with fewer ONNX calls."""
+
+    def _mels(self):
+        rng = np.random.default_rng(3)
+        return [rng.random((96, T)).astype(np.float32) for T in (100, 500, 1300)]
+
+    @pytest.mark.parametrize("max_patches", [1, 7, 512])
+    def test_effnet_batch_matches_per_track(self, max_patches):
+        from src.feature_extraction.trait_extractor import _run_effnet_batch
+
+        session = _FakeEffnet()
+        mels = self._mels()
+        batched = _run_effnet_batch(session, mels, max_patches=max_patches)
+        assert batched.shape == (3, 1280)
+        for k, mel in enumerate(mels):
+            np.testing.assert_allclose(batched[k], _effnet_reference(mel), rtol=1e-6)
+        assert max(session.batch_sizes) <= max_patches
+
+    def test_classifier_batch_single_call(self):
+        from src.feature_extraction.trait_extractor import _run_classifier_batch
+
+        head = _FakeHead()
+        emb = np.random.default_rng(1).random((5, 1280)).astype(np.float32)
+        out = _run_classifier_batch(head, emb)
+        assert out.shape == (5, 2)
+        assert head.calls == 1
+        # Reference: each embedding through the head on its own
+        for k in range(5):
+            single = head.run(None, {"input": emb[k : k + 1]})[0][0]
+            np.testing.assert_allclose(out[k], single, rtol=1e-6)
+
+    def test_classifier_batch_fixed_batch_dim_loops(self):
+        from src.feature_extraction.trait_extractor import _run_classifier_batch
+
+        head = _FakeHead(batch_dim=1)
+        emb = np.random.default_rng(2).random((4, 1280)).astype(np.float32)
+        out = _run_classifier_batch(head, emb)
+        assert out.shape == (4, 2)
+        assert head.calls == 4
+
+    def test_compute_batch_matches_compute(self, tmp_path):
+        import soundfile as sf
+
+        paths = []
+        for i, freq in enumerate((220.0, 440.0, 880.0)):
+            t = np.arange(int(TRAIT_SAMPLE_RATE * (2 + i))) / TRAIT_SAMPLE_RATE
+            y = (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+            path = tmp_path / ("tone_%d.wav" % i)
+            sf.write(str(path), y, TRAIT_SAMPLE_RATE)
+            paths.append(str(path))
+
+        extractor = _fake_extractor()
+        batched = extractor.compute_batch(paths)
+        assert len(batched) == 3
+        for path, traits in zip(paths, batched):
+            _is_valid_trait_dict(traits)
+            single = extractor.compute(path)
+            for key in ("voice_instrumental", "danceability", "reverb"):
+                assert traits[key] == pytest.approx(single[key], abs=1e-6)
+            assert traits["onset_density"] == single["onset_density"]
+            assert traits["mood_theme"] is None
+
+    def test_compute_batch_isolates_failures(self, tmp_path):
+        import soundfile as sf
+
+        good = tmp_path / "good.wav"
+        sf.write(str(good), np.zeros(TRAIT_SAMPLE_RATE, dtype=np.float32), TRAIT_SAMPLE_RATE)
+        missing = str(tmp_path / "missing.wav")
+
+        results = _fake_extractor().compute_batch([missing, str(good)])
+        assert isinstance(results[0], Exception)
+        _is_valid_trait_dict(results[1])
+
+    def test_compute_batch_empty(self):
+        assert _fake_extractor().compute_batch([]) == []
+
+
+class TestStoredEmbeddings:
+    """Heads-only recompute from persisted EffNet embeddings."""
+
+    def _tone(self, tmp_path, freq=440.0):
+        import soundfile as sf
+
+        t = np.arange(TRAIT_SAMPLE_RATE * 3) / TRAIT_SAMPLE_RATE
+        path = tmp_path / "tone.wav"
+        sf.write(str(path), (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32), TRAIT_SAMPLE_RATE)
+        return str(path)
+
+    def test_compute_with_embedding(self, tmp_path):
+        from src.feature_extraction.trait_extractor import TraitEmbedding
+
+        traits, embedding = _fake_extractor().compute(self._tone(tmp_path), with_embedding=True)
+        _is_valid_trait_dict(traits)
+        assert isinstance(embedding, TraitEmbedding)
+        assert embedding.effnet.shape == (1280,)
+        assert embedding.genre_probs is None
+
+    def test_compute_from_embeddings_matches_compute(self, tmp_path):
+        from src.feature_extraction.compact_descriptor import pack_vector, unpack_vector
+
+        extractor = _fake_extractor()
+        traits, embedding = extractor.compute(self._tone(tmp_path), with_embedding=True)
+        stored = unpack_vector(pack_vector(embedding.effnet))
+
+        recomputed = extractor.compute_from_embeddings(
+            [(stored, None, traits["onset_density"], traits["spectral_flatness"])]
+        )
+        assert len(recomputed) == 1
+        for key in ("voice_instrumental", "danceability", "reverb", "onset_density"):
+            assert recomputed[0][key] == pytest.approx(traits[key], abs=1e-6)
+        assert recomputed[0]["trait_version"] == traits["trait_version"]
+
+    def test_compute_from_embeddings_runs_heads_once(self):
+        extractor = _fake_extractor()
+        rng = np.random.default_rng(4)
+        items = [(rng.random(1280).astype(np.float32), None, 1.0, 0.01) for _ in range(6)]
+        assert len(extractor.compute_from_embeddings(items)) == 6
+        for head in extractor._classifiers.values():
+            if head is not None:
+                assert head.calls == 1
+
+    def test_compute_from_embeddings_empty(self):
+        assert _fake_extractor().compute_from_embeddings([]) == []
+
+    def test_heads_only_cannot_infer(self):
+        extractor = _fake_extractor()
+        extractor._effnet = None
+        with pytest.raises(RuntimeError, match="heads_only"):
+            extractor._infer([np.zeros((96, 200), dtype=np.float32)])
+
 
 # ------------------------------------------------------------------ #
 # Integration tests — require models/traits/ to be populated          #
@@ -851,6 +1297,14 @@ class TestTraitExtractorIntegration:
         assert t1["onset_density"] == t2["onset_density"]
         assert t1["voice_instrumental"] == t2["voice_instrumental"]
 
+    @pytest.mark.skipif(len(_TEST_FILES) < 2, reason="Need 2+ test data files")
+    def test_compute_batch_matches_compute(self, extractor):
+        paths = [str(p) for p in _TEST_FILES[:3]]
+        for path, traits in zip(paths, extractor.compute_batch(paths)):
+            single = extractor.compute(path)
+            for key in ("voice_instrumental", "danceability", "bright_dark", "reverb"):
+                assert traits[key] == pytest.approx(single[key], abs=1e-4)
+
     def test_different_files_different_results(self, extractor):
         """Two distinct tracks should produce different embeddings and genres."""
         f1 = _TEST_DATA / "[05A - Cm - 000] Bicep - Vespa.mp3"
@@ -919,3 +1373,316 @@ class TestModelManagerIntegration:
         from src.feature_extraction.model_manager import is_cached
 
         assert not is_cached("nonexistent-model")
+
+
+# ------------------------------------------------------------------ #
+# Dynamic-batch MAEST — tiny synthetic ONNX graphs, no downloads      #
+# ------------------------------------------------------------------ #
+
+
+def _write_fixed_batch_model(path, reshape_batch=False, dim=64):
+    """Write a (1, dim) -> (1, dim) MatMul+Sigmoid graph with a fixed batch dim.
+
+    With reshape_batch=True the graph also hard-codes batch 1 in a Reshape,
+    which a dim-0 rewrite cannot fix.
+    """
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    w = np.random.default_rng(0).standard_normal((dim, dim)).astype(np.float32)
+    nodes = [
+        helper.make_node("MatMul", ["input", "w"], ["mm"]),
+        helper.make_node("Sigmoid", ["mm"], ["sig"]),
+    ]
+    initializers = [numpy_helper.from_array(w, "w")]
+    if reshape_batch:
+        initializers.append(numpy_helper.from_array(np.array([1, dim], dtype=np.int64), "shape"))
+        nodes.append(helper.make_node("Reshape", ["sig", "shape"], ["activations"]))
+    else:
+        nodes.append(helper.make_node("Identity", ["sig"], ["activations"]))
+    graph = helper.make_graph(
+        nodes,
+        "fixed",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, dim])],
+        [helper.make_tensor_value_info("activations", TensorProto.FLOAT, [1, dim])],
+        initializer=initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+    return str(path)
+
+
+class TestDynamicBatchVariant:
+    @pytest.fixture
+    def manager(self, tmp_path, monkeypatch):
+        from src.feature_extraction import model_manager
+
+        monkeypatch.setattr(model_manager, "_resolve_models_dir", lambda: str(tmp_path))
+        monkeypatch.setattr(
+            model_manager, "_MANIFEST", {"tiny": ("unused/tiny.onnx", "tiny.onnx")}
+        )
+        monkeypatch.setattr(model_manager, "_session_cache", {})
+        return model_manager
+
+    def test_rewrite_makes_batch_symbolic(self, tmp_path):
+        from src.feature_extraction.model_manager import _make_batch_dynamic
+        import onnxruntime as ort
+
+        src = _write_fixed_batch_model(tmp_path / "tiny.onnx")
+        dst = str(tmp_path / "tiny.dynbatch.onnx")
+        _make_batch_dynamic(src, dst)
+        session = ort.InferenceSession(dst, providers=["CPUExecutionProvider"])
+        assert session.get_inputs()[0].shape[0] == "batch"
+        out = session.run(None, {"input": np.ones((5, 64), dtype=np.float32)})[0]
+        assert out.shape == (5, 64)
+
+    def test_load_dynamic_batch_matches_fixed(self, manager, tmp_path):
+        _write_fixed_batch_model(tmp_path / "tiny.onnx")
+        fixed = manager.load_model("tiny")
+        dynamic = manager.load_model("tiny", dynamic_batch=True)
+        assert dynamic is not fixed
+        assert (tmp_path / "tiny.dynbatch.onnx").exists()
+
+        x = np.random.default_rng(1).standard_normal((3, 64)).astype(np.float32)
+        batched = dynamic.run(None, {"input": x})[0]
+        for k in range(3):
+            single = fixed.run(None, {"input": x[k : k + 1]})[0]
+            np.testing.assert_allclose(batched[k : k + 1], single, atol=1e-6)
+        assert manager.load_model("tiny", dynamic_batch=True) is dynamic
+
+    def test_hardcoded_batch_fails_and_is_remembered(self, manager, tmp_path):
+        _write_fixed_batch_model(tmp_path / "tiny.onnx", reshape_batch=True)
+        with pytest.raises(RuntimeError):
+            manager.load_model("tiny", dynamic_batch=True)
+        assert not (tmp_path / "tiny.dynbatch.onnx").exists()
+        assert (tmp_path / "tiny.dynbatch.failed").exists()
+        with pytest.raises(RuntimeError, match="previously failed"):
+            manager.load_model("tiny", dynamic_batch=True)
+        # The plain model still loads
+        assert manager.load_model("tiny") is not None
+
+
+class TestSessionTuning:
+    @pytest.fixture
+    def manager(self, tmp_path, monkeypatch):
+        from src.feature_extraction import model_manager
+
+        monkeypatch.setattr(model_manager, "_resolve_models_dir", lambda: str(tmp_path))
+        monkeypatch.setattr(
+            model_manager, "_MANIFEST", {"tiny": ("unused/tiny.onnx", "tiny.onnx")}
+        )
+        monkeypatch.setattr(model_manager, "_session_cache", {})
+        return model_manager
+
+    def _opened_paths(self, manager, monkeypatch):
+        import onnxruntime as ort
+
+        opened = []
+        real = ort.InferenceSession
+
+        def recording(path, *args, **kwargs):
+            opened.append(path)
+            return real(path, *args, **kwargs)
+
+        monkeypatch.setattr(manager.ort, "InferenceSession", recording)
+        return opened
+
+    def test_threads_split_across_workers(self, manager, monkeypatch):
+        monkeypatch.setattr(manager, "TRAIT_ORT_INTRA_OP_THREADS", 0)
+        monkeypatch.setattr(manager, "TRAIT_WORKERS", 4)
+        monkeypatch.setattr(manager, "TRAIT_INFERENCE_SERVER", False)
+        monkeypatch.setattr(manager.os, "cpu_count", lambda: 8)
+        assert manager._intra_op_threads() == 2
+
+        monkeypatch.setattr(manager, "TRAIT_INFERENCE_SERVER", True)
+        assert manager._intra_op_threads() == 8
+
+        monkeypatch.setattr(manager, "TRAIT_WORKERS", 16)
+        monkeypatch.setattr(manager, "TRAIT_INFERENCE_SERVER", False)
+        assert manager._intra_op_threads() == 1
+
+        monkeypatch.setattr(manager, "TRAIT_ORT_INTRA_OP_THREADS", 3)
+        assert manager._session_options().intra_op_num_threads == 3
+
+    def test_unknown_execution_mode_raises(self, manager, monkeypatch):
+        monkeypatch.setattr(manager, "TRAIT_ORT_EXECUTION_MODE", "turbo")
+        with pytest.raises(ValueError, match="TRAIT_ORT_EXECUTION_MODE"):
+            manager._session_options()
+
+    def test_optimized_graph_cached_and_reused(self, manager, tmp_path, monkeypatch):
+        model_path = _write_fixed_batch_model(tmp_path / "tiny.onnx")
+        opt_path = manager._optimized_path(model_path)
+        x = np.random.default_rng(2).standard_normal((1, 64)).astype(np.float32)
+
+        first = manager.load_model("tiny").run(None, {"input": x})[0]
+        assert os.path.exists(opt_path)
+        assert not [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+
+        monkeypatch.setattr(manager, "_session_cache", {})
+        opened = self._opened_paths(manager, monkeypatch)
+        second = manager.load_model("tiny").run(None, {"input": x})[0]
+        assert opened == [opt_path]
+        np.testing.assert_allclose(first, second, atol=1e-6)
+
+    def test_corrupt_optimized_graph_is_rebuilt(self, manager, tmp_path, monkeypatch):
+        model_path = _write_fixed_batch_model(tmp_path / "tiny.onnx")
+        opt_path = manager._optimized_path(model_path)
+        with open(opt_path, "wb") as f:
+            f.write(b"not an onnx graph")
+
+        opened = self._opened_paths(manager, monkeypatch)
+        assert manager.load_model("tiny") is not None
+        assert opened == [opt_path, model_path]
+        assert os.path.getsize(opt_path) > 100
+
+    def test_cache_disabled_writes_nothing(self, manager, tmp_path, monkeypatch):
+        monkeypatch.setattr(manager, "TRAIT_ORT_OPTIMIZED_CACHE", False)
+        model_path = _write_fixed_batch_model(tmp_path / "tiny.onnx")
+        manager.load_model("tiny")
+        assert not os.path.exists(manager._optimized_path(model_path))
+
+
+class TestQuantizedVariant:
+    @pytest.fixture
+    def manager(self, tmp_path, monkeypatch):
+        from src.feature_extraction import model_manager
+
+        monkeypatch.setattr(model_manager, "_resolve_models_dir", lambda: str(tmp_path))
+        monkeypatch.setattr(
+            model_manager, "_MANIFEST", {"tiny": ("unused/tiny.onnx", "tiny.onnx")}
+        )
+        monkeypatch.setattr(model_manager, "_session_cache", {})
+        monkeypatch.setattr(model_manager, "TRAIT_QUANTIZED_MODELS", [])
+        return model_manager
+
+    def test_int8_variant_close_to_fp32(self, manager, tmp_path):
+        pytest.importorskip("onnx")
+        _write_fixed_batch_model(tmp_path / "tiny.onnx", dim=256)
+        fp32 = manager.load_model("tiny")
+        int8 = manager.load_model("tiny", quantized=True)
+        assert int8 is not fp32
+        assert (tmp_path / "tiny.int8.onnx").exists()
+        assert os.path.getsize(tmp_path / "tiny.int8.onnx") < os.path.getsize(
+            tmp_path / "tiny.onnx"
+        )
+
+        # Small inputs keep the sigmoid out of saturation, where any error is visible
+        x = 0.05 * np.random.default_rng(5).standard_normal((1, 256)).astype(np.float32)
+        ref = fp32.run(None, {"input": x})[0]
+        out = int8.run(None, {"input": x})[0]
+        assert np.max(np.abs(out - ref)) < 0.02
+        assert manager.load_model("tiny", quantized=True) is int8
+
+    def test_config_selects_int8(self, manager, tmp_path, monkeypatch):
+        pytest.importorskip("onnx")
+        _write_fixed_batch_model(tmp_path / "tiny.onnx", dim=256)
+        monkeypatch.setattr(manager, "TRAIT_QUANTIZED_MODELS", ["tiny"])
+        assert manager.load_model("tiny") is manager.load_model("tiny", quantized=True)
+
+    def test_dynamic_batch_int8(self, manager, tmp_path):
+        pytest.importorskip("onnx")
+        _write_fixed_batch_model(tmp_path / "tiny.onnx", dim=256)
+        session = manager.load_model("tiny", dynamic_batch=True, quantized=True)
+        assert (tmp_path / "tiny.dynbatch.int8.onnx").exists()
+        out = session.run(None, {"input": np.ones((3, 256), dtype=np.float32)})[0]
+        assert out.shape == (3, 256)
+
+    def test_quantization_failure(self, manager, tmp_path, monkeypatch):
+        _write_fixed_batch_model(tmp_path / "tiny.onnx", dim=256)
+
+        def broken(src_path, dst_path):
+            raise RuntimeError("quantizer exploded")
+
+        monkeypatch.setattr(manager, "_quantize_int8", broken)
+        with pytest.raises(RuntimeError, match="quantizer exploded"):
+            manager.load_model("tiny", quantized=True)
+
+        # Selected via config: the versions already say INT8, so no fp32 fallback
+        monkeypatch.setattr(manager, "TRAIT_QUANTIZED_MODELS", ["all"])
+        with pytest.raises(RuntimeError, match="quantizer exploded"):
+            manager.load_model("tiny")
+        assert not (tmp_path / "tiny.int8.onnx").exists()
+        assert manager.load_model("tiny", quantized=False) is not None
+
+    def test_compare_outputs_metrics(self):
+        from src.scripts.feature_extraction.compare_quantized_models import (
+            _compare_outputs,
+            _summarize,
+        )
+
+        emb = np.ones(1280, dtype=np.float32)
+        heads = {
+            "danceability-discogs-effnet-1": np.array([0.2, 0.8]),
+            # Single sigmoid output: the stored probability is index 0
+            "nsynth_reverb-discogs-effnet-1": np.array([0.4]),
+            "mtg_jamendo_moodtheme-discogs-effnet-1": np.array([0.1, 0.5, 0.3, 0.05]),
+        }
+        drifted = {
+            "danceability-discogs-effnet-1": np.array([0.25, 0.75]),
+            "nsynth_reverb-discogs-effnet-1": np.array([0.3]),
+            "mtg_jamendo_moodtheme-discogs-effnet-1": np.array([0.1, 0.3, 0.5, 0.05]),
+        }
+        genre = np.array([0.7, 0.2, 0.1])
+
+        row = _compare_outputs((emb, heads, genre), (emb, drifted, genre), top_k=2)
+        assert row["deltas"] == {
+            "danceability": pytest.approx(0.05),
+            "reverb": pytest.approx(0.1),
+        }
+        assert row["top1"] == {"mood_theme": False, "genre": True}
+        assert row["topk"] == {"mood_theme": 1.0, "genre": 1.0}
+        assert row["embedding_cosine"] == pytest.approx(1.0)
+
+        summary = _summarize([row, row])
+        assert summary["tracks"] == 2
+        assert summary["binary"]["danceability"]["max_abs_delta"] == pytest.approx(0.05)
+        assert summary["multilabel"]["mood_theme"]["top1_agreement"] == 0.0
+
+
+class _FakeMaest:
+    def __init__(self, batch_dim):
+        self.batch_dim = batch_dim
+        self.batch_sizes = []
+
+    def get_inputs(self):
+        return [_FakeInput([self.batch_dim, 1876, 96])]
+
+    def run(self, output_names, feed):
+        x = feed["input"]
+        self.batch_sizes.append(len(x))
+        # (n, 519) "probabilities" derived from each patch
+        means = x.mean(axis=(1, 2))[:, None]
+        return [np.tile(means, (1, 519)) + np.arange(519, dtype=np.float32) * 1e-3]
+
+
+class TestRunMaestBatching:
+    def _mel(self, seconds):
+        T = int(seconds * TRAIT_SAMPLE_RATE / 256)
+        return np.random.default_rng(4).random((96, T)).astype(np.float32)
+
+    def test_fixed_batch_runs_one_patch_per_call(self):
+        from src.feature_extraction.trait_extractor import _run_maest
+
+        mel = self._mel(7 * 60)
+        session = _FakeMaest(batch_dim=1)
+        _run_maest(session, mel)
+        assert session.batch_sizes == [1] * len(_patch_mel_for_maest(mel))
+
+    def test_dynamic_batch_matches_fixed(self):
+        from src.feature_extraction.trait_extractor import _run_maest
+
+        mel = self._mel(7 * 60)
+        fixed = _run_maest(_FakeMaest(batch_dim=1), mel)
+        session = _FakeMaest(batch_dim="batch")
+        dynamic = _run_maest(session, mel, max_batch=16)
+        assert session.batch_sizes == [len(_patch_mel_for_maest(mel))]
+        assert dynamic.shape == (519,)
+        np.testing.assert_allclose(dynamic, fixed, rtol=1e-6)
+
+    def test_dynamic_batch_respects_max_batch(self):
+        from src.feature_extraction.trait_extractor import _run_maest
+
+        session = _FakeMaest(batch_dim="batch")
+        _run_maest(session, self._mel(7 * 60), max_batch=4)
+        assert session.batch_sizes == [4, 4, 4, 1]
@@ -0,0 +1,162 @@
+"""Unit tests for src/feature_extraction/trait_streaming.py
+
+Run with:
+    python -m pytest src/tests/test_trait_streaming.py -v
+"""
+
+import librosa
+import numpy as np
+import pytest
+
+from src.feature_extraction import trait_extractor
+from src.feature_extraction.config import SAMPLE_RATE, TRAIT_SAMPLE_RATE
+from src.feature_extraction.trait_extractor import (
+    _prepare_signal,
+    _run_maest,
+)
+from src.feature_extraction.trait_streaming import (
+    iter_signal_blocks,
+    stream_backbone_outputs,
+    stream_duration,
+)
+from src.tests.test_trait_extractor import (
+    _FakeEffnet,
+    _FakeMaest,
+    _effnet_reference,
+    _fake_extractor,
+)
+
+
+def _write_music(path, duration_s, sr=SAMPLE_RATE, channels=2, quiet_intro_s=2.0):
+    """Gated tone plus noise with a near-silent intro, written as a WAV."""
+    import soundfile as sf
+
+    rng = np.random.default_rng(11)
+    n = int(sr * duration_s)
+    t = np.arange(n) / sr
+    gate = (np.sin(2 * np.pi * 2 * t) > 0).astype(np.float64)
+    y = 0.3 * np.sin(2 * np.pi * 330 * t) * gate + 0.05 * rng.standard_normal(n)
+    y[: int(sr * quiet_intro_s)] *= 1e-3
+    data = np.stack([y, 0.7 * y], axis=1) if channels == 2 else y
+    sf.write(str(path), data.astype(np.float32), sr)
+    return str(path)
+
+
+class TestIterSignalBlocks:
+    @pytest.mark.parametrize("sr,channels", [(SAMPLE_RATE, 2), (TRAIT_SAMPLE_RATE, 1)])
+    def test_matches_librosa_load(self, tmp_path, sr, channels):
+        path = _write_music(tmp_path / "a.wav", 12.3, sr=sr, channels=channels)
+        expected, _ = librosa.load(path, sr=TRAIT_SAMPLE_RATE, mono=True)
+        blocks = list(iter_signal_blocks(path, block_seconds=2.7))
+        assert len(blocks) > 1
+        streamed = np.concatenate(blocks)
+        assert len(streamed) == len(expected)
+        np.testing.assert_allclose(streamed, expected, atol=1e-6)
+
+    def test_duration(self, tmp_path):
+        path = _write_music(tmp_path / "a.wav", 3.0)
+        assert stream_duration(path) == pytest.approx(3.0)
+        assert stream_duration(str(tmp_path / "missing.wav")) is None
+
+
+class TestStreamBackboneOutputs:
+    def _full(self, path, maest):
+        y, _ = librosa.load(path, sr=TRAIT_SAMPLE_RATE, mono=True)
+        mel, onset_density, flatness = _prepare_signal(y)
+        return _effnet_reference(mel), _run_maest(maest, mel), onset_density, flatness
+
+    @pytest.mark.parametrize("duration_s", [0.5, 75.0])
+    def test_matches_in_memory_path(self, tmp_path, duration_s):
+        path = _write_music(tmp_path / "a.wav", duration_s)
+        emb, genre, onset_density, flatness = self._full(path, _FakeMaest("batch"))
+
+        s_emb, s_genre, s_onset, s_flat = stream_backbone_outputs(
+            path, _FakeEffnet(), _FakeMaest("batch"), max_patches=7, block_seconds=3.3
+        )
+        np.testing.assert_allclose(s_emb, emb, atol=1e-5)
+        np.testing.assert_allclose(s_genre, genre, atol=1e-5)
+        assert s_onset == onset_density
+        assert s_flat == pytest.approx(flatness, abs=1e-6)
+
+    def test_bounded_batches(self, tmp_path):
+        path = _write_music(tmp_path / "a.wav", 75.0)
+        effnet = _FakeEffnet()
+        maest = _FakeMaest(1)
+        stream_backbone_outputs(path, effnet, maest, max_patches=16, block_seconds=5.0)
+        assert max(effnet.batch_sizes) <= 16
+        assert set(maest.batch_sizes) == {1}
+        assert len(maest.batch_sizes) == 2
+
+    def test_without_maest(self, tmp_path):
+        path = _write_music(tmp_path / "a.wav", 4.0)
+        _, genre, _, _ = stream_backbone_outputs(path, _FakeEffnet(), None)
+        assert genre is None
+
+    def test_zero_samples_raises(self, tmp_path):
+        import soundfile as sf
+
+        path = tmp_path / "empty.wav"
+        sf.write(str(path), np.zeros(0, dtype=np.float32), SAMPLE_RATE)
+        with pytest.raises(ValueError, match="zero samples"):
+            stream_backbone_outputs(str(path), _FakeEffnet(), None)
+
+
+class TestExtractorStreaming:
+    def test_compute_streams_long_files(self, tmp_path, monkeypatch):
+        path = _write_music(tmp_path / "a.wav", 8.0)
+        extractor = _fake_extractor()
+
+        monkeypatch.setattr(trait_extractor, "TRAIT_STREAM_MIN_SECONDS", 0)
+        expected = extractor.compute(path)
+
+        monkeypatch.setattr(trait_extractor, "TRAIT_STREAM_MIN_SECONDS", 5.0)
+        calls = []
+        real = extractor.compute_streaming
+        monkeypatch.setattr(
+            extractor,
+            "compute_streaming",
+            lambda *args: calls.append(args) or real(*args),
+        )
+        traits, embedding = extractor.compute(path, with_embedding=True)
+        assert len(calls) == 1
+        assert embedding.effnet.shape == (1280,)
+        for key in ("voice_instrumental", "danceability", "onset_density"):
+            assert traits[key] == pytest.approx(expected[key], abs=1e-5)
+
+    def test_compute_batch_streams_only_long_files(self, tmp_path, monkeypatch):
+        short = _write_music(tmp_path / "short.wav", 2.0)
+        long = _write_music(tmp_path / "long.wav", 8.0)
+        extractor = _fake_extractor()
+        monkeypatch.setattr(trait_extractor, "TRAIT_STREAM_MIN_SECONDS", 5.0)
+
+        streamed = []
+        real = extractor.compute_streaming
+        monkeypatch.setattr(
+            extractor,
+            "compute_streaming",
+            lambda path, *args: streamed.append(path) or real(path, *args),
+        )
+        results = extractor.compute_batch([short, long])
+        assert streamed == [long]
+        assert all(isinstance(r, dict) for r in results)
+
+    def test_excerpt_policy_reads_only_excerpts(self, tmp_path, monkeypatch):
+        path = _write_music(tmp_path / "a.wav", 30.0)
+        extractor = _fake_extractor()
+        monkeypatch.setattr(trait_extractor, "TRAIT_ANALYSIS_POLICY", "excerpts")
+        monkeypatch.setattr(trait_extractor, "TRAIT_ANALYSIS_EXCERPTS", 2)
+        monkeypatch.setattr(trait_extractor, "TRAIT_ANALYSIS_SECONDS", 5.0)
+
+        monkeypatch.setattr(trait_extractor, "TRAIT_STREAM_MIN_SECONDS", 0)
+        expected = extractor.compute(path)
+        streamed = extractor.compute_streaming(path)
+        assert streamed["onset_density"] == pytest.approx(expected["onset_density"], abs=0.1)
+        assert streamed["spectral_flatness"] == pytest.approx(
+            expected["spectral_flatness"], rel=1e-2
+        )
+
+    def test_remote_extractor_never_streams(self):
+        from src.feature_extraction.inference_server import RemoteTraitExtractor
+
+        remote = RemoteTraitExtractor(0, None, None)
+        assert remote._should_stream("any.wav") is False
@@ -70,6 +70,7 @@ class _MatchFixture:
             "collection_metadata": TransitionMatch.collection_metadata,
             "db_session": TransitionMatch.db_session,
             "cosine_cache": TransitionMatch.cosine_cache,
+            "descriptor_store": TransitionMatch.descriptor_store,
             "effective_weights": TransitionMatch.effective_weights,
             "od_desc": TransitionMatch._on_deck_descriptor_cache.copy(),
             "cd_desc": TransitionMatch._candidate_descriptor_cache.copy(),
@@ -79,9 +80,11 @@ class _MatchFixture:
         TransitionMatch.collection_metadata = self._collection_md
         TransitionMatch.db_session = MagicMock()
         TransitionMatch.cosine_cache = None
+        TransitionMatch.descriptor_store = None
         TransitionMatch.effective_weights = None
         TransitionMatch._on_deck_descriptor_cache.clear()
         TransitionMatch._candidate_descriptor_cache.clear()
+        TransitionMatch._batch_similarity_cache.clear()
         TransitionMatch._on_deck_trait_cache.clear()
         TransitionMatch._candidate_trait_cache.clear()
         return self
@@ -90,9 +93,11 @@ class _MatchFixture:
         TransitionMatch.collection_metadata = self._originals["collection_metadata"]
         TransitionMatch.db_session = self._originals["db_session"]
         TransitionMatch.cosine_cache = self._originals["cosine_cache"]
+        TransitionMatch.descriptor_store = self._originals["descriptor_store"]
         TransitionMatch.effective_weights = self._originals["effective_weights"]
         TransitionMatch._on_deck_descriptor_cache = self._originals["od_desc"]
         TransitionMatch._candidate_descriptor_cache = self._originals["cd_desc"]
+        TransitionMatch._batch_similarity_cache.clear()
         TransitionMatch._on_deck_trait_cache = self._originals["od_trait"]
         TransitionMatch._candidate_trait_cache = self._originals["cd_trait"]
 
@@ -478,6 +483,66 @@ class TestDBBackedScoreRetrieval:
             assert min(args[0], args[1]) == 300
             assert max(args[0], args[1]) == 400
 
+    @patch.object(TransitionMatch, "_persist_similarity")
+    def test_descriptor_store_is_used_before_db_rows(self, mock_persist):
+        """Vectors in the descriptor store are scored without a descriptor query."""
+        import numpy as np
+
+        with _MatchFixture():
+            store = MagicMock()
+            store.vector.side_effect = lambda track_id: np.ones(75, dtype=np.float32)
+            TransitionMatch.descriptor_store = store
+
+            queried = []
+
+            def filter_by_side_effect(**kwargs):
+                queried.append(kwargs)
+                mock_filtered = MagicMock()
+                mock_filtered.first.return_value = None
+                return mock_filtered
+
+            TransitionMatch.db_session.query.return_value.filter_by.side_effect = (
+                filter_by_side_effect
+            )
+
+            md_a = _make_md(300, title="A")
+            md_b = _make_md(400, title="B")
+            match = TransitionMatch(md_b, md_a, CamelotPriority.SAME_KEY)
+            assert match.get_similarity_score() > 0
+            assert not [c for c in queried if "track_id" in c]
+            mock_persist.assert_called_once()
+
+    @patch.object(TransitionMatch, "_persist_similarity")
+    def test_primed_scores_replace_per_pair_scoring(self, mock_persist):
+        """prime_similarities() scores all candidates at once from the store."""
+        import numpy as np
+
+        from src.feature_extraction.track_similarity import late_fusion_v1
+
+        rng = np.random.default_rng(0)
+        vectors = {i: rng.uniform(0.0, 1.0, 75).astype(np.float32) for i in (300, 400, 500)}
+        with _MatchFixture():
+            store = MagicMock()
+            store.vector.side_effect = vectors.get
+            store.rows.side_effect = lambda ids: np.array(
+                [sorted(vectors).index(i) if i in vectors else -1 for i in ids]
+            )
+            store.vectors = np.stack([vectors[i] for i in sorted(vectors)])
+            TransitionMatch.descriptor_store = store
+            TransitionMatch.db_session.query.return_value.filter_by.return_value.first.return_value = None
+
+            TransitionMatch.prime_similarities(300, [400, 500, 999, None])
+            assert set(TransitionMatch._batch_similarity_cache) == {(300, 400), (300, 500)}
+
+            store.vector.side_effect = AssertionError("scored per pair")
+            md_a = _make_md(300, title="A")
+            md_c = _make_md(500, title="C")
+            match = TransitionMatch(md_c, md_a, CamelotPriority.SAME_KEY)
+            assert match.get_similarity_score() == pytest.approx(
+                late_fusion_v1(vectors[300], vectors[500]), abs=1e-6
+            )
+            mock_persist.assert_called_once()
+
     def test_symmetric_pair_lookup_uses_canonical_order(self):
         """Swapped IDs must produce the same canonical DB lookup."""
         with _MatchFixture():